@@ -0,0 +1,32 @@
+from . import runners
+
+
+HookResult = runners.HookResult
+
+
+def run(hook_type='pre-commit', files=None, jobs=None, chunk_size=None):
+    """
+    Runs the installed hooks in the current process, giving the result of each hook as soon as it finishes. This is
+    the same as running the hooks through the ``git-hooks`` script without paying for its start up or having to read
+    its log, a caller can stop on the first failure by closing the generator (hooks already running are left to
+    finish but no more are started). The output of every hook is captured.
+
+    :param hook_type: The type of hooks to run (such as "pre-commit")
+    :param files: An iterable of the paths to check, if this is None the hooks are ran over the staged changes (only
+        supported for the hook types with a runner)
+    :param jobs: The number of hooks to run at once, defaults to the ``GIT_HOOKS_JOBS`` environment variable or 1
+    :param chunk_size: The maximum number of files given to a hook at once when files are given, each hook gives a
+        result for each chunk
+    :return: A generator of ``HookResult`` objects with the ``hook`` (its path, or a ``plugins.PluginHook`` for plugin
+        hooks), its exit ``status``, the ``duration`` in seconds, the captured ``output`` and flags if a ``cached``
+        result was used or the hook was ``skipped`` as every file it would be given is excluded
+    """
+    if files is not None:
+        runner = runners.FileListHookRunner(hook_type, files, chunk_size, jobs=jobs)
+    elif hook_type in runners.runner_classes:
+        runner = runners.get_runner(hook_type, jobs=jobs)
+    else:
+        raise ValueError(u'"{0}" hooks can only be ran over a list of files'.format(hook_type))
+
+    runner.capture = True
+    return runner.iter_results()
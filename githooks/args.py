@@ -1,4 +1,28 @@
 import argparse
+import json
+import os
+from collections import namedtuple
+
+
+Change = namedtuple('Change', ['status', 'path', 'old_path', 'similarity', 'old_oid', 'new_oid'])
+
+
+def manifest():
+    """
+    Reads the manifest the runner wrote for the hooks, the path is given in the ``GIT_HOOKS_MANIFEST`` environment
+    variable
+
+    :return: The manifest dictionary or None if there isn't one
+    """
+    path = os.environ.get('GIT_HOOKS_MANIFEST')
+    if not path:
+        return None
+
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
 
 
 def pre_commit():
@@ -7,5 +31,57 @@ def pre_commit():
     parser.add_argument('--modified-files', nargs='*', dest='modified', default=[])
     parser.add_argument('--added-files', nargs='*', dest='added', default=[])
     parser.add_argument('--deleted-files', nargs='*', dest='deleted', default=[])
+    parser.add_argument('--renamed-files', nargs='*', dest='renamed', default=[])
+
+    args = parser.parse_args()
+    hook_manifest = manifest() or {}
+    args.changed_lines = dict(
+        (path, [tuple(r) for r in ranges]) for path, ranges in (hook_manifest.get('changed_lines') or {}).items()
+    )
+    args.changes = [Change(*(c.get(f) for f in Change._fields)) for c in hook_manifest.get('changes') or []]
+    return args
+
+
+def is_pure_rename(change):
+    """
+    Checks if a change only moved a file without changing its content, a hook that only looks at file content can
+    skip these
+
+    :param change: A ``Change`` from the ``changes`` of the parsed arguments
+    :return: True if the file was renamed with its content unchanged
+    """
+    return change.status == 'R' and change.old_oid is not None and change.old_oid == change.new_oid
+
+
+def is_line_changed(changed_lines, path, line):
+    """
+    Checks if a line of a file was added or changed. If there are no line ranges for the file (for example the hook
+    wasn't given a manifest) every line is treated as changed.
+
+    :param changed_lines: The ``changed_lines`` from the parsed arguments
+    :param path: The absolute path of the file
+    :param line: The line number (starting at 1)
+    :return: True if the line was changed
+    """
+    ranges = changed_lines.get(path)
+    if ranges is None:
+        return True
+
+    return any(start <= line <= end for start, end in ranges)
+
+
+def report_result(path, status):
+    """
+    Reports the result of checking a single file to the runner. The runner caches the files that pass so they are not
+    given to the hook again until they change. This does nothing if the runner isn't collecting results (the hook must
+    declare ``# githooks-results: jsonl``).
+
+    :param path: The path of the file as given to the hook
+    :param status: 0 if the file passed, anything else if it failed
+    """
+    results_path = os.environ.get('GIT_HOOKS_RESULTS')
+    if not results_path:
+        return
 
-    return parser.parse_args()
+    with open(results_path, 'a') as f:
+        f.write(json.dumps({'path': path, 'status': status}) + '\n')
@@ -0,0 +1,209 @@
+import hashlib
+import io
+import json
+import os
+import tarfile
+import tempfile
+import zipfile
+from collections import namedtuple
+
+from . import utils
+
+
+MANIFEST_NAME = 'githooks-bundle.json'
+MANIFEST_VERSION = 1
+
+ZIP_MAGIC = b'PK\x03\x04'
+
+
+BundleEntry = namedtuple('BundleEntry', ['hook_type', 'name', 'path', 'sha256', 'metadata'])
+
+
+class BundleError(Exception):
+    """
+    Raised when a bundle is invalid or its content doesn't match the manifest
+    """
+
+
+def parse_manifest(data):
+    """
+    Parses and validates a bundle manifest
+
+    :param data: The raw manifest
+    :return: A list of ``BundleEntry`` objects
+    """
+    try:
+        manifest = json.loads(data.decode('utf-8'))
+        if manifest.get('version') != MANIFEST_VERSION:
+            raise BundleError(u'Unsupported bundle version {0}'.format(manifest.get('version')))
+
+        entries = [
+            BundleEntry(h['type'], h['name'], h.get('path') or u'{0}/{1}'.format(h['type'], h['name']), h['sha256'].lower(), h.get('metadata') or {})
+            for h in manifest['hooks']
+        ]
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise BundleError(u'The bundle manifest is invalid: {0}'.format(e))
+
+    hook_names = utils.get_hook_names()
+    for entry in entries:
+        if entry.hook_type not in hook_names:
+            raise BundleError(u'"{0}" is not a known hook type'.format(entry.hook_type))
+
+        if not entry.name or os.path.basename(entry.name) != entry.name or entry.name in ('.', '..'):
+            raise BundleError(u'"{0}" is not a valid hook name'.format(entry.name))
+
+    if len(set(e.path for e in entries)) != len(entries):
+        raise BundleError('The bundle manifest lists a path more than once')
+
+    return entries
+
+
+def _verify(entry, content):
+    digest = hashlib.sha256(content).hexdigest()
+    if digest != entry.sha256:
+        raise BundleError(u'The hash of "{0}" does not match the manifest (expected {1}, got {2})'.format(entry.path, entry.sha256, digest))
+
+    return content
+
+
+def _member_path(name):
+    return name[2:] if name.startswith('./') else name
+
+
+def _iter_tar(fileobj):
+    """
+    Reads a tar bundle as a stream, the manifest must be the first member
+    """
+    with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+        members = iter(archive)
+        first = next(members, None)
+        if first is None or _member_path(first.name) != MANIFEST_NAME:
+            raise BundleError(u'"{0}" must be the first file in a tar bundle'.format(MANIFEST_NAME))
+
+        entries = dict((e.path, e) for e in parse_manifest(archive.extractfile(first).read()))
+        yield list(entries.values())
+
+        for member in members:
+            entry = entries.pop(_member_path(member.name), None) if member.isfile() else None
+            if entry:
+                yield entry, _verify(entry, archive.extractfile(member).read())
+
+        if entries:
+            raise BundleError(u'The bundle is missing {0}'.format(', '.join(sorted(entries))))
+
+
+def _iter_zip(fileobj):
+    """
+    Reads a zip bundle, zip files keep their index at the end so the archive must be seekable
+    """
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipfile as e:
+        raise BundleError(u'The bundle is not a valid archive: {0}'.format(e))
+
+    with archive:
+        try:
+            entries = parse_manifest(archive.read(MANIFEST_NAME))
+        except KeyError:
+            raise BundleError(u'The bundle has no "{0}"'.format(MANIFEST_NAME))
+
+        yield entries
+
+        for entry in entries:
+            try:
+                content = archive.read(entry.path)
+            except KeyError:
+                raise BundleError(u'The bundle is missing {0}'.format(entry.path))
+
+            yield entry, _verify(entry, content)
+
+
+def read_bundle(fileobj):
+    """
+    Reads a bundle archive (a tar, optionally compressed, or a zip). The hooks are verified against the manifest as
+    they are read so a hook is never returned if its content doesn't match its hash.
+
+    :param fileobj: A binary file object to read the bundle from. Tar bundles are read as a stream so this doesn't need
+        to be seekable.
+    :return: A generator that first yields the list of ``BundleEntry`` objects from the manifest and then a tuple of
+        each entry and its content
+    """
+    head = fileobj.read(len(ZIP_MAGIC))
+
+    if head == ZIP_MAGIC:
+        spooled = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+        spooled.write(head)
+        for block in iter(lambda: fileobj.read(65536), b''):
+            spooled.write(block)
+        spooled.seek(0)
+        return _iter_zip(spooled)
+
+    return _iter_tar(_Prefixed(head, fileobj))
+
+
+class _Prefixed(io.RawIOBase):
+    """
+    A stream that replays the bytes already read from the start of another stream
+    """
+
+    def __init__(self, head, stream):
+        super(_Prefixed, self).__init__()
+        self.head = head
+        self.stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.head:
+            size = min(len(buffer), len(self.head))
+            buffer[:size] = self.head[:size]
+            self.head = self.head[size:]
+            return size
+
+        data = self.stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def write_bundle(hooks_dir, path, metadata=None):
+    """
+    Creates a gzipped tar bundle from a directory laid out as ``<hook type>/<hook name>``
+
+    :param hooks_dir: The directory containing the hooks
+    :param path: The path to write the bundle to
+    :param metadata: A dictionary mapping "<hook type>/<hook name>" to extra metadata for that hook
+    :return: The list of ``BundleEntry`` objects in the bundle
+    """
+    entries = []
+    hook_names = utils.get_hook_names()
+
+    for hook_type in sorted(os.listdir(hooks_dir)):
+        type_dir = os.path.join(hooks_dir, hook_type)
+        if hook_type not in hook_names or not os.path.isdir(type_dir):
+            continue
+
+        for name in sorted(os.listdir(type_dir)):
+            with open(os.path.join(type_dir, name), 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+
+            entry_path = u'{0}/{1}'.format(hook_type, name)
+            entries.append(BundleEntry(hook_type, name, entry_path, digest, (metadata or {}).get(entry_path, {})))
+
+    manifest = json.dumps({
+        'version': MANIFEST_VERSION,
+        'hooks': [
+            {'type': e.hook_type, 'name': e.name, 'path': e.path, 'sha256': e.sha256, 'metadata': e.metadata} for e in entries
+        ],
+    }, indent=2, sort_keys=True).encode('utf-8')
+
+    with tarfile.open(path, 'w:gz') as archive:
+        info = tarfile.TarInfo(MANIFEST_NAME)
+        info.size = len(manifest)
+        info.mode = 0o644
+        archive.addfile(info, io.BytesIO(manifest))
+
+        for entry in entries:
+            archive.add(os.path.join(hooks_dir, entry.path), entry.path)
+
+    return entries
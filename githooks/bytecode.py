@@ -0,0 +1,152 @@
+import hashlib
+import logging
+import os
+import subprocess
+
+from . import utils
+
+
+logger = logging.getLogger(__name__)
+
+
+# Ran in the hooks own interpreter in place of the hook. The code object for the hooks source is read from the cache
+# and executed as "__main__". When compiling the code is stored rather than ran, when running a hook that isn't in the
+# cache for this interpreter the hook script is ran directly instead so nothing is compiled while the hooks run. The
+# cache file name includes the interpreters cache tag so hooks shared between python versions don't read each others
+# bytecode. Only modules that are already loaded at interpreter start up are used so the loader adds nothing to the
+# hooks start up time.
+LOADER = '''
+import marshal, os, sys
+mode, prefix, path = sys.argv[1:4]
+impl = getattr(sys, 'implementation', None)
+cached = '%s.%s.bin' % (prefix, getattr(impl, 'cache_tag', None) or 'py%d%d' % sys.version_info[:2])
+try:
+    with open(cached, 'rb') as f:
+        code = marshal.load(f)
+except Exception:
+    if mode == 'run':
+        os.execv(sys.executable, [sys.executable] + sys.argv[3:])
+    with open(path, 'rb') as f:
+        code = compile(f.read(), path, 'exec', 0, True)
+    try:
+        os.makedirs(os.path.dirname(cached))
+    except OSError:
+        pass
+    try:
+        tmp = '%s.%d' % (cached, os.getpid())
+        with open(tmp, 'wb') as f:
+            marshal.dump(code, f)
+        os.rename(tmp, cached)
+    except OSError:
+        pass
+if mode == 'compile':
+    sys.exit(0)
+sys.argv = sys.argv[3:]
+sys.path[0] = os.path.dirname(path)
+main = type(sys)('__main__')
+main.__file__ = path
+main.__builtins__ = __builtins__
+sys.modules['__main__'] = main
+del marshal, os, impl, cached, mode, prefix, path, f
+exec(code, main.__dict__)
+'''
+
+
+class BytecodeCache(object):
+    """
+    A cache of compiled python hooks keyed by the hash of their source. Hooks are installed without a ".py" suffix so
+    python never caches their bytecode itself, without this every python hook would compile its full source on every
+    run. Hooks are only compiled when they are installed and only hooks found in the cache are ran through the loader,
+    any other hook (such as one written by hand) is ran as it is. Changing a hook changes its hash so stale code is
+    never used.
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: The directory to store the compiled hooks in, defaults to "bytecode" in the users git-hooks cache
+        """
+        self.path = path or utils.user_cache_dir('bytecode')
+        self._prefixes = {}
+        self._compiled = set()
+
+    def prefix(self, path):
+        """
+        Gets the start of the cache file name for a hook, the loader adds the interpreters cache tag to this
+
+        :param path: The path of the hook
+        :return: The cache file prefix
+        """
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+
+        return os.path.join(self.path, digest[:2], digest)
+
+    def is_compiled(self, prefix):
+        """
+        Checks if a hook has been compiled into the cache by any interpreter
+
+        :param prefix: The cache file prefix of the hook
+        :return: True if the cache has code for the hook
+        """
+        directory, name = os.path.split(prefix)
+        try:
+            return any(f.startswith(name + '.') and f.endswith('.bin') for f in os.listdir(directory))
+        except OSError:
+            return False
+
+    def command(self, path, mode='run', interpreter=None):
+        """
+        Gets the command to run a hook through the loader
+
+        :param path: The path of the hook
+        :param mode: "run" to run the hook or "compile" to only compile it into the cache
+        :param interpreter: The interpreter command to use rather than the one from the hooks shebang
+        :return: The command as a list or None if the hook is not a python script or, when running, has not been
+            compiled
+        """
+        if path not in self._prefixes:
+            shebang = utils.python_interpreter(path)
+            try:
+                self._prefixes[path] = (shebang, self.prefix(path)) if shebang else None
+            except (IOError, OSError):
+                self._prefixes[path] = None
+
+        if self._prefixes[path] is None:
+            return None
+
+        shebang, prefix = self._prefixes[path]
+        if mode == 'run' and not self.is_compiled(prefix):
+            return None
+
+        return list(interpreter or shebang) + ['-c', LOADER, mode, prefix, path]
+
+    def compile(self, path, interpreter=None):
+        """
+        Compiles a python hook into the cache using the interpreter the hook is ran with. Hooks that are not python
+        scripts are ignored and each unique hook is only compiled once by a cache instance.
+
+        :param path: The path of the hook
+        :param interpreter: The interpreter command to use rather than the one from the hooks shebang
+        :return: True if the hook was compiled
+        """
+        command = self.command(path, 'compile', interpreter)
+        if command is None:
+            return False
+
+        key = (self._prefixes[path][1], tuple(interpreter or ()))
+        if key in self._compiled:
+            return True
+
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            output = process.communicate()[0]
+        except OSError as e:
+            logger.debug(u'Could not precompile "{0}": {1}'.format(path, e))
+            return False
+
+        if process.returncode != 0:
+            logger.debug(u'Could not precompile "{0}": {1}'.format(path, output.decode('utf-8', 'replace')))
+            return False
+
+        self._compiled.add(key)
+        return True
@@ -0,0 +1,360 @@
+import hashlib
+import json
+import logging
+import re
+import tempfile
+import threading
+
+import os
+
+from . import meta, repo, utils
+from .compat import FileExistsException, encode_path, replace, string_types
+
+
+logger = logging.getLogger(__name__)
+
+# only needed when a remote cache is configured
+requests = utils.LazyModule('requests')
+
+
+CACHE_DIR_NAME = 'githooks-cache'
+
+
+def hash_file(path):
+    """
+    Gets the sha1 hash of a files content
+
+    :param path: The path of the file to hash
+    :return: The hex digest
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def result_key(*parts):
+    """
+    Builds a cache key from the parts describing a hooks input (for example the path and blob id of a file)
+
+    :param parts: The strings making up the key
+    :return: The key
+    """
+    return hashlib.sha1(b'\0'.join(encode_path(p) for p in parts)).hexdigest()
+
+
+def is_pass(result):
+    """
+    Checks if a cached result is a pass
+
+    :param result: The cached result (or None)
+    :return: True if the result exists and has a zero status
+    """
+    return result is not None and result.get('status') == 0
+
+
+HASH_RE = re.compile(r'^[0-9a-f]{40}$')
+
+
+def is_valid_entry(hook_hash, key):
+    """
+    Checks an entry is made of two sha1 hex digests, entries from outside the process are checked before they are used
+    to build paths
+
+    :param hook_hash: The hash of the hook
+    :param key: The key describing the hooks input
+    :return: True if both are valid
+    """
+    return all(isinstance(v, string_types) and HASH_RE.match(v) for v in (hook_hash, key))
+
+
+class FileSystemBackend(object):
+    """
+    Stores results in a directory. Each result is a small JSON file so a lookup is a single file read and concurrent
+    writers never conflict.
+
+    A backend looks up and stores many entries at once, each entry is a tuple of the hook hash and the input key.
+
+    :var read_only: Flag if results are never written
+    """
+    read_only = False
+
+    def __init__(self, path):
+        """
+        :param path: The directory to store results in
+        """
+        self.path = path
+
+    def _entry_path(self, hook_hash, key):
+        return os.path.join(self.path, hook_hash, key[:2], key[2:])
+
+    def lookup(self, entries):
+        """
+        Gets the stored results for many entries
+
+        :param entries: A list of (hook hash, key) tuples
+        :return: A dictionary mapping entries to results, entries without a stored result are not included
+        """
+        results = {}
+        for hook_hash, key in entries:
+            try:
+                with open(self._entry_path(hook_hash, key)) as f:
+                    results[(hook_hash, key)] = json.load(f)
+            except (IOError, OSError, ValueError):
+                continue
+
+        return results
+
+    def store(self, results):
+        """
+        Stores many results, each entry is replaced atomically
+
+        :param results: A dictionary mapping (hook hash, key) tuples to result dictionaries
+        """
+        for (hook_hash, key), result in results.items():
+            path = self._entry_path(hook_hash, key)
+            try:
+                os.makedirs(os.path.dirname(path))
+            except FileExistsException:
+                pass
+
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(result, f)
+
+            replace(tmp_path, path)
+
+
+class HttpBackend(object):
+    """
+    Shares results through a cache server (see ``cache_server``) so results from one machine are used on every other.
+    All the entries in a lookup are sent in a single request. If the server can't be reached a warning is logged and
+    the backend is not used again for the life of the process, so a missing server never slows down the hooks more
+    than once.
+
+    Entries are posted as ``{"entries": [{"hook": <hook hash>, "key": <key>}, ...]}`` to ``<url>/lookup`` which
+    answers with the stored ``{"results": [{"hook": ..., "key": ..., "result": {...}}, ...]}``. Results are posted to
+    ``<url>/store`` in the same shape as the lookup response.
+
+    :var timeout: The number of seconds to wait for the server
+    """
+    timeout = 2.0
+
+    def __init__(self, url, read_only=True, token=None, timeout=None):
+        """
+        :param url: The base url of the cache server
+        :param read_only: Flag if results are only read from the server, developer machines usually read the results
+            uploaded by CI
+        :param token: The token sent to the server with stored results
+        :param timeout: The number of seconds to wait for the server
+        """
+        self.url = url.rstrip('/')
+        self.read_only = read_only
+        self.token = token
+        self.available = True
+        if timeout:
+            self.timeout = timeout
+
+    def _post(self, endpoint, payload):
+        if not self.available:
+            return None
+
+        headers = {'Authorization': u'Bearer {0}'.format(self.token)} if self.token else {}
+        try:
+            response = requests.post(u'{0}/{1}'.format(self.url, endpoint), json=payload, headers=headers, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json() if response.content else {}
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(u'Not using the remote result cache at "{0}": {1}'.format(self.url, e))
+            self.available = False
+            return None
+
+    def lookup(self, entries):
+        if not entries:
+            return {}
+
+        response = self._post('lookup', {'entries': [{'hook': h, 'key': k} for h, k in entries]}) or {}
+
+        requested = set(entries)
+        results = {}
+        for item in response.get('results') or []:
+            try:
+                entry = (item['hook'], item['key'])
+                if entry in requested and isinstance(item['result'], dict):
+                    results[entry] = item['result']
+            except (KeyError, TypeError):
+                continue
+
+        return results
+
+    def store(self, results):
+        if self.read_only or not results:
+            return
+
+        self._post('store', {'entries': [{'hook': h, 'key': k, 'result': r} for (h, k), r in results.items()]})
+
+
+class TieredBackend(object):
+    """
+    Looks results up in a local backend before falling back to a remote one, results found remotely are stored locally
+    so they are only fetched once. Results are stored in both backends (the remote backend ignores them if it is read
+    only).
+    """
+    read_only = False
+
+    def __init__(self, local, remote):
+        """
+        :param local: The backend checked first
+        :param remote: The backend checked for the entries the local backend doesn't have
+        """
+        self.local = local
+        self.remote = remote
+
+    def lookup(self, entries):
+        results = self.local.lookup(entries)
+        missing = [e for e in entries if e not in results]
+        if missing:
+            fetched = self.remote.lookup(missing)
+            if fetched:
+                self.local.store(fetched)
+                results.update(fetched)
+
+        return results
+
+    def store(self, results):
+        self.local.store(results)
+        self.remote.store(results)
+
+
+CACHE_MODES = ('read', 'write')
+
+
+def get_backend(path):
+    """
+    Gets the backend for a result cache. Results are always stored in a local directory, if the
+    ``GIT_HOOKS_CACHE_URL`` environment variable is set a cache server is also used. The ``GIT_HOOKS_CACHE_MODE``
+    environment variable is "read" (the default) to only read results from the server or "write" to upload results as
+    well, the ``GIT_HOOKS_CACHE_TOKEN`` environment variable is sent to the server with uploaded results.
+
+    :param path: The local directory to store results in
+    :return: The backend
+    """
+    local = FileSystemBackend(path)
+    url = os.environ.get('GIT_HOOKS_CACHE_URL')
+    if not url:
+        return local
+
+    mode = os.environ.get('GIT_HOOKS_CACHE_MODE', 'read').lower()
+    if mode not in CACHE_MODES:
+        logger.warning(u'Invalid cache mode "{0}", only reading from the remote result cache'.format(mode))
+
+    return TieredBackend(local, HttpBackend(url, read_only=mode != 'write', token=os.environ.get('GIT_HOOKS_CACHE_TOKEN')))
+
+
+class ResultCache(object):
+    """
+    Stores the results of running hooks keyed by the hash of the hook and a key describing the input the hook was given
+    (see ``result_key``). Changing a hook changes its hash so old results are never used for a new version of a hook.
+
+    The results are held by a backend (see ``get_backend``). The entries for a run can be looked up at once with
+    ``prefetch`` so a remote backend only needs a single round trip, the fetched results are kept for the life of the
+    cache.
+    """
+    def __init__(self, path=None, backend=None):
+        """
+        :param path: The directory to store results in. Defaults to a directory in the repos hooks directory
+        :param backend: The backend to use instead of the one configured by the environment
+        """
+        if backend is None:
+            path = path or os.path.join(repo.hooks_directory(), CACHE_DIR_NAME)
+            backend = get_backend(path)
+
+        self.path = path
+        self.backend = backend
+        self._hook_hashes = {}
+        self._fetched = {}
+        self._lock = threading.Lock()
+
+    def hook_hash(self, hook_path):
+        """
+        Gets the hash of a hook, the hash is only calculated once for each hook. Plugin hooks provide their own digest.
+
+        :param hook_path: The path of the hook
+        :return: The hash of the hooks content
+        """
+        with self._lock:
+            if hook_path not in self._hook_hashes:
+                self._hook_hashes[hook_path] = hook_path.digest if meta.is_plugin(hook_path) else hash_file(hook_path)
+
+            return self._hook_hashes[hook_path]
+
+    def prefetch(self, entries):
+        """
+        Looks up many entries (for any number of hooks) in one go, later lookups of these entries don't go to the
+        backend
+
+        :param entries: A list of (hook hash, key) tuples
+        """
+        with self._lock:
+            missing = list(set(e for e in entries if e not in self._fetched))
+
+        if not missing:
+            return
+
+        results = self.backend.lookup(missing)
+        with self._lock:
+            for entry in missing:
+                self._fetched[entry] = results.get(entry)
+
+    def get(self, hook_hash, key):
+        """
+        Gets a stored result
+
+        :param hook_hash: The hash of the hook
+        :param key: The key describing the hooks input
+        :return: The result dictionary or None if no result is stored
+        """
+        return self.get_many(hook_hash, [key]).get(key)
+
+    def get_many(self, hook_hash, keys):
+        """
+        Gets the stored results for many inputs to the same hook
+
+        :param hook_hash: The hash of the hook
+        :param keys: The keys to look up
+        :return: A dictionary mapping keys to results, keys without a stored result are not included
+        """
+        keys = list(keys)
+        with self._lock:
+            fetched = dict((k, self._fetched[(hook_hash, k)]) for k in keys if (hook_hash, k) in self._fetched)
+
+        missing = [(hook_hash, k) for k in keys if k not in fetched]
+        if missing:
+            fetched.update((k, r) for (_, k), r in self.backend.lookup(missing).items())
+
+        return dict((k, r) for k, r in fetched.items() if r is not None)
+
+    def set(self, hook_hash, key, result):
+        """
+        Stores a result
+
+        :param hook_hash: The hash of the hook
+        :param key: The key describing the hooks input
+        :param result: The result dictionary, this should include a 'status' (the return code of the hook)
+        """
+        self.set_many(hook_hash, {key: result})
+
+    def set_many(self, hook_hash, results):
+        """
+        Stores the results for many inputs to the same hook
+
+        :param hook_hash: The hash of the hook
+        :param results: A dictionary mapping keys to results
+        """
+        entries = dict(((hook_hash, k), r) for k, r in results.items())
+        self.backend.store(entries)
+
+        with self._lock:
+            self._fetched.update(entries)
@@ -0,0 +1,122 @@
+import hmac
+import json
+import logging
+
+from . import cache
+
+# the http server is only imported by this module so commands that don't serve the cache don't pay for loading it
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:  # pragma: no cover (python 2)
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+logger = logging.getLogger(__name__)
+
+
+MAX_REQUEST_SIZE = 16 * 1024 * 1024
+
+
+class CacheRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers the lookups and stores of ``cache.HttpBackend``. Entries that aren't made of two sha1 hex digests are
+    ignored so a request can never read or write outside of the cache directory.
+    """
+    server_version = 'githooks-cache'
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_no_content(self):
+        self.send_response(204)
+        self.end_headers()
+
+    def read_entries(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+
+        if not 0 < length <= MAX_REQUEST_SIZE:
+            return None
+
+        try:
+            entries = json.loads(self.rfile.read(length).decode('utf-8')).get('entries')
+        except (ValueError, AttributeError):
+            return None
+
+        if not isinstance(entries, list):
+            return None
+
+        return [e for e in entries if isinstance(e, dict) and cache.is_valid_entry(e.get('hook'), e.get('key'))]
+
+    def can_write(self):
+        if self.server.read_only:
+            return False
+
+        if not self.server.token:
+            return True
+
+        expected = u'Bearer {0}'.format(self.server.token)
+        return hmac.compare_digest(str(self.headers.get('Authorization') or ''), str(expected))
+
+    def do_POST(self):
+        if self.path.rstrip('/') == '/lookup':
+            entries = self.read_entries()
+            if entries is None:
+                return self.send_json(400, {'error': 'expected a json object with a list of entries'})
+
+            results = self.server.backend.lookup([(e['hook'], e['key']) for e in entries])
+            return self.send_json(200, {
+                'results': [{'hook': h, 'key': k, 'result': r} for (h, k), r in results.items()],
+            })
+
+        if self.path.rstrip('/') == '/store':
+            if not self.can_write():
+                return self.send_json(403, {'error': 'this client can not store results'})
+
+            entries = self.read_entries()
+            if entries is None:
+                return self.send_json(400, {'error': 'expected a json object with a list of entries'})
+
+            self.server.backend.store(dict(
+                ((e['hook'], e['key']), e['result']) for e in entries if isinstance(e.get('result'), dict)
+            ))
+            return self.send_no_content()
+
+        self.send_json(404, {'error': 'unknown endpoint'})
+
+
+class CacheServer(ThreadingMixIn, HTTPServer):
+    """
+    A small reference server for sharing hook results between machines, results are stored in a directory using
+    ``cache.FileSystemBackend``. CI usually runs with a token it sends when storing results, while developers only
+    read them.
+
+    :var backend: The backend the results are stored in
+    :var read_only: Flag if every store is refused
+    :var token: The token a client must send to store results, if this is None any client can store results
+    """
+    daemon_threads = True
+
+    def __init__(self, address, path, read_only=False, token=None):
+        """
+        :param address: The (host, port) tuple to listen on
+        :param path: The directory to store results in
+        :param read_only: Flag if every store is refused
+        :param token: The token a client must send to store results
+        """
+        HTTPServer.__init__(self, address, CacheRequestHandler)
+        self.backend = cache.FileSystemBackend(path)
+        self.read_only = read_only
+        self.token = token
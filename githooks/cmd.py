@@ -1,21 +1,42 @@
 from __future__ import print_function
 
-import hashlib
 import logging
 import stat
 from argparse import ArgumentParser
+from collections import namedtuple
+from contextlib import closing
 
 import posixpath
-import requests
 import os
-import shutil
+import sys
 
-from . import utils, repo
-from .compat import ConfigParser, urlsplit, urljoin, FileExistsException
+from . import utils
+from .compat import ConfigParser, urlsplit, urljoin, FileExistsException, replace
 
 
 logger = logging.getLogger(__name__)
 
+# these are only imported once a command uses them so running a single command doesn't pay for loading every other
+filecmp = utils.LazyModule('filecmp')
+multiprocessing = utils.LazyModule('multiprocessing')
+shutil = utils.LazyModule('shutil')
+tempfile = utils.LazyModule('tempfile')
+threading = utils.LazyModule('threading')
+requests = utils.LazyModule('requests')
+bundle = utils.LazyModule('githooks.bundle')
+bytecode = utils.LazyModule('githooks.bytecode')
+cache_server = utils.LazyModule('githooks.cache_server')
+deferred = utils.LazyModule('githooks.deferred')
+envs = utils.LazyModule('githooks.envs')
+meta = utils.LazyModule('githooks.meta')
+profiling = utils.LazyModule('githooks.profiling')
+repo = utils.LazyModule('githooks.repo')
+runners = utils.LazyModule('githooks.runners')
+schedule = utils.LazyModule('githooks.schedule')
+sources = utils.LazyModule('githooks.sources')
+stats = utils.LazyModule('githooks.stats')
+watch = utils.LazyModule('githooks.watch')
+
 
 def get_input():  # pragma: no cover (this is always mocked out)
     return input()
@@ -26,7 +47,8 @@ class Base(object):
     The base command object
 
     :var description: The brief description of the command
-    :var sub_commands: A dictionary mapping names to sub commands. Each value should be a class inheriting from Base.
+    :var sub_commands: A dictionary mapping names to sub commands. Each value should be a class inheriting from Base or
+        its "module:Class" reference, a reference is only imported if its command is selected (or the help is shown).
     """
     description = None
     sub_commands = {}
@@ -75,32 +97,53 @@ class Base(object):
         """
         pass
 
-    def register_sub_commands(self, parser):
+    def register_sub_commands(self, parser, argv=None):
         """
-        Add any sub commands to the argument parser.
+        Add any sub commands to the argument parser. Only the sub command selected by the command line is loaded and
+        has its arguments added, the others are registered by name alone. If no sub command is selected (such as when
+        showing the help) every sub command is loaded so they can be described.
 
         :param parser: The argument parser object
+        :param argv: The command line arguments to select the sub command from, defaults to the process arguments
         """
         sub_commands = self.get_sub_commands()
         if sub_commands:
             sub_parsers = parser.add_subparsers(dest=self.sub_parser_dest_name)
 
-            for name, cls in sub_commands.items():
-                cmd = cls(name)
+            argv = sys.argv[1:] if argv is None else argv
+            selected = next((i for i, arg in enumerate(argv) if arg in sub_commands), None)
+
+            for name in sub_commands:
+                if selected is not None and argv[selected] != name:
+                    sub_parsers.add_parser(name)
+                    continue
+
+                cmd = self.get_sub_command(name)(name)
 
                 sub_parser = sub_parsers.add_parser(name, help=cmd.get_description(), description=cmd.get_description())
 
                 cmd.add_args(sub_parser)
-                cmd.register_sub_commands(sub_parser)
+                cmd.register_sub_commands(sub_parser, argv[selected + 1:] if selected is not None else [])
 
     def get_sub_commands(self):
         """
-        Gets a dictionary mapping names to sub commands. Values should be classes inheriting from Base.
+        Gets a dictionary mapping names to sub commands. Values should be classes inheriting from Base or their
+        "module:Class" references.
 
         :return: The list of sub commands.
         """
         return self.sub_commands
 
+    def get_sub_command(self, name):
+        """
+        Gets the class of a sub command, importing it if it is registered by its reference
+
+        :param name: The name of the sub command
+        :return: The sub command class
+        """
+        cls = self.get_sub_commands()[name]
+        return utils.import_string(cls) if isinstance(cls, str) else cls
+
     def get_description(self):
         """
         Gets the description of the command
@@ -129,18 +172,67 @@ class Base(object):
 
         sub_command_name = getattr(args, self.sub_parser_dest_name, None)
         if sub_command_name:
-            return self.get_sub_commands()[sub_command_name]().action(args)
+            return self.get_sub_command(sub_command_name)().action(args)
         return self.action(args)
 
 
+RepoResult = namedtuple('RepoResult', ['root', 'changed', 'skipped', 'error'])
+
+
+def report_repos(results, changed_label):
+    """
+    Logs a consolidated report of an action performed over many repositories
+
+    :param results: A list of ``RepoResult`` objects
+    :param changed_label: The word used to describe the changed hooks (eg 'installed')
+    :return: The number of repositories the action failed for
+    """
+    failed = 0
+    for result in sorted(results, key=lambda r: r.root):
+        if result.error:
+            failed += 1
+            status = u'failed: {0}'.format(result.error)
+        elif result.changed:
+            status = u'{0} {1}'.format(changed_label, ', '.join(result.changed))
+        else:
+            status = u'up to date'
+
+        if result.skipped:
+            status += u' (skipped {0}, use "--overwrite" to replace)'.format(', '.join(result.skipped))
+
+        logger.info(u'{0}: {1}'.format(result.root, status))
+
+    changed = len([r for r in results if r.changed and not r.error])
+    logger.info(u'{0} repositories: {1} {2}, {3} up to date, {4} failed'.format(
+        len(results), changed, changed_label, len(results) - changed - failed, failed
+    ))
+
+    return failed
+
+
+def add_recursive_args(parser, verb):
+    """
+    Adds the arguments used to perform an action on every repository under a directory
+
+    :param parser: The argument parser object
+    :param verb: The action being performed (eg 'initialise')
+    """
+    parser.add_argument('-r', '--recursive', help=u'{0} every git repository (including submodules) found under the given directory'.format(verb.capitalize()), metavar='DIR', default=None, dest='recursive')
+    parser.add_argument('-j', '--jobs', help=u'The number of repositories to {0} at once when using "--recursive"'.format(verb), type=int, default=multiprocessing.cpu_count(), dest='jobs')
+
+
 class Init(Base):
     description = 'Initialises the hooks repository'
 
     def add_args(self, parser):
         parser.add_argument('-y', '--overwrite', help='Silently overwrite existing hooks', action='store_true', dest='overwrite')
         parser.add_argument('-n', '--no-overwrite', help='Silently avoid overwriting existing hooks', action='store_true', dest='no_overwrite')
+        add_recursive_args(parser, 'initialise')
 
     def action(self, args):
+        if args.recursive:
+            return self._init_recursive(args)
+
         if not repo.get().heads:
             logger.error('The hook runner doesnt currently work for new repos. Perform an initial commit before initialising githooks (see: https://github.com/wildfish/git-hooks/issues/4)')
             return 1
@@ -149,14 +241,40 @@ class Init(Base):
             logger.error('Both the overwrite and no overwrite flags were set')
             return 1
 
-        init_dir = os.path.join(repo.repo_root(), '.git', 'hooks')
+        self.init_repo(repo.repo_root(), args.overwrite, args.no_overwrite)
+
+        return 0
+
+    def _is_current(self, src, dst):
+        return filecmp.cmp(src, dst, shallow=False) and os.access(dst, os.X_OK) and os.path.isdir(dst + '.d')
+
+    def init_repo(self, root, overwrite=False, no_overwrite=False, interactive=True):
+        """
+        Initialises the hooks for a single repository
+
+        :param root: The root directory of the repository
+        :param overwrite: Flag if existing hooks should be overwritten without prompting
+        :param no_overwrite: Flag if existing hooks should be kept without prompting
+        :param interactive: Flag if the user can be prompted, if not existing hooks are only replaced if overwrite is set
+        :return: A tuple of the lists of hook names that were initialised and the existing hooks that were skipped
+        """
+        init_dir = repo.hooks_directory(root)
+        changed = []
+        skipped = []
 
         for hook_name in utils.get_hook_names():
             src = os.path.join(utils.get_hook_script_dir(), hook_name)
             dst = os.path.join(init_dir, hook_name)
 
-            if not args.overwrite and os.path.exists(dst):
-                if args.no_overwrite:
+            if os.path.exists(dst) and self._is_current(src, dst):
+                continue
+
+            if not overwrite and os.path.exists(dst):
+                if no_overwrite:
+                    continue
+
+                if not interactive:
+                    skipped.append(hook_name)
                     continue
 
                 logger.info(u'A "{0}" already exists for this repository. Do you want to continue? y/[N]'.format(hook_name))
@@ -174,7 +292,27 @@ class Init(Base):
             except FileExistsException:
                 pass
 
-        return 0
+            changed.append(hook_name)
+
+        return changed, skipped
+
+    def _init_recursive(self, args):
+        if args.overwrite and args.no_overwrite:
+            logger.error('Both the overwrite and no overwrite flags were set')
+            return 1
+
+        def init(root):
+            try:
+                if not repo.get(root).heads:
+                    return RepoResult(root, [], [], 'the repository has no commits')
+
+                changed, skipped = self.init_repo(root, args.overwrite, args.no_overwrite, interactive=False)
+                return RepoResult(root, changed, skipped, None)
+            except Exception as e:  # report the failure without abandoning the other repositories
+                return RepoResult(root, [], [], str(e) or e.__class__.__name__)
+
+        results = list(utils.imap_unordered(init, repo.find_repos(args.recursive), args.jobs))
+        return 1 if report_repos(results, 'initialised') else 0
 
 
 class Install(Base):
@@ -182,27 +320,140 @@ class Install(Base):
 
     def __init__(self, *args, **kwargs):
         self._config = None
+        self._downloads = {}
+        self._downloads_lock = threading.Lock()
+        self._mirrors = None
+        self._bytecode = None
+        self._envs = None
         super(Install, self).__init__(*args, **kwargs)
 
     def add_args(self, parser):
         parser.add_argument('hook_type', nargs='?', help='The hook type to install. If no hook is given the config from "githooks.cfg" or "setup.cfg" is used', default=None, choices=utils.get_hook_names())
-        parser.add_argument('hooks', nargs='*', help='The names/urls for hooks to install')
+        parser.add_argument('hooks', nargs='*', help='The urls or git sources ("git+<url>[@<ref>]#<path>") of the hooks to install')
         parser.add_argument('-u', '--upgrade', help='Flag if hooks should be upgraded with the remote version', action='store_true', dest='upgrade')
         parser.add_argument('-y', '--yes', help='Flag if all hooks should be installed without prompting', action='store_true', dest='yes')
+        parser.add_argument('--bundle', help='The path or url of a bundle of hooks to install', default=None, dest='bundle')
+        add_recursive_args(parser, 'install into')
 
     def action(self, args):
-        if args.hook_type:
-            self._install_hooks(args.hook_type, args.hooks, args.upgrade, args.yes)
-        else:
-            for hook_type, hooks in self.config.items():
-                self._install_hooks(hook_type, hooks, args.upgrade, args.yes)
+        if args.bundle:
+            return self._install_bundle(args)
+
+        if args.recursive:
+            return self._install_recursive(args)
+
+        try:
+            if args.hook_type:
+                self._install_hooks(args.hook_type, args.hooks, args.upgrade, args.yes)
+            else:
+                for hook_type, hooks in (self.config or {}).items():
+                    self._install_hooks(hook_type, hooks, args.upgrade, args.yes)
+        except sources.SourceError as e:
+            logger.error(u'Could not install the hooks: {0}'.format(e))
+            return 1
 
     def _name_from_uri(self, uri):
+        if sources.is_git_spec(uri):
+            return posixpath.basename(sources.parse_git_spec(uri).path)
+
         path = urlsplit(uri).path
         return posixpath.basename(path)
 
-    def _install_hooks(self, hook_name, hooks, upgrade, install_all=False):
-        type_repo = repo.hook_type_directory(hook_name)
+    @property
+    def mirrors(self):
+        if self._mirrors is None:
+            self._mirrors = sources.MirrorCache()
+
+        return self._mirrors
+
+    @property
+    def bytecode(self):
+        if self._bytecode is None:
+            self._bytecode = bytecode.BytecodeCache()
+
+        return self._bytecode
+
+    @property
+    def envs(self):
+        if self._envs is None:
+            self._envs = envs.EnvCache()
+
+        return self._envs
+
+    def _prepare(self, path, root=None):
+        """
+        Builds the environment for a newly installed hook if it declares requirements and compiles it if it is a python
+        hook, so its first run doesn't have to. Failing to do either is not an error, the environment is built again
+        when the hook is first ran and a hook that couldn't be compiled is ran directly.
+
+        :param path: The path of the installed hook
+        :param root: The root of the repository the hook was installed into
+        """
+        interpreter = None
+
+        if os.environ.get('GIT_HOOKS_ENVS', '1') != '0':
+            requirements = meta.hook_requirements(path, meta.config_section(root or repo.repo_root(), 'requirements'))
+            if requirements:
+                try:
+                    env = self.envs.get(requirements, utils.python_interpreter(path))
+                    interpreter = [self.envs.python(env)]
+                except (envs.EnvError, IOError, OSError) as e:
+                    logger.warning(u'Could not build the environment for "{0}": {1}'.format(os.path.basename(path), e))
+
+        if os.environ.get('GIT_HOOKS_BYTECODE', '1') != '0':
+            self.bytecode.compile(path, interpreter)
+
+    def _fetch_git_sources(self, uris):
+        """
+        Reads the hooks given as git sources. Hooks from the same source repo and ref are read together so each source
+        is only fetched (if it has changed) and read once.
+
+        :param uris: The hook uris, any that aren't git sources are ignored
+        """
+        with self._downloads_lock:
+            specs = [sources.parse_git_spec(uri) for uri in uris if sources.is_git_spec(uri) and uri not in self._downloads]
+
+        if specs:
+            contents = sources.read_git_specs(specs, self.mirrors)
+
+            with self._downloads_lock:
+                for uri, content in contents.items():
+                    self._downloads.setdefault(uri, content)
+
+    def _download(self, uri):
+        """
+        Downloads a hook. Each uri is only downloaded once so installing the same hook into many repositories only
+        makes a single request.
+
+        :param uri: The uri of the hook
+        :return: The content of the hook
+        """
+        with self._downloads_lock:
+            if uri in self._downloads:
+                return self._downloads[uri]
+
+        if sources.is_git_spec(uri):
+            self._fetch_git_sources([uri])
+            with self._downloads_lock:
+                content = self._downloads.get(uri)
+
+            if content is None:
+                raise sources.SourceError(u'"{0}" could not be read'.format(uri))
+
+            return content
+
+        content = requests.get(uri).content
+
+        with self._downloads_lock:
+            return self._downloads.setdefault(uri, content)
+
+    def _install_hooks(self, hook_name, hooks, upgrade, install_all=False, root=None):
+        type_repo = repo.hook_type_directory(hook_name, root)
+        installed = []
+
+        self._fetch_git_sources([
+            hook for hook in hooks if upgrade or not os.path.exists(os.path.join(type_repo, self._name_from_uri(hook)))
+        ])
 
         for hook in hooks:
             name = self._name_from_uri(hook)
@@ -210,16 +461,17 @@ class Install(Base):
 
             # check if we need to skip based on the hook alread existing
             if not upgrade and os.path.exists(os.path.join(type_repo, name)):
-                logger.info(u'"{0}" is already installed, use "--upgrade" to upgrade the hook to the newest version.'.format(name))
+                if root is None:
+                    logger.info(u'"{0}" is already installed, use "--upgrade" to upgrade the hook to the newest version.'.format(name))
                 continue
 
-            response = requests.get(uri)
+            content = self._download(uri)
 
             # print file content so that it can be checked before installing
             if not install_all:
                 logger.info('## Installing {} from {}'.format(name, uri))
 
-                for line in response.content.decode().split('\n'):
+                for line in content.decode().split('\n'):
                     logger.info(line)
 
                 if not input('Continue? [y/N]: ').lower() in ['y', 'yes']:
@@ -227,33 +479,185 @@ class Install(Base):
                     continue
 
             # save the hook
-            logger.info('Installing {} from {}'.format(name, uri))
             dst = os.path.join(type_repo, name)
+            if upgrade and os.path.exists(dst):
+                with open(dst, 'rb') as f:
+                    if f.read() == content:
+                        continue
+
+            if root is None:
+                logger.info('Installing {} from {}'.format(name, uri))
+
             with open(dst, 'wb') as f:
-                f.write(response.content)
+                f.write(content)
 
             st = os.stat(dst)
             os.chmod(dst, st.st_mode | stat.S_IEXEC)
+            self._prepare(dst, root)
 
-    @property
-    def config(self):
-        if self._config is None:  # pragma: no cover (dont need to cover the caching behaviour)
-            parser = ConfigParser()
+            installed.append(u'{0}/{1}'.format(hook_name, name))
 
-            if os.path.exists(os.path.join(repo.repo_root(), 'git-hooks.cfg')):
-                parser.read(os.path.join(repo.repo_root(), 'git-hooks.cfg'))
-                self._config = dict(
-                    (k, v.split('\n')) for k, v in parser.items('install')
-                )
-            elif os.path.exists(os.path.join(repo.repo_root(), 'setup.cfg')):
-                parser.read(os.path.join(repo.repo_root(), 'setup.cfg'))
-                self._config = dict(
+        return installed
+
+    def _install_recursive(self, args):
+        if not args.yes:
+            logger.error('Hooks cannot be reviewed when installing into many repositories, use "--yes" to install without prompting')
+            return 1
+
+        def install(root):
+            try:
+                if args.hook_type:
+                    config = {args.hook_type: args.hooks}
+                else:
+                    config = self.get_config(root) or {}
+
+                installed = []
+                for hook_type, hooks in sorted(config.items()):
+                    if not os.path.isdir(repo.hook_type_directory(hook_type, root)):
+                        return RepoResult(root, [], [], u'"{0}" hooks are not initialised, run "git hooks init" first'.format(hook_type))
+
+                    installed.extend(self._install_hooks(hook_type, hooks, args.upgrade, True, root))
+
+                return RepoResult(root, installed, [], None)
+            except Exception as e:  # report the failure without abandoning the other repositories
+                return RepoResult(root, [], [], str(e) or e.__class__.__name__)
+
+        results = list(utils.imap_unordered(install, repo.find_repos(args.recursive), args.jobs))
+        return 1 if report_repos(results, 'installed') else 0
+
+    def _open_bundle(self, location):
+        if urlsplit(location).scheme in ('http', 'https'):
+            response = requests.get(location, stream=True)
+            response.raise_for_status()
+            response.raw.decode_content = True
+            return response.raw
+
+        return open(location, 'rb')
+
+    def _install_bundle(self, args):
+        """
+        Installs every hook in a bundle. The bundle is read once as a stream, each hook is verified against the
+        manifest and written into every repository before any hook is moved into place, so a bad bundle never leaves a
+        repository partly upgraded.
+        """
+        if args.recursive and not args.yes:
+            logger.error('Hooks cannot be reviewed when installing into many repositories, use "--yes" to install without prompting')
+            return 1
+
+        roots = list(repo.find_repos(args.recursive)) if args.recursive else [repo.repo_root()]
+        errors = {}
+        staged = []
+
+        try:
+            with closing(self._open_bundle(args.bundle)) as f:
+                hooks = bundle.read_bundle(f)
+                entries = next(hooks)
+
+                if not args.yes:
+                    logger.info(u'## Installing {0} hook(s) from {1}'.format(len(entries), args.bundle))
+                    for entry in entries:
+                        details = u' '.join(u'{0}={1}'.format(k, v) for k, v in sorted(entry.metadata.items()))
+                        logger.info(u'{0}/{1} sha256:{2} {3}'.format(entry.hook_type, entry.name, entry.sha256[:12], details).rstrip())
+
+                    logger.info('Do you want to continue? y/[N]')
+                    if not get_input().lower() in ['y', 'yes']:
+                        logger.info(u'Not installing hooks from {0}'.format(args.bundle))
+                        return 0
+
+                for entry, content in hooks:
+                    for root in roots:
+                        type_dir = repo.hook_type_directory(entry.hook_type, root)
+                        dst = os.path.join(type_dir, entry.name)
+
+                        if root in errors:
+                            continue
+                        elif not os.path.isdir(type_dir):
+                            errors[root] = u'"{0}" hooks are not initialised, run "git hooks init" first'.format(entry.hook_type)
+                            continue
+                        elif os.path.exists(dst):
+                            if not args.upgrade:
+                                continue
+
+                            with open(dst, 'rb') as existing:
+                                if existing.read() == content:
+                                    continue
+
+                        fd, tmp_path = tempfile.mkstemp(dir=type_dir, prefix='.' + entry.name)
+                        staged.append((root, tmp_path, dst, u'{0}/{1}'.format(entry.hook_type, entry.name)))
+                        with os.fdopen(fd, 'wb') as out:
+                            out.write(content)
+                        os.chmod(tmp_path, 0o755)
+        except (bundle.BundleError, IOError, OSError, requests.RequestException) as e:
+            for _, tmp_path, _, _ in staged:
+                os.remove(tmp_path)
+
+            logger.error(u'Could not install the bundle: {0}'.format(e))
+            return 1
+
+        installed = dict((root, []) for root in roots)
+        for root, tmp_path, dst, label in staged:
+            if root in errors:
+                os.remove(tmp_path)
+            else:
+                replace(tmp_path, dst)
+                self._prepare(dst, root)
+                installed[root].append(label)
+
+        if args.recursive:
+            results = [RepoResult(root, installed[root], [], errors.get(root)) for root in roots]
+            return 1 if report_repos(results, 'installed') else 0
+
+        if errors:
+            logger.error(errors[roots[0]])
+            return 1
+
+        for label in installed[roots[0]]:
+            logger.info(u'Installed {0} from {1}'.format(label, args.bundle))
+
+        return 0
+
+    def get_config(self, root):
+        """
+        Reads the hooks to install from the "git-hooks.cfg" or "setup.cfg" file in the root of the repository
+
+        :param root: The root directory of the repository
+        :return: A dictionary mapping hook types to lists of hooks or None if there is no config
+        """
+        parser = ConfigParser()
+
+        if os.path.exists(os.path.join(root, 'git-hooks.cfg')):
+            parser.read(os.path.join(root, 'git-hooks.cfg'))
+            return dict(
+                (k, v.split('\n')) for k, v in parser.items('install')
+            )
+        elif os.path.exists(os.path.join(root, 'setup.cfg')):
+            parser.read(os.path.join(root, 'setup.cfg'))
+            if parser.has_section('git-hooks.install'):
+                return dict(
                     (k, v.split('\n')) for k, v in parser.items('git-hooks.install')
                 )
 
+    @property
+    def config(self):
+        if self._config is None:  # pragma: no cover (dont need to cover the caching behaviour)
+            self._config = self.get_config(repo.repo_root())
+
         return self._config
 
 
+class Bundle(Base):
+    description = 'Creates a bundle of hooks that can be installed with "git hooks install --bundle"'
+
+    def add_args(self, parser):
+        parser.add_argument('hooks_dir', help='The directory containing the hooks, laid out as "<hook type>/<hook name>"')
+        parser.add_argument('output', help='The path to write the bundle (a gzipped tar) to')
+
+    def action(self, args):
+        entries = bundle.write_bundle(args.hooks_dir, args.output)
+        logger.info(u'Bundled {0} hook(s) into {1}'.format(len(entries), args.output))
+        return 0
+
+
 class Uninstall(Base):
     def add_args(self, parser):
         parser.add_argument('hook_type', nargs='?', help='The hook type to uninstall.', choices=utils.get_hook_names())
@@ -271,10 +675,235 @@ class Uninstall(Base):
                 logger.info('{} hook called "{}" could not be found. SKIPPING.'.format(args.hook_type, hook))
 
 
+class Plan(Base):
+    description = 'Shows the predicted schedule for running the installed hooks'
+
+    def add_args(self, parser):
+        parser.add_argument('hook_type', nargs='?', help='The hook type to plan.', default='pre-commit', choices=utils.get_hook_names())
+        parser.add_argument('-j', '--jobs', help='The number of hooks to run at once, defaults to the "GIT_HOOKS_JOBS" environment variable or 1', type=int, default=None, dest='jobs')
+
+    def _format_duration(self, seconds):
+        return u'{0:.2f}s'.format(seconds)
+
+    def action(self, args):
+        runner = runners.get_runner(args.hook_type, jobs=args.jobs)
+        size = len(runner.get_process_args())
+        hooks = list(runner.get_finder())
+
+        hook_history = runner.get_history(args.hook_type)
+        predictions = runner.get_predictions(hooks, size, hook_history)
+        slots = runner.get_plan(hooks, size, hook_history)
+        if not slots:
+            logger.info(u'No "{0}" hooks are installed'.format(args.hook_type))
+            return 0
+
+        logger.info(u'Predicted schedule for "{0}" hooks over {1} file(s) using {2} worker(s):'.format(args.hook_type, size, runner.get_jobs()))
+        for slot in slots:
+            name = meta.hook_name(slot.hook)
+            if predictions.get(slot.hook) is None:
+                name += ' (no history)'
+
+            logger.info(u'  worker {0}  {1:>9} - {2:>9}  {3}'.format(
+                slot.worker + 1, self._format_duration(slot.start), self._format_duration(slot.end), name
+            ))
+
+        path = schedule.critical_path(slots)
+        logger.info(u'Expected critical path: {0} ({1})'.format(
+            self._format_duration(path[-1].end), ' -> '.join(meta.hook_name(s.hook) for s in path)
+        ))
+
+        return 0
+
+
+class Run(Base):
+    description = 'Runs the installed hooks over the whole repository, a range of revisions or a list of files'
+
+    def add_args(self, parser):
+        parser.add_argument('hook_type', help='The hook type to run.', choices=utils.get_hook_names())
+        parser.add_argument('paths', nargs='*', help='The files or directories to check')
+        parser.add_argument('-a', '--all-files', help='Check every file tracked by the repository', action='store_true', dest='all_files')
+        parser.add_argument('--from', help='Check the files changed since this revision', default=None, dest='from_ref')
+        parser.add_argument('--to', help='The end of the revision range given by "--from", defaults to the working tree', default=None, dest='to_ref')
+        parser.add_argument('-j', '--jobs', help='The number of hooks to run at once, defaults to the "GIT_HOOKS_JOBS" environment variable or 1', type=int, default=None, dest='jobs')
+        parser.add_argument('--chunk-size', help='The maximum number of files to give a hook at once', type=int, default=None, dest='chunk_size')
+
+    def action(self, args):
+        if args.to_ref and not args.from_ref:
+            logger.error('"--to" can only be used with "--from"')
+            return 1
+
+        if not (args.all_files or args.from_ref or args.paths):
+            logger.error('Either "--all-files", "--from" or a list of paths must be given')
+            return 1
+
+        files = repo.iter_files(args.all_files, args.from_ref, args.to_ref, args.paths)
+        runner = runners.FileListHookRunner(args.hook_type, files, chunk_size=args.chunk_size, jobs=args.jobs)
+
+        return 1 if runner.run() else 0
+
+
+class Profile(Base):
+    description = 'Runs each installed hook once against the current changes and shows where its time goes'
+
+    def add_args(self, parser):
+        parser.add_argument('hook_type', nargs='?', help='The hook type to profile.', default='pre-commit', choices=utils.get_hook_names())
+        parser.add_argument('--save-stats', help='Profile python hooks with cProfile and save a "<hook name>.pstats" file for each to this directory', default=None, dest='stats_dir')
+        parser.add_argument('--imports', help='The number of slowest imports to show for each python hook', type=int, default=3, dest='imports')
+
+    def _format_duration(self, seconds):
+        return u'-' if seconds is None else u'{0:.3f}s'.format(seconds)
+
+    def action(self, args):
+        runner = runners.get_runner(args.hook_type)
+        profiles = profiling.profile_hooks(runner, args.stats_dir)
+        if not profiles:
+            logger.info(u'No "{0}" hooks are installed'.format(args.hook_type))
+            return 0
+
+        row = u'{0:<24} {1:>9} {2:>9} {3:>9} {4:>9} {5:>9} {6:>6}'
+        logger.info(row.format('hook', 'wall', 'startup', 'work', 'user', 'sys', 'status'))
+        for p in profiles:
+            logger.info(row.format(
+                meta.hook_name(p.hook), self._format_duration(p.wall), self._format_duration(p.startup),
+                self._format_duration(p.work), self._format_duration(p.user), self._format_duration(p.system), p.status,
+            ))
+
+            if p.imports and args.imports > 0:
+                logger.info(u'  slowest imports: ' + u', '.join(
+                    u'{0} ({1})'.format(module, self._format_duration(seconds)) for module, seconds in p.imports[:args.imports]
+                ))
+
+            if p.stats_path:
+                logger.info(u'  stats saved to {0}'.format(p.stats_path))
+
+        python = [p for p in profiles if p.python]
+        if python:
+            startup = sum(p.startup for p in python)
+            total = sum(p.wall for p in python)
+            logger.info(u'Python hooks spent {0} of {1} ({2:.0f}%) starting up'.format(
+                self._format_duration(startup), self._format_duration(total), 100.0 * startup / total if total else 0,
+            ))
+
+        return 0
+
+
+class Replay(Base):
+    description = 'Runs the pre-commit hooks against every commit in a revision range'
+
+    def add_args(self, parser):
+        parser.add_argument('rev_range', help='The range of commits to check (eg "master..feature")')
+        parser.add_argument('-j', '--jobs', help='The number of hooks to run at once, defaults to the "GIT_HOOKS_JOBS" environment variable or 1', type=int, default=None, dest='jobs')
+
+    def action(self, args):
+        return 1 if runners.ReplayHookRunner(args.rev_range, jobs=args.jobs).run() else 0
+
+
+class CacheServer(Base):
+    description = 'Serves a result cache shared between machines'
+
+    def add_args(self, parser):
+        parser.add_argument('path', help='The directory to store the results in')
+        parser.add_argument('--host', help='The address to listen on', default='127.0.0.1', dest='host')
+        parser.add_argument('--port', help='The port to listen on', type=int, default=8765, dest='port')
+        parser.add_argument('--token', help='The token clients must send to store results, defaults to the "GIT_HOOKS_CACHE_TOKEN" environment variable', default=None, dest='token')
+        parser.add_argument('--read-only', help='Refuse to store any results', action='store_true', dest='read_only')
+
+    def action(self, args):
+        server = cache_server.CacheServer((args.host, args.port), args.path, args.read_only, args.token or os.environ.get('GIT_HOOKS_CACHE_TOKEN'))
+        logger.info(u'Serving the result cache in "{0}" on http://{1}:{2}'.format(args.path, *server.server_address[:2]))
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+        return 0
+
+
+class Stats(Base):
+    description = 'Shows how long each hook has taken to run'
+
+    def add_args(self, parser):
+        parser.add_argument('hook_type', nargs='?', help='Only show hooks of this type.', default=None, choices=utils.get_hook_names())
+        parser.add_argument('--openmetrics', help='Write the stats in the OpenMetrics text format to a file (or "-" for stdout) rather than showing them', nargs='?', const='-', default=None, dest='openmetrics')
+
+    def _format_duration(self, seconds):
+        return u'-' if seconds is None else u'{0:.2f}s'.format(seconds)
+
+    def action(self, args):
+        summaries = stats.RunStats().summary(args.hook_type)
+
+        if args.openmetrics == '-':
+            print(stats.openmetrics(summaries), end='')
+            return 0
+        elif args.openmetrics:
+            stats.write_openmetrics(summaries, args.openmetrics)
+            return 0
+
+        if not summaries:
+            logger.info(u'No hook runs have been recorded')
+            return 0
+
+        row = u'{0:<12} {1:<24} {2:>6} {3:>9} {4:>9} {5:>9} {6:>9} {7:>7}'
+        logger.info(row.format('type', 'hook', 'runs', 'p50', 'p95', 'max', 'failures', 'cached'))
+        for s in summaries:
+            logger.info(row.format(
+                s.hook_type, s.hook, s.runs, self._format_duration(s.p50), self._format_duration(s.p95),
+                self._format_duration(s.max), s.failures, s.cache_hits,
+            ))
+
+        return 0
+
+
+class Status(Base):
+    description = 'Shows the results of the hooks deferred from the last commit'
+
+    def action(self, args):
+        status = deferred.read_status()
+        if not status:
+            logger.info(u'No hooks have been deferred')
+            return 0
+
+        if not deferred.report(status, verbose=True):
+            return 0
+
+        deferred.mark_reported(status)
+        return 1 if deferred.has_failed(status) else 0
+
+
+class Watch(Base):
+    description = 'Runs the pre-commit hooks whenever the staged files change so their results are ready at commit time'
+
+    def add_args(self, parser):
+        parser.add_argument('-j', '--jobs', help='The number of hooks to run at once, defaults to the "GIT_HOOKS_JOBS" environment variable or 1', type=int, default=None, dest='jobs')
+        parser.add_argument('--debounce', help='The number of seconds without changes to wait before running the hooks', type=float, default=0.5, dest='debounce')
+        parser.add_argument('--poll', help='Poll for changes rather than using inotify', action='store_true', dest='poll')
+        parser.add_argument('--once', help='Run the hooks once and exit rather than waiting for changes', action='store_true', dest='once')
+
+    def action(self, args):
+        try:
+            watch.watch(lambda: runners.PreCommitHookRunner(jobs=args.jobs), debounce=args.debounce, once=args.once, poll=args.poll)
+        except KeyboardInterrupt:
+            pass
+
+        return 0
+
+
 class Hooks(Base):
     description = 'Manages your commit hooks for you!'
     sub_commands = {
-        'init': Init,
-        'install': Install,
-        'uninstall': Uninstall,
+        'bundle': 'githooks.cmd:Bundle',
+        'cache-server': 'githooks.cmd:CacheServer',
+        'init': 'githooks.cmd:Init',
+        'install': 'githooks.cmd:Install',
+        'uninstall': 'githooks.cmd:Uninstall',
+        'plan': 'githooks.cmd:Plan',
+        'profile': 'githooks.cmd:Profile',
+        'replay': 'githooks.cmd:Replay',
+        'run': 'githooks.cmd:Run',
+        'stats': 'githooks.cmd:Stats',
+        'status': 'githooks.cmd:Status',
+        'watch': 'githooks.cmd:Watch',
     }
@@ -14,4 +14,44 @@ try:
 except NameError:
     FileExistsException = OSError
 
-__all__ = [ConfigParser, urlsplit, urljoin, urlencode, FileExistsException]
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+try:
+    from os import replace
+except ImportError:
+    from os import rename as replace
+
+
+def decode_path(value):
+    """
+    Decodes a path from the output of a git command. Undecodable bytes are kept using surrogate escapes on python 3,
+    on python 2 the byte string is used as is.
+    """
+    if isinstance(value, str):  # pragma: no cover (python 2 only)
+        return value
+
+    return value.decode('utf-8', 'surrogateescape')
+
+
+def encode_path(value):
+    """
+    Encodes a path to bytes, the reverse of ``decode_path``.
+    """
+    if isinstance(value, bytes):
+        return value
+
+    return value.encode('utf-8', 'surrogateescape')
+
+
+__all__ = [
+    ConfigParser, urlsplit, urljoin, urlencode, FileExistsException, StringIO, string_types, replace, decode_path,
+    encode_path,
+]
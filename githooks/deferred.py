@@ -0,0 +1,217 @@
+import json
+import logging
+import subprocess
+import sys
+import tempfile
+import time
+
+import os
+
+from . import meta, repo
+from .compat import replace
+
+
+logger = logging.getLogger(__name__)
+
+
+QUEUE_FILE_NAME = 'githooks-deferred.json'
+
+STATUS_FILE_NAME = 'githooks-deferred-status.json'
+
+LOG_FILE_NAME = 'githooks-deferred.log'
+
+
+def _path(name, root=None):
+    return os.path.join(repo.hooks_directory(root), name)
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _write(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+
+    replace(tmp_path, path)
+
+
+def queue(hooks, root=None):
+    """
+    Records the hooks the pre-commit run deferred, the post-commit hook starts them once the commit has been made. An
+    empty list clears the queue.
+
+    :param hooks: The paths of the deferred hooks (plugin hooks are recorded as "plugin:<name>")
+    :param root: The root of the repo to use instead of the current repo
+    """
+    path = _path(QUEUE_FILE_NAME, root)
+    if hooks:
+        _write(path, {'hooks': [str(h) for h in hooks], 'queued': time.time()})
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def read_status(root=None):
+    """
+    Reads the state of the latest deferred run
+
+    :param root: The root of the repo to use instead of the current repo
+    :return: A dictionary with the ``commit``, the ``state`` ("running", "done" or "error"), the ``hooks``, the
+        ``results`` (each with the ``hook`` name, ``status``, ``duration``, ``output`` and ``cached`` flag) and if the
+        results have been ``reported``. None if nothing has been deferred.
+    """
+    return _read(_path(STATUS_FILE_NAME, root))
+
+
+def _detach_kwargs():
+    if hasattr(os, 'setsid'):
+        return {'preexec_fn': os.setsid}
+
+    return {'creationflags': 0x00000008}  # pragma: no cover (DETACHED_PROCESS on windows)
+
+
+def start(root=None):
+    """
+    Starts the queued hooks in a detached process against the commit that has just been made, the process outlives
+    the commit so the user doesn't wait for it. Its output is written to "githooks-deferred.log" in the hooks
+    directory.
+
+    :param root: The root of the repo to use instead of the current repo
+    :return: The started process or None if no hooks were queued
+    """
+    root = root or repo.repo_root()
+    queue_path = _path(QUEUE_FILE_NAME, root)
+    queued = _read(queue_path)
+    if os.path.exists(queue_path):
+        os.remove(queue_path)
+
+    if not queued or not queued.get('hooks'):
+        return None
+
+    sha = repo.head_commit(root)
+    _write(_path(STATUS_FILE_NAME, root), {
+        'commit': sha, 'state': 'running', 'started': time.time(), 'hooks': queued['hooks'], 'results': [], 'reported': False,
+    })
+
+    with open(_path(LOG_FILE_NAME, root), 'ab') as log, open(os.devnull, 'rb') as devnull:
+        return subprocess.Popen(
+            [sys.executable, '-m', 'githooks.deferred', sha], cwd=root, env=repo.isolated_env(), stdin=devnull,
+            stdout=log, stderr=subprocess.STDOUT, close_fds=True, **_detach_kwargs()
+        )
+
+
+def run(sha, root=None):
+    """
+    Runs the deferred hooks against a commit and records their results. If another commit has been made (and its own
+    hooks deferred) in the mean time the results are dropped.
+
+    :param sha: The commit to check
+    :param root: The root of the repo to use instead of the current repo
+    :return: 0 if every hook passed, 1 otherwise
+    """
+    from . import runners
+
+    root = root or repo.repo_root()
+    status = read_status(root)
+    if not status or status.get('commit') != sha:
+        return 1
+
+    try:
+        results = runners.DeferredHookRunner(sha, status['hooks']).run_deferred()
+        update = {'state': 'done', 'results': [
+            {'hook': meta.hook_name(r.hook), 'status': r.status, 'duration': r.duration, 'output': r.output, 'cached': r.cached}
+            for r in results
+        ]}
+    except Exception as e:  # the failure is recorded so it is reported like a failing hook
+        logger.exception(u'The deferred hooks for {0} could not be ran'.format(sha[:10]))
+        update = {'state': 'error', 'error': str(e) or e.__class__.__name__}
+
+    current = read_status(root)
+    if current and current.get('commit') == sha:
+        current.update(update, finished=time.time())
+        _write(_path(STATUS_FILE_NAME, root), current)
+
+    return 1 if has_failed(update) else 0
+
+
+def report(status, verbose=False):
+    """
+    Logs the state of a deferred run. Failures are logged as warnings (with the hooks output) so they are seen when
+    the run is reported by a commit.
+
+    :param status: The status from ``read_status``
+    :param verbose: Flag if passing hooks should be listed as well
+    :return: True if the run has finished
+    """
+    commit = status.get('commit', '')[:10]
+    if status.get('state') == 'running':
+        logger.info(u'Deferred hooks for {0} are still running: {1}'.format(
+            commit, ', '.join(os.path.basename(h) for h in status.get('hooks') or [])
+        ))
+        return False
+
+    if status.get('state') == 'error':
+        logger.warning(u'Deferred hooks for {0} could not be ran: {1}'.format(commit, status.get('error')))
+        return True
+
+    results = status.get('results') or []
+    failed = [r for r in results if r.get('status')]
+    for result in failed:
+        logger.warning(u'Deferred hook "{0}" failed for {1}'.format(result.get('hook'), commit))
+        if result.get('output'):
+            logger.warning(result['output'])
+
+    if verbose or not failed:
+        for result in results:
+            if not result.get('status'):
+                logger.info(u'Deferred hook "{0}" passed for {1}{2}'.format(
+                    result.get('hook'), commit, ' (cached)' if result.get('cached') else '',
+                ))
+
+    return True
+
+
+def has_failed(status):
+    """
+    Checks if a finished deferred run failed
+
+    :param status: The status from ``read_status``
+    :return: True if the run could not be ran or any hook failed
+    """
+    return status.get('state') == 'error' or any(r.get('status') for r in status.get('results') or [])
+
+
+def mark_reported(status, root=None):
+    """
+    Records that the results of a finished deferred run have been shown so the next commit doesn't show them again
+
+    :param status: The status from ``read_status``
+    :param root: The root of the repo to use instead of the current repo
+    """
+    status['reported'] = True
+    _write(_path(STATUS_FILE_NAME, root), status)
+
+
+def report_pending(root=None):
+    """
+    Reports the results of the latest deferred run if they haven't been reported yet, this is called at the start of
+    each commit. A finished run is only reported once.
+
+    :param root: The root of the repo to use instead of the current repo
+    """
+    status = read_status(root)
+    if not status or status.get('reported'):
+        return
+
+    if report(status):
+        mark_reported(status, root)
+
+
+if __name__ == '__main__':  # pragma: no cover (ran in the detached process started by ``start``)
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO, format='%(message)s')
+    sys.exit(run(sys.argv[1]))
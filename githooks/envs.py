@@ -0,0 +1,224 @@
+import errno
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+from . import utils
+
+
+logger = logging.getLogger(__name__)
+
+
+COMPLETE_MARKER = '.githooks-complete'
+
+BIN_DIR = 'Scripts' if os.name == 'nt' else 'bin'
+
+
+class EnvError(Exception):
+    """
+    Raised when an environment for a hook can't be built
+    """
+
+
+class EnvCache(object):
+    """
+    Virtual environments for hooks that declare requirements. There is one environment for each unique set of
+    requirements and interpreter, shared by every hook and repository on the machine. Using an environment marks it as
+    recently used and once there are more than ``max_envs`` the least recently used are removed.
+
+    Packages are installed from the wheelhouse directory given by the ``GIT_HOOKS_WHEELHOUSE`` environment variable
+    (without touching the network) if it is set, otherwise from the index given by ``GIT_HOOKS_INDEX_URL`` or pips
+    default index.
+
+    :var max_envs: The number of environments to keep
+    :var lock_timeout: The number of seconds to wait for another process building the same environment
+    """
+    max_envs = 10
+    lock_timeout = 600
+
+    def __init__(self, path=None):
+        """
+        :param path: The directory to store the environments in, defaults to "envs" in the users git-hooks cache
+        """
+        self.path = path or utils.user_cache_dir('envs')
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    def key(self, requirements, interpreter):
+        """
+        Gets the key identifying the environment for a set of requirements
+
+        :param requirements: The list of requirements
+        :param interpreter: The command of the python interpreter the environment is built from
+        :return: The key
+        """
+        return hashlib.sha256(json.dumps([list(interpreter), sorted(requirements)]).encode('utf-8')).hexdigest()[:32]
+
+    def env_path(self, key):
+        return os.path.join(self.path, key)
+
+    def python(self, env):
+        """
+        Gets the python interpreter of an environment
+
+        :param env: The environment directory
+        :return: The path to the interpreter
+        """
+        return os.path.join(env, BIN_DIR, 'python.exe' if os.name == 'nt' else 'python')
+
+    def activate(self, env, base_env=None):
+        """
+        Gets the process environment to run a hook in an environment with, the environments scripts are put first on
+        the path so hooks can call the tools installed in it
+
+        :param env: The environment directory
+        :param base_env: The process environment to start from, defaults to the current environment
+        :return: The process environment dictionary
+        """
+        base_env = dict(os.environ if base_env is None else base_env)
+        base_env.pop('PYTHONHOME', None)
+        base_env['VIRTUAL_ENV'] = env
+        base_env['PATH'] = os.pathsep.join([os.path.join(env, BIN_DIR)] + ([base_env['PATH']] if base_env.get('PATH') else []))
+        return base_env
+
+    def install_args(self):
+        """
+        Gets the arguments telling pip where to install packages from
+
+        :return: The list of arguments
+        """
+        wheelhouse = os.environ.get('GIT_HOOKS_WHEELHOUSE')
+        if wheelhouse:
+            return ['--no-index', '--find-links', os.path.abspath(os.path.expanduser(wheelhouse))]
+
+        index_url = os.environ.get('GIT_HOOKS_INDEX_URL')
+        if index_url:
+            return ['--index-url', index_url]
+
+        return []
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _acquire(self, env):
+        """
+        Takes the lock for building an environment across processes, a lock older than ``lock_timeout`` is treated as
+        abandoned
+        """
+        lock_dir = env + '.lock'
+        deadline = time.time() + self.lock_timeout
+
+        while True:
+            try:
+                os.mkdir(lock_dir)
+                return lock_dir
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+            try:
+                if time.time() - os.stat(lock_dir).st_mtime > self.lock_timeout:
+                    os.rmdir(lock_dir)
+                    continue
+            except OSError:
+                continue
+
+            if time.time() > deadline:
+                raise EnvError(u'Timed out waiting for "{0}" to be built'.format(env))
+
+            time.sleep(0.5)
+
+    def _run(self, command):
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = process.communicate()[0]
+        if process.returncode != 0:
+            raise EnvError(u'"{0}" failed:\n{1}'.format(' '.join(command), output.decode('utf-8', 'replace').strip()))
+
+    def build(self, env, requirements, interpreter):
+        """
+        Creates an environment and installs the requirements into it. The environment is only marked as complete once
+        everything is installed so a failed build is never used.
+
+        :param env: The environment directory
+        :param requirements: The list of requirements
+        :param interpreter: The command of the python interpreter to build the environment from
+        """
+        shutil.rmtree(env, ignore_errors=True)
+        try:
+            self._run(list(interpreter) + ['-m', 'venv', env])
+            self._run([self.python(env), '-m', 'pip', 'install', '--quiet', '--disable-pip-version-check'] + self.install_args() + list(requirements))
+        except (EnvError, OSError):
+            shutil.rmtree(env, ignore_errors=True)
+            raise
+
+        with open(os.path.join(env, COMPLETE_MARKER), 'w') as f:
+            json.dump({'interpreter': list(interpreter), 'requirements': sorted(requirements)}, f)
+
+    def get(self, requirements, interpreter=None, build=True):
+        """
+        Gets the environment for a set of requirements, building it if it doesn't exist yet
+
+        :param requirements: The list of requirements
+        :param interpreter: The command of the python interpreter to build the environment from, defaults to the
+            interpreter git-hooks is running under
+        :param build: Flag if the environment should be built if it doesn't exist
+        :return: The environment directory or None if it doesn't exist and ``build`` is False
+        """
+        interpreter = list(interpreter or [sys.executable])
+        key = self.key(requirements, interpreter)
+        env = self.env_path(key)
+        marker = os.path.join(env, COMPLETE_MARKER)
+
+        with self._key_lock(key):
+            if not os.path.exists(marker):
+                if not build:
+                    return None
+
+                if not os.path.isdir(self.path):
+                    os.makedirs(self.path)
+
+                lock_dir = self._acquire(env)
+                try:
+                    if not os.path.exists(marker):
+                        logger.info(u'Building an environment with {0}'.format(', '.join(sorted(requirements))))
+                        self.build(env, requirements, interpreter)
+                finally:
+                    os.rmdir(lock_dir)
+
+                self.prune(keep=key)
+
+        try:
+            os.utime(marker, None)
+        except OSError:
+            pass
+
+        return env
+
+    def prune(self, keep=None):
+        """
+        Removes the least recently used environments so there are at most ``max_envs``
+
+        :param keep: The key of an environment that must not be removed
+        :return: The list of removed environment directories
+        """
+        envs = []
+        for name in os.listdir(self.path):
+            try:
+                envs.append((os.stat(os.path.join(self.path, name, COMPLETE_MARKER)).st_mtime, name))
+            except OSError:
+                continue
+
+        removed = []
+        for _, name in sorted(envs, reverse=True)[self.max_envs:]:
+            if name != keep:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+                removed.append(os.path.join(self.path, name))
+
+        return removed
@@ -1,27 +1,60 @@
 import glob
+import logging
 
 import os
 
-from . import repo
+from . import meta, plugins, repo
+
+
+logger = logging.getLogger(__name__)
 
 
 class HookFinder(object):
     """
     Searches through the hooks directory and gives each present hook. This is designed to be iterated over to get the
-    absolute paths of each installed hook.
+    absolute paths of each installed hook followed by the plugin hooks enabled for the hook type.
 
     :var hook_type: The type of hook to search for (such as 'pre-commit')
+    :var root: The root of the repo to search, if this is None the current repo is used
     """
-    def __init__(self, hook_type):
+    def __init__(self, hook_type, root=None):
         self.hook_type = hook_type
+        self.root = root
 
     def __iter__(self):
-        hook_glob = os.path.join(repo.hook_type_directory(self.hook_type), '*')
+        hook_glob = os.path.join(repo.hook_type_directory(self.hook_type, self.root), '*')
 
         for p in glob.glob(hook_glob):
             yield p
 
+        for hook in self.get_plugins():
+            yield hook
+
+    def get_plugins(self):
+        """
+        Gets the plugin hooks the repo enables for the hook type. Plugins are installed python packages registering a
+        callable under the "githooks.hooks" entry point group, a repo opts in to them by listing their names against
+        the hook type in the "plugins" config section. Setting the ``GIT_HOOKS_PLUGINS`` environment variable to 0
+        disables all plugins.
+
+        :return: A list of ``plugins.PluginHook`` objects
+        """
+        if os.environ.get('GIT_HOOKS_PLUGINS', '1') == '0':
+            return []
+
+        try:
+            names = meta.split_list(meta.config_section(self.root or repo.repo_root(), 'plugins').get(self.hook_type))
+        except Exception:  # not being able to read the config shouldn't stop the script hooks running
+            return []
+
+        return plugins.find_plugins(names)
+
 
 class PreCommitHookFinder(HookFinder):
-    def __init__(self):
-        super(PreCommitHookFinder, self).__init__('pre-commit')
+    def __init__(self, root=None):
+        super(PreCommitHookFinder, self).__init__('pre-commit', root)
+
+
+class PostCommitHookFinder(HookFinder):
+    def __init__(self, root=None):
+        super(PostCommitHookFinder, self).__init__('post-commit', root)
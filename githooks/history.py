@@ -0,0 +1,98 @@
+import json
+import os
+import tempfile
+import threading
+
+from . import repo
+from .compat import replace
+
+
+HISTORY_FILE_NAME = 'githooks-history.json'
+
+
+def size_bucket(size):
+    """
+    Gets the bucket an input size falls into. Buckets grow exponentially (0, 1, 2-3, 4-7, ...) so that runs over a
+    similar number of files share their history.
+
+    :param size: The number of files given to the hook
+    :return: The bucket number
+    """
+    return max(0, int(size)).bit_length()
+
+
+class DurationHistory(object):
+    """
+    A rolling record of how long each hook of a given type has taken to run keyed by the hook name and the size of the
+    input it was given. The history is stored in the repos hooks directory. A single history object can be shared by
+    runners on several threads.
+
+    :var max_samples: The number of durations to keep for each hook and input size
+    """
+    max_samples = 10
+
+    def __init__(self, hook_type, path=None):
+        """
+        :param hook_type: The type of hook to record durations for
+        :param path: The file to store the history in. Defaults to a file in the repos hooks directory
+        """
+        self.hook_type = hook_type
+        self.path = path or os.path.join(repo.hooks_directory(), HISTORY_FILE_NAME)
+        self._data = None
+        self._lock = threading.RLock()
+
+    @property
+    def data(self):
+        if self._data is None:
+            try:
+                with open(self.path) as f:
+                    self._data = json.load(f)
+            except (IOError, OSError, ValueError):
+                self._data = {}
+
+        return self._data
+
+    def record(self, name, size, duration):
+        """
+        Records a run of a hook. Only the most recent ``max_samples`` runs for each input size are kept.
+
+        :param name: The name of the hook
+        :param size: The number of files the hook was given
+        :param duration: The number of seconds the hook took to run
+        """
+        with self._lock:
+            hooks = self.data.setdefault(self.hook_type, {})
+            samples = hooks.setdefault(name, {}).setdefault(str(size_bucket(size)), [])
+            samples.append(round(duration, 4))
+            del samples[:-self.max_samples]
+
+    def predict(self, name, size):
+        """
+        Predicts how long a hook will take using the median of the recorded runs with the closest input size.
+
+        :param name: The name of the hook
+        :param size: The number of files the hook will be given
+        :return: The predicted number of seconds or None if the hook has never been recorded
+        """
+        buckets = dict(
+            (int(k), v) for k, v in self.data.get(self.hook_type, {}).get(name, {}).items() if v
+        )
+        if not buckets:
+            return None
+
+        target = size_bucket(size)
+        nearest = min(buckets, key=lambda b: (abs(b - target), -b))
+        samples = sorted(buckets[nearest])
+        return samples[len(samples) // 2]
+
+    def save(self):
+        """
+        Writes the history back to disk. The file is replaced atomically so concurrent runs never see a partial file.
+        """
+        directory = os.path.dirname(self.path)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + HISTORY_FILE_NAME)
+        with os.fdopen(fd, 'w') as f:
+            with self._lock:
+                json.dump(self.data, f, sort_keys=True)
+
+        replace(tmp_path, self.path)
@@ -0,0 +1,476 @@
+"""
+A reader for the git index that finds the staged changes without running git or building GitPython diff objects.
+
+The index is memory mapped and walked in step with the HEAD tree (read straight from the object database through
+gitdb). Both are in the same (byte) order so a single merge pass finds every change. Subtrees the index's cache tree
+records as unchanged from HEAD are skipped without reading them. Only the paths that changed are kept.
+"""
+import mmap
+import os
+import struct
+import threading
+from array import array
+from collections import namedtuple
+
+from . import utils
+
+
+gitdb = utils.LazyModule('gitdb')
+
+SUBMODULE_MODE = 0o160000
+TREE_MODE = 0o40000
+
+FLAG_EXTENDED = 0x4000
+FLAG_NAME_MASK = 0xfff
+EXTENDED_INTENT_TO_ADD = 0x2000
+
+ENTRY_HEADER = struct.Struct('>10I20sH')
+FLAGS = struct.Struct('>H')
+HEADER = struct.Struct('>4sII')
+EXTENSION_HEADER = struct.Struct('>4sI')
+CHECKSUM_SIZE = 20
+
+# extensions that mean the entries in the file aren't the full index
+UNSUPPORTED_EXTENSIONS = (b'link', b'sdir')
+
+
+StagedChanges = namedtuple('StagedChanges', ['added', 'modified', 'deleted'])
+
+
+class UnsupportedIndex(Exception):
+    """
+    Raised when the index or repo uses a feature the reader doesn't understand (such as split or sparse indexes, sha256
+    object ids or the reftable ref store). The caller should fall back to asking git.
+    """
+
+
+class IndexFile(object):
+    """
+    A memory mapped git index (versions 2 to 4). The entries are read in a first pass that only records where each one
+    starts, names are only read while walking.
+
+    :var version: The index format version
+    :var count: The number of entries
+    :var cache_tree: A dictionary mapping directory prefixes (eg b'src/') to a tuple of the tree id and the number of
+        entries in the directory for each directory the index records as a valid tree
+    """
+
+    def __init__(self, path):
+        """
+        :param path: The path of the index file
+        """
+        with open(path, 'rb') as f:
+            try:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise UnsupportedIndex('The index is empty')
+
+        try:
+            signature, self.version, self.count = HEADER.unpack_from(self.map, 0)
+            if signature != b'DIRC' or self.version not in (2, 3, 4):
+                raise UnsupportedIndex(u'Unsupported index version {0}'.format(self.version))
+
+            self.offsets = array('L')
+            end = self._scan_entries()
+            self.cache_tree = self._read_extensions(end)
+        except (struct.error, IndexError) as e:
+            self.close()
+            raise UnsupportedIndex(u'The index could not be read: {0}'.format(e))
+        except UnsupportedIndex:
+            self.close()
+            raise
+
+    def close(self):
+        self.map.close()
+
+    def _varint(self, pos):
+        byte = ord(self.map[pos:pos + 1])
+        pos += 1
+        value = byte & 0x7f
+
+        while byte & 0x80:
+            byte = ord(self.map[pos:pos + 1])
+            pos += 1
+            value = ((value + 1) << 7) | (byte & 0x7f)
+
+        return value, pos
+
+    def _scan_entries(self):
+        """
+        Records the offset of every entry. Only the flags (and for version 4 the end of the name) of each entry are read.
+
+        :return: The offset of the end of the entries
+        """
+        pos = HEADER.size
+        data = self.map
+        find = data.find
+        unpack_flags = FLAGS.unpack_from
+        offsets = self.offsets
+        append = offsets.append
+        flags_offset = ENTRY_HEADER.size - FLAGS.size
+
+        for _ in range(self.count):
+            append(pos)
+            flags = unpack_flags(data, pos + flags_offset)[0]
+            start = pos + ENTRY_HEADER.size + (2 if flags & FLAG_EXTENDED else 0)
+
+            if self.version == 4:
+                # skip the compressed prefix length, its last byte is the first without the high bit set
+                while ord(data[start:start + 1]) & 0x80:
+                    start += 1
+                pos = find(b'\0', start + 1) + 1
+            else:
+                length = flags & FLAG_NAME_MASK
+                end = find(b'\0', start) if length == FLAG_NAME_MASK else start + length
+                pos += (end - pos + 8) & ~7
+
+            if pos <= 0:
+                raise UnsupportedIndex('The index entries are truncated')
+
+        return pos
+
+    def _read_extensions(self, pos):
+        """
+        Reads the extensions following the entries, only the cache tree is used
+
+        :param pos: The offset of the first extension
+        :return: The cache tree
+        """
+        cache_tree = {}
+        end = len(self.map) - CHECKSUM_SIZE
+
+        while pos < end:
+            signature, size = EXTENSION_HEADER.unpack_from(self.map, pos)
+            pos += EXTENSION_HEADER.size
+
+            if signature == b'TREE':
+                _parse_cache_tree(self.map[pos:pos + size], 0, b'', cache_tree)
+            elif signature in UNSUPPORTED_EXTENSIONS or not b'A' <= signature[:1] <= b'Z':
+                raise UnsupportedIndex(u'Unsupported index extension {0!r}'.format(signature))
+
+            pos += size
+
+        if pos != end:
+            raise UnsupportedIndex('The index checksum is not where it is expected, the repo may not use sha1')
+
+        return cache_tree
+
+    def entries(self):
+        """
+        Walks the entries in order
+
+        :return: An ``EntryCursor`` at the first entry
+        """
+        return EntryCursor(self)
+
+
+def _parse_cache_tree(data, pos, prefix, cache_tree):
+    """
+    Parses a node of the cache tree extension and its children
+
+    :return: The offset of the end of the node
+    """
+    end = data.index(b'\0', pos)
+    name = data[pos:end]
+    path = prefix + name + b'/' if name else prefix
+    pos = end + 1
+
+    end = data.index(b'\n', pos)
+    count, subtrees = (int(v) for v in data[pos:end].split(b' '))
+    pos = end + 1
+
+    if count >= 0:
+        cache_tree[path] = (data[pos:pos + 20], count)
+        pos += 20
+
+    for _ in range(subtrees):
+        pos = _parse_cache_tree(data, pos, path, cache_tree)
+
+    return pos
+
+
+class EntryCursor(object):
+    """
+    A position in the index entries. Only the current entry is decoded.
+
+    :var path: The path of the current entry or None once every entry has been read
+    :var mode: The mode of the current entry
+    :var sha: The binary object id of the current entry
+    :var stage: The merge stage of the current entry (0 unless there is a conflict)
+    :var intent_to_add: Flag if the entry was added with ``git add -N``
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.position = -1
+        self.path = b''
+        self.advance()
+
+    def _name(self, pos, flags, previous):
+        """
+        Reads the path of an entry
+
+        :return: A tuple of the path and the offset the name starts at
+        """
+        data = self.index.map
+        start = pos + ENTRY_HEADER.size + (2 if flags & FLAG_EXTENDED else 0)
+
+        if self.index.version == 4:
+            strip, name_start = self.index._varint(start)
+            return previous[:len(previous) - strip] + data[name_start:data.find(b'\0', name_start)], start
+
+        length = flags & FLAG_NAME_MASK
+        end = data.find(b'\0', start) if length == FLAG_NAME_MASK else start + length
+        return data[start:end], start
+
+    def _decode(self, pos, previous):
+        fields = ENTRY_HEADER.unpack_from(self.index.map, pos)
+        flags = fields[11]
+        path, start = self._name(pos, flags, previous)
+        extended = FLAGS.unpack_from(self.index.map, start - 2)[0] if flags & FLAG_EXTENDED else 0
+
+        return path, fields[6], fields[10], (flags >> 12) & 3, bool(extended & EXTENDED_INTENT_TO_ADD)
+
+    def advance(self, count=1):
+        """
+        Moves past entries. Version 4 indexes compress each path against the previous one so the paths of skipped
+        entries are still read, for earlier versions skipping is free.
+
+        :param count: The number of entries to move past
+        """
+        count = min(count, self.index.count - self.position)
+        if self.index.version == 4:
+            data = self.index.map
+            offsets = self.index.offsets
+            flags_offset = ENTRY_HEADER.size - FLAGS.size
+
+            for _ in range(count - 1):
+                self.position += 1
+                pos = offsets[self.position]
+                self.path = self._name(pos, FLAGS.unpack_from(data, pos + flags_offset)[0], self.path)[0]
+
+            count = 1
+
+        self.position += count
+        if self.position >= self.index.count:
+            self.path = None
+            return
+
+        self.path, self.mode, self.sha, self.stage, self.intent_to_add = self._decode(
+            self.index.offsets[self.position], self.path or b''
+        )
+
+    def next_path(self):
+        """
+        Moves past every entry for the current path (a conflicted path has an entry for each stage)
+        """
+        path = self.path
+        while self.path is not None and self.path == path:
+            self.advance()
+
+
+def read_tree(odb, sha):
+    """
+    Reads the entries of a tree object
+
+    :param odb: The gitdb object database
+    :param sha: The binary id of the tree
+    :return: A generator of (mode, name, binary id) tuples in the order they are stored
+    """
+    data = odb.stream(sha).read()
+    pos = 0
+
+    while pos < len(data):
+        space = data.index(b' ', pos)
+        nul = data.index(b'\0', space)
+        yield int(data[pos:space], 8), data[space + 1:nul], data[nul + 1:nul + 21]
+        pos = nul + 21
+
+
+def compare(index, odb, tree_sha):
+    """
+    Compares the index to a tree. Submodules are not included.
+
+    :param index: The ``IndexFile`` to compare
+    :param odb: The gitdb object database to read the tree from
+    :param tree_sha: The binary id of the tree or None to treat every entry as added
+    :return: A ``StagedChanges`` of lists of the changed paths as bytes
+    """
+    changes = StagedChanges([], [], [])
+    cursor = index.entries()
+
+    def take_added(before):
+        while cursor.path is not None and (before is None or cursor.path < before):
+            if not cursor.intent_to_add and cursor.mode != SUBMODULE_MODE:
+                changes.added.append(cursor.path)
+            cursor.next_path()
+
+    def compare_file(path, mode, sha):
+        take_added(path)
+
+        if cursor.path != path or cursor.intent_to_add:
+            if mode != SUBMODULE_MODE:
+                changes.deleted.append(path)
+            return
+
+        if SUBMODULE_MODE not in (mode, cursor.mode) and (cursor.stage or cursor.mode != mode or cursor.sha != sha):
+            changes.modified.append(path)
+
+        cursor.next_path()
+
+    def walk(prefix, sha):
+        cached = index.cache_tree.get(prefix)
+        if cached and cached[0] == sha:
+            take_added(prefix)
+            if cursor.path is not None and cursor.path.startswith(prefix):
+                cursor.advance(cached[1])
+            return
+
+        for mode, name, child_sha in read_tree(odb, sha):
+            if mode == TREE_MODE:
+                walk(prefix + name + b'/', child_sha)
+            else:
+                compare_file(prefix + name, mode, child_sha)
+
+    if tree_sha is not None:
+        walk(b'', tree_sha)
+
+    take_added(None)
+    return changes
+
+
+def _read_file(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def common_dir(git_dir):
+    """
+    Gets the directory holding the refs and objects shared by all worktrees
+
+    :param git_dir: The git directory of the working tree
+    :return: The common directory
+    """
+    if os.environ.get('GIT_COMMON_DIR'):
+        return os.path.abspath(os.environ['GIT_COMMON_DIR'])
+
+    common = _read_file(os.path.join(git_dir, 'commondir'))
+    if common:
+        return os.path.normpath(os.path.join(git_dir, common.decode('utf-8')))
+
+    return git_dir
+
+
+def resolve_ref(git_dir, ref='HEAD'):
+    """
+    Resolves a ref to a commit by reading the ref files directly
+
+    :param git_dir: The git directory
+    :param ref: The ref to resolve
+    :return: The hex id of the commit or None if the ref doesn't exist (such as HEAD before the first commit)
+    """
+    common = common_dir(git_dir)
+    if os.path.exists(os.path.join(common, 'reftable')):
+        raise UnsupportedIndex('The reftable ref store is not supported')
+
+    name = ref.encode('utf-8')
+    for _ in range(10):
+        value = None
+        for directory in (git_dir, common):
+            value = _read_file(os.path.join(directory, name.decode('utf-8')))
+            if value:
+                break
+
+        if not value:
+            packed = _read_file(os.path.join(common, 'packed-refs')) or b''
+            for line in packed.splitlines():
+                parts = line.split(b' ')
+                if len(parts) == 2 and parts[1] == name:
+                    value = parts[0]
+                    break
+
+        if not value:
+            return None
+
+        if not value.startswith(b'ref:'):
+            return value.decode('ascii')
+
+        name = value[4:].strip()
+
+    raise UnsupportedIndex(u'Too many symbolic refs resolving {0}'.format(ref))
+
+
+_odbs = {}
+_odb_lock = threading.Lock()
+
+
+def get_odb(objects_dir):
+    """
+    Gets the object database for a directory. Each database is opened once and kept so its pack indexes are reused.
+
+    :param objects_dir: The git objects directory
+    :return: The gitdb object database
+    """
+    with _odb_lock:
+        if objects_dir not in _odbs:
+            _odbs[objects_dir] = gitdb.GitDB(objects_dir)
+        else:
+            _odbs[objects_dir].update_cache()
+
+        return _odbs[objects_dir]
+
+
+def commit_tree(odb, commit):
+    """
+    Gets the tree of a commit
+
+    :param odb: The gitdb object database
+    :param commit: The hex id of the commit
+    :return: The binary id of the tree
+    """
+    header = odb.stream(bytes(bytearray.fromhex(commit))).read().split(b'\n', 1)[0]
+    if not header.startswith(b'tree '):
+        raise UnsupportedIndex(u'{0} is not a commit'.format(commit))
+
+    return bytes(bytearray.fromhex(header[5:].decode('ascii')))
+
+
+_last = {}
+
+
+def staged_changes(git_dir, index_path=None):
+    """
+    Gets the changes staged in the index compared to HEAD. The result for the last index and HEAD read is kept so
+    asking for the added, modified and deleted files separately only reads the index once.
+
+    :param git_dir: The git directory of the repo
+    :param index_path: The index file, defaults to the index in the git directory
+    :return: A ``StagedChanges`` of lists of paths (as bytes) relative to the repo root
+    """
+    index_path = index_path or os.path.join(git_dir, 'index')
+    head = resolve_ref(git_dir)
+
+    try:
+        st = os.stat(index_path)
+    except OSError:
+        raise UnsupportedIndex(u'The index "{0}" does not exist'.format(index_path))
+
+    key = (index_path, st.st_mtime, st.st_size, st.st_ino, head)
+
+    if _last.get('key') == key:
+        return _last['changes']
+
+    objects_dir = os.path.abspath(os.environ.get('GIT_OBJECT_DIRECTORY') or os.path.join(common_dir(git_dir), 'objects'))
+    odb = get_odb(objects_dir)
+
+    index = IndexFile(index_path)
+    try:
+        changes = compare(index, odb, commit_tree(odb, head) if head else None)
+    finally:
+        index.close()
+
+    _last.update(key=key, changes=changes)
+    return changes
@@ -0,0 +1,249 @@
+import os
+import re
+
+from .compat import ConfigParser
+
+
+HEADER_RE = re.compile(r'^#\s*githooks-([a-z0-9-]+)\s*:\s*(.*?)\s*$')
+
+HEADER_MAX_LINES = 50
+
+
+def parse_header(lines):
+    """
+    Reads the metadata fields from the comment block at the top of a hook. Fields are comment lines of the form
+    ``# githooks-<name>: <value>``, a field given on several lines has its values joined with a space. The header ends
+    at the first line that isn't a comment or blank.
+
+    :param lines: The lines of the hook
+    :return: A dictionary mapping each field name to its value
+    """
+    fields = {}
+    for i, line in enumerate(lines):
+        line = line.strip()
+        if i >= HEADER_MAX_LINES or (line and not line.startswith('#')):
+            break
+
+        match = HEADER_RE.match(line)
+        if match:
+            name, value = match.groups()
+            fields[name] = u'{0} {1}'.format(fields[name], value) if name in fields else value
+
+    return fields
+
+
+_header_cache = {}
+
+
+def is_plugin(hook):
+    """
+    Checks if a hook is provided by an installed package (a ``plugins.PluginHook``) rather than being a script
+
+    :param hook: The path of a script hook or a plugin hook
+    :return: True if the hook is a plugin
+    """
+    return getattr(hook, 'is_plugin', False)
+
+
+def hook_name(hook):
+    """
+    Gets the name a hook is reported, recorded and configured under. This is the file name of a script hook or
+    "plugin:<name>" for a plugin hook.
+
+    :param hook: The path of a script hook or a plugin hook
+    :return: The name of the hook
+    """
+    return str(hook) if is_plugin(hook) else os.path.basename(hook)
+
+
+def read_header(path):
+    """
+    Reads the metadata fields from a hook. The result is stored against the size and modification time of the hook so
+    each hook is only read once while it is unchanged.
+
+    :param path: The path of the hook. Plugin hooks have no header, their metadata is given with the hook.
+    :return: A dictionary mapping each field name to its value, empty if the hook can't be read
+    """
+    if is_plugin(path):
+        return path.metadata
+
+    try:
+        st = os.stat(path)
+    except (OSError, ValueError):
+        return {}
+
+    key = (path, st.st_size, st.st_mtime)
+    if key not in _header_cache:
+        try:
+            with open(path, 'rb') as f:
+                lines = [f.readline(1024).decode('utf-8', 'replace') for _ in range(HEADER_MAX_LINES)]
+        except (IOError, OSError):
+            return {}
+
+        _header_cache[key] = parse_header(lines)
+
+    return _header_cache[key]
+
+
+def split_list(value):
+    """
+    Splits a metadata or config value holding a list separated by whitespace or commas
+
+    :param value: The value to split
+    :return: The list of items
+    """
+    return [item for item in re.split(r'[\s,]+', value or '') if item]
+
+
+def config_path(root):
+    """
+    Gets the file the repositories config is read from, "git-hooks.cfg" or, if that file doesn't exist, "setup.cfg"
+
+    :param root: The root directory of the repository
+    :return: The path of the config file or None if the repository has neither
+    """
+    for name in ('git-hooks.cfg', 'setup.cfg'):
+        if os.path.exists(os.path.join(root, name)):
+            return os.path.join(root, name)
+
+    return None
+
+
+def config_section(root, name):
+    """
+    Reads a section from the repositories config. This is the "<name>" section of "git-hooks.cfg" or, if that file
+    doesn't exist, the "git-hooks.<name>" section of "setup.cfg".
+
+    :param root: The root directory of the repository
+    :param name: The name of the section
+    :return: A dictionary of the options in the section, empty if there is no such section
+    """
+    parser = ConfigParser()
+
+    path = config_path(root)
+    if path:
+        parser.read(path)
+        if os.path.basename(path) == 'setup.cfg':
+            name = 'git-hooks.' + name
+
+    return dict(parser.items(name)) if parser.has_section(name) else {}
+
+
+def hook_field(path, name, config=None):
+    """
+    Gets a metadata field for a hook from its header or, if the header doesn't have the field, from the hooks entry in
+    a config section
+
+    :param path: The path of the hook
+    :param name: The name of the field
+    :param config: The config section (keyed by hook name) to fall back to
+    :return: The value or None if the field isn't given
+    """
+    value = read_header(path).get(name)
+    if value is None and config:
+        value = config.get(hook_name(path).lower())
+
+    return value
+
+
+def hook_requirements(path, config=None):
+    """
+    Gets the packages a hook needs installed to run. These are given by the ``githooks-requirements`` header field or,
+    if the hook doesn't have one, the hooks entry in the "requirements" config section.
+
+    :param path: The path of the hook
+    :param config: The "requirements" config section to fall back to
+    :return: The sorted list of requirements, empty if the hook doesn't declare any
+    """
+    return sorted(set(split_list(hook_field(path, 'requirements', config))))
+
+
+RESULTS_FORMATS = ('jsonl',)
+
+
+def hook_results_format(path, config=None):
+    """
+    Gets the format a hook reports the result of each file it checks in. This is given by the ``githooks-results``
+    header field or the hooks entry in the "results" config section, the only format is "jsonl".
+
+    :param path: The path of the hook
+    :param config: The "results" config section to fall back to
+    :return: The format or None if the hook only reports its exit status
+    """
+    value = (hook_field(path, 'results', config) or '').strip().lower()
+    return value if value in RESULTS_FORMATS else None
+
+
+DEFERRED_VALUES = {
+    'always': 'always', 'yes': 'always', 'true': 'always', '1': 'always',
+    'never': 'never', 'no': 'never', 'false': 'never', '0': 'never',
+}
+
+
+def hook_deferred(path, config=None):
+    """
+    Gets if a hook should be ran in the background after the commit is made rather than before it. This is given by
+    the ``githooks-deferred`` header field or the hooks entry in the "deferred" config section, "always" (or "yes")
+    always defers the hook and "never" (or "no") stops the hook being deferred to keep the commit within its budget.
+
+    :param path: The path of the hook
+    :param config: The "deferred" config section to fall back to
+    :return: "always", "never" or None if the hook doesn't say
+    """
+    return DEFERRED_VALUES.get((hook_field(path, 'deferred', config) or '').strip().lower())
+
+
+FIXER_VALUES = ('yes', 'true', '1', 'on')
+
+
+def hook_is_fixer(path, config=None):
+    """
+    Checks if a hook fixes the files it is given (such as a formatter) rather than only checking them. This is given by
+    the ``githooks-fixer`` header field or the hooks entry in the "fixers" config section.
+
+    :param path: The path of the hook
+    :param config: The "fixers" config section to fall back to
+    :return: True if the hook is a fixer
+    """
+    return (hook_field(path, 'fixer', config) or '').strip().lower() in FIXER_VALUES
+
+
+SIZE_RE = re.compile(r'^(\d+)\s*([kmg]?)i?b?$', re.IGNORECASE)
+
+SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+EXCLUDE_KINDS = ('binary', 'lfs')
+
+
+def parse_size(value):
+    """
+    Parses a size such as "500", "200K" or "2M" (units are powers of 1024)
+
+    :param value: The size
+    :return: The number of bytes
+    """
+    match = SIZE_RE.match(value.strip())
+    if not match:
+        raise ValueError(u'"{0}" is not a valid size'.format(value))
+
+    return int(match.group(1)) * SIZE_UNITS[match.group(2).lower()]
+
+
+def hook_exclusions(path, exclude_config=None, max_size_config=None):
+    """
+    Gets the kinds of files a hook has opted out of being given. These are given by the ``githooks-exclude`` header
+    field (any of "binary" and "lfs") and the ``githooks-max-size`` header field or the hooks entries in the "exclude"
+    and "max-size" config sections.
+
+    :param path: The path of the hook
+    :param exclude_config: The "exclude" config section to fall back to
+    :param max_size_config: The "max-size" config section to fall back to
+    :return: A tuple of the set of excluded kinds and the maximum file size (None if there is no limit)
+    """
+    kinds = set(k.lower() for k in split_list(hook_field(path, 'exclude', exclude_config)))
+    unknown = kinds - set(EXCLUDE_KINDS)
+    if unknown:
+        raise ValueError(u'Unknown exclusion {0}, expected one of {1}'.format(', '.join(sorted(unknown)), ', '.join(EXCLUDE_KINDS)))
+
+    max_size = hook_field(path, 'max-size', max_size_config)
+    return kinds, parse_size(max_size) if max_size else None
@@ -0,0 +1,218 @@
+import hashlib
+import logging
+import multiprocessing
+import sys
+import traceback
+from collections import namedtuple
+
+from . import cache, repo, utils
+from .compat import StringIO
+
+try:
+    from importlib import metadata
+except ImportError:  # pragma: no cover (python < 3.8)
+    metadata = None
+
+try:
+    from importlib.util import find_spec
+except ImportError:  # pragma: no cover (python 2)
+    find_spec = None
+
+
+logger = logging.getLogger(__name__)
+
+
+ENTRY_POINT_GROUP = 'githooks.hooks'
+
+PLUGIN_PREFIX = 'plugin:'
+
+
+ChangeSet = namedtuple('ChangeSet', [
+    'hook_type', 'root', 'files', 'added', 'modified', 'deleted', 'changes', 'changed_lines', 'file_info',
+])
+
+
+def change_set(manifest, files):
+    """
+    Builds the change set given to plugin hooks from the manifest the runner wrote for the script hooks
+
+    :param manifest: The manifest dictionary (or None if the runner doesn't write one)
+    :param files: The files being checked
+    :return: A ``ChangeSet``
+    """
+    manifest = manifest or {}
+    return ChangeSet(
+        manifest.get('hook_type'),
+        manifest.get('root'),
+        list(files),
+        list(manifest.get('added') or []),
+        list(manifest.get('modified') or []),
+        list(manifest.get('deleted') or []),
+        [repo.FileChange(**c) for c in manifest.get('changes') or []],
+        dict((p, [tuple(r) for r in ranges]) for p, ranges in (manifest.get('changed_lines') or {}).items()),
+        dict((p, repo.FileInfo(**info)) for p, info in (manifest.get('file_info') or {}).items()),
+    )
+
+
+def iter_entry_points(group=ENTRY_POINT_GROUP):
+    """
+    Gets the entry points registered by the installed packages
+
+    :param group: The entry point group
+    :return: A generator of (name, "module:attribute") tuples
+    """
+    if metadata is not None:
+        entry_points = metadata.entry_points()
+        selected = entry_points.select(group=group) if hasattr(entry_points, 'select') else entry_points.get(group, [])
+        for entry_point in selected:
+            yield entry_point.name, entry_point.value
+    else:  # pragma: no cover (python < 3.8)
+        import pkg_resources
+        for entry_point in pkg_resources.iter_entry_points(group):
+            yield entry_point.name, u'{0}:{1}'.format(entry_point.module_name, '.'.join(entry_point.attrs))
+
+
+def load_target(target):
+    """
+    Imports the callable an entry point refers to
+
+    :param target: The "module:attribute" reference
+    :return: The callable
+    """
+    return utils.import_string(target)
+
+
+class PluginHook(object):
+    """
+    A hook provided by an installed package rather than a script. It is scheduled, cached and recorded alongside the
+    script hooks under the name "plugin:<name>". Plugins have no header to read so their metadata is given with the
+    hook, any field it doesn't give is read from the config sections like for script hooks.
+
+    :var name: The entry point name
+    :var target: The "module:attribute" reference to the hook callable
+    :var metadata: A dictionary of the hooks metadata fields (the same fields as a script hooks header)
+    """
+    is_plugin = True
+
+    def __init__(self, name, target, metadata=None):
+        self.name = name
+        self.target = target
+        self.metadata = dict(metadata or {})
+
+    def __str__(self):
+        return PLUGIN_PREFIX + self.name
+
+    def __repr__(self):
+        return u'PluginHook({0!r}, {1!r})'.format(self.name, self.target)
+
+    def __eq__(self, other):
+        return isinstance(other, PluginHook) and (self.name, self.target) == (other.name, other.target)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.name, self.target))
+
+    @property
+    def digest(self):
+        """
+        The hash identifying the current version of the hook, built from its reference and the source of its module
+        so cached results are not reused once the plugin changes
+        """
+        parts = [self.target]
+        try:
+            spec = find_spec(self.target.partition(':')[0]) if find_spec else None
+            if spec is not None and spec.origin and spec.has_location:
+                parts.append(cache.hash_file(spec.origin))
+        except (ImportError, ValueError, IOError, OSError):
+            pass
+
+        return hashlib.sha1(u'\0'.join(parts).encode('utf-8')).hexdigest()
+
+
+def find_plugins(names, group=ENTRY_POINT_GROUP):
+    """
+    Finds the plugin hooks with the given names. A name that no installed package registers is logged and skipped.
+
+    :param names: The entry point names of the plugins to use
+    :param group: The entry point group
+    :return: A list of ``PluginHook`` objects in the order of the names
+    """
+    if not names:
+        return []
+
+    registered = dict(iter_entry_points(group))
+    hooks = []
+    for name in names:
+        if name in registered:
+            hooks.append(PluginHook(name, registered[name]))
+        else:
+            logger.warning(u'No installed package provides the "{0}" hook plugin'.format(name))
+
+    return hooks
+
+
+_change_set = None
+_targets = {}
+
+
+def _init_worker(shared_change_set):
+    global _change_set
+    _change_set = shared_change_set
+
+
+def _run_plugin(target, files=None):
+    """
+    Runs a plugin in a pool worker, the output is captured and returned with the status. A plugin returning None or
+    True passes, False fails and an integer is used as the status.
+    """
+    changes = _change_set if files is None else _change_set._replace(files=files)
+    output = StringIO()
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout = sys.stderr = output
+
+    try:
+        if target not in _targets:
+            _targets[target] = load_target(target)
+
+        res = _targets[target](changes)
+        status = 0 if res is None or res is True else 1 if res is False else int(res)
+    except Exception:  # a broken plugin fails its hook rather than the run
+        traceback.print_exc()
+        status = 1
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+
+    return status, output.getvalue().rstrip('\n')
+
+
+class PluginPool(object):
+    """
+    A pool of processes running plugin hooks. The change set is sent to each process once when the pool starts and
+    every plugin in the run is executed by the same pool, each process only imports each plugin once.
+    """
+    def __init__(self, shared_change_set, processes=1):
+        """
+        :param shared_change_set: The ``ChangeSet`` given to the plugins
+        :param processes: The number of plugins to run at once
+        """
+        self.change_set = shared_change_set
+        self._pool = multiprocessing.Pool(max(1, processes), _init_worker, (shared_change_set,))
+
+    def run(self, hook, files=None):
+        """
+        Runs a plugin hook
+
+        :param hook: The ``PluginHook`` to run
+        :param files: The files to give the plugin if they differ from the files in the change set
+        :return: A tuple of the status and the output of the plugin
+        """
+        if files is not None and files == self.change_set.files:
+            files = None
+
+        return self._pool.apply(_run_plugin, (hook.target, files))
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
@@ -0,0 +1,178 @@
+import os
+import subprocess
+import time
+from collections import namedtuple
+from timeit import default_timer
+
+from . import meta, utils
+
+try:
+    import resource
+except ImportError:  # pragma: no cover (resource is not available on windows)
+    resource = None
+
+
+START_MARKER = 'githooks-profile-start'
+
+IMPORT_TIME_PREFIX = 'import time:'
+
+# Ran in the hooks interpreter with "-X importtime". The marker separates the interpreter and harness start up from the
+# imports made by the hook itself, cProfile is only enabled when the stats are being saved so the timings are not
+# skewed by the profiler otherwise.
+HARNESS = '''
+import runpy, sys, time
+stats_path, path = sys.argv[1], sys.argv[2]
+sys.argv = sys.argv[2:]
+sys.path[0] = __import__('os').path.dirname(path)
+profiler = None
+if stats_path:
+    import cProfile
+    profiler = cProfile.Profile()
+sys.stderr.write('{0} %r\\n' % time.time())
+sys.stderr.flush()
+if profiler:
+    profiler.enable()
+try:
+    runpy.run_path(path, run_name='__main__')
+finally:
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(stats_path)
+'''.format(START_MARKER)
+
+
+HookProfile = namedtuple('HookProfile', [
+    'hook', 'python', 'status', 'wall', 'startup', 'work', 'user', 'system', 'imports', 'stats_path', 'output',
+])
+
+
+def parse_import_times(lines):
+    """
+    Reads the top level imports from the output of ``python -X importtime``. Nested imports are already included in
+    the cumulative time of the import that caused them.
+
+    :param lines: The import time lines
+    :return: A list of (module, seconds) tuples, slowest first
+    """
+    imports = []
+    for line in lines:
+        parts = line[len(IMPORT_TIME_PREFIX):].split('|')
+        if len(parts) != 3 or parts[2].startswith('  '):
+            continue
+
+        try:
+            imports.append((parts[2].strip(), int(parts[1]) / 1000000.0))
+        except ValueError:
+            continue
+
+    return sorted(imports, key=lambda i: -i[1])
+
+
+def _children_usage():
+    if resource is None:  # pragma: no cover
+        return None
+
+    return resource.getrusage(resource.RUSAGE_CHILDREN)
+
+
+def _usage_delta(before, after):
+    if before is None or after is None:  # pragma: no cover
+        return None, None
+
+    return after.ru_utime - before.ru_utime, after.ru_stime - before.ru_stime
+
+
+def profile_hook(path, args, stats_path=None, interpreter=None, **kwargs):
+    """
+    Runs a single hook under the profiling harness. Python hooks are ran by their own interpreter with
+    ``-X importtime``, their start up time is the time taken to start the interpreter plus the time spent in the
+    hooks own imports and everything else is counted as work. Other hooks only have their wall clock and cpu time
+    recorded.
+
+    :param path: The path of the hook
+    :param args: The arguments to give the hook
+    :param stats_path: The file to save the cProfile stats of a python hook to, if this is None the hook isn't ran
+        under cProfile
+    :param interpreter: The interpreter command to run a python hook with rather than the one from its shebang
+    :param kwargs: Extra keyword arguments used to start the hook process
+    :return: A ``HookProfile``
+    """
+    shebang = utils.python_interpreter(path)
+    interpreter = (interpreter or shebang) if shebang else None
+    if interpreter:
+        command = interpreter + ['-X', 'importtime', '-c', HARNESS, stats_path or '', path] + list(args)
+    else:
+        command = [path] + list(args)
+
+    usage = _children_usage()
+    launched = time.time()
+    start = default_timer()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs)
+    out, err = process.communicate()
+    wall = default_timer() - start
+    user, system = _usage_delta(usage, _children_usage())
+
+    output = out.decode('utf-8', 'replace').splitlines()
+    if not interpreter:
+        output += err.decode('utf-8', 'replace').splitlines()
+        return HookProfile(path, False, process.returncode, wall, None, None, user, system, [], None, u'\n'.join(output))
+
+    started = None
+    import_lines = []
+    for line in err.decode('utf-8', 'replace').splitlines():
+        if line.startswith(START_MARKER):
+            started = float(line.split()[1])
+        elif line.startswith(IMPORT_TIME_PREFIX):
+            if started is not None:
+                import_lines.append(line)
+        else:
+            output.append(line)
+
+    imports = parse_import_times(import_lines)
+    startup = min(wall, max(0.0, (started or launched) - launched) + sum(s for _, s in imports))
+
+    return HookProfile(
+        path, True, process.returncode, wall, startup, wall - startup, user, system, imports,
+        stats_path if stats_path and os.path.exists(stats_path) else None, u'\n'.join(output),
+    )
+
+
+def profile_hooks(runner, stats_dir=None):
+    """
+    Profiles each hook found by a runner against the arguments it would give them. The hooks are ran one at a time so
+    they don't compete with each other. Plugin hooks run inside the runners process pool so are not profiled.
+
+    :param runner: The runner for the hook type being profiled
+    :param stats_dir: The directory to save the cProfile stats of python hooks to, one "<hook name>.pstats" file per
+        hook. If this is None cProfile isn't used.
+    :return: A list of ``HookProfile`` objects, slowest first
+    """
+    args, _ = runner.build_args()
+    kwargs = runner.get_subprocess_kwargs()
+
+    if stats_dir and not os.path.isdir(stats_dir):
+        os.makedirs(stats_dir)
+
+    manifest = runner.get_manifest()
+    manifest_path = runner.write_manifest(manifest) if manifest is not None else None
+    if manifest_path:
+        kwargs['env'] = dict(kwargs.get('env') or os.environ, GIT_HOOKS_MANIFEST=manifest_path)
+
+    profiles = []
+    try:
+        for path in sorted(p for p in runner.get_finder() if not meta.is_plugin(p)):
+            stats_path = os.path.join(os.path.abspath(stats_dir), os.path.basename(path) + '.pstats') if stats_dir else None
+            hook_kwargs = dict(kwargs)
+            interpreter = None
+
+            env = runner.get_hook_env(path)
+            if env:
+                interpreter = [runner.get_envs().python(env)]
+                hook_kwargs['env'] = runner.get_envs().activate(env, kwargs.get('env'))
+
+            profiles.append(profile_hook(path, args, stats_path, interpreter, **hook_kwargs))
+    finally:
+        if manifest_path:
+            os.remove(manifest_path)
+
+    return sorted(profiles, key=lambda p: -p.wall)
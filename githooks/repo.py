@@ -1,24 +1,118 @@
-import git
 import os
+import re
+import shutil
+import subprocess
+import tempfile
+from collections import namedtuple
 
+from . import index, utils
+from .compat import decode_path, encode_path
 
-def get():
+
+git = utils.LazyModule('git')
+
+SUBMODULE_MODE = 0o160000
+
+NULL_SHA = '0' * 40
+
+# environment variables set by git that tie commands to the current repo, these are removed when running commands in
+# submodules and worktrees
+LOCAL_ENV_VARS = (
+    'GIT_ALTERNATE_OBJECT_DIRECTORIES', 'GIT_COMMON_DIR', 'GIT_CONFIG', 'GIT_DIR', 'GIT_GRAFT_FILE', 'GIT_INDEX_FILE',
+    'GIT_NO_REPLACE_OBJECTS', 'GIT_OBJECT_DIRECTORY', 'GIT_PREFIX', 'GIT_REPLACE_REF_BASE', 'GIT_SHALLOW_FILE',
+    'GIT_WORK_TREE',
+)
+
+SubmoduleChanges = namedtuple('SubmoduleChanges', ['path', 'root', 'added', 'modified', 'deleted'])
+
+CommitChanges = namedtuple('CommitChanges', ['sha', 'added', 'modified', 'deleted'])
+
+FileInfo = namedtuple('FileInfo', ['size', 'binary', 'lfs'])
+
+FileChange = namedtuple('FileChange', ['status', 'path', 'old_path', 'similarity', 'old_oid', 'new_oid'])
+
+
+def get(path=None):
     """
-    Gets the repo object for the current git repo. This will track back through parent parent directories find the
-    repo root.
+    Gets the repo object for the current git repo. If ``GIT_DIR`` is set (git doesn't export it to hooks but a user may
+    have) that directory is used, otherwise this will track back through parent parent directories find the repo root.
+    Finding the git directory or root doesn't need the repo object (see ``git_dir`` and ``repo_root``) so GitPython is
+    only loaded when this is called.
 
+    :param path: The root of the repo to use instead of the current repo
     :return: The git repo object (object details can be found here http://gitpython.readthedocs.org/en/stable/tutorial.html#meet-the-repo-type)
     """
+    if path:
+        return git.Repo(path)
+
+    if os.environ.get('GIT_DIR'):
+        return git.Repo(os.path.abspath(os.environ['GIT_DIR']))
+
     return git.Repo(os.getcwd(), search_parent_directories=True)
 
 
+_locations = {}
+
+
+def _locate():
+    """
+    Finds the git directory and the root of the working tree of the current repo with a single ``rev-parse`` call. Both
+    come from git as hooks are only given ``GIT_INDEX_FILE`` and in a linked worktree the git directory isn't in the
+    root. The result is stored against the current directory and git environment so git is only asked once.
+
+    :return: A tuple of the absolute paths of the git directory and the root directory
+    """
+    key = (os.getcwd(), os.environ.get('GIT_DIR'), os.environ.get('GIT_WORK_TREE'))
+    if key not in _locations:
+        git_dir_path, root = _git_output(None, ['rev-parse', '--git-dir', '--show-toplevel']).splitlines()[:2]
+        _locations[key] = (os.path.abspath(git_dir_path), os.path.abspath(root))
+
+    return _locations[key]
+
+
+def git_dir():
+    """
+    Gets the git directory of the repo without creating the repo object
+
+    :return: The absolute path to the git directory
+    """
+    return _locate()[0]
+
+
 def repo_root():
     """
-    Gets the root directory of the git repo
+    Gets the root directory of the git repo (the root of the linked worktree when ran in one)
 
     :return: The root directory of the git repo
     """
-    return os.path.dirname(get().git_dir)
+    return _locate()[1]
+
+
+def head_commit(root=None):
+    """
+    Gets the commit HEAD points to
+
+    :param root: The root of the repo to use instead of the current repo
+    :return: The commit id
+    """
+    return _git_output(root or repo_root(), ['rev-parse', 'HEAD']).strip()
+
+
+def head_tree(root=None, env=None):
+    """
+    Gets the tree HEAD points to, with the staged changes this describes everything in the index without writing it
+
+    :param root: The root of the repo to use instead of the current repo
+    :param env: The environment to run git with
+    :return: The tree id or None if the repo has no HEAD yet
+    """
+    with open(os.devnull, 'w') as devnull:
+        try:
+            return decode_path(subprocess.check_output(
+                ['git', 'rev-parse', '--verify', '--quiet', 'HEAD^{tree}'], cwd=root or repo_root(), env=env, stderr=devnull,
+            )).strip()
+        except subprocess.CalledProcessError:
+            return None
 
 
 def untracked_files():
@@ -31,41 +125,903 @@ def untracked_files():
     return [os.path.join(repo_root_dir, p) for p in get().untracked_files]
 
 
+def has_staged_changes():
+    """
+    Checks if the index differs from HEAD. This only asks git for the exit status so no diff is built and GitPython is
+    not loaded. If the repo has no HEAD yet everything in the index is a change.
+
+    :return: True if there are staged changes, False otherwise
+    """
+    with open(os.devnull, 'w') as devnull:
+        status = subprocess.call(['git', 'diff-index', '--cached', '--quiet', 'HEAD', '--'], cwd=repo_root(), stderr=devnull)
+
+    return status != 0
+
+
+def index_path():
+    """
+    Gets the path of the index file git is using for the current repo. Git exports ``GIT_INDEX_FILE`` to hooks when it
+    is using another index (such as when committing with ``git commit <paths>``).
+
+    :return: The absolute path to the index
+    """
+    return os.path.abspath(os.environ.get('GIT_INDEX_FILE') or os.path.join(git_dir(), 'index'))
+
+
+def _index_changes():
+    """
+    Gets the staged changes by reading the index directly if the ``GIT_HOOKS_INDEX_BACKEND`` environment variable is set
+    to "mmap". If the index uses a feature the reader doesn't support None is returned and GitPython is used instead.
+
+    :return: An ``index.StagedChanges`` of lists of paths relative to the repo root or None
+    """
+    if os.environ.get('GIT_HOOKS_INDEX_BACKEND') != 'mmap':
+        return None
+
+    try:
+        changes = index.staged_changes(git_dir(), index_path())
+    except index.UnsupportedIndex:
+        return None
+
+    return index.StagedChanges(*([decode_path(p) for p in paths] for paths in changes))
+
+
+def _is_submodule(diff):
+    return SUBMODULE_MODE in (getattr(diff, 'a_mode', None), getattr(diff, 'b_mode', None))
+
+
 def modified_files():
     """
-    Gets a list of modified files in the repo.
+    Gets a list of modified files in the repo. Submodules are not included, see ``submodule_changes``.
 
     :return: A list of absolute paths to all changed files in the repo
     """
     repo_root_dir = repo_root()
-    return [os.path.join(repo_root_dir, d.b_path) for d in get().head.commit.diff() if not (d.new_file or d.deleted_file)]
+    changes = _index_changes()
+    if changes is not None:
+        return [os.path.join(repo_root_dir, p) for p in changes.modified]
+
+    return [os.path.join(repo_root_dir, d.b_path) for d in get().head.commit.diff() if not (d.new_file or d.deleted_file or _is_submodule(d))]
 
 
 def added_files():
     """
-    Gets a list of added files in the repo.
+    Gets a list of added files in the repo. Submodules are not included, see ``submodule_changes``.
 
     :return: A list of absolute paths to all added files in the repo
     """
     repo_root_dir = repo_root()
-    return [os.path.join(repo_root_dir, d.b_path) for d in get().head.commit.diff() if d.new_file]
+    changes = _index_changes()
+    if changes is not None:
+        return [os.path.join(repo_root_dir, p) for p in changes.added]
+
+    return [os.path.join(repo_root_dir, d.b_path) for d in get().head.commit.diff() if d.new_file and not _is_submodule(d)]
 
 
 def deleted_files():
     """
-    Gets a list of deleted files in the repo.
+    Gets a list of deleted files in the repo. Submodules are not included, see ``submodule_changes``.
 
     :return: A list of absolute paths to all deleted files in the repo
     """
     repo_root_dir = repo_root()
-    return [os.path.join(repo_root_dir, d.b_path) for d in get().head.commit.diff() if d.deleted_file]
+    changes = _index_changes()
+    if changes is not None:
+        return [os.path.join(repo_root_dir, p) for p in changes.deleted]
+
+    return [os.path.join(repo_root_dir, d.b_path) for d in get().head.commit.diff() if d.deleted_file and not _is_submodule(d)]
+
+
+def isolated_env():
+    """
+    Gets the environment to run git commands in another repo or worktree (such as a submodule) with. Any variables git
+    has set to tie commands to the current repo are removed.
+
+    :return: The environment dictionary
+    """
+    return dict((k, v) for k, v in os.environ.items() if k not in LOCAL_ENV_VARS)
+
+
+def _git_output(root, args, env=None):
+    return decode_path(subprocess.check_output(['git'] + list(args), cwd=root, env=env))
+
+
+def _parse_name_status(output):
+    """
+    Parses the output of a ``--name-status -z --no-renames`` diff.
+
+    :return: A dictionary mapping paths to their status letter
+    """
+    fields = output.split('\0')
+    return dict(
+        (path, status[0]) for status, path in zip(fields[0::2], fields[1::2]) if path
+    )
+
+
+HUNK_RE = re.compile(br'^@@ -\d+(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+C_ESCAPES = {b'a': b'\a', b'b': b'\b', b't': b'\t', b'n': b'\n', b'v': b'\v', b'f': b'\f', b'r': b'\r', b'"': b'"', b'\\': b'\\'}
+
+
+def _unquote_path(value):
+    """
+    Reverses the C style quoting git uses for paths with unusual characters in diff headers
+
+    :param value: The path as bytes, possibly quoted
+    :return: The unquoted path as bytes
+    """
+    if not value.startswith(b'"'):
+        return value
+
+    value = value[1:-1]
+    out = bytearray()
+    i = 0
+    while i < len(value):
+        char = value[i:i + 1]
+        if char != b'\\':
+            out += char
+            i += 1
+        elif value[i + 1:i + 2] in C_ESCAPES:
+            out += C_ESCAPES[value[i + 1:i + 2]]
+            i += 2
+        else:
+            out.append(int(value[i + 1:i + 4], 8))
+            i += 4
+
+    return bytes(out)
+
+
+def parse_zero_context_diff(output):
+    """
+    Parses the output of a ``-U0`` diff into the ranges of lines added or changed in each file. Hunks that only remove
+    lines are skipped as there is nothing left in the new file to check.
+
+    :param output: The diff output as bytes
+    :return: A dictionary mapping each path (relative to the repo root) to a list of inclusive (start, end) tuples
+    """
+    ranges = {}
+    current = None
+    body = 0
+
+    for line in output.split(b'\n'):
+        if body:
+            # the removed and added lines of a hunk can look like headers so they are skipped by count
+            if line[:1] in (b'+', b'-'):
+                body -= 1
+        elif line.startswith(b'+++ '):
+            target = line[4:].rstrip(b'\t')
+            current = None if target == b'/dev/null' else decode_path(_unquote_path(target)[2:])
+            if current is not None:
+                ranges.setdefault(current, [])
+        elif line.startswith(b'@@'):
+            match = HUNK_RE.match(line)
+            if match:
+                removed, start, added = int(match.group(1) or 1), int(match.group(2)), int(match.group(3) or 1)
+                body = removed + added
+                if added and current is not None:
+                    ranges[current].append((start, start + added - 1))
+
+    return ranges
+
+
+def changed_lines(root=None):
+    """
+    Gets the lines added or changed in each staged file using a single zero context diff of the index against HEAD.
+    Submodules and binary files are not included.
+
+    :param root: The root of the repo to use instead of the current repo
+    :return: A dictionary mapping the absolute path of each file to a list of inclusive (start, end) line ranges
+    """
+    root = root or repo_root()
+    output = subprocess.check_output([
+        'git', '-c', 'core.quotepath=off', 'diff', '--cached', '-U0', '--no-color', '--no-ext-diff', '--no-renames',
+        '--ignore-submodules', '--diff-filter=AM', '--src-prefix=a/', '--dst-prefix=b/', '--',
+    ], cwd=root)
+
+    return dict((os.path.join(root, path), lines) for path, lines in parse_zero_context_diff(output).items())
+
+
+def parse_raw_diff(output):
+    """
+    Parses the output of a ``--raw -z --no-abbrev`` diff. Submodule changes are left out.
+
+    :param output: The output of the diff
+    :return: A list of ``FileChange`` objects with paths relative to the repo root. The old path is only set for
+        renames and copies, the similarity only for renames, copies and rewrites. The object id of a side that doesn't
+        exist is None.
+    """
+    fields = iter(output.split('\0'))
+    changes = []
+
+    for field in fields:
+        if not field.startswith(':'):
+            continue
+
+        old_mode, new_mode, old_oid, new_oid, status = field.lstrip(':').split(' ')[:5]
+        old_path = next(fields) if status[0] in 'RC' else None
+        path = next(fields)
+
+        if '160000' in (old_mode, new_mode):
+            continue
+
+        changes.append(FileChange(
+            status[0], path, old_path, int(status[1:]) if status[1:] else None,
+            None if old_oid == NULL_SHA else old_oid, None if new_oid == NULL_SHA else new_oid,
+        ))
+
+    return changes
+
+
+def staged_changes(root=None, env=None):
+    """
+    Gets every staged change with renames detected, using a single diff of the index against HEAD (or against nothing
+    if the repo has no commits yet)
+
+    :param root: The root of the repo to use instead of the current repo
+    :param env: The environment to run git with
+    :return: A list of ``FileChange`` objects with absolute paths
+    """
+    root = root or repo_root()
+    output = _git_output(root, [
+        'diff', '--cached', '--raw', '-z', '--no-abbrev', '-M', '--no-ext-diff', '--no-color', '--ignore-submodules',
+    ], env)
+
+    return [
+        c._replace(path=os.path.join(root, c.path), old_path=os.path.join(root, c.old_path) if c.old_path else None)
+        for c in parse_raw_diff(output)
+    ]
+
+
+CLASSIFY_ATTRIBUTES = ['binary', 'text', 'diff', 'filter']
+
+
+def _staged_sizes(root, paths, env=None):
+    """
+    Gets the size of the staged blob for each path with a single ``cat-file --batch-check`` call
+
+    :return: A dictionary mapping each path to its size, paths that aren't staged are left out
+    """
+    # batch-check reads one object name per line so a path with a newline in it can't be asked for
+    paths = [p for p in paths if '\n' not in p]
+    if not paths:
+        return {}
+
+    process = subprocess.Popen(
+        ['git', 'cat-file', '--batch-check=%(objectsize)'], cwd=root, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+    )
+    output = process.communicate(b''.join(b':' + encode_path(p) + b'\n' for p in paths))[0]
+
+    sizes = {}
+    for path, line in zip(paths, output.decode('ascii', 'replace').splitlines()):
+        if line.isdigit():
+            sizes[path] = int(line)
+
+    return sizes
+
+
+def _staged_attributes(root, paths, env=None):
+    """
+    Gets the attributes used to classify each path, read from the staged ".gitattributes" files, with a single
+    ``check-attr`` call
+
+    :return: A dictionary mapping each path to a dictionary of attribute values
+    """
+    process = subprocess.Popen(
+        ['git', 'check-attr', '--cached', '--stdin', '-z'] + CLASSIFY_ATTRIBUTES, cwd=root, env=env,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+    )
+    output = decode_path(process.communicate(b''.join(encode_path(p) + b'\0' for p in paths))[0])
+
+    attributes = {}
+    fields = output.split('\0')
+    for path, name, value in zip(fields[0::3], fields[1::3], fields[2::3]):
+        attributes.setdefault(path, {})[name] = value
+
+    return attributes
+
+
+def classify_files(paths, root=None, env=None):
+    """
+    Classifies files so hooks can skip binaries, LFS files and very large files without opening any of them. The
+    whole list is classified with one ``check-attr`` and one ``cat-file --batch-check`` call. A file is binary if the
+    ``binary`` attribute is set or ``text`` or ``diff`` is unset, and is an LFS file if its ``filter`` is "lfs". The
+    size is of the staged content.
+
+    :param paths: The absolute paths of the files
+    :param root: The root of the repo to use instead of the current repo
+    :param env: The environment to run git with
+    :return: A dictionary mapping each path to a ``FileInfo``, the size is None if it isn't known
+    """
+    root = root or repo_root()
+    relative = dict((os.path.relpath(p, root).replace(os.sep, '/'), p) for p in paths)
+    if not relative:
+        return {}
+
+    attributes = _staged_attributes(root, list(relative), env)
+    sizes = _staged_sizes(root, list(relative), env)
+
+    classes = {}
+    for path, absolute in relative.items():
+        attrs = attributes.get(path, {})
+        classes[absolute] = FileInfo(
+            sizes.get(path),
+            attrs.get('binary') == 'set' or attrs.get('text') == 'unset' or attrs.get('diff') == 'unset',
+            attrs.get('filter') == 'lfs',
+        )
+
+    return classes
+
+
+def submodule_paths(root=None, env=None):
+    """
+    Gets the paths of the submodules registered in ".gitmodules"
+
+    :param root: The root of the repo to use instead of the current repo
+    :param env: The environment to run git with
+    :return: A list of paths relative to the repo root
+    """
+    root = root or repo_root()
+    if not os.path.exists(os.path.join(root, '.gitmodules')):
+        return []
+
+    try:
+        output = _git_output(root, ['config', '-f', '.gitmodules', '-z', '--get-regexp', r'^submodule\..*\.path$'], env=env)
+    except subprocess.CalledProcessError:
+        return []
+
+    return [entry.split('\n', 1)[1] for entry in output.split('\0') if '\n' in entry]
+
+
+def staged_submodule_pointers(root=None, env=None):
+    """
+    Gets the submodules whose commit pointer has been changed in the index
+
+    :param root: The root of the repo to use instead of the current repo
+    :param env: The environment to run git with
+    :return: A dictionary mapping submodule paths to a tuple of the old and new commit
+    """
+    output = _git_output(root or repo_root(), ['diff-index', '--cached', '--raw', '-z', '--no-renames', 'HEAD', '--'], env=env)
+    fields = output.split('\0')
+
+    pointers = {}
+    for meta, path in zip(fields[0::2], fields[1::2]):
+        old_mode, new_mode, old_sha, new_sha = meta.lstrip(':').split(' ')[:4]
+        if '160000' in (old_mode, new_mode):
+            pointers[path] = (old_sha, new_sha)
+
+    return pointers
+
+
+def _submodule_changes(root, path, pointer):
+    """
+    Gets the files changed in a single submodule. This combines the files changed between the old and new commit
+    pointer with any changes staged inside the submodule.
+
+    :param root: The root of the parent repo
+    :param path: The path of the submodule relative to the root
+    :param pointer: A tuple of the old and new commit of the submodule or None if the pointer hasn't changed
+    :return: A ``SubmoduleChanges`` object or None if the submodule has no changes or isn't initialised
+    """
+    sub_root = os.path.join(root, path)
+    if not os.path.exists(os.path.join(sub_root, '.git')):
+        return None
+
+    env = isolated_env()
+    statuses = {}
+
+    if pointer:
+        old_sha, new_sha = pointer
+        if new_sha == NULL_SHA:
+            return None
+        elif old_sha == NULL_SHA:
+            output = _git_output(sub_root, ['ls-tree', '-r', '-z', '--name-only', new_sha], env=env)
+            statuses = dict((p, 'A') for p in output.split('\0') if p)
+        else:
+            output = _git_output(sub_root, ['diff', '--name-status', '-z', '--no-renames', old_sha, new_sha, '--'], env=env)
+            statuses = _parse_name_status(output)
+
+    try:
+        staged = _parse_name_status(_git_output(sub_root, ['diff-index', '--cached', '--name-status', '-z', '--no-renames', 'HEAD', '--'], env=env))
+    except subprocess.CalledProcessError:
+        staged = {}
+
+    for p, status in staged.items():
+        if statuses.get(p) == 'A' and status == 'D':
+            del statuses[p]
+        elif statuses.get(p) != 'A':
+            statuses[p] = status
+
+    if not statuses:
+        return None
+
+    def paths(predicate):
+        return [os.path.join(sub_root, p) for p, status in sorted(statuses.items()) if predicate(status)]
+
+    return SubmoduleChanges(
+        path,
+        sub_root,
+        paths(lambda status: status == 'A'),
+        paths(lambda status: status not in 'AD'),
+        paths(lambda status: status == 'D'),
+    )
+
+
+def submodule_changes(jobs=1, root=None):
+    """
+    Gets the changes inside each submodule that either has a new commit pointer staged or has staged changes of its own.
+    Each submodule is queried concurrently.
+
+    :param jobs: The number of submodules to query at once
+    :param root: The root of a submodule to use instead of the current repo
+    :return: A list of ``SubmoduleChanges`` objects sorted by path
+    """
+    env = isolated_env() if root else None
+    root = root or repo_root()
+    paths = submodule_paths(root, env)
+    if not paths:
+        return []
+
+    pointers = staged_submodule_pointers(root, env)
+    paths = sorted(set(paths) | set(pointers))
+
+    changes = utils.imap_unordered(lambda p: _submodule_changes(root, p, pointers.get(p)), paths, jobs)
+    return sorted((c for c in changes if c), key=lambda c: c.path)
+
+
+def find_git_dir(root):
+    """
+    Gets the git directory for a working tree. Submodules and worktrees have a ``.git`` file pointing to their git
+    directory rather than a ``.git`` directory. For worktrees the common git directory (that holds the hooks) is used.
+
+    :param root: The root of the working tree
+    :return: The path to the git directory
+    """
+    path = os.path.join(root, '.git')
+    if not os.path.isfile(path):
+        return path
+
+    with open(path) as f:
+        content = f.read().strip()
+
+    if not content.startswith('gitdir:'):
+        return path
+
+    path = os.path.normpath(os.path.join(root, content[len('gitdir:'):].strip()))
+
+    common_dir_file = os.path.join(path, 'commondir')
+    if os.path.isfile(common_dir_file):
+        with open(common_dir_file) as f:
+            path = os.path.normpath(os.path.join(path, f.read().strip()))
+
+    return path
+
+
+def find_repos(top):
+    """
+    Finds all the git working trees under a directory including nested repos and initialised submodules.
+
+    :param top: The directory to search
+    :return: A generator of the root directories of the repos found
+    """
+    for dir_path, dir_names, file_names in os.walk(top):
+        if '.git' in dir_names or '.git' in file_names:
+            yield dir_path
+
+        if '.git' in dir_names:
+            dir_names.remove('.git')
+
+        dir_names.sort()
+
+
+def _split_nul(stream, buffer_size=65536):
+    """
+    Reads NUL separated fields from a stream as they become available
+
+    :param stream: The binary stream to read
+    :param buffer_size: The number of bytes to read at a time
+    :return: A generator of the decoded non empty fields
+    """
+    remainder = b''
+    for block in iter(lambda: stream.read(buffer_size), b''):
+        parts = (remainder + block).split(b'\0')
+        remainder = parts.pop()
+
+        for part in parts:
+            if part:
+                yield decode_path(part)
+
+    if remainder:
+        yield decode_path(remainder)
+
+
+def stream_git_paths(args, root=None, buffer_size=65536):
+    """
+    Runs a git command that outputs NUL separated paths (such as ``ls-files -z``) and yields each path as it is read.
+    The output is never held in memory all at once.
+
+    :param args: The arguments to pass to git
+    :param root: The directory to run git in, defaults to the repo root
+    :param buffer_size: The number of bytes to read at a time
+    :return: A generator of paths relative to the root
+    """
+    process = subprocess.Popen(['git'] + list(args), cwd=root or repo_root(), stdout=subprocess.PIPE)
+
+    try:
+        for path in _split_nul(process.stdout, buffer_size):
+            yield path
+    finally:
+        process.stdout.close()
+        if process.wait() not in (0, -13):
+            raise subprocess.CalledProcessError(process.returncode, ['git'] + list(args))
+
+
+def _diff_tree_entry(field, path):
+    """
+    Parses a raw ``diff-tree`` entry
+
+    :param field: The ":<old mode> <new mode> <old sha> <new sha> <status>" field
+    :param path: The path of the entry
+    :return: A tuple of the status letter, path and new blob id or None for submodule pointer changes
+    """
+    old_mode, new_mode, old_sha, new_sha, status = field.lstrip(':').split(' ')[:5]
+    if '160000' in (old_mode, new_mode):
+        return None
+
+    return status[0], path, new_sha
+
+
+def _commit_changes(root, sha, entries):
+    def select(statuses):
+        return [(os.path.join(root, path), new_sha) for status, path, new_sha in entries if status in statuses]
+
+    return CommitChanges(sha, select('A'), select('MT'), [os.path.join(root, path) for status, path, _ in entries if status == 'D'])
+
+
+def commit_changes(sha, root=None):
+    """
+    Gets the changes a single commit made to its first parent, this is what the pre-commit hooks were given when the
+    commit was made (including for merge commits). A root commit adds every file.
+
+    :param sha: The commit
+    :param root: The root of the repo to use instead of the current repo
+    :return: A ``CommitChanges`` object where added and modified are lists of (path, blob id) tuples
+    """
+    root = root or repo_root()
+    with open(os.devnull, 'w') as devnull:
+        try:
+            parent = decode_path(subprocess.check_output(
+                ['git', 'rev-parse', '--verify', '--quiet', sha + '^1'], cwd=root, stderr=devnull,
+            )).strip()
+        except subprocess.CalledProcessError:
+            parent = None
+
+    args = ['diff-tree', '-r', '-z', '--no-renames'] + ([parent, sha] if parent else ['--root', '--no-commit-id', sha])
+    fields = iter(_git_output(root, args).split('\0'))
+
+    entries = []
+    for field in fields:
+        if field.startswith(':'):
+            entry = _diff_tree_entry(field, next(fields))
+            if entry:
+                entries.append(entry)
+
+    return _commit_changes(root, sha, entries)
+
+
+def iter_commit_changes(rev_range, root=None):
+    """
+    Streams the changes made by each commit in a revision range, oldest first. The commits from a single ``rev-list``
+    are piped into a single ``diff-tree`` so only two processes are used however long the range is. Merge commits are
+    skipped as their changes come from the commits being merged, submodule pointer changes are ignored.
+
+    :param rev_range: The revision range (eg "master..feature")
+    :param root: The root of the repo to use instead of the current repo
+    :return: A generator of ``CommitChanges`` objects where added and modified are lists of (path, blob id) tuples
+    """
+    root = root or repo_root()
+    rev_list_args = ['git', 'rev-list', '--reverse', '--no-merges', rev_range, '--']
+    rev_list = subprocess.Popen(rev_list_args, cwd=root, stdout=subprocess.PIPE)
+    diff_tree = subprocess.Popen(
+        ['git', 'diff-tree', '--stdin', '-r', '-z', '--root', '--no-renames'],
+        cwd=root, stdin=rev_list.stdout, stdout=subprocess.PIPE,
+    )
+    rev_list.stdout.close()
+
+    try:
+        fields = _split_nul(diff_tree.stdout)
+        sha = None
+        entries = []
+
+        for field in fields:
+            if not field.startswith(':'):
+                if sha:
+                    yield _commit_changes(root, sha, entries)
+
+                sha = field.strip()
+                entries = []
+                continue
+
+            entry = _diff_tree_entry(field, next(fields))
+            if entry:
+                entries.append(entry)
+
+        if sha:
+            yield _commit_changes(root, sha, entries)
+    finally:
+        diff_tree.stdout.close()
+        diff_tree.wait()
+        if rev_list.wait() != 0:
+            raise subprocess.CalledProcessError(rev_list.returncode, rev_list_args)
+
+
+class Worktree(object):
+    """
+    A temporary detached worktree used to check out commits without touching the users working tree. This is used as a
+    context manager, the worktree is removed on exit.
+
+    :var path: The root of the worktree
+    """
+    def __init__(self, root=None):
+        """
+        :param root: The root of the repo to use instead of the current repo
+        """
+        self.root = root or repo_root()
+        self.path = None
+        self._tmp_dir = None
+
+    def __enter__(self):
+        self._tmp_dir = tempfile.mkdtemp(prefix='githooks-')
+        self.path = os.path.join(self._tmp_dir, 'worktree')
+
+        subprocess.check_call(['git', 'worktree', 'add', '-q', '--detach', '--no-checkout', self.path], cwd=self.root)
+        return self
+
+    def checkout(self, sha):
+        """
+        Checks out a commit in the worktree. Only files that differ from the current checkout are written.
+
+        :param sha: The commit to check out
+        """
+        subprocess.check_call(['git', 'checkout', '-q', '--force', '--detach', sha], cwd=self.path, env=isolated_env())
+
+    def __exit__(self, *args):
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+        subprocess.call(['git', 'worktree', 'prune'], cwd=self.root)
+
+
+def unstaged_files(paths=None, root=None):
+    """
+    Gets the tracked files whose working tree content differs from the staged content
+
+    :param paths: A list of absolute paths to limit the check to
+    :param root: The root of the repo to use instead of the current repo
+    :return: A list of absolute paths
+    """
+    root = root or repo_root()
+    args = ['diff', '--name-only', '-z', '--no-renames', '--ignore-submodules', '--']
+    if paths is not None:
+        if not paths:
+            return []
+        args.extend(os.path.relpath(p, root) for p in paths)
+
+    return [os.path.join(root, p) for p in _git_output(root, args).split('\0') if p]
+
+
+def _git_stdin(root, args, paths, env=None):
+    """
+    Runs a git command that reads a nul separated list of paths from its stdin
+
+    :param root: The directory to run the command from
+    :param args: The arguments for git
+    :param paths: The paths to write, relative to the root
+    :param env: The environment to run the command with
+    """
+    process = subprocess.Popen(['git'] + list(args), cwd=root, stdin=subprocess.PIPE, env=env)
+    process.communicate(b''.join(encode_path(p) + b'\0' for p in paths))
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, 'git {0}'.format(args[0]))
+
+
+def stage_files(paths, work_tree=None):
+    """
+    Stages the current content of files in the current repo with a single ``update-index`` call. When committing with
+    ``git commit <paths>`` git commits a temporary index and writes the same paths to the locked repo index, so both
+    are updated.
+
+    :param paths: The absolute paths of the files in the repo
+    :param work_tree: A copy of the repo (such as a ``StagedSnapshot``) to read the content from instead of the
+        working tree
+    """
+    root = repo_root()
+    relative = [os.path.relpath(p, root) for p in paths]
+    if not relative:
+        return
+
+    indexes = [index_path()]
+    locked_index = os.path.join(git_dir(), 'index.lock')
+    if os.path.basename(indexes[0]).startswith('next-index-') and os.path.exists(locked_index):
+        indexes.append(locked_index)
+
+    for index_file in indexes:
+        env = dict(os.environ, GIT_INDEX_FILE=index_file)
+        if work_tree:
+            env.update(GIT_DIR=git_dir(), GIT_WORK_TREE=work_tree)
+
+        _git_stdin(work_tree or root, ['update-index', '-z', '--stdin'], relative, env=env)
+
+
+def checkout_files(paths):
+    """
+    Writes the staged content of files in the current repo over their working tree copies with a single
+    ``checkout-index`` call
+
+    :param paths: The absolute paths of the files in the repo
+    """
+    root = repo_root()
+    relative = [os.path.relpath(p, root) for p in paths]
+    if relative:
+        _git_stdin(root, ['checkout-index', '--force', '-z', '--stdin'], relative)
+
+
+def snapshot_base_dir():
+    """
+    Gets the directory to create staged snapshots in. This is the ``GIT_HOOKS_SNAPSHOT_DIR`` environment variable if it
+    is set, otherwise a memory backed directory (``XDG_RUNTIME_DIR`` or "/dev/shm") if there is one.
+
+    :return: The directory or None to use the default temporary directory
+    """
+    configured = os.environ.get('GIT_HOOKS_SNAPSHOT_DIR')
+    if configured:
+        return configured
+
+    for candidate in [os.environ.get('XDG_RUNTIME_DIR'), '/dev/shm']:
+        if candidate and os.path.isdir(candidate) and os.access(candidate, os.W_OK | os.X_OK):
+            return candidate
+
+    return None
+
+
+class StagedSnapshot(object):
+    """
+    A temporary copy of the repo as it will be committed. The staged content of the changed files (and of any other
+    tracked file with unstaged changes) is written with a single ``checkout-index`` call, everything else is symlinked
+    to the working tree so building the snapshot only touches the directories holding changed files. This is used as a
+    context manager, the snapshot is removed on exit.
+
+    :var path: The root of the snapshot
+    """
+    def __init__(self, paths, root=None):
+        """
+        :param paths: The absolute paths of the staged files to write
+        :param root: The root of the repo to use instead of the current repo
+        """
+        self.root = root or repo_root()
+        self.paths = paths
+        self.path = None
+        self._tmp_dir = None
+
+    def __enter__(self):
+        self._tmp_dir = tempfile.mkdtemp(prefix='githooks-snapshot-', dir=snapshot_base_dir())
+        self.path = os.path.join(self._tmp_dir, os.path.basename(self.root.rstrip(os.sep)) or 'repo')
+        os.mkdir(self.path)
+
+        try:
+            written = self.checkout(sorted(set(self.paths) | set(unstaged_files(root=self.root))))
+            self.link(written)
+        except Exception:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+            raise
+
+        return self
+
+    def checkout(self, paths):
+        """
+        Writes the staged content of files into the snapshot
+
+        :param paths: The absolute paths of the files
+        :return: The set of paths written, relative to the repo root
+        """
+        relative = [os.path.relpath(p, self.root) for p in paths]
+        if relative:
+            _git_stdin(self.root, ['checkout-index', '--force', '-z', '--stdin', '--prefix=' + self.path + os.sep], relative)
+
+        return set(relative)
+
+    def link(self, written):
+        """
+        Links every working tree entry that isn't written into the snapshot. Directories holding written files are
+        created for real and their other entries are linked, any other directory is linked as a whole.
+
+        :param written: The set of written paths, relative to the repo root
+        """
+        dirs = set([''])
+        for path in written:
+            parent = os.path.dirname(path)
+            while parent and parent not in dirs:
+                dirs.add(parent)
+                parent = os.path.dirname(parent)
+
+        for directory in dirs:
+            try:
+                names = os.listdir(os.path.join(self.root, directory))
+            except OSError:  # the directory has been removed from the working tree
+                continue
+
+            for name in names:
+                path = os.path.join(directory, name)
+                if path in dirs or path in written:
+                    continue
+
+                try:
+                    os.symlink(os.path.join(self.root, path), os.path.join(self.path, path))
+                except OSError:
+                    pass
+
+    def path_for(self, path):
+        """
+        Maps a path in the repo to the same path in the snapshot, anything else is returned unchanged
+
+        :param path: The path to map
+        :return: The mapped path
+        """
+        if path == self.root:
+            return self.path
+
+        if path.startswith(os.path.join(self.root, '')):
+            return os.path.join(self.path, os.path.relpath(path, self.root))
+
+        return path
+
+    def __exit__(self, *args):
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+
+def iter_files(all_files=False, from_ref=None, to_ref=None, paths=None):
+    """
+    Streams the files to check when running hooks outside of a commit. Only files that exist in the working tree are
+    given, submodules are skipped.
+
+    :param all_files: Flag if every tracked file should be given
+    :param from_ref: The start of a revision range to get the changed files from
+    :param to_ref: The end of the revision range, if this is not given the range ends at the working tree
+    :param paths: A list of files or directories to limit the tracked files to
+    :return: A generator of absolute paths
+    """
+    root = repo_root()
+
+    if from_ref:
+        args = ['diff', '--name-only', '-z', '--no-renames', '--diff-filter=d', from_ref]
+        if to_ref:
+            args.append(to_ref)
+    else:
+        args = ['ls-files', '-z']
+
+    args.append('--')
+    if paths and not all_files:
+        args.extend(os.path.relpath(os.path.abspath(p), root) for p in paths)
+
+    for path in stream_git_paths(args, root):
+        path = os.path.join(root, path)
+        if os.path.isfile(path) or os.path.islink(path):
+            yield path
+
+
+def hooks_directory(root=None):
+    """
+    Gets the git hooks directory of the repo
+
+    :param root: The root of the repo to use instead of the current repo
+    :return: The path to the hooks directory
+    """
+    return os.path.join(find_git_dir(root or repo_root()), 'hooks')
 
 
-def hook_type_directory(hook_type):
+def hook_type_directory(hook_type, root=None):
     """
     Gets the directory to install hooks of the specified type to
 
     :param hook_type: the type of hook to get the install directory for
+    :param root: The root of the repo to use instead of the current repo
     :return: The path to install hooks to
     """
-    return os.path.join(repo_root(), '.git', 'hooks', hook_type + '.d')
+    return os.path.join(hooks_directory(root), hook_type + '.d')
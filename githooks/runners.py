@@ -1,21 +1,72 @@
+import json
 import logging
 import subprocess
+import tempfile
+from collections import namedtuple
+from timeit import default_timer
 
 import os
 
-from . import finders, repo
+from . import bytecode, cache, deferred, envs, finders, history, meta, plugins, repo, schedule, stats, utils
 
 
 logger = logging.getLogger(__name__)
 
 
+MANIFEST_VERSION = 1
+
+
+HookResult = namedtuple('HookResult', ['hook', 'status', 'duration', 'output', 'cached', 'skipped'])
+HookResult.__new__.__defaults__ = (False,)  # hooks are only skipped when every file they would be given is excluded
+
+
 class HookRunner(object):
     """
     Base class for running git hooks
 
     :var finder_class: The class to use to find the hooks to run.
+    :var history_class: The class used to record how long each hook takes. If this is None no history is kept and the
+        hooks are ran in the order they are found.
+    :var jobs: The number of hooks to run at once. If this is not set the ``GIT_HOOKS_JOBS`` environment variable is
+        used, falling back to running one hook at a time.
+    :var capture: Flag if the output of each hook should be collected and logged once the hook finishes. Output is
+        always captured when more than one job is used.
+    :var cache_class: The class used to store hook results. If this is None (or the ``GIT_HOOKS_CACHE`` environment
+        variable is 0) every hook is always ran.
+    :var stats_class: The class used to record every hook run. If this is None (or the ``GIT_HOOKS_STATS`` environment
+        variable is 0) runs are not recorded.
+    :var bytecode_class: The class used to cache the compiled code of python hooks, only hooks compiled when they were
+        installed are ran from the cache. If this is None (or the ``GIT_HOOKS_BYTECODE`` environment variable is 0)
+        python hooks are ran directly.
+    :var env_class: The class used to provide environments for hooks that declare requirements. If this is None (or
+        the ``GIT_HOOKS_ENVS`` environment variable is 0) hooks are always ran with their own interpreter.
+    :var manifest_path: The manifest file for the hooks currently running, its path is given to the hooks in the
+        ``GIT_HOOKS_MANIFEST`` environment variable
+    :var results_paths: A dictionary mapping each running hook that reports per file results to the file it writes
+        them to, the path is given to the hook in the ``GIT_HOOKS_RESULTS`` environment variable
+    :var plugin_pool: The pool of processes running the plugin hooks in the current run
     """
     finder_class = None
+    history_class = None
+    cache_class = None
+    stats_class = None
+    bytecode_class = bytecode.BytecodeCache
+    env_class = envs.EnvCache
+    jobs = None
+    capture = False
+    _bytecode = None
+    _envs = None
+    _config_sections = None
+    manifest_path = None
+    results_paths = None
+    plugin_pool = None
+
+    def __init__(self, jobs=None):
+        """
+        :param jobs: The number of hooks to run at once
+        """
+        if jobs:
+            self.jobs = jobs
 
     def get_process_args(self, *args):
         """
@@ -35,6 +86,14 @@ class HookRunner(object):
         """
         return kwargs
 
+    def get_subprocess_kwargs(self):
+        """
+        Gets any extra keyword arguments used to start the hook processes (such as the working directory).
+
+        :return: The dictionary of keyword arguments
+        """
+        return {}
+
     def get_finder_class(self):
         """
         Gets the class to use to find the hooks.
@@ -51,42 +110,1538 @@ class HookRunner(object):
         """
         return self.get_finder_class()()
 
-    def run(self):
+    def get_jobs(self):
         """
-        Runs all the registered commit hooks
+        Gets the number of hooks to run at once.
 
-        :return: A sum of the return codes generated by the registered hooks
+        :return: The number of jobs
         """
-        finder = self.get_finder()
-        logger.info(u'Running "{0}" hooks\n'.format(finder.hook_type))
+        jobs = self.jobs or os.environ.get('GIT_HOOKS_JOBS') or 1
+
+        try:
+            return max(1, int(jobs))
+        except ValueError:
+            logger.warning(u'Invalid number of jobs "{0}", running one hook at a time'.format(jobs))
+            return 1
+
+    def get_history(self, hook_type):
+        """
+        Gets the duration history for the hook type being ran
+
+        :param hook_type: The type of hook being ran
+        :return: The history object or None if no history should be kept
+        """
+        if self.history_class is None:
+            return None
+
+        return self.history_class(hook_type)
+
+    def get_cache(self):
+        """
+        Gets the cache to store hook results in
+
+        :return: The cache instance or None if results should not be cached
+        """
+        if self.cache_class is None or os.environ.get('GIT_HOOKS_CACHE', '1') == '0':
+            return None
+
+        return self.cache_class()
+
+    def get_stats(self):
+        """
+        Gets the store to record each hook run in
+
+        :return: The stats instance or None if runs should not be recorded
+        """
+        if self.stats_class is None or os.environ.get('GIT_HOOKS_STATS', '1') == '0':
+            return None
+
+        return self.stats_class()
+
+    def get_bytecode(self):
+        """
+        Gets the cache of compiled python hooks, a single cache is used for the life of the runner so each hook is only
+        hashed once
+
+        :return: The bytecode cache or None if python hooks should be ran directly
+        """
+        if self.bytecode_class is None or os.environ.get('GIT_HOOKS_BYTECODE', '1') == '0':
+            return None
+
+        if self._bytecode is None:
+            self._bytecode = self.bytecode_class()
+
+        return self._bytecode
+
+    def get_envs(self):
+        """
+        Gets the cache of environments for hooks that declare requirements
+
+        :return: The environment cache or None if hooks should be ran with their own interpreter
+        """
+        if self.env_class is None or os.environ.get('GIT_HOOKS_ENVS', '1') == '0':
+            return None
+
+        if self._envs is None:
+            self._envs = self.env_class()
+
+        return self._envs
+
+    def get_config_section(self, name):
+        """
+        Gets a section of the repositories config, each section is only read once for the life of the runner
+
+        :param name: The name of the section (such as "requirements")
+        :return: A dictionary mapping hook names to their values
+        """
+        if self._config_sections is None:
+            self._config_sections = {}
+
+        if name not in self._config_sections:
+            try:
+                self._config_sections[name] = meta.config_section(repo.repo_root(), name)
+            except Exception:  # not being able to read the config shouldn't stop the hooks running
+                self._config_sections[name] = {}
+
+        return self._config_sections[name]
+
+    def get_hook_env(self, path):
+        """
+        Gets the environment a hook should be ran in, building it if it doesn't exist yet
+
+        :param path: The path of the hook
+        :return: The environment directory or None if the hook doesn't declare any requirements (or is a plugin)
+        """
+        env_cache = self.get_envs()
+        if env_cache is None or meta.is_plugin(path):
+            return None
+
+        requirements = meta.hook_requirements(path, self.get_config_section('requirements'))
+        if not requirements:
+            return None
+
+        return env_cache.get(requirements, utils.python_interpreter(path))
+
+    def get_hook_command(self, path, env=None):
+        """
+        Gets the command used to start a hook. Python hooks that were compiled when they were installed are started
+        through the bytecode loader so their source isn't compiled on every run, using the interpreter from the hooks
+        environment if it has one. Any other hook is started directly.
+
+        :param path: The path of the hook
+        :param env: The environment the hook is ran in
+        :return: The command as a list
+        """
+        interpreter = [self.get_envs().python(env)] if env else None
+        bytecode_cache = self.get_bytecode()
+        command = bytecode_cache.command(path, interpreter=interpreter) if bytecode_cache is not None else None
+
+        if command is None and interpreter and utils.python_interpreter(path):
+            command = interpreter + [path]
+
+        return command or [path]
+
+    def save_stats(self, run_stats):
+        """
+        Saves the recorded runs. If the ``GIT_HOOKS_METRICS_FILE`` environment variable is set a summary of all the
+        recorded runs is also written to that file in the OpenMetrics text format. Failing to save the stats never
+        fails the hooks.
+
+        :param run_stats: The stats to save or None
+        """
+        if run_stats is None:
+            return
+
+        try:
+            run_stats.save()
+
+            metrics_path = os.environ.get('GIT_HOOKS_METRICS_FILE')
+            if metrics_path:
+                stats.write_openmetrics(run_stats.summary(), metrics_path)
+        except (IOError, OSError) as e:
+            logger.warning(u'Could not save the hook stats: {0}'.format(e))
+
+    def get_input_key(self, args):
+        """
+        Gets a key describing everything a hook will be given, this is used to look up cached results. If the input
+        can't be described None is returned and results are not cached.
+
+        :param args: The arguments the hooks will be given
+        :return: The cache key or None
+        """
+        return None
+
+    def get_predictions(self, hooks, size, hook_history=None):
+        """
+        Predicts how long each hook will take to run.
+
+        :param hooks: The paths of the hooks to run
+        :param size: The number of files the hooks will be given
+        :param hook_history: The duration history to base the predictions on
+        :return: A dictionary mapping hook paths to the predicted number of seconds (or None if unknown)
+        """
+        if hook_history is None:
+            return {}
+
+        return dict(
+            (p, hook_history.predict(meta.hook_name(p), size)) for p in hooks
+        )
+
+    def get_plan(self, hooks, size, hook_history=None):
+        """
+        Predicts the order the hooks will be started in and which worker will run each of them. The longest running
+        hooks are started first so that the pool of workers is kept busy.
+
+        :param hooks: The paths of the hooks to run
+        :param size: The number of files the hooks will be given
+        :param hook_history: The duration history to base the predictions on
+        :return: A list of ``schedule.Slot`` objects in the order the hooks will be started
+        """
+        return schedule.plan(hooks, self.get_predictions(hooks, size, hook_history), self.get_jobs())
+
+    def run_hook(self, path, args, capture=False):
+        """
+        Runs a single hook
+
+        :param path: The path of the hook to run
+        :param args: The arguments to give the hook
+        :param capture: Flag if the output from the hook should be collected and logged once it has finished. This
+            stops the output of hooks running at the same time being interleaved.
+        :return: A ``HookResult`` for the hook
+        """
+        if meta.is_plugin(path):
+            return self.run_plugin(path, args, capture)
+
+        name = meta.hook_name(path)
+        kwargs = self.get_subprocess_kwargs()
+        output = None
+        start = default_timer()
+
+        try:
+            env = self.get_hook_env(path)
+        except (envs.EnvError, IOError, OSError) as e:
+            logger.error(u'Could not build the environment for "{0}": {1}'.format(name, e))
+            return HookResult(path, 1, default_timer() - start, str(e) if capture else None, False)
+
+        command = self.get_hook_command(path, env) + args
+        if self.manifest_path:
+            kwargs['env'] = dict(kwargs.get('env') or os.environ, GIT_HOOKS_MANIFEST=self.manifest_path)
+
+        if self.results_paths and path in self.results_paths:
+            kwargs['env'] = dict(kwargs.get('env') or os.environ, GIT_HOOKS_RESULTS=self.results_paths[path])
+
+        if env:
+            kwargs['env'] = self.get_envs().activate(env, kwargs.get('env'))
+
+        if capture:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, **kwargs)
+            output = process.communicate()[0].decode('utf-8', 'replace').rstrip('\n')
+            res = process.returncode
+
+            logger.info(u'Running "{0}"'.format(name))
+            if output:
+                logger.info(output)
+        else:
+            logger.info(u'Running "{0}"'.format(name))
+            res = subprocess.call(command, **kwargs)
+
+        return HookResult(path, res, default_timer() - start, output, False)
+
+    def get_plugin_files(self, args):
+        """
+        Gets the files a plugin hook is given from the arguments a script hook would be given
+
+        :param args: The arguments for the hook
+        :return: The list of files
+        """
+        files = []
+        for arg in args:
+            if arg.startswith('--'):
+                break
+            files.append(arg)
+
+        return files
+
+    def start_plugin_pool(self, args, processes=1):
+        """
+        Starts a pool of processes to run plugin hooks. The change set the plugins are given is built from the manifest
+        so plugins see the same details as script hooks.
+
+        :param args: The arguments built for all the hooks
+        :param processes: The number of processes in the pool
+        :return: The ``plugins.PluginPool``
+        """
+        change_set = plugins.change_set(self.get_manifest(), self.get_plugin_files(args))
+        return plugins.PluginPool(change_set, processes)
+
+    def run_plugin(self, hook, args, capture=False):
+        """
+        Runs a plugin hook in the pool of the current run, or in a pool of its own if it is ran outside of
+        ``run_hooks``. The output of a plugin is always captured.
+
+        :param hook: The ``plugins.PluginHook`` to run
+        :param args: The arguments a script hook would be given, the plugin is given the files from these
+        :param capture: Flag if the output should be logged with the result rather than as soon as the hook finishes
+        :return: A ``HookResult`` for the hook
+        """
+        start = default_timer()
+        files = self.get_plugin_files(args)
+        pool = self.plugin_pool
+
+        logger.info(u'Running "{0}"'.format(hook))
+        if pool is not None:
+            res, output = pool.run(hook, files)
+        else:
+            pool = self.start_plugin_pool(args)
+            try:
+                res, output = pool.run(hook)
+            finally:
+                pool.close()
+
+        if output:
+            logger.info(output)
+
+        return HookResult(hook, res, default_timer() - start, output if capture else None, False)
+
+    def get_manifest(self):
+        """
+        Gets the manifest describing the change the hooks are ran over. The manifest is written to a json file for the
+        life of the run so hooks can read details that don't fit in their arguments.
+
+        :return: The manifest dictionary or None if the hooks are not given a manifest
+        """
+        return None
+
+    def write_manifest(self, manifest):
+        """
+        Writes a manifest to a new temporary file
+
+        :param manifest: The manifest dictionary
+        :return: The path of the file, the caller is responsible for removing it
+        """
+        fd, path = tempfile.mkstemp(prefix='githooks-manifest-', suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f)
+
+        return path
+
+    def get_file_keys(self):
+        """
+        Gets a key describing the content of each file the hooks are given, these are used to cache the result of each
+        file for hooks that report per file results. If this is empty results are only cached for the hook as a whole.
+
+        :return: A dictionary mapping file paths to their cache keys
+        """
+        return {}
+
+    def hook_path(self, path):
+        """
+        Gets the path a hook is given for a file
+
+        :param path: The path of the file
+        :return: The path the hook sees
+        """
+        return path
+
+    def reports_results(self, path):
+        """
+        Checks if a hook reports the result of each file it checks (see ``read_results``)
+
+        :param path: The path of the hook
+        :return: True if the hook reports per file results
+        """
+        return meta.hook_results_format(path, self.get_config_section('results')) is not None
+
+    def get_passed_files(self, result_cache, path, file_keys):
+        """
+        Gets the files a hook has already passed in their current state
+
+        :param result_cache: The cache of results
+        :param path: The path of the hook
+        :param file_keys: The dictionary mapping files to their cache keys
+        :return: The set of passed files
+        """
+        cached = result_cache.get_many(result_cache.hook_hash(path), list(file_keys.values()))
+        return set(p for p, key in file_keys.items() if cache.is_pass(cached.get(key)))
 
-        args = list(self.get_process_args())
+    def read_results(self, results_path, file_keys):
+        """
+        Reads the per file results written by a hook. Each line is a json object with the ``path`` of a file (absolute
+        or relative to the directory the hook was ran from) and the ``status`` of the file (0 for a pass). Lines that
+        can't be read and files the hook wasn't given are ignored.
+
+        :param results_path: The file the hook wrote its results to
+        :param file_keys: The dictionary mapping files to their cache keys
+        :return: A dictionary mapping files to their status
+        """
+        cwd = self.get_subprocess_kwargs().get('cwd') or os.getcwd()
+        files = dict((os.path.normpath(self.hook_path(p)), p) for p in file_keys)
+
+        results = {}
+        try:
+            with open(results_path) as f:
+                for line in f:
+                    try:
+                        result = json.loads(line)
+                        reported = os.path.normpath(os.path.join(cwd, result['path']))
+                        status = int(result['status'])
+                    except (ValueError, TypeError, KeyError, AttributeError):
+                        continue
+
+                    if reported in files:
+                        results[files[reported]] = status
+        except (IOError, OSError):
+            pass
+
+        return results
+
+    def store_file_results(self, result_cache, result, hook_args, file_keys, results_path):
+        """
+        Caches the passing files from a hook run. If the hook passed every file it was given has passed, otherwise only
+        the files the hook reported as passing are stored.
+
+        :param result_cache: The cache of results
+        :param result: The ``HookResult`` of the run
+        :param hook_args: The arguments the hook was given
+        :param file_keys: The dictionary mapping files to their cache keys
+        :param results_path: The file the hook wrote its results to
+        """
+        if result.status == 0:
+            given = set(hook_args)
+            passed = [p for p in file_keys if self.hook_path(p) in given]
+        else:
+            passed = [p for p, status in self.read_results(results_path, file_keys).items() if status == 0]
+
+        if passed:
+            result_cache.set_many(result_cache.hook_hash(result.hook), dict((file_keys[p], {'status': 0}) for p in passed))
+
+    def run_hooks(self, hooks, args, size, hook_history=None, store_failures=False):
+        """
+        Runs the hooks in the order given through the pool of workers. If a result is cached for a hook and the input
+        it would be given the cached result is used instead of running the hook. Passing results are cached. Hooks
+        with every file excluded are given a skipped result before any hook is started.
+
+        Hooks that report per file results (see ``read_results``) also have the result of each file they pass cached,
+        they are only given the files they haven't already passed and aren't ran at all if they have passed them all.
+
+        :param hooks: The paths of the hooks to run
+        :param args: The arguments to give the hooks
+        :param size: The number of files the hooks are given
+        :param hook_history: The duration history to record the hook durations in
+        :param store_failures: Flag if failing results should be cached as well, the output of each hook is captured so
+            it can be reported with the cached result
+        :return: A generator of ``HookResult`` objects in the order the hooks finish
+        """
+        jobs = self.get_jobs()
+        capture = self.capture or jobs > 1 or store_failures
+        result_cache = self.get_cache()
+        key = self.get_input_key(args) if result_cache is not None else None
+        file_keys = self.get_file_keys() if result_cache is not None else {}
+
+        reporting = [path for path in hooks if file_keys and self.reports_results(path)]
+        if result_cache is not None:
+            # a single lookup covers every hook so a remote cache only costs one round trip
+            entries = [(result_cache.hook_hash(path), key) for path in hooks if key is not None]
+            entries.extend((result_cache.hook_hash(path), k) for path in reporting for k in file_keys.values())
+            result_cache.prefetch(entries)
+
+        passed = dict((path, self.get_passed_files(result_cache, path, file_keys)) for path in reporting)
+        hook_args = dict((path, self.get_hook_args(path, args, passed.get(path))) for path in hooks)
+        skipped = [path for path in hooks if hook_args[path] is None and not passed.get(path)]
+        for path in skipped:
+            logger.info(u'Skipping "{0}", all of its files are excluded'.format(meta.hook_name(path)))
+
+        def run(path):
+            if key is not None:
+                cached = result_cache.get(result_cache.hook_hash(path), key)
+                if cached is not None:
+                    return HookResult(path, cached.get('status', 1), 0.0, cached.get('output'), True)
+
+            if hook_args[path] is None:  # every file the hook would be given has already passed
+                return HookResult(path, 0, 0.0, None, True)
+
+            if path not in passed:
+                return self.run_hook(path, hook_args[path], capture)
+
+            fd, self.results_paths[path] = tempfile.mkstemp(prefix='githooks-results-', suffix='.jsonl')
+            os.close(fd)
+            try:
+                result = self.run_hook(path, hook_args[path], capture)
+                self.store_file_results(result_cache, result, hook_args[path], file_keys, self.results_paths[path])
+                return result
+            finally:
+                os.remove(self.results_paths.pop(path))
+
+        manifest = self.get_manifest()
+        self.manifest_path = self.write_manifest(manifest) if manifest is not None else None
+        self.results_paths = {}
+
+        plugin_hooks = [h for h in hooks if meta.is_plugin(h) and hook_args[h] is not None]
+        if plugin_hooks:
+            self.plugin_pool = self.start_plugin_pool([self.hook_path(a) for a in args], min(jobs, len(plugin_hooks)))
+
+        try:
+            for path in skipped:
+                yield HookResult(path, 0, 0.0, None, False, True)
+
+            for result in utils.imap_unordered(run, [h for h in hooks if h not in skipped], jobs):
+                if not result.cached:
+                    if hook_history is not None:
+                        hook_history.record(meta.hook_name(result.hook), size, result.duration)
+
+                    if key is not None and (result.status == 0 or store_failures):
+                        result_cache.set(result_cache.hook_hash(result.hook), key, {'status': result.status, 'output': result.output})
+
+                yield result
+        finally:
+            if self.manifest_path:
+                os.remove(self.manifest_path)
+                self.manifest_path = None
+
+            if self.plugin_pool is not None:
+                self.plugin_pool.close()
+                self.plugin_pool = None
+
+    def has_work(self):
+        """
+        Checks if there is anything for the hooks to do. This is called before any arguments for the hooks are built so
+        should be cheap.
+
+        :return: True if the hooks should be ran, False otherwise
+        """
+        return True
+
+    def build_args(self, exclude=None):
+        """
+        Builds the full list of arguments to give the hooks from the process args and kwargs.
+
+        :param exclude: A set of files to leave out of the arguments
+        :return: A tuple of the arguments and the number of files the hooks are given
+        """
+        exclude = exclude or set()
+        args = [a for a in self.get_process_args() if a not in exclude]
+        size = len(args)
 
         for k, v in sorted(self.get_process_kwargs().items()):
+            v = [a for a in v if a not in exclude]
             if v:
                 args.append(k)
                 args.extend(v)
 
-        res = 0
-        for path in self.get_finder():
-            logger.info(u'Running "{0}"'.format(os.path.basename(path)))
-            res += subprocess.call([path] + args)
+        return args, size
+
+    def get_hook_args(self, path, args, exclude=None):
+        """
+        Gets the arguments to give a single hook
+
+        :param path: The path of the hook
+        :param args: The arguments built for all the hooks
+        :param exclude: A set of files to leave out of the arguments (such as files the hook has already passed)
+        :return: The arguments for the hook or None if the hook has nothing to check and should be skipped
+        """
+        if exclude:
+            args, size = self.build_args(exclude)
+            return args if size else None
+
+        return args
 
-        return res
+    def select_hooks(self, hooks, size, hook_history=None):
+        """
+        Chooses which of the planned hooks are ran now
+
+        :param hooks: The paths of the hooks in the order they will be started
+        :param size: The number of files the hooks will be given
+        :param hook_history: The duration history the hooks were planned with
+        :return: The paths of the hooks to run
+        """
+        return hooks
+
+    def iter_results(self):
+        """
+        Runs all the registered commit hooks, giving the result of each hook as soon as it finishes so callers can act
+        on a failure before the other hooks are done. If no hooks are installed or there is nothing for them to check
+        no work is done. The durations and stats are saved once the results are exhausted (or the generator is closed).
+
+        :return: A generator of ``HookResult`` objects
+        """
+        finder = self.get_finder()
+        found = list(finder)
+        if not found or not self.has_work():
+            return
+
+        logger.info(u'Running "{0}" hooks\n'.format(finder.hook_type))
+
+        args, size = self.build_args()
+        hook_history = self.get_history(finder.hook_type)
+        run_stats = self.get_stats()
+        hooks = self.select_hooks([slot.hook for slot in self.get_plan(found, size, hook_history)], size, hook_history)
+
+        try:
+            for result in self.run_hooks(hooks, args, size, hook_history):
+                if run_stats is not None and not result.skipped:
+                    run_stats.record(finder.hook_type, result, size)
+
+                if result.cached:
+                    logger.info(u'Using the precomputed result for "{0}"'.format(meta.hook_name(result.hook)))
+                    if result.output:
+                        logger.info(result.output)
+
+                yield result
+        finally:
+            if hook_history is not None:
+                hook_history.save()
+
+            self.save_stats(run_stats)
+
+    def run(self):
+        """
+        Runs all the registered commit hooks. If no hooks are installed or there is nothing for them to check no work is
+        done.
+
+        :return: A sum of the return codes generated by the registered hooks
+        """
+        return sum(result.status for result in self.iter_results())
+
+    def precompute(self):
+        """
+        Runs any hooks that don't yet have a cached result for their current input and caches the results, failures
+        included. A later ``run`` over the same input then reports the results instantly.
+
+        :return: A list of the ``HookResult`` objects
+        """
+        finder = self.get_finder()
+        found = list(finder)
+        if not found or not self.has_work():
+            return []
+
+        args, size = self.build_args()
+        hook_history = self.get_history(finder.hook_type)
+        run_stats = self.get_stats()
+        hooks = [slot.hook for slot in self.get_plan(found, size, hook_history)]
+
+        results = [r for r in self.run_hooks(hooks, args, size, hook_history, store_failures=True) if not r.skipped]
+
+        if hook_history is not None:
+            hook_history.save()
+
+        if run_stats is not None:
+            for result in results:
+                run_stats.record(finder.hook_type, result, size)
+
+            self.save_stats(run_stats)
+
+        return results
 
 
 class PreCommitHookRunner(HookRunner):
     """
-    Runs the 'pre-commit' hooks.
+    Runs the 'pre-commit' hooks. Once the hooks for the repo have ran, the hooks are also ran over the changes in each
+    submodule (see ``SubmoduleHookRunner``).
+
+    :var recurse_submodules: Flag if changes in submodules should be checked. This can also be disabled by setting the
+        ``GIT_HOOKS_SUBMODULES`` environment variable to 0.
+    :var snapshot_class: The class used to build a snapshot of the staged content for the hooks to run against, so
+        hooks check what is being committed rather than the working tree. The ``GIT_HOOKS_SNAPSHOT`` environment
+        variable controls when it is used, "auto" (the default) only builds a snapshot when a staged file also has
+        unstaged changes, 1 always builds one and 0 never does. If this is None hooks always run against the working
+        tree.
+    :var snapshot: The snapshot the hooks currently running are using
+    :var defer_hooks: Flag if hooks can be deferred until after the commit is made (see ``select_hooks``). This is
+        only set by the installed pre-commit hook script, anything else running the hooks (such as ``api.run``) runs
+        every hook. This can also be disabled by setting the ``GIT_HOOKS_DEFERRED`` environment variable to 0.
+    :var fix_files: Flag if hooks that fix files are ran before the other hooks and the files they change re-staged
+        (see ``run_fixers``). This can also be disabled by setting the ``GIT_HOOKS_FIXERS`` environment variable to 0,
+        fixers are then ran like any other hook.
     """
     finder_class = finders.PreCommitHookFinder
+    history_class = history.DurationHistory
+    cache_class = cache.ResultCache
+    stats_class = stats.RunStats
+    snapshot_class = repo.StagedSnapshot
+    recurse_submodules = True
+    defer_hooks = False
+    fix_files = True
+    snapshot = None
+
+    def __init__(self, *args, **kwargs):
+        """
+        :param defer_hooks: Flag if hooks can be deferred until after the commit is made
+        """
+        self._files = {}
+        if kwargs.pop('defer_hooks', False):
+            self.defer_hooks = True
+
+        super(PreCommitHookRunner, self).__init__(*args, **kwargs)
+
+    def _get_files(self, key, func):
+        """
+        Gets a list of files from the repo, the result is stored so that the diff is only computed once per run.
+
+        :param key: The name to store the result under
+        :param func: The repo function to get the files from
+        :return: The list of files
+        """
+        if key not in self._files:
+            self._files[key] = func()
+
+        return self._files[key]
+
+    @property
+    def added_files(self):
+        return self._get_files('added', repo.added_files)
+
+    @property
+    def modified_files(self):
+        return self._get_files('modified', repo.modified_files)
+
+    @property
+    def deleted_files(self):
+        return self._get_files('deleted', repo.deleted_files)
+
+    @property
+    def changed_lines(self):
+        return self._get_files('changed_lines', repo.changed_lines)
+
+    @property
+    def file_changes(self):
+        return self._get_files('changes', repo.staged_changes)
+
+    @property
+    def unstaged_files(self):
+        return self._get_files('unstaged', lambda: repo.unstaged_files(self.added_files + self.modified_files))
+
+    @property
+    def renamed_files(self):
+        return [c.path for c in self.file_changes if c.status == 'R']
+
+    @property
+    def head_tree(self):
+        return self._get_files('head_tree', repo.head_tree)
+
+    @property
+    def config_digest(self):
+        def digest():
+            path = meta.config_path(repo.repo_root())
+            return cache.hash_file(path) if path else ''
+
+        return self._get_files('config_digest', digest)
+
+    @property
+    def file_info(self):
+        return self._get_files('file_info', lambda: repo.classify_files(self.added_files + self.modified_files))
+
+    def get_excluded_files(self, path):
+        """
+        Gets the files a hook has opted out of being given by kind (binary or LFS files) or size
+
+        :param path: The path of the hook
+        :return: The set of excluded files
+        """
+        try:
+            kinds, max_size = meta.hook_exclusions(path, self.get_config_section('exclude'), self.get_config_section('max-size'))
+        except ValueError as e:
+            logger.warning(u'Ignoring the exclusions for "{0}": {1}'.format(meta.hook_name(path), e))
+            return set()
+
+        if not kinds and max_size is None:
+            return set()
+
+        excluded = set()
+        for p, info in self.file_info.items():
+            too_big = max_size is not None and info.size is not None and info.size > max_size
+            if too_big or ('binary' in kinds and info.binary) or ('lfs' in kinds and info.lfs):
+                excluded.add(p)
+
+        return excluded
+
+    def get_hook_args(self, path, args, exclude=None):
+        """
+        Hooks that exclude binary, LFS or large files are given the arguments without those files. If every file is
+        excluded the hook is skipped. When a snapshot is being used the files are given as their paths in the snapshot.
+        """
+        excluded = self.get_excluded_files(path) | set(exclude or ())
+        if excluded:
+            args, size = self.build_args(excluded)
+            if not size:
+                return None
+
+        return [self.hook_path(a) for a in args]
+
+    def hook_path(self, path):
+        return self.snapshot.path_for(path) if self.snapshot is not None else path
+
+    def get_file_keys(self):
+        """
+        Files are keyed by their path and the object id of their staged content. Files with unstaged changes are left
+        out unless the hooks are ran against a snapshot, as the hooks would check content that isn't being committed.
+        """
+        try:
+            unstaged = set(self.unstaged_files) if self.snapshot is None else set()
+        except (subprocess.CalledProcessError, OSError):
+            return {}
+
+        return dict(
+            (c.path, cache.result_key(os.path.relpath(c.path, repo.repo_root()), c.new_oid))
+            for c in self.file_changes if c.new_oid and c.status != 'D' and c.path not in unstaged
+        )
+
+    def use_snapshot(self):
+        """
+        Checks if the hooks should be ran against a snapshot of the staged content (see ``snapshot_class``)
+
+        :return: True if a snapshot should be built
+        """
+        mode = os.environ.get('GIT_HOOKS_SNAPSHOT', 'auto')
+        if self.snapshot_class is None or mode == '0':
+            return False
+
+        if mode == '1':
+            return True
+
+        try:
+            return bool(self.unstaged_files)
+        except (subprocess.CalledProcessError, OSError):
+            return False
+
+    def open_snapshot(self):
+        """
+        Builds the snapshot for the hooks to run against if one should be used. If it can't be built the hooks are ran
+        against the working tree.
+
+        :return: The snapshot or None
+        """
+        if not self.use_snapshot():
+            return None
+
+        snapshot = self.snapshot_class(self.added_files + self.modified_files)
+        try:
+            self.snapshot = snapshot.__enter__()
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.warning(u'Could not build a snapshot of the staged files, running against the working tree: {0}'.format(e))
+
+        return self.snapshot
+
+    def close_snapshot(self):
+        if self.snapshot is not None:
+            self.snapshot.__exit__(None, None, None)
+            self.snapshot = None
+
+    def run_hooks(self, hooks, args, size, hook_history=None, store_failures=False):
+        """
+        A single snapshot is built for the hooks and removed once they have all finished. Any fixers are ran first (see
+        ``run_fixers``). Fixers are left out when precomputing results as their results are never cached and they
+        shouldn't rewrite files in the background.
+        """
+        fixers = self.get_fixers(hooks)
+        hooks = [h for h in hooks if h not in fixers]
+        if store_failures:
+            fixers = []
+
+        opened = self.snapshot is None and self.open_snapshot() is not None
+
+        try:
+            if fixers:
+                for result in self.run_fixers(fixers, args, size, hook_history):
+                    yield result
+
+            for result in super(PreCommitHookRunner, self).run_hooks(hooks, args, size, hook_history, store_failures):
+                yield result
+        finally:
+            if opened:
+                self.close_snapshot()
+
+    def get_fixers(self, hooks):
+        """
+        Gets the hooks that fix the files they are given, these declare ``# githooks-fixer: yes`` or are listed in the
+        "fixers" config section
+
+        :param hooks: The paths of the hooks
+        :return: The paths of the fixers in name order
+        """
+        if not self.fix_files or os.environ.get('GIT_HOOKS_FIXERS', '1') == '0':
+            return []
+
+        config = self.get_config_section('fixers')
+        return sorted((h for h in hooks if meta.hook_is_fixer(h, config)), key=meta.hook_name)
+
+    def hash_files(self, paths):
+        """
+        Gets the hash of the content of each file as the hooks see it
+
+        :param paths: The paths of the files in the repo
+        :return: A dictionary mapping each path to its hash, or None if the file can't be read
+        """
+        hashes = {}
+        for path in paths:
+            try:
+                hashes[path] = cache.hash_file(self.hook_path(path))
+            except (IOError, OSError):
+                hashes[path] = None
+
+        return hashes
+
+    def run_fixers(self, fixers, args, size, hook_history=None):
+        """
+        Runs the hooks that fix files one at a time, so two fixers never rewrite a file at once, before any other hook.
+        The staged files each fixer changes are found by comparing their hashes before and after it runs. A fixer that
+        changes files and fails is ran again over the fixed files so it only fails for problems it couldn't fix. Once
+        every fixer has finished the changed files are re-staged together (see ``stage_fixed_files``) so the other
+        hooks, and the commit, see the fixed content. Fixer results are never cached as a passing run may still have
+        changed files.
+
+        :param fixers: The paths of the fixers in the order to run them
+        :param args: The arguments to give the hooks
+        :param size: The number of files the hooks are given
+        :param hook_history: The duration history to record the fixer durations in
+        :return: A list of ``HookResult`` objects
+        """
+        results = []
+        changed = {}
+        excluded = dict((path, self.get_excluded_files(path)) for path in fixers)
+
+        manifest = self.get_manifest()
+        self.manifest_path = self.write_manifest(manifest) if manifest is not None else None
+
+        try:
+            for path in fixers:
+                hook_args = self.get_hook_args(path, args)
+                if hook_args is None:
+                    logger.info(u'Skipping "{0}", all of its files are excluded'.format(meta.hook_name(path)))
+                    results.append(HookResult(path, 0, 0.0, None, False, True))
+                    continue
+
+                before = self.hash_files(sorted(set(self.added_files + self.modified_files) - excluded[path]))
+                result = self.run_hook(path, hook_args, self.capture)
+                after = self.hash_files(before)
+
+                if after != before and result.status:
+                    logger.info(u'Running "{0}" again over the files it fixed'.format(meta.hook_name(path)))
+                    rerun = self.run_hook(path, hook_args, self.capture)
+                    result = rerun._replace(duration=result.duration + rerun.duration)
+                    after = self.hash_files(before)
+
+                if hook_history is not None:
+                    hook_history.record(meta.hook_name(path), size, result.duration)
+
+                changed[path] = [p for p in before if after[p] != before[p]]
+                results.append(result)
+        finally:
+            if self.manifest_path:
+                os.remove(self.manifest_path)
+                self.manifest_path = None
+
+        fixed = sorted(set(p for paths in changed.values() for p in paths))
+        if fixed:
+            try:
+                self.stage_fixed_files(fixed)
+            except (subprocess.CalledProcessError, OSError) as e:
+                logger.error(u'Could not re-stage the fixed files: {0}'.format(e))
+                results = [r._replace(status=r.status or 1) if changed.get(r.hook) else r for r in results]
+
+        return results
+
+    def stage_fixed_files(self, paths):
+        """
+        Re-stages the files changed by fixers with a single ``update-index`` call. When a snapshot is being used the
+        fixed content is staged from the snapshot and written back over working tree files without unstaged changes,
+        files with unstaged changes keep them and only their staged content is fixed. Without a snapshot files with
+        unstaged changes are not re-staged as their unstaged changes would be staged with the fix. The details of the
+        staged changes are read again for the hooks that run afterwards.
+
+        :param paths: The paths of the changed files
+        """
+        unstaged = set(self.unstaged_files)
+        if self.snapshot is None:
+            for path in paths:
+                if path in unstaged:
+                    logger.warning(u'"{0}" was fixed but not re-staged as it has unstaged changes'.format(path))
+
+            paths = [p for p in paths if p not in unstaged]
+            repo.stage_files(paths)
+        else:
+            repo.stage_files(paths, self.snapshot.path)
+            repo.checkout_files([p for p in paths if p not in unstaged])
+
+            for path in paths:
+                if path in unstaged:
+                    logger.warning(u'The fix to "{0}" was staged, its unstaged changes were left as they are'.format(path))
+
+        if paths:
+            logger.info(u'Re-staged {0} fixed file{1}'.format(len(paths), '' if len(paths) == 1 else 's'))
+
+        for key in ('changes', 'changed_lines', 'file_info'):
+            self._files.pop(key, None)
+
+    def get_subprocess_kwargs(self):
+        if self.snapshot is not None:
+            return {'cwd': self.snapshot.path}
+
+        return super(PreCommitHookRunner, self).get_subprocess_kwargs()
+
+    def has_work(self):
+        return repo.has_staged_changes()
 
     def get_process_args(self, *args):
-        args += tuple(repo.added_files() + repo.modified_files())
+        args += tuple(self.added_files + self.modified_files)
         return super(PreCommitHookRunner, self).get_process_args(*args)
 
     def get_process_kwargs(self, **kwargs):
-        kwargs.setdefault('--added-files', repo.added_files())
-        kwargs.setdefault('--modified-files', repo.modified_files())
-        kwargs.setdefault('--deleted-files', repo.deleted_files())
+        kwargs.setdefault('--added-files', self.added_files)
+        kwargs.setdefault('--modified-files', self.modified_files)
+        kwargs.setdefault('--deleted-files', self.deleted_files)
+        kwargs.setdefault('--renamed-files', self.renamed_files)
         return super(PreCommitHookRunner, self).get_process_kwargs(**kwargs)
+
+    def get_input_key(self, args):
+        """
+        The key is built from the arguments, the content of each file being checked, the tree HEAD points to and the
+        repositories config, so a result is only reused when the hooks would see exactly the same files, including the
+        files that aren't being changed but a hook may read. Paths are relative to the repo root and files are
+        identified by the object id of their staged content so the same commit gives the same key in every clone and
+        results can be shared through a remote cache. Files the hooks see with unstaged changes are hashed as they are
+        in the working tree.
+        """
+        root = repo.repo_root()
+        try:
+            unstaged = set(self.unstaged_files) if self.snapshot is None else set()
+        except (subprocess.CalledProcessError, OSError):
+            unstaged = None
+
+        oids = dict((c.path, c.new_oid) for c in self.file_changes if c.new_oid)
+
+        ids = []
+        for path in self.added_files + self.modified_files:
+            if unstaged is not None and path not in unstaged and path in oids:
+                ids.append(oids[path])
+                continue
+
+            try:
+                ids.append(cache.hash_file(self.hook_path(path)))
+            except (IOError, OSError):
+                ids.append('')
+
+        relative = [os.path.relpath(a, root) if os.path.isabs(a) else a for a in args]
+        changes = [(c.status, os.path.relpath(c.path, root), c.new_oid) for c in self.file_changes]
+        changes.extend(('D', os.path.relpath(p, root), None) for p in self.deleted_files)
+        changes = json.dumps(sorted(set(changes)))
+        changed_lines = json.dumps(sorted((os.path.relpath(p, root), lines) for p, lines in self.changed_lines.items()))
+        return cache.result_key(*(relative + ids + [changes, changed_lines, self.head_tree or '', self.config_digest]))
+
+    def get_manifest(self):
+        """
+        The manifest lists the staged files and, for each added or modified file, the ranges of lines that were added
+        or changed so hooks can limit their checks to the changed lines. Each change is also given with its status, the
+        path it was renamed from, the rename similarity and the object ids of the old and new content. The file info is
+        only given when the files have already been classified for a hook that excludes files, so runs without any
+        exclusions don't pay for the extra git calls. When a snapshot is being used the paths are in the snapshot.
+        """
+        path_for = self.snapshot.path_for if self.snapshot is not None else (lambda p: p)
+
+        return {
+            'version': MANIFEST_VERSION,
+            'hook_type': 'pre-commit',
+            'root': path_for(repo.repo_root()),
+            'added': [path_for(p) for p in self.added_files],
+            'modified': [path_for(p) for p in self.modified_files],
+            'deleted': [path_for(p) for p in self.deleted_files],
+            'changed_lines': dict((path_for(p), lines) for p, lines in self.changed_lines.items()),
+            'file_info': dict((path_for(p), info._asdict()) for p, info in self._files.get('file_info', {}).items()),
+            'changes': [
+                dict(c._asdict(), path=path_for(c.path), old_path=path_for(c.old_path) if c.old_path else None)
+                for c in self.file_changes
+            ],
+        }
+
+    def get_submodule_changes(self):
+        """
+        Gets the changes in each submodule with a staged pointer change or staged changes of its own
+
+        :return: A list of ``repo.SubmoduleChanges`` objects
+        """
+        return repo.submodule_changes(self.get_jobs())
+
+    def iter_submodule_results(self):
+        """
+        Runs the hooks over the changes in each submodule. The submodules are processed in parallel, the results of
+        each submodule are given once all of its hooks have finished.
+
+        :return: A generator of ``HookResult`` objects
+        """
+        changes = self.get_submodule_changes()
+        if not changes:
+            return
+
+        jobs = self.get_jobs()
+        hook_history = self.get_history('pre-commit')
+
+        def run(change):
+            logger.info(u'Running "pre-commit" hooks in submodule "{0}"\n'.format(change.path))
+
+            runner = SubmoduleHookRunner(change, hook_history, jobs=jobs)
+            runner.capture = self.capture or (jobs > 1 and len(changes) > 1)
+            return list(runner.iter_results())
+
+        for results in utils.imap_unordered(run, changes, jobs):
+            for result in results:
+                yield result
+
+    def run_submodules(self):
+        """
+        Runs the hooks over the changes in each submodule. The submodules are processed in parallel.
+
+        :return: A sum of the return codes generated by the hooks
+        """
+        return sum(result.status for result in self.iter_submodule_results())
+
+    def get_commit_budget(self):
+        """
+        Gets the number of seconds the hooks ran before a commit should take. This is the ``GIT_HOOKS_COMMIT_BUDGET``
+        environment variable or the "pre-commit" entry in the "budget" config section.
+
+        :return: The budget in seconds or None if there is no budget
+        """
+        value = os.environ.get('GIT_HOOKS_COMMIT_BUDGET') or self.get_config_section('budget').get('pre-commit')
+        if not value:
+            return None
+
+        try:
+            return float(value)
+        except ValueError:
+            logger.warning(u'Invalid commit budget "{0}", no hooks are deferred to keep within it'.format(value))
+            return None
+
+    def select_hooks(self, hooks, size, hook_history=None):
+        """
+        Hooks that declare ``# githooks-deferred: always`` (or are listed in the "deferred" config section) are left
+        for the post-commit hook to run in the background once the commit is made. If the hooks are predicted to take
+        longer than the commit budget the slowest hooks are deferred as well until the rest fit, unless they declare
+        ``# githooks-deferred: never``. Hooks without any recorded durations are never deferred by the budget and fixers
+        are never deferred as their fixes have to be made before the commit. The results of the hooks deferred from the
+        previous commit are reported first if they haven't been already.
+        """
+        if not self.defer_hooks or os.environ.get('GIT_HOOKS_DEFERRED', '1') == '0':
+            return hooks
+
+        deferred.report_pending()
+
+        config = self.get_config_section('deferred')
+        fixers = self.get_fixers(hooks)
+        modes = dict((h, 'never' if h in fixers else meta.hook_deferred(h, config)) for h in hooks)
+        deferred_hooks = [h for h in hooks if modes[h] == 'always']
+        remaining = [h for h in hooks if modes[h] != 'always']
+
+        budget = self.get_commit_budget()
+        if budget is not None:
+            predictions = self.get_predictions(remaining, size, hook_history)
+            candidates = sorted(
+                (h for h in remaining if modes[h] != 'never' and predictions.get(h) is not None), key=lambda h: -predictions[h],
+            )
+
+            for hook in candidates:
+                slots = schedule.plan(remaining, predictions, self.get_jobs())
+                if max(s.end for s in slots) <= budget:
+                    break
+
+                logger.info(u'Deferring "{0}", the hooks are predicted to take {1:.2f}s and the commit budget is {2:.2f}s'.format(
+                    meta.hook_name(hook), max(s.end for s in slots), budget,
+                ))
+                remaining.remove(hook)
+                deferred_hooks.append(hook)
+
+        deferred.queue(deferred_hooks)
+        if deferred_hooks:
+            logger.info(u'Running {0} after the commit'.format(', '.join(u'"{0}"'.format(meta.hook_name(h)) for h in deferred_hooks)))
+
+        return [h for h in hooks if h in remaining]
+
+    def iter_results(self):
+        """
+        Once the hooks for the repo have finished the results of the hooks ran over each submodule are given.
+
+        When hooks can be deferred any queue left by an earlier attempt is cleared first, the results of the hooks
+        deferred from the previous commit are reported once there is something to commit (see ``select_hooks``) and
+        if any hook fails the queue is cleared again so a rejected commit doesn't leave deferred hooks behind.
+        """
+        if self.defer_hooks:
+            deferred.queue([])
+
+        passed = False
+        try:
+            failed = False
+            for result in super(PreCommitHookRunner, self).iter_results():
+                failed = failed or bool(result.status)
+                yield result
+
+            if self.recurse_submodules and os.environ.get('GIT_HOOKS_SUBMODULES', '1') != '0':
+                for result in self.iter_submodule_results():
+                    failed = failed or bool(result.status)
+                    yield result
+
+            passed = not failed
+        finally:
+            if self.defer_hooks and not passed:
+                deferred.queue([])
+
+
+class SubmoduleHookRunner(PreCommitHookRunner):
+    """
+    Runs the 'pre-commit' hooks over the changes in a single submodule. If the submodule has its own hooks installed
+    they are used, otherwise the parent repos hooks are ran scoped to the submodule. Hooks are ran from the submodule
+    root with the git environment of the parent repo removed.
+    """
+    snapshot_class = None
+    defer_hooks = False
+    fix_files = False
+
+    def __init__(self, changes, hook_history=None, *args, **kwargs):
+        """
+        :param changes: The ``repo.SubmoduleChanges`` to run the hooks over
+        :param hook_history: The duration history shared with the parent runner
+        """
+        super(SubmoduleHookRunner, self).__init__(*args, **kwargs)
+        self.changes = changes
+        self.hook_history = hook_history
+        self._files = {
+            'added': changes.added,
+            'modified': changes.modified,
+            'deleted': changes.deleted,
+            # line ranges and renames are not worked out for submodules so hooks check their files in full
+            'changed_lines': {},
+            'changes': [],
+        }
+
+    @property
+    def file_info(self):
+        return self._get_files('file_info', lambda: repo.classify_files(
+            self.added_files + self.modified_files, self.changes.root, repo.isolated_env(),
+        ))
+
+    @property
+    def head_tree(self):
+        return self._get_files('head_tree', lambda: repo.head_tree(self.changes.root, repo.isolated_env()))
+
+    def get_finder(self):
+        finder = self.get_finder_class()(root=self.changes.root)
+        if any(True for _ in finder):
+            return finder
+
+        return super(SubmoduleHookRunner, self).get_finder()
+
+    def get_history(self, hook_type):
+        return self.hook_history
+
+    def has_work(self):
+        return True
+
+    def get_subprocess_kwargs(self):
+        return {'cwd': self.changes.root, 'env': repo.isolated_env()}
+
+    def get_submodule_changes(self):
+        return repo.submodule_changes(self.get_jobs(), self.changes.root)
+
+
+class FileListHookRunner(HookRunner):
+    """
+    Runs the hooks of a given type over an arbitrary stream of files rather than the files staged for a commit. The
+    files are split into bounded chunks and every hook is given every chunk, so very large repos never build huge
+    argument lists. The (hook, chunk) pairs are ran through the pool of workers, within each chunk the hooks predicted
+    to take longest are started first.
+
+    :var chunk_size: The maximum number of files given to a hook at once
+    :var max_chunk_chars: The maximum total length of the file paths given to a hook at once
+    """
+    history_class = history.DurationHistory
+    stats_class = stats.RunStats
+    chunk_size = 1000
+    max_chunk_chars = 65536
+
+    def __init__(self, hook_type, files, chunk_size=None, *args, **kwargs):
+        """
+        :param hook_type: The type of hooks to run
+        :param files: An iterable of the paths to check
+        :param chunk_size: The maximum number of files given to a hook at once
+        """
+        super(FileListHookRunner, self).__init__(*args, **kwargs)
+        self.hook_type = hook_type
+        self.files = files
+        if chunk_size:
+            self.chunk_size = chunk_size
+
+    def get_finder(self):
+        return finders.HookFinder(self.hook_type)
+
+    def iter_results(self):
+        """
+        Runs all the hooks over all the files, each hook gives a result for each chunk as soon as it finishes
+
+        :return: A generator of ``HookResult`` objects
+        """
+        hooks = list(self.get_finder())
+        if not hooks:
+            return
+
+        logger.info(u'Running "{0}" hooks\n'.format(self.hook_type))
+
+        hook_history = self.get_history(self.hook_type)
+        run_stats = self.get_stats()
+        jobs = self.get_jobs()
+        capture = self.capture or jobs > 1
+        totals = {'files': 0, 'chunks': 0}
+
+        def tasks():
+            for chunk in utils.chunks(self.files, self.chunk_size, self.max_chunk_chars):
+                totals['files'] += len(chunk)
+                totals['chunks'] += 1
+
+                predictions = self.get_predictions(hooks, len(chunk), hook_history)
+                for hook in schedule.longest_first(hooks, predictions):
+                    yield hook, chunk
+
+        def run_task(task):
+            hook, chunk = task
+            return self.run_hook(hook, list(self.get_process_args(*chunk)), capture), len(chunk)
+
+        try:
+            for result, size in utils.imap_unordered(run_task, tasks(), jobs):
+                if hook_history is not None:
+                    hook_history.record(meta.hook_name(result.hook), size, result.duration)
+
+                if run_stats is not None:
+                    run_stats.record(self.hook_type, result, size)
+
+                yield result
+        finally:
+            if hook_history is not None:
+                hook_history.save()
+
+            self.save_stats(run_stats)
+            logger.info(u'Checked {0} file(s) in {1} chunk(s)'.format(totals['files'], totals['chunks']))
+
+    def run(self):
+        """
+        Runs all the hooks over all the files
+
+        :return: A sum of the return codes generated by the hooks
+        """
+        return sum(result.status for result in self.iter_results())
+
+
+class ReplayHookRunner(HookRunner):
+    """
+    Runs the 'pre-commit' hooks against every commit in a revision range as if each commit was being made. Each commit
+    is checked out into a temporary worktree and the hooks are given the files the commit added or modified.
+
+    Passing results are cached keyed by the hook and the path and blob id of each file, so content that has already
+    passed a hook (in an earlier commit or an earlier replay) is never checked by that hook again. A commit where every
+    file has already passed every hook is not even checked out.
+
+    :var cache_class: The class used to store the hook results
+    """
+    finder_class = finders.PreCommitHookFinder
+    history_class = history.DurationHistory
+    cache_class = cache.ResultCache
+    stats_class = stats.RunStats
+
+    def __init__(self, rev_range, *args, **kwargs):
+        """
+        :param rev_range: The range of commits to check (eg "master..feature")
+        """
+        super(ReplayHookRunner, self).__init__(*args, **kwargs)
+        self.rev_range = rev_range
+        self.worktree = None
+
+    def get_subprocess_kwargs(self):
+        return {'cwd': self.worktree.path, 'env': repo.isolated_env()}
+
+    def _worktree_path(self, path):
+        return os.path.join(self.worktree.path, os.path.relpath(path, self.worktree.root))
+
+    def get_commit_args(self, commit, pending):
+        """
+        Gets the arguments to give a hook when checking a commit
+
+        :param commit: The ``repo.CommitChanges`` being checked
+        :param pending: The set of paths the hook still needs to check
+        :return: The list of arguments
+        """
+        added = [self._worktree_path(p) for p, _ in commit.added if p in pending]
+        modified = [self._worktree_path(p) for p, _ in commit.modified if p in pending]
+        deleted = [self._worktree_path(p) for p in commit.deleted]
+
+        args = added + modified
+        for k, v in [('--added-files', added), ('--deleted-files', deleted), ('--modified-files', modified)]:
+            if v:
+                args.append(k)
+                args.extend(v)
+
+        return args
+
+    def run_commit(self, commit, hooks, result_cache, hook_history, run_stats=None):
+        """
+        Runs the hooks against a single commit. Only the files each hook hasn't already passed are checked.
+
+        :param commit: The ``repo.CommitChanges`` to check
+        :param hooks: The paths of the hooks to run
+        :param result_cache: The cache of hook results
+        :param hook_history: The duration history used to order the hooks
+        :param run_stats: The stats to record each hook run in
+        :return: A tuple of the sum of the hook return codes and the number of hooks whose results were reused
+        """
+        files = commit.added + commit.modified
+        keys = dict((cache.result_key(os.path.relpath(p, self.worktree.root), blob), p) for p, blob in files)
+
+        if result_cache:
+            result_cache.prefetch([(result_cache.hook_hash(hook), key) for hook in hooks for key in keys])
+
+        pending = {}
+        for hook in hooks:
+            cached = result_cache.get_many(result_cache.hook_hash(hook), keys) if result_cache else {}
+            paths = set(p for key, p in keys.items() if not cache.is_pass(cached.get(key)))
+            if paths:
+                pending[hook] = paths
+
+        reused = len(hooks) - len(pending)
+        if not pending:
+            logger.info(u'{0}: all results reused'.format(commit.sha[:10]))
+            return 0, reused
+
+        self.worktree.checkout(commit.sha)
+
+        jobs = self.get_jobs()
+        capture = self.capture or jobs > 1
+        predictions = dict(
+            (hook, hook_history.predict(meta.hook_name(hook), len(paths)) if hook_history else None) for hook, paths in pending.items()
+        )
+
+        def run(hook):
+            return self.run_hook(hook, self.get_commit_args(commit, pending[hook]), capture)
+
+        res = 0
+        for result in utils.imap_unordered(run, schedule.longest_first(list(pending), predictions), jobs):
+            res += result.status
+
+            if hook_history is not None:
+                hook_history.record(meta.hook_name(result.hook), len(pending[result.hook]), result.duration)
+
+            if run_stats is not None:
+                run_stats.record('pre-commit', result, len(pending[result.hook]))
+
+            if result.status == 0 and result_cache:
+                result_cache.set_many(result_cache.hook_hash(result.hook), dict(
+                    (key, {'status': 0}) for key, p in keys.items() if p in pending[result.hook]
+                ))
+
+        logger.info(u'{0}: {1}'.format(commit.sha[:10], 'failed' if res else 'passed'))
+        return res, reused
+
+    def get_commits(self):
+        """
+        Gets the changes made by each commit to check
+
+        :return: An iterable of ``repo.CommitChanges`` objects
+        """
+        return repo.iter_commit_changes(self.rev_range)
+
+    def run(self):
+        """
+        Runs the hooks against every commit in the range
+
+        :return: The number of commits that failed
+        """
+        hooks = list(self.get_finder())
+        if not hooks:
+            return 0
+
+        logger.info(u'Replaying "pre-commit" hooks over {0}\n'.format(self.rev_range))
+
+        result_cache = self.get_cache()
+        hook_history = self.get_history('pre-commit')
+        run_stats = self.get_stats()
+        commits = failed = reused = 0
+
+        with repo.Worktree() as worktree:
+            self.worktree = worktree
+
+            for commit in self.get_commits():
+                res, commit_reused = self.run_commit(commit, hooks, result_cache, hook_history, run_stats)
+
+                commits += 1
+                failed += 1 if res else 0
+                reused += commit_reused
+
+        if hook_history is not None:
+            hook_history.save()
+
+        self.save_stats(run_stats)
+        logger.info(u'{0} commit(s) checked, {1} failed, {2} hook run(s) reused from earlier results'.format(commits, failed, reused))
+        return failed
+
+
+class DeferredHookRunner(ReplayHookRunner):
+    """
+    Runs the hooks deferred from a pre-commit run against the commit once it has been made (see ``deferred``). The
+    commit is checked like a replayed commit so files a hook has already passed are not checked again and passing
+    files are cached for later commits. Unlike a replay the hooks are given the changes made to the first parent, so
+    merge commits are checked with what the pre-commit hooks would have been given.
+    """
+    capture = True
+
+    def __init__(self, sha, hooks, *args, **kwargs):
+        """
+        :param sha: The commit to check
+        :param hooks: The paths of the deferred hooks
+        """
+        super(DeferredHookRunner, self).__init__(sha, *args, **kwargs)
+        self.sha = sha
+        self.hooks = hooks
+        self.results = []
+
+    def get_commits(self):
+        return [repo.commit_changes(self.sha)]
+
+    def get_finder(self):
+        # hooks uninstalled since the commit are dropped
+        return [h for h in super(DeferredHookRunner, self).get_finder() if str(h) in self.hooks]
+
+    def run_hook(self, path, args, capture=False):
+        result = super(DeferredHookRunner, self).run_hook(path, args, capture)
+        self.results.append(result)
+        return result
+
+    def run_deferred(self):
+        """
+        Runs the deferred hooks against the commit
+
+        :return: A list of ``HookResult`` objects, hooks that had already passed every file are given a cached result
+        """
+        self.results = []
+        self.run()
+
+        ran = set(r.hook for r in self.results)
+        return self.results + [HookResult(h, 0, 0.0, None, True) for h in self.get_finder() if h not in ran]
+
+
+class PostCommitHookRunner(HookRunner):
+    """
+    Runs the 'post-commit' hooks. The commit has already been made so the hooks are given no arguments and their
+    results can't stop it.
+    """
+    finder_class = finders.PostCommitHookFinder
+    stats_class = stats.RunStats
+
+
+runner_classes = {
+    'pre-commit': PreCommitHookRunner,
+    'post-commit': PostCommitHookRunner,
+}
+
+
+def get_runner(hook_type, **kwargs):
+    """
+    Gets a runner for the given hook type
+
+    :param hook_type: The type of hook to run (such as 'pre-commit')
+    :param kwargs: Extra arguments to pass to the runner
+    :return: The runner instance
+    """
+    return runner_classes[hook_type](**kwargs)
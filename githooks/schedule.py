@@ -0,0 +1,58 @@
+import heapq
+from collections import namedtuple
+
+
+Slot = namedtuple('Slot', ['hook', 'worker', 'start', 'end'])
+
+
+def longest_first(hooks, predictions):
+    """
+    Orders the hooks so that those predicted to take longest are started first. Hooks without a prediction are started
+    before everything else as nothing is known about how long they will take. Hooks with equal predictions keep their
+    original order.
+
+    :param hooks: The hooks to order
+    :param predictions: A dictionary mapping hooks to their predicted duration (or None)
+    :return: The ordered list of hooks
+    """
+    def key(hook):
+        duration = predictions.get(hook)
+        return duration is not None, -(duration or 0)
+
+    return sorted(hooks, key=key)
+
+
+def plan(hooks, predictions, jobs):
+    """
+    Simulates running the hooks longest first on a pool of workers. Each hook is assigned to the worker that becomes
+    free first.
+
+    :param hooks: The hooks to schedule
+    :param predictions: A dictionary mapping hooks to their predicted duration (or None)
+    :param jobs: The number of workers
+    :return: A list of slots giving the worker, start and end time of each hook in the order they are started
+    """
+    workers = [(0.0, w) for w in range(max(1, jobs))]
+    slots = []
+
+    for hook in longest_first(hooks, predictions):
+        start, worker = heapq.heappop(workers)
+        end = start + (predictions.get(hook) or 0.0)
+        slots.append(Slot(hook, worker, start, end))
+        heapq.heappush(workers, (end, worker))
+
+    return slots
+
+
+def critical_path(slots):
+    """
+    Gets the slots run by the worker that finishes last, this determines the total time taken to run all the hooks.
+
+    :param slots: The planned slots
+    :return: The list of slots on the critical path
+    """
+    if not slots:
+        return []
+
+    last = max(slots, key=lambda s: (s.end, -s.worker))
+    return [s for s in slots if s.worker == last.worker]
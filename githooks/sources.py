@@ -0,0 +1,244 @@
+import hashlib
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import namedtuple
+
+from . import repo, utils
+from .compat import replace, urlsplit
+
+
+logger = logging.getLogger(__name__)
+
+
+GIT_SPEC_PREFIX = 'git+'
+
+SHA_RE = re.compile('^[0-9a-f]{40}$')
+
+
+GitSpec = namedtuple('GitSpec', ['spec', 'url', 'ref', 'path'])
+
+
+class SourceError(Exception):
+    """
+    Raised when a hook can't be read from a git source
+    """
+
+
+def is_git_spec(spec):
+    """
+    Checks if a hook is given as a git source spec rather than a url
+
+    :param spec: The hook spec
+    :return: True if the spec is a git source spec
+    """
+    return spec.startswith(GIT_SPEC_PREFIX)
+
+
+def parse_git_spec(spec):
+    """
+    Parses a git source spec of the form ``git+<url>[@<ref>]#<path>``. The url can be any url git understands or a
+    local path. If no ref is given the default branch (``HEAD``) of the source repo is used.
+
+    :param spec: The hook spec
+    :return: A ``GitSpec``
+    """
+    if not is_git_spec(spec) or '#' not in spec:
+        raise SourceError(u'"{0}" is not a valid git source, expected "git+<url>[@<ref>]#<path>"'.format(spec))
+
+    source, path = spec[len(GIT_SPEC_PREFIX):].rsplit('#', 1)
+    path = path.strip('/')
+
+    # the ref is after the last "@" that isn't part of the host (eg "ssh://git@host/repo" or "git@host:repo"), refs
+    # can contain "/" so only the scheme and host are skipped
+    host_end = 0
+    if '://' in source:
+        host_end = source.find('/', source.index('://') + 3)
+        host_end = len(source) if host_end == -1 else host_end
+    elif re.match(r'^[^/]+@[^/]+:', source):
+        host_end = source.index(':') + 1
+
+    url, ref = source, 'HEAD'
+    at = source.rfind('@', host_end)
+    if at != -1:
+        url, ref = source[:at], source[at + 1:]
+
+    if not url or not ref or not path:
+        raise SourceError(u'"{0}" is not a valid git source, expected "git+<url>[@<ref>]#<path>"'.format(spec))
+
+    if not urlsplit(url).scheme and not re.match(r'^[^/]+@[^/]+:', url):
+        url = os.path.abspath(os.path.expanduser(url))
+
+    return GitSpec(spec, url, ref, path)
+
+
+def _git(args, cwd=None, input=None):
+    process = subprocess.Popen(
+        ['git'] + list(args), cwd=cwd, env=repo.isolated_env(),
+        stdin=subprocess.PIPE if input is not None else None, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    out, err = process.communicate(input)
+
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, ['git'] + list(args), err)
+
+    return out
+
+
+class MirrorCache(object):
+    """
+    Bare mirrors of the repos hooks are installed from. The mirrors live in the users cache directory so they are
+    shared by every project on the machine. A mirror is only fetched when the ref being installed has moved since it
+    was last fetched.
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: The directory to store the mirrors in, defaults to "mirrors" in the users git-hooks cache
+        """
+        self.path = path or utils.user_cache_dir('mirrors')
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def mirror_path(self, url):
+        """
+        Gets the directory of the mirror for a url
+
+        :param url: The url of the source repo
+        :return: The path of the bare mirror
+        """
+        return os.path.join(self.path, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.git')
+
+    def _url_lock(self, url):
+        with self._lock:
+            return self._locks.setdefault(url, threading.Lock())
+
+    def _has_commit(self, mirror, sha):
+        try:
+            _git(['cat-file', '-e', sha + '^{commit}'], cwd=mirror)
+            return True
+        except subprocess.CalledProcessError:
+            return False
+
+    def _remote_sha(self, url, ref):
+        """
+        Asks the source repo which commit a ref points to without fetching anything
+
+        :return: The commit id or None if the ref is not a branch, tag or HEAD (for example a commit id)
+        """
+        if SHA_RE.match(ref):
+            return None
+
+        refs = {}
+        for line in _git(['ls-remote', url, ref, ref + '^{}']).decode('utf-8').splitlines():
+            sha, name = line.split('\t', 1)
+            refs[name] = sha
+
+        # ls-remote matches the pattern against the end of each ref so the exact name is tried first
+        for name in (ref, 'refs/heads/' + ref, 'refs/tags/' + ref):
+            if name + '^{}' in refs:
+                return refs[name + '^{}']
+            if name in refs:
+                return refs[name]
+
+        return None
+
+    def _clone(self, url, mirror):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        tmp_dir = tempfile.mkdtemp(dir=self.path, prefix='.clone-')
+        try:
+            _git(['clone', '--mirror', '--quiet', url, os.path.join(tmp_dir, 'mirror.git')])
+            if not os.path.isdir(mirror):
+                replace(os.path.join(tmp_dir, 'mirror.git'), mirror)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def resolve(self, url, ref):
+        """
+        Makes sure the mirror for a url has the commit a ref points to, cloning or fetching only when needed
+
+        :param url: The url of the source repo
+        :param ref: The branch, tag or commit to use
+        :return: A tuple of the mirror directory and the commit id
+        """
+        mirror = self.mirror_path(url)
+
+        with self._url_lock(url):
+            try:
+                sha = self._remote_sha(url, ref)
+            except subprocess.CalledProcessError as e:
+                if not os.path.isdir(mirror):
+                    raise SourceError(u'Could not read "{0}": {1}'.format(url, (e.output or b'').decode('utf-8', 'replace').strip()))
+
+                logger.warning(u'Could not reach "{0}", using the cached mirror'.format(url))
+                sha = None
+            else:
+                if not os.path.isdir(mirror):
+                    self._clone(url, mirror)
+                elif not self._has_commit(mirror, sha or ref):
+                    logger.info(u'Fetching {0}'.format(url))
+                    _git(['fetch', '--quiet', '--prune', 'origin'], cwd=mirror)
+
+            try:
+                return mirror, sha or _git(['rev-parse', '--verify', '--quiet', ref + '^{commit}'], cwd=mirror).decode('utf-8').strip()
+            except subprocess.CalledProcessError:
+                raise SourceError(u'"{0}" does not exist in "{1}"'.format(ref, url))
+
+    def read_files(self, mirror, sha, paths):
+        """
+        Reads files from a commit in a mirror. All the files are read by a single ``cat-file`` process.
+
+        :param mirror: The mirror directory
+        :param sha: The commit to read the files from
+        :param paths: The paths of the files in the repo
+        :return: A dictionary mapping each path to its content
+        """
+        paths = list(paths)
+        request = ''.join(u'{0}:{1}\n'.format(sha, p) for p in paths).encode('utf-8')
+        output = _git(['cat-file', '--batch'], cwd=mirror, input=request)
+
+        contents = {}
+        pos = 0
+        for path in paths:
+            end = output.index(b'\n', pos)
+            header = output[pos:end].split(b' ')
+            pos = end + 1
+
+            if len(header) != 3 or header[1] != b'blob':
+                raise SourceError(u'"{0}" is not a file in {1}'.format(path, sha))
+
+            size = int(header[2])
+            contents[path] = output[pos:pos + size]
+            pos += size + 1
+
+        return contents
+
+
+def read_git_specs(specs, mirrors=None):
+    """
+    Reads the hooks for a list of git source specs. Each source repo and ref is resolved once and all the hooks from it
+    are read from a single tree read.
+
+    :param specs: A list of ``GitSpec`` objects
+    :param mirrors: The ``MirrorCache`` to use
+    :return: A dictionary mapping each spec string to the content of the hook
+    """
+    mirrors = mirrors or MirrorCache()
+    grouped = {}
+    for spec in specs:
+        grouped.setdefault((spec.url, spec.ref), []).append(spec)
+
+    contents = {}
+    for (url, ref), group in sorted(grouped.items()):
+        mirror, sha = mirrors.resolve(url, ref)
+        files = mirrors.read_files(mirror, sha, sorted(set(s.path for s in group)))
+        for spec in group:
+            contents[spec.spec] = files[spec.path]
+
+    return contents
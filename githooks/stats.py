@@ -0,0 +1,200 @@
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from . import meta, repo
+from .compat import replace
+
+
+STATS_FILE_NAME = 'githooks-stats.jsonl'
+
+
+RunRecord = namedtuple('RunRecord', ['time', 'hook_type', 'hook', 'duration', 'files', 'status', 'cached'])
+HookSummary = namedtuple('HookSummary', ['hook_type', 'hook', 'runs', 'p50', 'p95', 'max', 'total', 'failures', 'cache_hits'])
+
+
+def percentile(values, pct):
+    """
+    Gets a percentile of a list of values using the nearest rank method
+
+    :param values: The values
+    :param pct: The percentile to get (0-100)
+    :return: The value at the percentile or None if there are no values
+    """
+    if not values:
+        return None
+
+    values = sorted(values)
+    return values[max(0, int(math.ceil(pct / 100.0 * len(values))) - 1)]
+
+
+class RunStats(object):
+    """
+    A record of every hook run stored as one compact json list per line in the repos hooks directory. Once the file
+    grows past ``max_bytes`` it is rotated, keeping ``backups`` old files, so the store never grows without bound. A
+    single stats object can be shared by runners on several threads.
+
+    :var max_bytes: The size the file can grow to before it is rotated
+    :var backups: The number of rotated files to keep
+    """
+    max_bytes = 1024 * 1024
+    backups = 2
+
+    def __init__(self, path=None):
+        """
+        :param path: The file to store the records in. Defaults to a file in the repos hooks directory
+        """
+        self.path = path or os.path.join(repo.hooks_directory(), STATS_FILE_NAME)
+        self.pending = []
+        self._lock = threading.Lock()
+
+    def record(self, hook_type, result, files):
+        """
+        Records a run of a hook, the record is written when ``save`` is called
+
+        :param hook_type: The type of the hook
+        :param result: The ``runners.HookResult`` from the run
+        :param files: The number of files the hook was given
+        """
+        with self._lock:
+            self.pending.append(RunRecord(
+                round(time.time(), 3), hook_type, meta.hook_name(result.hook), round(result.duration, 4), files,
+                result.status, bool(result.cached),
+            ))
+
+    def rotate(self):
+        """
+        Moves the current file to the first backup, shifting the older backups along
+        """
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(u'{0}.{1}'.format(self.path, i)):
+                replace(u'{0}.{1}'.format(self.path, i), u'{0}.{1}'.format(self.path, i + 1))
+
+        if self.backups:
+            replace(self.path, self.path + '.1')
+        else:
+            os.remove(self.path)
+
+    def save(self):
+        """
+        Appends the pending records to the file in a single write, rotating the file first if it has grown too large
+        """
+        with self._lock:
+            records, self.pending = self.pending, []
+
+        if not records:
+            return
+
+        try:
+            if os.path.getsize(self.path) >= self.max_bytes:
+                self.rotate()
+        except OSError:
+            pass
+
+        data = ''.join(json.dumps(list(r), separators=(',', ':')) + '\n' for r in records)
+        with open(self.path, 'a') as f:
+            f.write(data)
+
+    def records(self):
+        """
+        Reads all the stored records, oldest first. Lines that can't be read are skipped.
+
+        :return: A generator of ``RunRecord`` objects
+        """
+        paths = [u'{0}.{1}'.format(self.path, i) for i in range(self.backups, 0, -1)] + [self.path]
+
+        for path in paths:
+            try:
+                with open(path) as f:
+                    for line in f:
+                        try:
+                            yield RunRecord(*json.loads(line))
+                        except (TypeError, ValueError):
+                            continue
+            except (IOError, OSError):
+                continue
+
+    def summary(self, hook_type=None):
+        """
+        Summarises the stored records for each hook. Durations only include runs where the hook was actually ran, runs
+        using a cached result are counted separately.
+
+        :param hook_type: Only summarise hooks of this type if given
+        :return: A list of ``HookSummary`` objects sorted by hook type and name
+        """
+        grouped = {}
+        for record in self.records():
+            if hook_type is None or record.hook_type == hook_type:
+                grouped.setdefault((record.hook_type, record.hook), []).append(record)
+
+        summaries = []
+        for (record_type, hook), records in sorted(grouped.items()):
+            durations = [r.duration for r in records if not r.cached]
+            summaries.append(HookSummary(
+                record_type, hook, len(records), percentile(durations, 50), percentile(durations, 95),
+                max(durations) if durations else None, sum(durations), sum(1 for r in records if r.status),
+                sum(1 for r in records if r.cached),
+            ))
+
+        return summaries
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def openmetrics(summaries):
+    """
+    Formats hook summaries in the OpenMetrics text format
+
+    :param summaries: The ``HookSummary`` objects to format
+    :return: The text
+    """
+    lines = [
+        '# TYPE githooks_hook_duration_seconds summary',
+        '# UNIT githooks_hook_duration_seconds seconds',
+        '# HELP githooks_hook_duration_seconds Time taken by each hook run',
+    ]
+    for s in summaries:
+        labels = u'hook_type="{0}",hook="{1}"'.format(_escape_label(s.hook_type), _escape_label(s.hook))
+        for quantile, value in [('0.5', s.p50), ('0.95', s.p95), ('1.0', s.max)]:
+            if value is not None:
+                lines.append(u'githooks_hook_duration_seconds{{{0},quantile="{1}"}} {2}'.format(labels, quantile, value))
+
+        lines.append(u'githooks_hook_duration_seconds_count{{{0}}} {1}'.format(labels, s.runs - s.cache_hits))
+        lines.append(u'githooks_hook_duration_seconds_sum{{{0}}} {1}'.format(labels, round(s.total, 4)))
+
+    for name, attr, description in [
+        ('githooks_hook_failures', 'failures', 'Hook runs that returned a non zero status'),
+        ('githooks_hook_cache_hits', 'cache_hits', 'Hook runs where a cached result was used'),
+    ]:
+        lines.append(u'# TYPE {0} counter'.format(name))
+        lines.append(u'# HELP {0} {1}'.format(name, description))
+        for s in summaries:
+            lines.append(u'{0}_total{{hook_type="{1}",hook="{2}"}} {3}'.format(
+                name, _escape_label(s.hook_type), _escape_label(s.hook), getattr(s, attr)
+            ))
+
+    lines.append('# EOF')
+    return u'\n'.join(lines) + u'\n'
+
+
+def write_openmetrics(summaries, path):
+    """
+    Writes the summaries to a file in the OpenMetrics text format. The file is replaced atomically so a collector never
+    reads a partial file.
+
+    :param summaries: The ``HookSummary`` objects to write
+    :param path: The file to write to
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.githooks-metrics')
+    with os.fdopen(fd, 'w') as f:
+        f.write(openmetrics(summaries))
+
+    os.chmod(tmp_path, 0o644)
+    replace(tmp_path, path)
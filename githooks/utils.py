@@ -1,9 +1,154 @@
+import importlib
 import os
+import shlex
 
 
 def get_hook_script_dir():
     return os.path.join(os.path.dirname(__file__), 'hook_scripts')
 
 
+_hook_names = []
+
+
 def get_hook_names():
-    return os.listdir(get_hook_script_dir())
+    """
+    Gets the names of the hook types git-hooks provides scripts for. The scripts directory is only read once.
+
+    :return: The sorted list of hook type names
+    """
+    if not _hook_names:
+        _hook_names.extend(sorted(os.listdir(get_hook_script_dir())))
+
+    return list(_hook_names)
+
+
+def import_string(target):
+    """
+    Imports an object from its "module:attribute" reference (eg "githooks.cmd:Install")
+
+    :param target: The reference, the attribute can be a dotted path within the module
+    :return: The object
+    """
+    module_name, _, attributes = target.partition(':')
+    obj = importlib.import_module(module_name)
+    for attribute in filter(None, attributes.split('.')):
+        obj = getattr(obj, attribute)
+
+    return obj
+
+
+def imap_unordered(func, iterable, jobs=1):
+    """
+    Applies ``func`` to each item in ``iterable`` yielding the results as they complete. Items are started in the order
+    they are given so the caller controls which work is picked up first. If more than one job is requested the items
+    are processed in a pool of threads.
+
+    :param func: The function to apply to each item
+    :param iterable: The items to process
+    :param jobs: The maximum number of items to process at once
+    :return: A generator of the results of ``func``
+    """
+    if jobs <= 1:
+        for item in iterable:
+            yield func(item)
+        return
+
+    from multiprocessing.pool import ThreadPool
+
+    pool = ThreadPool(jobs)
+    try:
+        for res in pool.imap_unordered(func, iterable, chunksize=1):
+            yield res
+    finally:
+        pool.terminate()
+
+
+def chunks(iterable, max_items, max_chars=None):
+    """
+    Splits an iterable of strings into lists. Each list has at most ``max_items`` items and, if given, the total length
+    of the items in each list is kept under ``max_chars`` (a single item longer than this is given its own list). The
+    iterable is consumed lazily so only one chunk is held at a time.
+
+    :param iterable: The strings to split
+    :param max_items: The maximum number of items in each chunk
+    :param max_chars: The maximum total length of the items in each chunk
+    :return: A generator of lists
+    """
+    chunk = []
+    chars = 0
+
+    for item in iterable:
+        if chunk and (len(chunk) >= max_items or (max_chars and chars + len(item) > max_chars)):
+            yield chunk
+            chunk = []
+            chars = 0
+
+        chunk.append(item)
+        chars += len(item)
+
+    if chunk:
+        yield chunk
+
+
+class LazyModule(object):
+    """
+    A stand in for a module that is only imported when one of its attributes is first used. This keeps heavy
+    dependencies off the start up path of hooks that never need them. Setting or deleting an attribute is passed on to
+    the module so patching through the stand in patches the module itself.
+    """
+    def __init__(self, name):
+        """
+        :param name: The dotted name of the module to import
+        """
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_module', None)
+
+    def _load(self):
+        if self._module is None:
+            object.__setattr__(self, '_module', importlib.import_module(self._name))
+
+        return self._module
+
+    def __getattr__(self, item):
+        return getattr(self._load(), item)
+
+    def __setattr__(self, item, value):
+        setattr(self._load(), item, value)
+
+    def __delattr__(self, item):
+        delattr(self._load(), item)
+
+
+def user_cache_dir(*parts):
+    """
+    Gets a directory in the users cache for data shared between all repositories on the machine. This is the
+    ``GIT_HOOKS_CACHE_DIR`` environment variable if it is set, otherwise the "git-hooks" directory in the XDG cache
+    directory.
+
+    :param parts: Sub directories to join to the cache directory
+    :return: The absolute path to the directory (it may not exist yet)
+    """
+    base = os.environ.get('GIT_HOOKS_CACHE_DIR')
+    if not base:
+        base = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'git-hooks')
+
+    return os.path.abspath(os.path.join(base, *parts))
+
+
+def python_interpreter(path):
+    """
+    Gets the interpreter a hook is ran with if it is a python script
+
+    :param path: The path of the hook
+    :return: The interpreter command from the hooks shebang as a list or None if the hook isn't a python script
+    """
+    try:
+        with open(path, 'rb') as f:
+            first = f.readline(256).decode('utf-8', 'replace').strip()
+    except (IOError, OSError, ValueError):
+        return None
+
+    if not first.startswith('#!') or 'python' not in first:
+        return None
+
+    return shlex.split(first[2:])
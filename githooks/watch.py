@@ -0,0 +1,243 @@
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import time
+
+from . import meta, repo
+
+
+logger = logging.getLogger(__name__)
+
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class PollingWatcher(object):
+    """
+    Watches a set of files by checking their modification time and size at a regular interval. This works everywhere
+    but is slower to react and does more work than ``InotifyWatcher``.
+
+    :var interval: The number of seconds between checks
+    """
+    interval = 0.25
+
+    def __init__(self, paths):
+        """
+        :param paths: The files to watch, these do not need to exist
+        """
+        self.paths = list(paths)
+        self._snapshot = self.snapshot()
+
+    def snapshot(self):
+        """
+        Gets the current state of all the watched files
+
+        :return: A dictionary mapping each path to its modification time and size (None if it doesn't exist)
+        """
+        state = {}
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                state[path] = (st.st_mtime, st.st_size)
+            except OSError:
+                state[path] = None
+
+        return state
+
+    def wait(self, timeout=None):
+        """
+        Waits for any of the watched files to change
+
+        :param timeout: The maximum number of seconds to wait, None to wait forever
+        :return: True if a file changed, False if the timeout was reached
+        """
+        deadline = None if timeout is None else time.time() + timeout
+
+        while True:
+            snapshot = self.snapshot()
+            if snapshot != self._snapshot:
+                self._snapshot = snapshot
+                return True
+
+            if deadline is not None and time.time() >= deadline:
+                return False
+
+            time.sleep(self.interval if deadline is None else max(0, min(self.interval, deadline - time.time())))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """
+    Watches a set of files using the linux inotify api. The directory containing each file is watched (git replaces
+    the index rather than writing to it) and only events for the watched files are reported.
+    """
+
+    def __init__(self, paths):
+        """
+        :param paths: The files to watch, these do not need to exist but their directories do
+        """
+        self._libc = self.load_libc()
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        self.names = {}
+        try:
+            for path in paths:
+                directory, name = os.path.split(os.path.abspath(path))
+                if not os.path.isdir(directory):
+                    continue
+
+                wd = self._libc.inotify_add_watch(self.fd, directory.encode(sys.getfilesystemencoding()), WATCH_MASK)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(), u'Could not watch "{0}"'.format(directory))
+
+                self.names.setdefault(wd, set()).add(name.encode(sys.getfilesystemencoding()))
+        except Exception:
+            self.close()
+            raise
+
+    @staticmethod
+    def load_libc():
+        """
+        Loads the c library exposing the inotify functions
+
+        :return: The loaded library
+        """
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, 'inotify is only available on linux')
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+
+    def read_events(self):
+        """
+        Reads all the pending events
+
+        :return: A list of (watch descriptor, file name) tuples
+        """
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return events
+                raise
+
+            if not data:
+                return events
+
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                events.append((wd, data[offset:offset + length].rstrip(b'\0')))
+                offset += length
+
+    def wait(self, timeout=None):
+        """
+        Waits for any of the watched files to change
+
+        :param timeout: The maximum number of seconds to wait, None to wait forever
+        :return: True if a file changed, False if the timeout was reached
+        """
+        deadline = None if timeout is None else time.time() + timeout
+
+        while True:
+            remaining = None if deadline is None else max(0, deadline - time.time())
+            readable = select.select([self.fd], [], [], remaining)[0]
+            if not readable:
+                return False
+
+            if any(name in self.names.get(wd, ()) for wd, name in self.read_events()):
+                return True
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def get_watcher(paths, poll=False):
+    """
+    Gets the best available watcher for the given files
+
+    :param paths: The files to watch
+    :param poll: Flag if polling should be used even if inotify is available
+    :return: The watcher object
+    """
+    if not poll:
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError) as e:
+            logger.debug(u'Falling back to polling: {0}'.format(e))
+
+    return PollingWatcher(paths)
+
+
+def watched_paths(runner):
+    """
+    Gets the files to watch for a runner. This is the index (so changes to what is staged are seen) and each of the
+    staged files (so edits to the working copy of a staged file are seen).
+
+    :param runner: The pre-commit runner
+    :return: The list of paths to watch
+    """
+    return [repo.index_path()] + list(runner.added_files) + list(runner.modified_files)
+
+
+def watch(runner_factory, debounce=0.5, once=False, poll=False):
+    """
+    Speculatively runs the hooks each time the staged files change so that the results are already cached when the
+    commit is made. Results for the current content of the staged files are cached (failures included), so hooks whose
+    input hasn't changed are not ran again.
+
+    :param runner_factory: A callable creating a new runner for each pass
+    :param debounce: The number of seconds with no changes to wait for before running the hooks
+    :param once: Flag if the hooks should only be ran once rather than waiting for changes
+    :param poll: Flag if the files should be polled rather than using inotify
+    :return: The results of the last pass
+    """
+    while True:
+        runner = runner_factory()
+        results = runner.precompute()
+
+        ran = [r for r in results if not r.cached]
+        failed = [meta.hook_name(r.hook) for r in results if r.status]
+        logger.info(u'Precomputed {0} hook(s), {1} reused{2}'.format(
+            len(ran), len(results) - len(ran), u', failing: ' + u', '.join(sorted(failed)) if failed else ''
+        ))
+
+        if once:
+            return results
+
+        watcher = get_watcher(watched_paths(runner), poll=poll)
+        try:
+            watcher.wait()
+            while watcher.wait(debounce):
+                pass
+        finally:
+            watcher.close()
@@ -0,0 +1,84 @@
+import shutil
+import stat
+import tempfile
+
+import os
+from mock import patch, Mock
+from unittest2 import TestCase
+
+from githooks import api
+
+
+class ApiRun(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.hooks = os.path.join(self.root, 'pre-commit.d')
+        os.makedirs(self.hooks)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write_hook(self, name, body):
+        path = os.path.join(self.hooks, name)
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\n' + body)
+
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        return path
+
+    def run_files(self, files, **kwargs):
+        with patch('githooks.runners.repo.hook_type_directory', return_value=self.hooks), \
+                patch('githooks.finders.HookFinder.get_plugins', return_value=[]), \
+                patch('githooks.runners.FileListHookRunner.get_history', return_value=None), \
+                patch.dict(os.environ, {'GIT_HOOKS_STATS': '0', 'GIT_HOOKS_BYTECODE': '0', 'GIT_HOOKS_ENVS': '0'}):
+            for result in api.run('pre-commit', files, **kwargs):
+                yield result
+
+    def test_files_are_given___each_hook_result_is_given_with_its_output(self):
+        passing = self.write_hook('passing', 'echo "checked $@"\n')
+        failing = self.write_hook('failing', 'echo "bad $1"\nexit 3\n')
+
+        results = sorted(self.run_files(['a.py', 'b.py'], jobs=2))
+
+        self.assertEqual(
+            [(failing, 3, 'bad a.py', False, False), (passing, 0, 'checked a.py b.py', False, False)],
+            [(r.hook, r.status, r.output, r.cached, r.skipped) for r in results],
+        )
+        self.assertTrue(all(r.duration > 0 for r in results))
+
+    def test_files_are_chunked___each_chunk_gives_a_result(self):
+        hook = self.write_hook('passing', 'echo "$@"\n')
+
+        results = list(self.run_files(['a.py', 'b.py', 'c.py'], chunk_size=2))
+
+        self.assertEqual([(hook, 'a.py b.py'), (hook, 'c.py')], [(r.hook, r.output) for r in results])
+
+    def test_caller_stops_after_the_first_result___no_more_hooks_are_started(self):
+        self.write_hook('first', 'exit 1\n')
+        self.write_hook('second', 'exit 1\n')
+
+        run_hook = Mock(side_effect=lambda path, args, capture: api.HookResult(path, 1, 0.1, '', False))
+
+        with patch('githooks.runners.FileListHookRunner.run_hook', run_hook):
+            results = self.run_files(['a.py'])
+            next(results)
+            results.close()
+
+        self.assertEqual(1, run_hook.call_count)
+
+    def test_no_files_are_given___staged_changes_are_checked_by_the_hook_type_runner(self):
+        with patch('githooks.runners.get_runner') as runner_mock:
+            runner_mock.return_value.iter_results = Mock(return_value=iter([api.HookResult('/hooks/flake8', 0, 0.1, '', True)]))
+
+            self.assertEqual([api.HookResult('/hooks/flake8', 0, 0.1, '', True)], list(api.run('pre-commit', jobs=4)))
+            runner_mock.assert_called_once_with('pre-commit', jobs=4)
+            self.assertTrue(runner_mock.return_value.capture)
+
+    def test_no_files_are_given_for_a_hook_type_without_a_runner___value_error_is_raised(self):
+        with self.assertRaises(ValueError):
+            api.run('commit-msg')
+
+
+class ApiHookResult(TestCase):
+    def test_skipped_is_not_given___result_is_not_skipped(self):
+        self.assertFalse(api.HookResult('/hooks/flake8', 0, 0.1, None, False).skipped)
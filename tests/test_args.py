@@ -1,7 +1,12 @@
+import json
 import string
 import sys
+import tempfile
 
-from githooks.args import pre_commit
+import os
+from mock import patch
+
+from githooks.args import Change, is_line_changed, is_pure_rename, manifest, pre_commit, report_result
 from hypothesis import given
 from hypothesis.strategies import text, lists
 from unittest2 import TestCase
@@ -23,3 +28,82 @@ class ArgsPreCommit(TestCase):
         self.assertListEqual(added, args.added)
         self.assertListEqual(modified, args.modified)
         self.assertListEqual(deleted, args.deleted)
+
+    def test_manifest_is_given___changed_lines_are_read_from_it(self):
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'changed_lines': {'/repo/a.py': [[1, 2], [10, 10]]}}, f)
+
+            with patch.dict(os.environ, {'GIT_HOOKS_MANIFEST': path}):
+                sys.argv = ['foo', '/repo/a.py']
+
+                self.assertEqual({'/repo/a.py': [(1, 2), (10, 10)]}, pre_commit().changed_lines)
+        finally:
+            os.remove(path)
+
+    def test_manifest_is_not_given___changed_lines_are_empty(self):
+        with patch.dict(os.environ, {'GIT_HOOKS_MANIFEST': ''}):
+            sys.argv = ['foo', '/repo/a.py']
+
+            self.assertEqual({}, pre_commit().changed_lines)
+            self.assertEqual([], pre_commit().changes)
+            self.assertIsNone(manifest())
+
+    def test_files_are_renamed___renames_are_read_from_the_arguments_and_manifest(self):
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'changes': [
+                    {'status': 'R', 'path': '/repo/new.py', 'old_path': '/repo/old.py', 'similarity': 100, 'old_oid': 'a' * 40, 'new_oid': 'a' * 40},
+                ]}, f)
+
+            with patch.dict(os.environ, {'GIT_HOOKS_MANIFEST': path}):
+                sys.argv = ['foo', '/repo/new.py', '--modified-files', '/repo/new.py', '--renamed-files', '/repo/new.py']
+                args = pre_commit()
+
+            self.assertEqual(['/repo/new.py'], args.renamed)
+            self.assertEqual([Change('R', '/repo/new.py', '/repo/old.py', 100, 'a' * 40, 'a' * 40)], args.changes)
+        finally:
+            os.remove(path)
+
+
+class ArgsIsPureRename(TestCase):
+    def test_file_is_renamed_without_changes___result_is_true(self):
+        self.assertTrue(is_pure_rename(Change('R', '/b.py', '/a.py', 100, 'a' * 40, 'a' * 40)))
+
+    def test_file_is_renamed_and_changed___result_is_false(self):
+        self.assertFalse(is_pure_rename(Change('R', '/b.py', '/a.py', 90, 'a' * 40, 'b' * 40)))
+
+    def test_file_is_modified___result_is_false(self):
+        self.assertFalse(is_pure_rename(Change('M', '/a.py', None, None, 'a' * 40, 'a' * 40)))
+
+
+class ArgsIsLineChanged(TestCase):
+    def test_line_is_in_a_range___result_is_true(self):
+        self.assertTrue(is_line_changed({'/a.py': [(1, 2), (10, 12)]}, '/a.py', 11))
+
+    def test_line_is_outside_the_ranges___result_is_false(self):
+        self.assertFalse(is_line_changed({'/a.py': [(1, 2), (10, 12)]}, '/a.py', 5))
+
+    def test_file_has_no_ranges___every_line_is_changed(self):
+        self.assertTrue(is_line_changed({}, '/a.py', 5))
+
+
+class ArgsReportResult(TestCase):
+    def test_runner_collects_results___each_result_is_written_as_a_json_line(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            with patch.dict(os.environ, {'GIT_HOOKS_RESULTS': path}):
+                report_result('/repo/a.py', 0)
+                report_result('/repo/b.py', 1)
+
+            with open(path) as f:
+                self.assertEqual([{'path': '/repo/a.py', 'status': 0}, {'path': '/repo/b.py', 'status': 1}], [json.loads(line) for line in f])
+        finally:
+            os.remove(path)
+
+    def test_runner_does_not_collect_results___nothing_is_written(self):
+        with patch.dict(os.environ, {'GIT_HOOKS_RESULTS': ''}):
+            report_result('/repo/a.py', 0)
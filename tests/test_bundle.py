@@ -0,0 +1,130 @@
+import hashlib
+import io
+import json
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
+import os
+from unittest2 import TestCase
+
+from githooks import bundle
+
+
+def manifest(hooks):
+    return json.dumps({
+        'version': 1,
+        'hooks': [{'type': t, 'name': n, 'sha256': hashlib.sha256(c).hexdigest()} for t, n, c in hooks],
+    }).encode('utf-8')
+
+
+def tar_bundle(members, mode='w:gz'):
+    data = io.BytesIO()
+    with tarfile.open(fileobj=data, mode=mode) as archive:
+        for name, content in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+
+    return data.getvalue()
+
+
+def zip_bundle(members):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, 'w') as archive:
+        for name, content in members:
+            archive.writestr(name, content)
+
+    return data.getvalue()
+
+
+class NonSeekable(io.RawIOBase):
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self.data.read(min(len(buffer), 7))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+
+class BundleReadBundle(TestCase):
+    hooks = [('pre-commit', 'flake8', b'flake8 hook'), ('pre-commit', 'isort', b'isort hook')]
+
+    def read(self, data):
+        hooks = bundle.read_bundle(NonSeekable(data))
+        entries = next(hooks)
+        return sorted(e.path for e in entries), dict((e.path, c) for e, c in hooks)
+
+    def test_tar_bundle_is_streamed___each_hook_is_verified_and_returned(self):
+        data = tar_bundle([(bundle.MANIFEST_NAME, manifest(self.hooks)), ('pre-commit/flake8', b'flake8 hook'), ('./pre-commit/isort', b'isort hook')])
+
+        self.assertEqual(
+            (['pre-commit/flake8', 'pre-commit/isort'], {'pre-commit/flake8': b'flake8 hook', 'pre-commit/isort': b'isort hook'}),
+            self.read(data),
+        )
+
+    def test_zip_bundle_is_read___each_hook_is_verified_and_returned(self):
+        data = zip_bundle([('pre-commit/isort', b'isort hook'), ('pre-commit/flake8', b'flake8 hook'), (bundle.MANIFEST_NAME, manifest(self.hooks))])
+
+        self.assertEqual(
+            (['pre-commit/flake8', 'pre-commit/isort'], {'pre-commit/flake8': b'flake8 hook', 'pre-commit/isort': b'isort hook'}),
+            self.read(data),
+        )
+
+    def test_hook_does_not_match_its_hash___bundle_error_is_raised(self):
+        for data in [
+            tar_bundle([(bundle.MANIFEST_NAME, manifest(self.hooks)), ('pre-commit/flake8', b'tampered'), ('pre-commit/isort', b'isort hook')]),
+            zip_bundle([(bundle.MANIFEST_NAME, manifest(self.hooks)), ('pre-commit/flake8', b'tampered'), ('pre-commit/isort', b'isort hook')]),
+        ]:
+            self.assertRaises(bundle.BundleError, self.read, data)
+
+    def test_hook_is_missing___bundle_error_is_raised(self):
+        for data in [
+            tar_bundle([(bundle.MANIFEST_NAME, manifest(self.hooks)), ('pre-commit/flake8', b'flake8 hook')], mode='w'),
+            zip_bundle([(bundle.MANIFEST_NAME, manifest(self.hooks)), ('pre-commit/flake8', b'flake8 hook')]),
+        ]:
+            self.assertRaises(bundle.BundleError, self.read, data)
+
+    def test_manifest_is_not_first_in_a_tar___bundle_error_is_raised(self):
+        data = tar_bundle([('pre-commit/flake8', b'flake8 hook'), (bundle.MANIFEST_NAME, manifest(self.hooks[:1]))])
+        self.assertRaises(bundle.BundleError, self.read, data)
+
+    def test_zip_has_no_manifest___bundle_error_is_raised(self):
+        self.assertRaises(bundle.BundleError, self.read, zip_bundle([('pre-commit/flake8', b'flake8 hook')]))
+
+    def test_manifest_is_invalid___bundle_error_is_raised(self):
+        for data in [
+            b'not json',
+            json.dumps({'version': 2, 'hooks': []}).encode('utf-8'),
+            json.dumps({'version': 1}).encode('utf-8'),
+            manifest([('not-a-hook', 'flake8', b'')]),
+            manifest([('pre-commit', '../flake8', b'')]),
+            manifest([('pre-commit', 'flake8', b''), ('pre-commit', 'flake8', b'')]),
+        ]:
+            self.assertRaises(bundle.BundleError, bundle.parse_manifest, data)
+
+
+class BundleWriteBundle(TestCase):
+    def test_bundle_is_written___it_can_be_read_back_with_metadata(self):
+        root = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(root, 'hooks', 'pre-commit'))
+            os.makedirs(os.path.join(root, 'hooks', 'not-a-hook'))
+            with open(os.path.join(root, 'hooks', 'pre-commit', 'flake8'), 'wb') as f:
+                f.write(b'flake8 hook')
+
+            path = os.path.join(root, 'hooks.tar.gz')
+            written = bundle.write_bundle(os.path.join(root, 'hooks'), path, {'pre-commit/flake8': {'version': '1.0'}})
+
+            with open(path, 'rb') as f:
+                hooks = bundle.read_bundle(f)
+                self.assertEqual(written, next(hooks))
+                self.assertEqual([(written[0], b'flake8 hook')], list(hooks))
+                self.assertEqual({'version': '1.0'}, written[0].metadata)
+        finally:
+            shutil.rmtree(root)
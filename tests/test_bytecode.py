@@ -0,0 +1,104 @@
+import glob
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import os
+from unittest2 import TestCase
+
+from githooks import bytecode
+
+
+class BytecodeCacheTestCase(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = bytecode.BytecodeCache(os.path.join(self.root, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write_hook(self, content, name='hook'):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        os.chmod(path, 0o755)
+        return path
+
+    def cached_files(self):
+        return glob.glob(os.path.join(self.root, 'cache', '*', '*.bin'))
+
+
+class BytecodeCacheCommand(BytecodeCacheTestCase):
+    def test_hook_is_not_python___command_is_none(self):
+        self.assertIsNone(self.cache.command(self.write_hook('#!/bin/sh\nexit 0\n')))
+        self.assertIsNone(self.cache.command(os.path.join(self.root, 'missing')))
+
+    def test_hook_has_not_been_compiled___command_is_none_and_nothing_is_compiled(self):
+        path = self.write_hook('#!{0}\nprint("one")\n'.format(sys.executable))
+
+        self.assertIsNone(self.cache.command(path))
+        self.assertEqual([], self.cached_files())
+
+    def test_hook_is_ran_through_the_loader___hook_behaves_as_if_ran_directly(self):
+        path = self.write_hook(
+            '#!{0}\nimport os, sys\nprint(__name__, os.path.basename(__file__), sys.argv[1:], sys.path[0] == os.path.dirname(__file__))\n'
+            'sys.exit(3)\n'.format(sys.executable)
+        )
+        self.cache.compile(path)
+
+        process = subprocess.Popen(self.cache.command(path) + ['a.py', 'b.py'], stdout=subprocess.PIPE)
+        output = process.communicate()[0].decode('utf-8').strip()
+
+        self.assertEqual(3, process.returncode)
+        self.assertEqual("__main__ hook ['a.py', 'b.py'] True", output)
+        self.assertEqual(1, len(self.cached_files()))
+
+    def test_hook_is_changed___it_is_ran_directly_until_it_is_compiled_again(self):
+        path = self.write_hook('#!{0}\nprint("one")\n'.format(sys.executable))
+        self.cache.compile(path)
+        self.assertEqual(b'one\n', subprocess.check_output(self.cache.command(path)))
+
+        path = self.write_hook('#!{0}\nprint("two")\n'.format(sys.executable))
+        cache = bytecode.BytecodeCache(self.cache.path)
+        self.assertIsNone(cache.command(path))
+
+        cache.compile(path)
+        self.assertEqual(b'two\n', subprocess.check_output(cache.command(path)))
+        self.assertEqual(2, len(self.cached_files()))
+
+    def test_cached_code_is_corrupt___hook_is_ran_from_source_without_compiling(self):
+        path = self.write_hook('#!{0}\nimport sys\nprint(sys.argv)\n'.format(sys.executable))
+        prefix = self.cache.prefix(path)
+        os.makedirs(os.path.dirname(prefix))
+        cached = u'{0}.{1}.bin'.format(prefix, getattr(getattr(sys, 'implementation', None), 'cache_tag', None) or 'py{0}{1}'.format(*sys.version_info[:2]))
+        with open(cached, 'wb') as f:
+            f.write(b'not code')
+
+        self.assertEqual(repr([path, 'a.py']).encode('utf-8') + b'\n', subprocess.check_output(self.cache.command(path) + ['a.py']))
+        with open(cached, 'rb') as f:
+            self.assertEqual(b'not code', f.read())
+
+    def test_hook_is_compiled_by_another_interpreter___hook_is_ran_from_source_without_compiling(self):
+        path = self.write_hook('#!{0}\nprint(__file__)\n'.format(sys.executable))
+        prefix = self.cache.prefix(path)
+        os.makedirs(os.path.dirname(prefix))
+        open(prefix + '.other-interpreter.bin', 'wb').close()
+
+        self.assertEqual(path.encode('utf-8') + b'\n', subprocess.check_output(self.cache.command(path)))
+        self.assertEqual(1, len(self.cached_files()))
+
+
+class BytecodeCacheCompile(BytecodeCacheTestCase):
+    def test_hook_is_python___code_is_cached_without_running_the_hook(self):
+        path = self.write_hook('#!{0}\nraise SystemExit("ran")\n'.format(sys.executable))
+
+        self.assertTrue(self.cache.compile(path))
+        self.assertEqual(1, len(self.cached_files()))
+
+    def test_hook_has_a_syntax_error___result_is_false(self):
+        self.assertFalse(self.cache.compile(self.write_hook('#!{0}\ndef broken(\n'.format(sys.executable))))
+        self.assertEqual([], self.cached_files())
+
+    def test_hook_is_not_python___result_is_false(self):
+        self.assertFalse(self.cache.compile(self.write_hook('#!/bin/sh\nexit 0\n')))
@@ -0,0 +1,194 @@
+import shutil
+import string
+import tempfile
+import threading
+
+import os
+from hypothesis import given
+from hypothesis.strategies import text, integers
+from mock import patch, Mock
+from unittest2 import TestCase
+
+from githooks import cache, cache_server
+
+
+class CacheHashFile(TestCase):
+    def test_hash_is_the_sha1_of_the_content(self):
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(b'content')
+
+        try:
+            self.assertEqual('040f06fd774092478d450774f5ba30c5da78acc8', cache.hash_file(f.name))
+        finally:
+            os.remove(f.name)
+
+
+class CacheResultKey(TestCase):
+    @given(text(min_size=1, max_size=10, alphabet=string.ascii_letters), text(min_size=1, max_size=10, alphabet=string.ascii_letters))
+    def test_different_parts_give_different_keys(self, a, b):
+        self.assertEqual(cache.result_key(a, b), cache.result_key(a, b))
+        self.assertNotEqual(cache.result_key(a, b), cache.result_key(a + b))
+
+
+class CacheIsPass(TestCase):
+    def test_only_zero_status_is_a_pass(self):
+        self.assertTrue(cache.is_pass({'status': 0}))
+        self.assertFalse(cache.is_pass({'status': 1}))
+        self.assertFalse(cache.is_pass(None))
+
+
+class ResultCacheTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = cache.ResultCache(os.path.join(self.dir, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_path_is_not_given___cache_is_stored_in_the_hooks_directory(self):
+        with patch('githooks.repo.repo_root', Mock(return_value=self.dir)):
+            self.assertEqual(os.path.join(self.dir, '.git', 'hooks', cache.CACHE_DIR_NAME), cache.ResultCache().path)
+
+    def test_hook_hash_is_calculated_once(self):
+        with patch('githooks.cache.hash_file', Mock(return_value='abc')) as hash_mock:
+            self.assertEqual('abc', self.cache.hook_hash('/hooks/flake8'))
+            self.assertEqual('abc', self.cache.hook_hash('/hooks/flake8'))
+
+            hash_mock.assert_called_once_with('/hooks/flake8')
+
+    def test_result_is_not_stored___none_is_returned(self):
+        self.assertIsNone(self.cache.get('hook', cache.result_key('a')))
+
+    @given(integers(min_value=0, max_value=255))
+    def test_result_is_stored___result_is_returned(self, status):
+        key = cache.result_key('a.py', 'blob')
+        self.cache.set('hook', key, {'status': status})
+
+        self.assertEqual({'status': status}, self.cache.get('hook', key))
+        self.assertIsNone(self.cache.get('other-hook', key))
+
+    def test_many_results_are_stored___only_stored_results_are_returned(self):
+        keys = [cache.result_key(str(i)) for i in range(3)]
+        self.cache.set_many('hook', {keys[0]: {'status': 0}, keys[1]: {'status': 1}})
+
+        self.assertEqual({keys[0]: {'status': 0}, keys[1]: {'status': 1}}, self.cache.get_many('hook', keys))
+
+    def test_entries_are_prefetched___later_lookups_do_not_use_the_backend(self):
+        keys = [cache.result_key(str(i)) for i in range(3)]
+        self.cache.set_many('hook', {keys[0]: {'status': 0}})
+        backend = Mock(wraps=self.cache.backend)
+        prefetched = cache.ResultCache(backend=backend)
+
+        prefetched.prefetch([('hook', k) for k in keys] + [('other', keys[0])])
+        backend.lookup.reset_mock()
+
+        self.assertEqual({keys[0]: {'status': 0}}, prefetched.get_many('hook', keys))
+        self.assertIsNone(prefetched.get('other', keys[0]))
+        backend.lookup.assert_not_called()
+
+
+class CacheGetBackend(TestCase):
+    def test_no_url_is_set___filesystem_backend_is_used(self):
+        with patch.dict(os.environ, {}, clear=True):
+            backend = cache.get_backend('/cache')
+
+        self.assertIsInstance(backend, cache.FileSystemBackend)
+        self.assertEqual('/cache', backend.path)
+
+    def test_url_is_set___remote_backend_is_used_behind_the_filesystem(self):
+        with patch.dict(os.environ, {'GIT_HOOKS_CACHE_URL': 'http://cache/', 'GIT_HOOKS_CACHE_TOKEN': 'secret'}, clear=True):
+            backend = cache.get_backend('/cache')
+
+        self.assertIsInstance(backend, cache.TieredBackend)
+        self.assertEqual(('/cache', 'http://cache', True, 'secret'), (backend.local.path, backend.remote.url, backend.remote.read_only, backend.remote.token))
+
+    def test_write_mode_is_set___remote_backend_stores_results(self):
+        with patch.dict(os.environ, {'GIT_HOOKS_CACHE_URL': 'http://cache', 'GIT_HOOKS_CACHE_MODE': 'write'}, clear=True):
+            self.assertFalse(cache.get_backend('/cache').remote.read_only)
+
+
+class CacheTieredBackend(TestCase):
+    def test_local_backend_is_missing_entries___remote_results_are_stored_locally(self):
+        local = Mock(lookup=Mock(return_value={('h', 'a'): {'status': 0}}))
+        remote = Mock(lookup=Mock(return_value={('h', 'b'): {'status': 0}}))
+
+        results = cache.TieredBackend(local, remote).lookup([('h', 'a'), ('h', 'b'), ('h', 'c')])
+
+        self.assertEqual({('h', 'a'): {'status': 0}, ('h', 'b'): {'status': 0}}, results)
+        remote.lookup.assert_called_once_with([('h', 'b'), ('h', 'c')])
+        local.store.assert_called_once_with({('h', 'b'): {'status': 0}})
+
+    def test_results_are_stored___both_backends_are_given_the_results(self):
+        local, remote = Mock(), Mock()
+
+        cache.TieredBackend(local, remote).store({('h', 'a'): {'status': 0}})
+
+        local.store.assert_called_once_with({('h', 'a'): {'status': 0}})
+        remote.store.assert_called_once_with({('h', 'a'): {'status': 0}})
+
+
+class CacheServerTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.server = cache_server.CacheServer(('127.0.0.1', 0), self.dir, token='secret')
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{0}'.format(self.server.server_address[1])
+        self.hook = cache.result_key('hook')
+        self.keys = [cache.result_key(str(i)) for i in range(3)]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        shutil.rmtree(self.dir)
+
+    def test_writer_stores_results___reader_gets_them_in_one_request(self):
+        cache.HttpBackend(self.url, read_only=False, token='secret').store({(self.hook, self.keys[0]): {'status': 0}})
+        reader = cache.HttpBackend(self.url)
+
+        with patch('githooks.cache.requests.post', wraps=cache.requests.post) as post_mock:
+            results = reader.lookup([(self.hook, k) for k in self.keys])
+
+        self.assertEqual({(self.hook, self.keys[0]): {'status': 0}}, results)
+        self.assertEqual(1, post_mock.call_count)
+
+    def test_results_are_stored___no_content_is_returned_without_content_headers(self):
+        response = cache.requests.post(
+            self.url + '/store', json={'entries': [{'hook': self.hook, 'key': self.keys[0], 'result': {'status': 0}}]},
+            headers={'Authorization': 'Bearer secret'},
+        )
+
+        self.assertEqual(204, response.status_code)
+        self.assertEqual(b'', response.content)
+        self.assertNotIn('Content-Type', response.headers)
+        self.assertNotIn('Content-Length', response.headers)
+
+    def test_reader_stores_results___nothing_is_sent(self):
+        reader = cache.HttpBackend(self.url, token='secret')
+
+        with patch('githooks.cache.requests.post') as post_mock:
+            reader.store({(self.hook, self.keys[0]): {'status': 0}})
+
+        post_mock.assert_not_called()
+
+    def test_writer_has_the_wrong_token___results_are_not_stored(self):
+        writer = cache.HttpBackend(self.url, read_only=False, token='wrong')
+        writer.store({(self.hook, self.keys[0]): {'status': 0}})
+
+        self.assertFalse(writer.available)
+        self.assertEqual({}, cache.HttpBackend(self.url).lookup([(self.hook, self.keys[0])]))
+
+    def test_entries_are_not_hashes___entries_are_ignored(self):
+        cache.HttpBackend(self.url, read_only=False, token='secret').store({('../../escape', 'x'): {'status': 0}})
+
+        self.assertEqual([], os.listdir(self.dir))
+
+    def test_server_cannot_be_reached___backend_is_disabled_after_the_first_failure(self):
+        backend = cache.HttpBackend('http://127.0.0.1:1', timeout=0.5)
+
+        with patch('githooks.cache.requests.post', wraps=cache.requests.post) as post_mock:
+            self.assertEqual({}, backend.lookup([(self.hook, self.keys[0])]))
+            self.assertEqual({}, backend.lookup([(self.hook, self.keys[1])]))
+
+        self.assertEqual(1, post_mock.call_count)
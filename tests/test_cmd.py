@@ -1,10 +1,14 @@
 import hashlib
+import io
 import string
+import tarfile
 
 import sys
 import os
+import git
 import responses
 import shutil
+import subprocess
 import tempfile
 from mock import Mock, patch
 from random import choice
@@ -15,7 +19,8 @@ from unittest2 import TestCase
 from hypothesis import given, assume
 from hypothesis.strategies import text, dictionaries, lists, integers, sampled_from, fixed_dictionaries
 
-from githooks import cmd, utils, repo
+from githooks import cmd, envs, history, profiling, utils, repo, sources, stats
+from githooks.runners import HookResult
 from githooks.compat import ConfigParser
 
 
@@ -137,6 +142,86 @@ class BaseRun(TestCase):
         other_action_mock.assert_not_called()
 
 
+class BaseRegisterSubCommands(TestCase):
+    def test_sub_command_is_selected___only_it_is_loaded_and_has_its_args_added(self):
+        add_args = Mock()
+
+        class SubCmd(cmd.Base):
+            def add_args(self, parser):
+                add_args(self.name)
+                parser.add_argument('--flag', action='store_true')
+
+        class Cmd(cmd.Base):
+            sub_commands = {'one': SubCmd, 'two': SubCmd, 'three': 'githooks.missing:Command'}
+
+        sys.argv = ['foo', 'two', '--flag']
+
+        args = Cmd().parse_args()
+
+        self.assertEqual('two', args.sub_command)
+        self.assertTrue(args.flag)
+        add_args.assert_called_once_with('two')
+
+    def test_sub_command_is_registered_by_reference___it_is_imported_when_ran(self):
+        action_mock = Mock(return_value=3)
+
+        class Cmd(cmd.Base):
+            sub_commands = {'stats': 'githooks.cmd:Stats'}
+
+        sys.argv = ['foo', 'stats']
+
+        with patch('githooks.cmd.Stats.action', action_mock):
+            self.assertEqual(3, Cmd().run())
+
+
+class CmdStartupBudget(TestCase):
+    # the most modules and import time "git hooks uninstall --help" may add on top of the bare interpreter
+    MAX_MODULES = 30
+    MAX_IMPORT_SECONDS = 0.15
+
+    def import_times(self, *args):
+        root = os.path.dirname(os.path.dirname(__file__))
+        env = dict(os.environ, PYTHONPATH=root)
+        process = subprocess.Popen([sys.executable, '-X', 'importtime'] + list(args), cwd=root, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        _, err = process.communicate()
+
+        times = {}
+        for line in err.decode().splitlines():
+            if line.startswith('import time:') and not line.endswith('imported package'):
+                own, _, name = line[len('import time:'):].split('|')
+                times[name.strip()] = int(own.strip()) if own.strip().isdigit() else 0
+
+        return times
+
+    def test_help_is_shown___startup_stays_within_the_budget(self):
+        if sys.version_info < (3, 7):
+            self.skipTest('-X importtime needs python 3.7')
+
+        base = self.import_times('-c', 'pass')
+        command = self.import_times(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scripts', 'git-hooks'), 'uninstall', '--help')
+        added = dict((name, us) for name, us in command.items() if name not in base)
+
+        self.assertIn('githooks.cmd', added)
+        self.assertLessEqual(len(added), self.MAX_MODULES, sorted(added))
+        self.assertLess(sum(added.values()) / 1e6, self.MAX_IMPORT_SECONDS, sorted(added.items(), key=lambda i: -i[1])[:10])
+
+    def test_command_is_parsed___only_the_modules_it_needs_are_imported(self):
+        script = (
+            'import sys; sys.argv = ["git-hooks", "uninstall", "pre-commit", "flake8"]\n'
+            'from githooks import cmd\n'
+            'cmd.Hooks().parse_args()\n'
+            'print("\\n".join(sorted(sys.modules)))\n'
+        )
+        output = subprocess.check_output([sys.executable, '-c', script], cwd=os.path.dirname(os.path.dirname(__file__)))
+        loaded = set(output.decode().split())
+
+        self.assertEqual(set(), loaded & set([
+            'requests', 'git', 'githooks.bundle', 'githooks.bytecode', 'githooks.envs', 'githooks.meta',
+            'githooks.profiling', 'githooks.repo', 'githooks.runners', 'githooks.sources', 'githooks.stats',
+            'githooks.watch', 'githooks.cache_server', 'multiprocessing', 'filecmp', 'http.server', 'socketserver',
+        ]))
+
+
 class CmdInit(TestCase):
     def setUp(self):
         self.repo_dir = tempfile.mkdtemp()
@@ -177,7 +262,9 @@ class CmdInit(TestCase):
                             with open(os.path.join(utils.get_hook_script_dir(), name)) as new:
                                 self.assertEqual(new.read(), f.read())
 
-                        log_mock.info.assert_called_once_with(u'A "{0}" already exists for this repository. Do you want to continue? y/[N]'.format(name))
+                        log_mock.info.assert_any_call(u'A "{0}" already exists for this repository. Do you want to continue? y/[N]'.format(name))
+
+                    self.assertEqual(len(self.hook_names), log_mock.info.call_count)
 
     def test_user_has_preexisitng_hooks_user_responds_no_to_all___no_are_overwritten(self):
         with patch('githooks.cmd.repo.repo_root', Mock(return_value=self.repo_dir)):
@@ -196,7 +283,9 @@ class CmdInit(TestCase):
                         with open(os.path.join(self.hooks_dir, name)) as f:
                             self.assertEqual(name, f.read())
 
-                        log_mock.info.assert_called_once_with(u'A "{0}" already exists for this repository. Do you want to continue? y/[N]'.format(name))
+                        log_mock.info.assert_any_call(u'A "{0}" already exists for this repository. Do you want to continue? y/[N]'.format(name))
+
+                    self.assertEqual(len(self.hook_names), log_mock.info.call_count)
 
     def test_user_has_preexisitng_hooks_with_overwrite_flag___all_are_overwritten(self):
         with patch('githooks.cmd.repo.repo_root', Mock(return_value=self.repo_dir)):
@@ -492,6 +581,73 @@ class CmdInstall(TestCase):
                     self.assertTrue(os.path.exists(os.path.join(repo.hook_type_directory(hook_type), hook['filename'])))
 
 
+class CmdInstallPrecompile(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    @responses.activate
+    def test_python_hook_is_installed___hook_is_compiled_into_the_bytecode_cache(self):
+        responses.add(responses.GET, 'http://example.com/check', body='#!{0}\nprint("check")\n'.format(sys.executable), status=200)
+
+        with FakeRepoDir(), patch.dict(os.environ, {'GIT_HOOKS_CACHE_DIR': self.cache_dir, 'GIT_HOOKS_BYTECODE': '1'}):
+            sys.argv = ['foo', 'install', 'pre-commit', 'http://example.com/check', '-y']
+            cmd.Hooks().run()
+
+            self.assertEqual(1, len(os.listdir(os.path.join(self.cache_dir, 'bytecode'))))
+
+    @responses.activate
+    def test_bytecode_is_disabled___hook_is_not_compiled(self):
+        responses.add(responses.GET, 'http://example.com/check', body='#!{0}\nprint("check")\n'.format(sys.executable), status=200)
+
+        with FakeRepoDir(), patch.dict(os.environ, {'GIT_HOOKS_CACHE_DIR': self.cache_dir, 'GIT_HOOKS_BYTECODE': '0'}):
+            sys.argv = ['foo', 'install', 'pre-commit', 'http://example.com/check', '-y']
+            cmd.Hooks().run()
+
+            self.assertFalse(os.path.exists(os.path.join(self.cache_dir, 'bytecode')))
+
+
+class CmdInstallEnv(TestCase):
+    @responses.activate
+    def test_hook_declares_requirements___environment_is_built_at_install(self):
+        responses.add(responses.GET, 'http://example.com/check', body='#!/usr/bin/env python3\n# githooks-requirements: flake8\n', status=200)
+
+        with FakeRepoDir(), patch.dict(os.environ, {'GIT_HOOKS_ENVS': '1', 'GIT_HOOKS_BYTECODE': '0'}):
+            with patch('githooks.cmd.envs.EnvCache') as env_cache_mock:
+                sys.argv = ['foo', 'install', 'pre-commit', 'http://example.com/check', '-y']
+                cmd.Hooks().run()
+
+                env_cache_mock.return_value.get.assert_called_once_with(['flake8'], ['/usr/bin/env', 'python3'])
+
+    @responses.activate
+    def test_requirements_are_in_the_config___environment_is_built_at_install(self):
+        responses.add(responses.GET, 'http://example.com/check', body='#!/bin/sh\n', status=200)
+
+        with FakeRepoDir() as dir, patch.dict(os.environ, {'GIT_HOOKS_ENVS': '1', 'GIT_HOOKS_BYTECODE': '0'}):
+            with open(os.path.join(str(dir), 'git-hooks.cfg'), 'w') as f:
+                f.write('[install]\npre-commit = http://example.com/check\n[requirements]\ncheck = flake8 isort\n')
+
+            with patch('githooks.cmd.envs.EnvCache') as env_cache_mock:
+                sys.argv = ['foo', 'install', '-y']
+                cmd.Hooks().run()
+
+                env_cache_mock.return_value.get.assert_called_once_with(['flake8', 'isort'], None)
+
+    @responses.activate
+    def test_environment_cannot_be_built___hook_is_still_installed(self):
+        responses.add(responses.GET, 'http://example.com/check', body='#!/bin/sh\n# githooks-requirements: flake8\n', status=200)
+
+        with FakeRepoDir(), patch.dict(os.environ, {'GIT_HOOKS_ENVS': '1', 'GIT_HOOKS_BYTECODE': '0'}):
+            with patch('githooks.cmd.envs.EnvCache') as env_cache_mock:
+                env_cache_mock.return_value.get.side_effect = envs.EnvError('no index')
+                sys.argv = ['foo', 'install', 'pre-commit', 'http://example.com/check', '-y']
+                cmd.Hooks().run()
+
+                self.assertTrue(os.path.exists(os.path.join(repo.hook_type_directory('pre-commit'), 'check')))
+
+
 class CmdRemove(TestCase):
     @given(text(min_size=1, max_size=10, alphabet=string.ascii_letters), sampled_from(utils.get_hook_names()))
     def test_hook_exists_in___hook_is_deleted(self, name, hook_type):
@@ -514,3 +670,494 @@ class CmdRemove(TestCase):
                 cmd.Hooks().run()
 
                 mock_logger.assert_called_with('{} hook called "{}" could not be found. SKIPPING.'.format(hook_type, name))
+
+
+class CmdPlan(TestCase):
+    def _install(self, name):
+        path = os.path.join(repo.hook_type_directory('pre-commit'), name)
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\n')
+
+        return path
+
+    def test_no_hooks_are_installed___user_is_told(self):
+        with FakeRepoDir():
+            with patch('githooks.repo.added_files', Mock(return_value=[])), patch('githooks.repo.modified_files', Mock(return_value=[])):
+                with patch('githooks.cmd.logger') as log_mock:
+                    sys.argv = ['foo', 'plan', 'pre-commit']
+
+                    self.assertEqual(0, cmd.Hooks().run())
+                    log_mock.info.assert_called_once_with(u'No "pre-commit" hooks are installed')
+
+    def test_hooks_have_history___schedule_and_critical_path_are_shown(self):
+        with FakeRepoDir():
+            with patch('githooks.repo.added_files', Mock(return_value=['a'])), patch('githooks.repo.modified_files', Mock(return_value=['b'])):
+                self._install('flake8')
+                self._install('isort')
+                self._install('tests')
+
+                hook_history = history.DurationHistory('pre-commit')
+                hook_history.record('flake8', 2, 2)
+                hook_history.record('tests', 2, 40)
+                hook_history.save()
+
+                with patch('githooks.cmd.logger') as log_mock:
+                    sys.argv = ['foo', 'plan', 'pre-commit', '-j', '2']
+
+                    self.assertEqual(0, cmd.Hooks().run())
+
+                    lines = [c[0][0] for c in log_mock.info.call_args_list]
+                    self.assertEqual([
+                        u'Predicted schedule for "pre-commit" hooks over 2 file(s) using 2 worker(s):',
+                        u'  worker 1      0.00s -     0.00s  isort (no history)',
+                        u'  worker 1      0.00s -    40.00s  tests',
+                        u'  worker 2      0.00s -     2.00s  flake8',
+                        u'Expected critical path: 40.00s (isort -> tests)',
+                    ], lines)
+
+
+def make_committed_repo(path):
+    os.makedirs(path)
+    repo_obj = git.Repo.init(path)
+    repo_obj.git.commit('--allow-empty', '-m', 'initial', author='a <a@b>', env={'GIT_COMMITTER_NAME': 'a', 'GIT_COMMITTER_EMAIL': 'a@b'})
+    return repo_obj
+
+
+class CmdInitRecursive(TestCase):
+    def setUp(self):
+        self.top = tempfile.mkdtemp()
+        self.hook_names = utils.get_hook_names()
+
+    def tearDown(self):
+        shutil.rmtree(self.top)
+
+    def test_repos_are_found___each_is_initialised_and_report_is_given(self):
+        make_committed_repo(os.path.join(self.top, 'a'))
+        make_committed_repo(os.path.join(self.top, 'b', 'c'))
+        git.Repo.init(os.path.join(self.top, 'new'))
+
+        with patch('githooks.cmd.logger') as log_mock:
+            sys.argv = ['foo', 'init', '--recursive', self.top, '-j', '2']
+
+            self.assertEqual(1, cmd.Hooks().run())
+
+            for d in ['a', os.path.join('b', 'c')]:
+                for name in self.hook_names:
+                    self.assertTrue(os.path.exists(os.path.join(self.top, d, '.git', 'hooks', name)))
+                    self.assertTrue(os.path.isdir(os.path.join(self.top, d, '.git', 'hooks', name + '.d')))
+
+            lines = [c[0][0] for c in log_mock.info.call_args_list]
+            self.assertIn(u'{0}: initialised {1}'.format(os.path.join(self.top, 'a'), ', '.join(self.hook_names)), lines)
+            self.assertIn(u'{0}: failed: the repository has no commits'.format(os.path.join(self.top, 'new')), lines)
+            self.assertEqual(u'3 repositories: 2 initialised, 0 up to date, 1 failed', lines[-1])
+
+    def test_repos_are_already_initialised___they_are_reported_as_up_to_date(self):
+        make_committed_repo(os.path.join(self.top, 'a'))
+        sys.argv = ['foo', 'init', '--recursive', self.top]
+        cmd.Hooks().run()
+
+        with patch('githooks.cmd.shutil') as shutil_mock:
+            with patch('githooks.cmd.logger') as log_mock:
+                self.assertEqual(0, cmd.Hooks().run())
+
+                shutil_mock.copy.assert_not_called()
+                log_mock.info.assert_any_call(u'{0}: up to date'.format(os.path.join(self.top, 'a')))
+
+    def test_repo_has_a_different_hook___hook_is_skipped_unless_overwrite_is_set(self):
+        make_committed_repo(os.path.join(self.top, 'a'))
+        for name in self.hook_names:
+            with open(os.path.join(self.top, 'a', '.git', 'hooks', name), 'w') as f:
+                f.write('custom')
+
+        with patch('githooks.cmd.logger') as log_mock:
+            sys.argv = ['foo', 'init', '--recursive', self.top]
+            self.assertEqual(0, cmd.Hooks().run())
+
+            log_mock.info.assert_any_call(u'{0}: up to date (skipped {1}, use "--overwrite" to replace)'.format(os.path.join(self.top, 'a'), ', '.join(self.hook_names)))
+            with open(os.path.join(self.top, 'a', '.git', 'hooks', self.hook_names[0])) as f:
+                self.assertEqual('custom', f.read())
+
+        sys.argv = ['foo', 'init', '--recursive', self.top, '-y']
+        self.assertEqual(0, cmd.Hooks().run())
+        with open(os.path.join(self.top, 'a', '.git', 'hooks', self.hook_names[0])) as f:
+            with open(os.path.join(utils.get_hook_script_dir(), self.hook_names[0])) as new:
+                self.assertEqual(new.read(), f.read())
+
+    def test_both_the_overwrite_and_no_overwrite_flags_are_set___the_user_is_given_an_error(self):
+        with patch('githooks.cmd.logger') as log_mock:
+            sys.argv = ['foo', 'init', '--recursive', self.top, '-y', '-n']
+
+            self.assertEqual(1, cmd.Hooks().run())
+            log_mock.error.assert_called_once_with('Both the overwrite and no overwrite flags were set')
+
+
+class CmdInstallRecursive(TestCase):
+    def setUp(self):
+        self.top = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.top)
+
+    def test_yes_is_not_set___the_user_is_given_an_error(self):
+        with patch('githooks.cmd.logger') as log_mock:
+            sys.argv = ['foo', 'install', '--recursive', self.top]
+
+            self.assertEqual(1, cmd.Hooks().run())
+            log_mock.error.assert_called_once_with('Hooks cannot be reviewed when installing into many repositories, use "--yes" to install without prompting')
+
+    @responses.activate
+    def test_repos_have_config___hooks_are_installed_into_each_with_one_download(self):
+        for d in ['a', 'b']:
+            make_committed_repo(os.path.join(self.top, d))
+            with open(os.path.join(self.top, d, 'git-hooks.cfg'), 'w') as f:
+                f.write('[install]\npre-commit = http://hooks/flake8\n')
+        make_committed_repo(os.path.join(self.top, 'uninitialised'))
+        with open(os.path.join(self.top, 'uninitialised', 'git-hooks.cfg'), 'w') as f:
+            f.write('[install]\npre-commit = http://hooks/flake8\n')
+
+        responses.add(responses.GET, 'http://hooks/flake8', body='flake8 hook', status=200)
+
+        for d in ['a', 'b']:
+            cmd.Init().init_repo(os.path.join(self.top, d), overwrite=True)
+
+        with patch('githooks.cmd.logger') as log_mock:
+            sys.argv = ['foo', 'install', '--recursive', self.top, '-y']
+
+            self.assertEqual(1, cmd.Hooks().run())
+
+            for d in ['a', 'b']:
+                with open(os.path.join(self.top, d, '.git', 'hooks', 'pre-commit.d', 'flake8')) as f:
+                    self.assertEqual('flake8 hook', f.read())
+
+            self.assertEqual(1, len(responses.calls))
+
+            lines = [c[0][0] for c in log_mock.info.call_args_list]
+            self.assertIn(u'{0}: installed pre-commit/flake8'.format(os.path.join(self.top, 'a')), lines)
+            self.assertIn(u'{0}: failed: "pre-commit" hooks are not initialised, run "git hooks init" first'.format(os.path.join(self.top, 'uninitialised')), lines)
+
+        with patch('githooks.cmd.logger') as log_mock:
+            sys.argv = ['foo', 'install', '--recursive', self.top, '-y', '--upgrade']
+
+            cmd.Hooks().run()
+
+            log_mock.info.assert_any_call(u'{0}: up to date'.format(os.path.join(self.top, 'a')))
+
+
+class CmdRun(TestCase):
+    def test_no_files_are_selected___the_user_is_given_an_error(self):
+        with patch('githooks.cmd.logger') as log_mock:
+            sys.argv = ['foo', 'run', 'pre-commit']
+
+            self.assertEqual(1, cmd.Hooks().run())
+            log_mock.error.assert_called_once_with('Either "--all-files", "--from" or a list of paths must be given')
+
+    def test_to_is_given_without_from___the_user_is_given_an_error(self):
+        with patch('githooks.cmd.logger') as log_mock:
+            sys.argv = ['foo', 'run', 'pre-commit', '--all-files', '--to', 'HEAD']
+
+            self.assertEqual(1, cmd.Hooks().run())
+            log_mock.error.assert_called_once_with('"--to" can only be used with "--from"')
+
+    def test_range_is_given___files_from_the_range_are_ran_through_the_hooks(self):
+        with patch('githooks.cmd.repo.iter_files', Mock(return_value=iter(['a']))) as iter_mock:
+            with patch('githooks.cmd.runners.FileListHookRunner') as runner_mock:
+                runner_mock.return_value.run = Mock(return_value=3)
+                sys.argv = ['foo', 'run', 'pre-commit', '--from', 'master', '--to', 'HEAD', '-j', '4', '--chunk-size', '10']
+
+                self.assertEqual(1, cmd.Hooks().run())
+
+                iter_mock.assert_called_once_with(False, 'master', 'HEAD', [])
+                runner_mock.assert_called_once_with('pre-commit', iter_mock.return_value, chunk_size=10, jobs=4)
+
+
+class CmdReplay(TestCase):
+    def test_commits_fail___status_is_one(self):
+        with patch('githooks.cmd.runners.ReplayHookRunner') as runner_mock:
+            runner_mock.return_value.run = Mock(return_value=2)
+            sys.argv = ['foo', 'replay', 'master..feature', '-j', '3']
+
+            self.assertEqual(1, cmd.Hooks().run())
+            runner_mock.assert_called_once_with('master..feature', jobs=3)
+
+    def test_all_commits_pass___status_is_zero(self):
+        with patch('githooks.cmd.runners.ReplayHookRunner') as runner_mock:
+            runner_mock.return_value.run = Mock(return_value=0)
+            sys.argv = ['foo', 'replay', 'master..feature']
+
+            self.assertEqual(0, cmd.Hooks().run())
+
+
+class CmdWatch(TestCase):
+    def test_options_are_given___they_are_passed_to_the_watcher(self):
+        with patch('githooks.cmd.watch.watch') as watch_mock:
+            with patch('githooks.cmd.runners.PreCommitHookRunner') as runner_mock:
+                sys.argv = ['foo', 'watch', '-j', '2', '--debounce', '1.5', '--poll', '--once']
+
+                self.assertEqual(0, cmd.Hooks().run())
+
+                factory = watch_mock.call_args[0][0]
+                self.assertEqual({'debounce': 1.5, 'once': True, 'poll': True}, watch_mock.call_args[1])
+                self.assertEqual(runner_mock.return_value, factory())
+                runner_mock.assert_called_once_with(jobs=2)
+
+    def test_watcher_is_interrupted___status_is_zero(self):
+        with patch('githooks.cmd.watch.watch', Mock(side_effect=KeyboardInterrupt)):
+            sys.argv = ['foo', 'watch']
+
+            self.assertEqual(0, cmd.Hooks().run())
+
+
+class CmdStatus(TestCase):
+    def test_no_hooks_have_been_deferred___status_is_zero(self):
+        with patch('githooks.cmd.deferred.read_status', return_value=None):
+            sys.argv = ['foo', 'status']
+
+            self.assertEqual(0, cmd.Hooks().run())
+
+    def test_deferred_hooks_have_failed___results_are_marked_as_reported_and_status_is_one(self):
+        status = {'commit': 'abc', 'state': 'done', 'results': [{'hook': 'mypy', 'status': 1}]}
+
+        with patch('githooks.cmd.deferred.read_status', return_value=status), patch('githooks.cmd.deferred.mark_reported') as mark_mock:
+            sys.argv = ['foo', 'status']
+
+            self.assertEqual(1, cmd.Hooks().run())
+            mark_mock.assert_called_once_with(status)
+
+    def test_deferred_hooks_are_running___status_is_zero_and_results_are_not_marked(self):
+        with patch('githooks.cmd.deferred.read_status', return_value={'commit': 'abc', 'state': 'running', 'hooks': []}), \
+                patch('githooks.cmd.deferred.mark_reported') as mark_mock:
+            sys.argv = ['foo', 'status']
+
+            self.assertEqual(0, cmd.Hooks().run())
+            mark_mock.assert_not_called()
+
+
+class CmdCacheServer(TestCase):
+    def test_options_are_given___server_is_started_with_them_and_closed_on_interrupt(self):
+        with patch('githooks.cmd.cache_server.CacheServer') as server_mock, patch.dict(os.environ, {'GIT_HOOKS_CACHE_TOKEN': 'secret'}):
+            server_mock.return_value.server_address = ('0.0.0.0', 9000)
+            server_mock.return_value.serve_forever = Mock(side_effect=KeyboardInterrupt)
+            sys.argv = ['foo', 'cache-server', '/results', '--host', '0.0.0.0', '--port', '9000', '--read-only']
+
+            self.assertEqual(0, cmd.Hooks().run())
+
+            server_mock.assert_called_once_with(('0.0.0.0', 9000), '/results', True, 'secret')
+            server_mock.return_value.server_close.assert_called_once_with()
+
+
+class CmdProfile(TestCase):
+    def test_hooks_are_profiled___stats_dir_is_passed_and_status_is_zero(self):
+        profile = profiling.HookProfile('/hooks/flake8', True, 1, 1.0, 0.6, 0.4, 0.5, 0.1, [('flake8', 0.5)], None, '')
+
+        with patch('githooks.cmd.profiling.profile_hooks', return_value=[profile]) as profile_mock:
+            sys.argv = ['foo', 'profile', '--save-stats', 'stats']
+
+            self.assertEqual(0, cmd.Hooks().run())
+            self.assertEqual('stats', profile_mock.call_args[0][1])
+
+    def test_no_hooks_are_installed___status_is_zero(self):
+        with patch('githooks.cmd.profiling.profile_hooks', return_value=[]):
+            sys.argv = ['foo', 'profile', 'pre-commit']
+
+            self.assertEqual(0, cmd.Hooks().run())
+
+
+class CmdStats(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.run_stats = stats.RunStats(os.path.join(self.root, 'stats.jsonl'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _run(self, *args):
+        with patch('githooks.cmd.stats.RunStats', Mock(return_value=self.run_stats)):
+            sys.argv = ['foo', 'stats'] + list(args)
+            return cmd.Hooks().run()
+
+    def test_no_runs_are_recorded___the_user_is_told(self):
+        with patch('githooks.cmd.logger') as log_mock:
+            self.assertEqual(0, self._run())
+            log_mock.info.assert_called_once_with('No hook runs have been recorded')
+
+    def test_runs_are_recorded___a_row_is_shown_for_each_hook(self):
+        self.run_stats.record('pre-commit', HookResult('/hooks/flake8', 1, 1.5, None, False), 1)
+        self.run_stats.record('pre-commit', HookResult('/hooks/isort', 0, 0, None, True), 1)
+        self.run_stats.save()
+
+        with patch('githooks.cmd.logger') as log_mock:
+            self.assertEqual(0, self._run('pre-commit'))
+
+            rows = [c[0][0].split() for c in log_mock.info.call_args_list]
+            self.assertEqual([
+                ['type', 'hook', 'runs', 'p50', 'p95', 'max', 'failures', 'cached'],
+                ['pre-commit', 'flake8', '1', '1.50s', '1.50s', '1.50s', '1', '0'],
+                ['pre-commit', 'isort', '1', '-', '-', '-', '0', '1'],
+            ], rows)
+
+    def test_openmetrics_is_requested_with_a_file___metrics_are_written_to_the_file(self):
+        path = os.path.join(self.root, 'githooks.prom')
+
+        self.assertEqual(0, self._run('--openmetrics', path))
+        with open(path) as f:
+            self.assertEqual(stats.openmetrics([]), f.read())
+
+    def test_openmetrics_is_requested_without_a_file___metrics_are_printed(self):
+        with patch('githooks.cmd.print', create=True) as print_mock:
+            self.assertEqual(0, self._run('--openmetrics'))
+            print_mock.assert_called_once_with(stats.openmetrics([]), end='')
+
+
+class CmdInstallGitSource(TestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+
+        git.Repo.init(self.source)
+        os.mkdir(os.path.join(self.source, 'pre-commit'))
+        for name in ['flake8', 'isort']:
+            with open(os.path.join(self.source, 'pre-commit', name), 'w') as f:
+                f.write(name + ' hook')
+
+        subprocess.check_call(['git', 'add', '-A'], cwd=self.source)
+        subprocess.check_call(['git', '-c', 'user.name=a', '-c', 'user.email=a@b', 'commit', '-q', '-m', 'hooks'], cwd=self.source)
+
+    def tearDown(self):
+        shutil.rmtree(self.source)
+        shutil.rmtree(self.cache_dir)
+
+    def test_hooks_are_git_sources___each_hook_is_installed_from_a_single_read_of_the_source(self):
+        flake8 = 'git+{0}#pre-commit/flake8'.format(self.source)
+        isort = 'git+{0}@HEAD#pre-commit/isort'.format(self.source)
+
+        with FakeRepoDir(), patch.dict(os.environ, {'GIT_HOOKS_CACHE_DIR': self.cache_dir}):
+            with patch('githooks.cmd.sources.read_git_specs', Mock(wraps=sources.read_git_specs)) as read_mock:
+                sys.argv = ['foo', 'install', 'pre-commit', flake8, isort, '-y']
+                cmd.Hooks().run()
+
+                read_mock.assert_called_once()
+                self.assertEqual(2, len(read_mock.call_args[0][0]))
+
+            for name in ['flake8', 'isort']:
+                with open(os.path.join(repo.hook_type_directory('pre-commit'), name)) as f:
+                    self.assertEqual(name + ' hook', f.read())
+
+            self.assertEqual(1, len(os.listdir(os.path.join(self.cache_dir, 'mirrors'))))
+
+    def test_hook_is_already_installed___the_source_is_not_read(self):
+        with FakeRepoDir(), patch.dict(os.environ, {'GIT_HOOKS_CACHE_DIR': self.cache_dir}):
+            with open(os.path.join(repo.hook_type_directory('pre-commit'), 'flake8'), 'w') as f:
+                f.write('installed')
+
+            with patch('githooks.cmd.sources.read_git_specs') as read_mock:
+                sys.argv = ['foo', 'install', 'pre-commit', 'git+{0}#pre-commit/flake8'.format(self.source), '-y']
+                cmd.Hooks().run()
+
+                read_mock.assert_not_called()
+
+    def install(self, spec):
+        with FakeRepoDir(), patch.dict(os.environ, {'GIT_HOOKS_CACHE_DIR': self.cache_dir}), patch('githooks.cmd.logger') as log_mock:
+            sys.argv = ['foo', 'install', 'pre-commit', spec, '-y']
+            status = cmd.Hooks().run()
+            installed = os.listdir(repo.hook_type_directory('pre-commit'))
+
+        return status, installed, log_mock
+
+    def test_ref_does_not_exist___error_is_logged_and_nothing_is_installed(self):
+        status, installed, log_mock = self.install('git+{0}@missing#pre-commit/flake8'.format(self.source))
+
+        self.assertEqual(1, status)
+        self.assertEqual([], installed)
+        log_mock.error.assert_called_once_with(u'Could not install the hooks: "missing" does not exist in "{0}"'.format(self.source))
+
+    def test_path_does_not_exist___error_is_logged_and_nothing_is_installed(self):
+        status, installed, log_mock = self.install('git+{0}#pre-commit/missing'.format(self.source))
+
+        self.assertEqual(1, status)
+        self.assertEqual([], installed)
+        log_mock.error.assert_called_once()
+
+    def test_spec_is_invalid___error_is_logged(self):
+        status, _, log_mock = self.install('git+{0}'.format(self.source))
+
+        self.assertEqual(1, status)
+        log_mock.error.assert_called_once()
+
+    def test_source_gives_no_content_for_a_hook___error_is_logged(self):
+        with patch('githooks.cmd.sources.read_git_specs', return_value={}):
+            status, installed, log_mock = self.install('git+{0}#pre-commit/flake8'.format(self.source))
+
+        self.assertEqual(1, status)
+        self.assertEqual([], installed)
+        log_mock.error.assert_called_once_with(u'Could not install the hooks: "git+{0}#pre-commit/flake8" could not be read'.format(self.source))
+
+
+class CmdInstallBundle(TestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.source, 'pre-commit'))
+        for name in ['flake8', 'isort']:
+            with open(os.path.join(self.source, 'pre-commit', name), 'w') as f:
+                f.write(name + ' hook')
+
+        self.bundle = os.path.join(self.source, 'hooks.tar.gz')
+        sys.argv = ['foo', 'bundle', self.source, self.bundle]
+        cmd.Hooks().run()
+
+    def tearDown(self):
+        shutil.rmtree(self.source)
+
+    def test_bundle_is_given___each_hook_is_installed_executable(self):
+        with FakeRepoDir():
+            sys.argv = ['foo', 'install', '--bundle', self.bundle, '-y']
+            self.assertEqual(0, cmd.Hooks().run())
+
+            for name in ['flake8', 'isort']:
+                path = os.path.join(repo.hook_type_directory('pre-commit'), name)
+                with open(path) as f:
+                    self.assertEqual(name + ' hook', f.read())
+                self.assertTrue(os.access(path, os.X_OK))
+
+    def test_hook_is_already_installed_without_upgrade___existing_hook_is_kept(self):
+        with FakeRepoDir():
+            with open(os.path.join(repo.hook_type_directory('pre-commit'), 'flake8'), 'w') as f:
+                f.write('installed')
+
+            sys.argv = ['foo', 'install', '--bundle', self.bundle, '-y']
+            cmd.Hooks().run()
+
+            with open(os.path.join(repo.hook_type_directory('pre-commit'), 'flake8')) as f:
+                self.assertEqual('installed', f.read())
+
+            sys.argv = ['foo', 'install', '--bundle', self.bundle, '-y', '--upgrade']
+            cmd.Hooks().run()
+
+            with open(os.path.join(repo.hook_type_directory('pre-commit'), 'flake8')) as f:
+                self.assertEqual('flake8 hook', f.read())
+
+    def test_hook_does_not_match_the_manifest___nothing_is_installed(self):
+        with open(os.path.join(self.source, 'pre-commit', 'isort'), 'w') as f:
+            f.write('tampered')
+
+        # rebuild the archive with the old manifest but the tampered hook
+        with tarfile.open(self.bundle) as original:
+            manifest = original.extractfile('githooks-bundle.json').read()
+
+        with tarfile.open(self.bundle, 'w:gz') as archive:
+            info = tarfile.TarInfo('githooks-bundle.json')
+            info.size = len(manifest)
+            archive.addfile(info, io.BytesIO(manifest))
+            archive.add(os.path.join(self.source, 'pre-commit'), 'pre-commit')
+
+        with FakeRepoDir():
+            sys.argv = ['foo', 'install', '--bundle', self.bundle, '-y']
+            self.assertEqual(1, cmd.Hooks().run())
+
+            self.assertEqual([], os.listdir(repo.hook_type_directory('pre-commit')))
+
+    def test_user_declines___nothing_is_installed(self):
+        with FakeRepoDir(), patch('githooks.cmd.get_input', return_value='n'):
+            sys.argv = ['foo', 'install', '--bundle', self.bundle]
+            self.assertEqual(0, cmd.Hooks().run())
+
+            self.assertEqual([], os.listdir(repo.hook_type_directory('pre-commit')))
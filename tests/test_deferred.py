@@ -0,0 +1,113 @@
+import json
+import shutil
+import tempfile
+
+import os
+from mock import patch, Mock
+from unittest2 import TestCase
+
+from githooks import deferred, runners
+
+
+class DeferredBase(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.hooks_dir = os.path.join(self.root, '.git', 'hooks')
+        os.makedirs(self.hooks_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def read(self, name):
+        with open(os.path.join(self.hooks_dir, name)) as f:
+            return json.load(f)
+
+    def write_status(self, **status):
+        with open(os.path.join(self.hooks_dir, deferred.STATUS_FILE_NAME), 'w') as f:
+            json.dump(dict({'commit': 'abc', 'state': 'running', 'hooks': ['/hooks/mypy'], 'results': [], 'reported': False}, **status), f)
+
+
+class DeferredQueue(DeferredBase):
+    def test_hooks_are_queued___queue_is_written(self):
+        deferred.queue(['/hooks/mypy'], self.root)
+
+        self.assertEqual(['/hooks/mypy'], self.read(deferred.QUEUE_FILE_NAME)['hooks'])
+
+    def test_no_hooks_are_queued___old_queue_is_removed(self):
+        deferred.queue(['/hooks/mypy'], self.root)
+        deferred.queue([], self.root)
+
+        self.assertFalse(os.path.exists(os.path.join(self.hooks_dir, deferred.QUEUE_FILE_NAME)))
+
+
+class DeferredStart(DeferredBase):
+    def test_hooks_are_queued___detached_process_is_started_for_the_head_commit(self):
+        deferred.queue(['/hooks/mypy'], self.root)
+
+        with patch('githooks.deferred.repo.head_commit', return_value='abc'), patch('githooks.deferred.subprocess.Popen') as popen_mock:
+            self.assertEqual(popen_mock.return_value, deferred.start(self.root))
+
+        self.assertEqual([deferred.sys.executable, '-m', 'githooks.deferred', 'abc'], popen_mock.call_args[0][0])
+        self.assertEqual(self.root, popen_mock.call_args[1]['cwd'])
+        self.assertIn('preexec_fn', popen_mock.call_args[1])
+        self.assertFalse(os.path.exists(os.path.join(self.hooks_dir, deferred.QUEUE_FILE_NAME)))
+        self.assertEqual(('abc', 'running', ['/hooks/mypy']), tuple(self.read(deferred.STATUS_FILE_NAME)[k] for k in ('commit', 'state', 'hooks')))
+
+    def test_nothing_is_queued___nothing_is_started(self):
+        with patch('githooks.deferred.subprocess.Popen') as popen_mock:
+            self.assertIsNone(deferred.start(self.root))
+
+        popen_mock.assert_not_called()
+
+
+class DeferredRun(DeferredBase):
+    def test_hooks_are_ran___results_are_recorded(self):
+        self.write_status()
+
+        with patch('githooks.runners.DeferredHookRunner') as runner_mock:
+            runner_mock.return_value.run_deferred = Mock(return_value=[runners.HookResult('/hooks/mypy', 1, 2.0, 'bad', False)])
+
+            self.assertEqual(1, deferred.run('abc', self.root))
+
+        runner_mock.assert_called_once_with('abc', ['/hooks/mypy'])
+        status = self.read(deferred.STATUS_FILE_NAME)
+        self.assertEqual('done', status['state'])
+        self.assertEqual([{'hook': 'mypy', 'status': 1, 'duration': 2.0, 'output': 'bad', 'cached': False}], status['results'])
+
+    def test_runner_raises___error_is_recorded(self):
+        self.write_status()
+
+        with patch('githooks.runners.DeferredHookRunner', side_effect=OSError('no worktree')):
+            self.assertEqual(1, deferred.run('abc', self.root))
+
+        self.assertEqual(('error', 'no worktree'), tuple(self.read(deferred.STATUS_FILE_NAME)[k] for k in ('state', 'error')))
+
+    def test_another_commit_was_made___results_are_dropped(self):
+        self.write_status()
+
+        with patch('githooks.runners.DeferredHookRunner') as runner_mock:
+            runner_mock.return_value.run_deferred = Mock(side_effect=lambda: self.write_status(commit='def') or [])
+            deferred.run('abc', self.root)
+
+        self.assertEqual(('def', 'running'), tuple(self.read(deferred.STATUS_FILE_NAME)[k] for k in ('commit', 'state')))
+
+
+class DeferredReportPending(DeferredBase):
+    def test_run_has_failed___failure_is_reported_once(self):
+        self.write_status(state='done', results=[{'hook': 'mypy', 'status': 1, 'output': 'bad', 'cached': False}])
+
+        with patch('githooks.deferred.logger') as logger_mock:
+            deferred.report_pending(self.root)
+            deferred.report_pending(self.root)
+
+        self.assertEqual(['Deferred hook "mypy" failed for abc', 'bad'], [c[0][0] for c in logger_mock.warning.call_args_list])
+        self.assertTrue(self.read(deferred.STATUS_FILE_NAME)['reported'])
+
+    def test_run_is_still_running___it_is_reported_again_later(self):
+        self.write_status()
+
+        with patch('githooks.deferred.logger') as logger_mock:
+            deferred.report_pending(self.root)
+
+        logger_mock.info.assert_called_once_with('Deferred hooks for abc are still running: mypy')
+        self.assertFalse(self.read(deferred.STATUS_FILE_NAME)['reported'])
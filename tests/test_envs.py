@@ -0,0 +1,109 @@
+import json
+import shutil
+import tempfile
+import time
+
+import os
+from mock import patch
+from unittest2 import TestCase
+
+from githooks import envs
+
+
+class FakeBuildEnvCache(envs.EnvCache):
+    def __init__(self, *args, **kwargs):
+        super(FakeBuildEnvCache, self).__init__(*args, **kwargs)
+        self.built = []
+
+    def build(self, env, requirements, interpreter):
+        self.built.append((requirements, interpreter))
+        shutil.rmtree(env, ignore_errors=True)
+        os.makedirs(env)
+        with open(os.path.join(env, envs.COMPLETE_MARKER), 'w') as f:
+            json.dump({}, f)
+
+
+class EnvCacheTestCase(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = FakeBuildEnvCache(os.path.join(self.root, 'envs'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+
+class EnvCacheKey(EnvCacheTestCase):
+    def test_requirements_are_in_a_different_order___key_is_the_same(self):
+        self.assertEqual(self.cache.key(['a', 'b'], ['python3']), self.cache.key(['b', 'a'], ['python3']))
+
+    def test_interpreter_is_different___key_is_different(self):
+        self.assertNotEqual(self.cache.key(['a'], ['python3']), self.cache.key(['a'], ['python3.12']))
+
+
+class EnvCacheGet(EnvCacheTestCase):
+    def test_environment_does_not_exist___it_is_built_once(self):
+        first = self.cache.get(['flake8'], ['python3'])
+        second = self.cache.get(['flake8'], ['python3'])
+
+        self.assertEqual(first, second)
+        self.assertEqual([(['flake8'], ['python3'])], self.cache.built)
+
+    def test_build_is_false___missing_environment_is_not_built(self):
+        self.assertIsNone(self.cache.get(['flake8'], ['python3'], build=False))
+        self.assertEqual([], self.cache.built)
+
+    def test_build_failed_previously___environment_is_built_again(self):
+        os.makedirs(self.cache.env_path(self.cache.key(['flake8'], ['python3'])))
+
+        self.cache.get(['flake8'], ['python3'])
+
+        self.assertEqual(1, len(self.cache.built))
+
+    def test_more_than_max_envs_exist___least_recently_used_are_removed(self):
+        now = time.time()
+        paths = []
+        for i, req in enumerate(['a', 'b', 'c']):
+            paths.append(self.cache.get([req]))
+            os.utime(os.path.join(paths[-1], envs.COMPLETE_MARKER), (now - 100 + i, now - 100 + i))
+
+        os.utime(os.path.join(paths[0], envs.COMPLETE_MARKER), (now, now))
+        self.cache.max_envs = 2
+        self.cache.get(['d'])
+
+        self.assertEqual([True, False, False, True], [os.path.isdir(p) for p in paths + [self.cache.env_path(self.cache.key(['d'], self.cache.built[-1][1]))]])
+
+
+class EnvCacheBuild(EnvCacheTestCase):
+    def test_install_fails___environment_is_removed(self):
+        env = os.path.join(self.root, 'env')
+        cache = envs.EnvCache(os.path.join(self.root, 'envs'))
+
+        def run(command):
+            if 'venv' in command:
+                os.makedirs(env)
+            else:
+                raise envs.EnvError('failed')
+
+        with patch.object(cache, '_run', side_effect=run):
+            self.assertRaises(envs.EnvError, cache.build, env, ['flake8'], ['python3'])
+
+        self.assertFalse(os.path.exists(env))
+
+
+class EnvCacheInstallArgs(TestCase):
+    def test_wheelhouse_is_set___index_is_not_used(self):
+        with patch.dict(os.environ, {'GIT_HOOKS_WHEELHOUSE': '/wheels', 'GIT_HOOKS_INDEX_URL': 'https://index'}):
+            self.assertEqual(['--no-index', '--find-links', os.path.abspath('/wheels')], envs.EnvCache('/envs').install_args())
+
+    def test_index_url_is_set___index_is_used(self):
+        with patch.dict(os.environ, {'GIT_HOOKS_WHEELHOUSE': '', 'GIT_HOOKS_INDEX_URL': 'https://index'}):
+            self.assertEqual(['--index-url', 'https://index'], envs.EnvCache('/envs').install_args())
+
+
+class EnvCacheActivate(TestCase):
+    def test_environment_is_activated___scripts_are_first_on_the_path(self):
+        env = envs.EnvCache('/envs').activate('/envs/abc', {'PATH': '/usr/bin', 'PYTHONHOME': '/py'})
+
+        self.assertEqual(os.pathsep.join([os.path.join('/envs/abc', envs.BIN_DIR), '/usr/bin']), env['PATH'])
+        self.assertEqual('/envs/abc', env['VIRTUAL_ENV'])
+        self.assertNotIn('PYTHONHOME', env)
@@ -0,0 +1,78 @@
+import json
+import shutil
+import tempfile
+
+import os
+from hypothesis import given
+from hypothesis.strategies import floats, integers, lists
+from mock import patch, Mock
+from unittest2 import TestCase
+
+from githooks import history
+
+
+class HistorySizeBucket(TestCase):
+    def test_sizes_are_grouped_into_exponential_buckets(self):
+        self.assertEqual(0, history.size_bucket(0))
+        self.assertEqual(1, history.size_bucket(1))
+        self.assertEqual(2, history.size_bucket(3))
+        self.assertEqual(3, history.size_bucket(4))
+        self.assertEqual(3, history.size_bucket(7))
+        self.assertEqual(4, history.size_bucket(8))
+
+
+class DurationHistoryTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, history.HISTORY_FILE_NAME)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_path_is_not_given___history_is_stored_in_the_hooks_directory(self):
+        with patch('githooks.repo.repo_root', Mock(return_value=self.dir)):
+            hook_history = history.DurationHistory('pre-commit')
+
+            self.assertEqual(os.path.join(self.dir, '.git', 'hooks', history.HISTORY_FILE_NAME), hook_history.path)
+
+    def test_hook_has_no_history___prediction_is_none(self):
+        hook_history = history.DurationHistory('pre-commit', self.path)
+
+        self.assertIsNone(hook_history.predict('flake8', 10))
+
+    def test_history_file_is_invalid___history_is_empty(self):
+        with open(self.path, 'w') as f:
+            f.write('not json')
+
+        self.assertEqual({}, history.DurationHistory('pre-commit', self.path).data)
+
+    @given(lists(floats(min_value=0, max_value=100), min_size=1, max_size=20))
+    def test_durations_are_recorded___prediction_is_the_median_of_the_latest_samples(self, durations):
+        hook_history = history.DurationHistory('pre-commit', self.path)
+
+        for d in durations:
+            hook_history.record('flake8', 5, d)
+
+        latest = sorted(round(d, 4) for d in durations[-history.DurationHistory.max_samples:])
+        self.assertEqual(latest[len(latest) // 2], hook_history.predict('flake8', 5))
+
+    @given(integers(min_value=0, max_value=10000))
+    def test_size_has_no_history___closest_size_is_used(self, size):
+        hook_history = history.DurationHistory('pre-commit', self.path)
+        hook_history.record('tests', 1, 1.0)
+        hook_history.record('tests', 1000, 40.0)
+
+        expected = 1.0 if abs(history.size_bucket(size) - 1) < abs(history.size_bucket(size) - history.size_bucket(1000)) else 40.0
+        self.assertEqual(expected, hook_history.predict('tests', size))
+
+    def test_history_is_saved___history_is_loaded_by_a_new_object(self):
+        hook_history = history.DurationHistory('pre-commit', self.path)
+        hook_history.record('flake8', 3, 2.5)
+        hook_history.save()
+
+        with open(self.path) as f:
+            self.assertEqual({'pre-commit': {'flake8': {'2': [2.5]}}}, json.load(f))
+
+        self.assertEqual(2.5, history.DurationHistory('pre-commit', self.path).predict('flake8', 3))
+        self.assertIsNone(history.DurationHistory('commit-msg', self.path).predict('flake8', 3))
+        self.assertEqual([history.HISTORY_FILE_NAME], os.listdir(self.dir))
@@ -0,0 +1,259 @@
+import random
+import shutil
+import struct
+import subprocess
+import tempfile
+
+import os
+from mock import patch
+from unittest2 import TestCase
+
+from githooks import index, repo
+
+
+def git(root, *args):
+    subprocess.check_call(['git'] + list(args), cwd=root, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def write(root, path, content):
+    path = os.path.join(root, path)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+class IndexFixtureTestCase(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        git(self.root, 'init', '-q')
+        git(self.root, 'config', 'user.name', 'a')
+        git(self.root, 'config', 'user.email', 'a@b')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def commit(self):
+        git(self.root, 'add', '-A')
+        git(self.root, 'commit', '-q', '-m', 'commit')
+
+    def locate(self):
+        return patch('githooks.repo._locate', return_value=(os.path.join(self.root, '.git'), self.root))
+
+    def changes(self, index_path=None):
+        changes = index.staged_changes(os.path.join(self.root, '.git'), index_path)
+        return tuple(sorted(p.decode('utf-8') for p in paths) for paths in changes)
+
+    def gitpython_changes(self):
+        with patch.dict(os.environ, {'GIT_DIR': os.path.join(self.root, '.git')}), self.locate():
+            os.environ.pop('GIT_HOOKS_INDEX_BACKEND', None)
+            return tuple(
+                sorted(os.path.relpath(p, self.root) for p in func())
+                for func in (repo.added_files, repo.modified_files, repo.deleted_files)
+            )
+
+    def assertMatchesGitPython(self):
+        self.assertEqual(self.gitpython_changes(), self.changes())
+
+
+class IndexStagedChangesCorpus(IndexFixtureTestCase):
+    def build_corpus(self, seed):
+        rand = random.Random(seed)
+        files = ['top.py', 'a.txt', 'a-b', 'a/x.py', 'a/b/c.py', 'a/b/d/e.py', 'z/deep/er/f.py', 'z/g.py', 'long/' + 'n' * 250]
+        for i, path in enumerate(files):
+            write(self.root, path, 'content {0}\n'.format(i))
+        self.commit()
+
+        for i in range(6):
+            action = rand.choice(['add', 'modify', 'delete', 'chmod', 'symlink'])
+            if action == 'add':
+                path = rand.choice(['new.py', 'a/new.py', 'a/b/d/new.py', 'n/e/w.py', 'a.new', 'z/deep/new'])
+                write(self.root, path, 'added {0} {1}\n'.format(seed, i))
+            else:
+                existing = [p for p in files if os.path.exists(os.path.join(self.root, p))]
+                path = os.path.join(self.root, rand.choice(existing))
+                if action == 'modify':
+                    write(self.root, path, 'modified {0} {1}\n'.format(seed, i))
+                elif action == 'delete':
+                    os.remove(path)
+                elif action == 'chmod':
+                    os.chmod(path, 0o755)
+                else:
+                    os.remove(path)
+                    os.symlink('top.py', path)
+
+            git(self.root, 'add', '-A')
+
+    def test_changes_match_gitpython_for_each_index_version(self):
+        for seed in range(8):
+            for version in (2, 3, 4):
+                shutil.rmtree(self.root)
+                self.setUp()
+
+                self.build_corpus(seed)
+                git(self.root, 'update-index', '--index-version', str(version))
+
+                self.assertMatchesGitPython()
+
+    def test_objects_are_packed___changes_match_gitpython(self):
+        self.build_corpus(100)
+        git(self.root, 'gc', '-q')
+
+        self.assertMatchesGitPython()
+
+    def test_nothing_is_staged___there_are_no_changes(self):
+        self.build_corpus(1)
+        self.commit()
+
+        self.assertEqual(([], [], []), self.changes())
+
+    def test_subtree_is_unchanged___it_is_skipped_using_the_cache_tree(self):
+        write(self.root, 'a/one.py', 'one')
+        write(self.root, 'b/two.py', 'two')
+        self.commit()
+        write(self.root, 'b/two.py', 'changed')
+        git(self.root, 'add', 'b/two.py')
+
+        read_tree = index.read_tree
+        with patch('githooks.index.read_tree', side_effect=lambda odb, sha: list(read_tree(odb, sha))) as read_mock:
+            self.assertEqual(([], ['b/two.py'], []), self.changes())
+            self.assertEqual(2, read_mock.call_count)
+
+    def test_file_is_replaced_by_a_directory___changes_match_gitpython(self):
+        write(self.root, 'a', 'file')
+        write(self.root, 'b.py', 'b')
+        self.commit()
+
+        os.remove(os.path.join(self.root, 'a'))
+        write(self.root, 'a/inner.py', 'inner')
+        git(self.root, 'add', '-A')
+
+        self.assertMatchesGitPython()
+
+    def test_intent_to_add_files_are_not_changes(self):
+        write(self.root, 'a.py', 'a')
+        self.commit()
+        write(self.root, 'b.py', 'b')
+        git(self.root, 'add', '-N', 'b.py')
+
+        self.assertEqual(([], [], []), self.changes())
+
+    def test_submodules_are_not_included(self):
+        sub = tempfile.mkdtemp()
+        try:
+            git(sub, 'init', '-q')
+            git(sub, '-c', 'user.name=a', '-c', 'user.email=a@b', 'commit', '-q', '--allow-empty', '-m', 'init')
+            write(self.root, 'a.py', 'a')
+            self.commit()
+            git(self.root, 'submodule', '-q', 'add', sub, 'lib')
+
+            self.assertEqual((['.gitmodules'], [], []), self.changes())
+            self.assertMatchesGitPython()
+        finally:
+            shutil.rmtree(sub)
+
+    def test_another_index_file_is_used___it_is_read(self):
+        write(self.root, 'a.py', 'a')
+        self.commit()
+
+        other = os.path.join(self.root, '.git', 'other-index')
+        shutil.copy(os.path.join(self.root, '.git', 'index'), other)
+        write(self.root, 'b.py', 'b')
+        subprocess.check_call(['git', 'add', 'b.py'], cwd=self.root, env=dict(os.environ, GIT_INDEX_FILE=other))
+
+        self.assertEqual(([], [], []), self.changes())
+        self.assertEqual((['b.py'], [], []), self.changes(other))
+
+    def test_no_commits_yet___every_entry_is_added(self):
+        write(self.root, 'a.py', 'a')
+        write(self.root, 'b/c.py', 'c')
+        git(self.root, 'add', '-A')
+
+        self.assertEqual((['a.py', 'b/c.py'], [], []), self.changes())
+
+    def test_head_is_detached_and_refs_are_packed___changes_are_found(self):
+        write(self.root, 'a.py', 'a')
+        self.commit()
+        git(self.root, 'pack-refs', '--all')
+        write(self.root, 'a.py', 'b')
+        git(self.root, 'add', '-A')
+
+        self.assertEqual(([], ['a.py'], []), self.changes())
+
+        git(self.root, 'checkout', '-q', '--detach')
+        self.assertEqual(([], ['a.py'], []), self.changes())
+
+
+class IndexUnsupported(IndexFixtureTestCase):
+    def test_index_is_split___unsupported_index_is_raised(self):
+        write(self.root, 'a.py', 'a')
+        self.commit()
+        git(self.root, 'update-index', '--split-index')
+
+        self.assertRaises(index.UnsupportedIndex, self.changes)
+
+    def test_index_has_an_unknown_version___unsupported_index_is_raised(self):
+        write(self.root, 'a.py', 'a')
+        self.commit()
+
+        path = os.path.join(self.root, '.git', 'index')
+        with open(path, 'r+b') as f:
+            f.seek(4)
+            f.write(struct.pack('>I', 5))
+
+        self.assertRaises(index.UnsupportedIndex, self.changes)
+
+    def test_index_is_truncated___unsupported_index_is_raised(self):
+        write(self.root, 'a.py', 'a')
+        self.commit()
+
+        path = os.path.join(self.root, '.git', 'index')
+        with open(path, 'r+b') as f:
+            f.truncate(40)
+
+        self.assertRaises(index.UnsupportedIndex, self.changes)
+
+    def test_index_is_missing___unsupported_index_is_raised(self):
+        write(self.root, 'a.py', 'a')
+        self.commit()
+        os.remove(os.path.join(self.root, '.git', 'index'))
+
+        self.assertRaises(index.UnsupportedIndex, self.changes)
+
+
+class RepoIndexBackend(IndexFixtureTestCase):
+    def test_backend_is_enabled___repo_files_come_from_the_index_reader(self):
+        write(self.root, 'a.py', 'a')
+        write(self.root, 'b.py', 'b')
+        self.commit()
+        write(self.root, 'a.py', 'changed')
+        write(self.root, 'c.py', 'c')
+        os.remove(os.path.join(self.root, 'b.py'))
+        git(self.root, 'add', '-A')
+
+        with patch.dict(os.environ, {'GIT_DIR': os.path.join(self.root, '.git'), 'GIT_HOOKS_INDEX_BACKEND': 'mmap'}), self.locate():
+            with patch('githooks.repo.get') as get_mock:
+                self.assertEqual([os.path.join(self.root, 'c.py')], repo.added_files())
+                self.assertEqual([os.path.join(self.root, 'a.py')], repo.modified_files())
+                self.assertEqual([os.path.join(self.root, 'b.py')], repo.deleted_files())
+                get_mock.assert_not_called()
+
+    def test_index_is_unsupported___gitpython_is_used(self):
+        write(self.root, 'a.py', 'a')
+        self.commit()
+        write(self.root, 'a.py', 'changed')
+        git(self.root, 'add', '-A')
+        git(self.root, 'update-index', '--split-index')
+
+        with patch.dict(os.environ, {'GIT_DIR': os.path.join(self.root, '.git'), 'GIT_HOOKS_INDEX_BACKEND': 'mmap'}), self.locate():
+            self.assertEqual([os.path.join(self.root, 'a.py')], repo.modified_files())
+
+    def test_index_file_is_set_in_the_environment___it_is_used(self):
+        with patch.dict(os.environ, {'GIT_INDEX_FILE': '/tmp/other-index'}):
+            self.assertEqual('/tmp/other-index', repo.index_path())
+
+    def test_index_file_is_not_set___the_index_in_the_git_dir_is_used(self):
+        with patch('githooks.repo._locate', return_value=('/repo/.git', '/repo')), patch.dict(os.environ, {}):
+            os.environ.pop('GIT_INDEX_FILE', None)
+            self.assertEqual('/repo/.git/index', repo.index_path())
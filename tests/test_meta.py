@@ -0,0 +1,229 @@
+import shutil
+import tempfile
+
+import os
+from hypothesis import given
+from hypothesis.strategies import lists, text
+from unittest2 import TestCase
+
+from githooks import meta, plugins
+
+
+class MetaParseHeader(TestCase):
+    def test_fields_are_in_the_header___fields_are_returned(self):
+        lines = [
+            '#!/usr/bin/env python\n',
+            '# A hook that checks things\n',
+            '# githooks-requirements: flake8==6.0.0\n',
+            '#githooks-requirements : flake8-bugbear\n',
+            '\n',
+            '# githooks-other: value  \n',
+            'import sys\n',
+            '# githooks-ignored: after the header\n',
+        ]
+
+        self.assertEqual(
+            {'requirements': 'flake8==6.0.0 flake8-bugbear', 'other': 'value'},
+            meta.parse_header(lines),
+        )
+
+    def test_header_is_longer_than_the_maximum___later_fields_are_ignored(self):
+        lines = ['#\n'] * meta.HEADER_MAX_LINES + ['# githooks-requirements: flake8\n']
+
+        self.assertEqual({}, meta.parse_header(lines))
+
+
+class MetaReadHeader(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'hook')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_hook_is_changed___new_fields_are_read(self):
+        with open(self.path, 'w') as f:
+            f.write('#!/bin/sh\n# githooks-requirements: one\n')
+        self.assertEqual({'requirements': 'one'}, meta.read_header(self.path))
+
+        with open(self.path, 'w') as f:
+            f.write('#!/bin/sh\n# githooks-requirements: one two\n')
+        self.assertEqual({'requirements': 'one two'}, meta.read_header(self.path))
+
+    def test_hook_does_not_exist___result_is_empty(self):
+        self.assertEqual({}, meta.read_header(self.path))
+
+
+class MetaSplitList(TestCase):
+    @given(lists(text(min_size=1, alphabet='abc=.0123456789-'), max_size=5))
+    def test_items_are_separated_by_whitespace_or_commas___items_are_returned(self, items):
+        self.assertEqual(items, meta.split_list(', \n'.join(items)))
+
+    def test_value_is_none___result_is_empty(self):
+        self.assertEqual([], meta.split_list(None))
+
+
+class MetaHookName(TestCase):
+    def test_hook_is_a_script___name_is_its_file_name(self):
+        self.assertEqual('flake8', meta.hook_name('/repo/.git/hooks/pre-commit.d/flake8'))
+        self.assertFalse(meta.is_plugin('/repo/.git/hooks/pre-commit.d/flake8'))
+
+    def test_hook_is_a_plugin___name_is_prefixed(self):
+        self.assertEqual('plugin:check', meta.hook_name(plugins.PluginHook('check', 'pkg:check')))
+
+
+class MetaConfigSection(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_git_hooks_cfg_exists___section_is_read_from_it(self):
+        with open(os.path.join(self.root, 'git-hooks.cfg'), 'w') as f:
+            f.write('[requirements]\nflake8 = flake8==6.0.0\n    flake8-bugbear\n')
+        with open(os.path.join(self.root, 'setup.cfg'), 'w') as f:
+            f.write('[git-hooks.requirements]\nflake8 = other\n')
+
+        self.assertEqual({'flake8': 'flake8==6.0.0\nflake8-bugbear'}, meta.config_section(self.root, 'requirements'))
+
+    def test_only_setup_cfg_exists___prefixed_section_is_read(self):
+        with open(os.path.join(self.root, 'setup.cfg'), 'w') as f:
+            f.write('[git-hooks.requirements]\nflake8 = flake8\n')
+
+        self.assertEqual({'flake8': 'flake8'}, meta.config_section(self.root, 'requirements'))
+
+    def test_section_does_not_exist___result_is_empty(self):
+        self.assertEqual({}, meta.config_section(self.root, 'requirements'))
+
+    def test_config_files_exist___path_of_the_file_read_is_given(self):
+        self.assertIsNone(meta.config_path(self.root))
+
+        open(os.path.join(self.root, 'setup.cfg'), 'w').close()
+        self.assertEqual(os.path.join(self.root, 'setup.cfg'), meta.config_path(self.root))
+
+        open(os.path.join(self.root, 'git-hooks.cfg'), 'w').close()
+        self.assertEqual(os.path.join(self.root, 'git-hooks.cfg'), meta.config_path(self.root))
+
+
+class MetaHookRequirements(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write_hook(self, name, content):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_hook_has_a_header___header_is_used_over_the_config(self):
+        path = self.write_hook('flake8', '#!/bin/sh\n# githooks-requirements: flake8, flake8==6.0.0 flake8\n')
+
+        self.assertEqual(['flake8', 'flake8==6.0.0'], meta.hook_requirements(path, {'flake8': 'other'}))
+
+    def test_hook_has_no_header___config_entry_for_the_hook_is_used(self):
+        path = self.write_hook('Flake8', '#!/bin/sh\n')
+
+        self.assertEqual(['flake8==6.0.0'], meta.hook_requirements(path, {'flake8': 'flake8==6.0.0'}))
+        self.assertEqual([], meta.hook_requirements(path))
+
+
+class MetaParseSize(TestCase):
+    def test_size_has_a_unit___size_is_in_bytes(self):
+        self.assertEqual([500, 200 * 1024, 2 * 1024 ** 2, 2 * 1024 ** 2, 1024 ** 3], [meta.parse_size(v) for v in ['500', '200K', '2M', '2 MiB', '1gb']])
+
+    def test_size_is_invalid___value_error_is_raised(self):
+        self.assertRaises(ValueError, meta.parse_size, 'big')
+
+
+class MetaHookExclusions(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write_hook(self, name, content):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_hook_has_header_fields___exclusions_are_read_from_them(self):
+        path = self.write_hook('flake8', '#!/bin/sh\n# githooks-exclude: Binary, lfs\n# githooks-max-size: 1M\n')
+
+        self.assertEqual(({'binary', 'lfs'}, 1024 ** 2), meta.hook_exclusions(path, {'flake8': ''}, {'flake8': '5K'}))
+
+    def test_hook_has_no_header_fields___exclusions_are_read_from_the_config(self):
+        path = self.write_hook('flake8', '#!/bin/sh\n')
+
+        self.assertEqual(({'lfs'}, 5 * 1024), meta.hook_exclusions(path, {'flake8': 'lfs'}, {'flake8': '5K'}))
+        self.assertEqual((set(), None), meta.hook_exclusions(path))
+
+    def test_exclusion_is_unknown___value_error_is_raised(self):
+        path = self.write_hook('flake8', '#!/bin/sh\n# githooks-exclude: images\n')
+
+        self.assertRaises(ValueError, meta.hook_exclusions, path)
+
+
+class MetaHookDeferred(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_hook_is_deferred_in_the_header_or_config___mode_is_returned(self):
+        path = os.path.join(self.root, 'mypy')
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\n# githooks-deferred: Yes\n')
+
+        self.assertEqual('always', meta.hook_deferred(path))
+        self.assertEqual('never', meta.hook_deferred(os.path.join(self.root, 'flake8'), {'flake8': 'never'}))
+
+    def test_mode_is_missing_or_unknown___result_is_none(self):
+        self.assertIsNone(meta.hook_deferred(os.path.join(self.root, 'flake8')))
+        self.assertIsNone(meta.hook_deferred(os.path.join(self.root, 'flake8'), {'flake8': 'later'}))
+
+
+class MetaHookIsFixer(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_hook_is_a_fixer_in_the_header_or_config___result_is_true(self):
+        path = os.path.join(self.root, 'black')
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\n# githooks-fixer: Yes\n')
+
+        self.assertTrue(meta.hook_is_fixer(path))
+        self.assertTrue(meta.hook_is_fixer(os.path.join(self.root, 'isort'), {'isort': 'true'}))
+
+    def test_fixer_is_missing_or_disabled___result_is_false(self):
+        self.assertFalse(meta.hook_is_fixer(os.path.join(self.root, 'flake8')))
+        self.assertFalse(meta.hook_is_fixer(os.path.join(self.root, 'flake8'), {'flake8': 'no'}))
+
+
+class MetaHookResultsFormat(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_format_is_in_the_header_or_config___it_is_returned(self):
+        path = os.path.join(self.root, 'flake8')
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\n# githooks-results: JSONL\n')
+
+        self.assertEqual('jsonl', meta.hook_results_format(path))
+        self.assertEqual('jsonl', meta.hook_results_format(os.path.join(self.root, 'other'), {'other': 'jsonl'}))
+
+    def test_format_is_missing_or_unknown___result_is_none(self):
+        self.assertIsNone(meta.hook_results_format(os.path.join(self.root, 'flake8')))
+        self.assertIsNone(meta.hook_results_format(os.path.join(self.root, 'flake8'), {'flake8': 'xml'}))
@@ -0,0 +1,243 @@
+import pickle
+import shutil
+import tempfile
+
+import os
+from mock import patch
+from unittest2 import TestCase
+
+from githooks import cache, finders, meta, plugins, repo, runners
+
+
+def passing_plugin(changes):
+    print(u'checked {0}'.format(','.join(changes.files)))
+
+
+def failing_plugin(changes):
+    print(u'{0} is wrong'.format(changes.files[0]))
+    return False
+
+
+def status_plugin(changes):
+    return 3
+
+
+def broken_plugin(changes):
+    raise RuntimeError('broken')
+
+
+def change_set_plugin(changes):
+    print(u'{0} {1} {2}'.format(changes.hook_type, changes.root, changes.changes[0].old_path))
+
+
+class PluginsChangeSet(TestCase):
+    def test_manifest_is_given___details_are_converted_to_tuples(self):
+        change_set = plugins.change_set({
+            'hook_type': 'pre-commit',
+            'root': '/repo',
+            'added': ['/repo/new.py'],
+            'modified': [],
+            'deleted': [],
+            'changed_lines': {'/repo/new.py': [[1, 4]]},
+            'file_info': {'/repo/new.py': {'size': 10, 'binary': False, 'lfs': False}},
+            'changes': [{'status': 'A', 'path': '/repo/new.py', 'old_path': None, 'similarity': None, 'old_oid': None, 'new_oid': 'a' * 40}],
+        }, ['/repo/new.py'])
+
+        self.assertEqual('pre-commit', change_set.hook_type)
+        self.assertEqual(['/repo/new.py'], change_set.files)
+        self.assertEqual({'/repo/new.py': [(1, 4)]}, change_set.changed_lines)
+        self.assertEqual(repo.FileInfo(10, False, False), change_set.file_info['/repo/new.py'])
+        self.assertEqual(repo.FileChange('A', '/repo/new.py', None, None, None, 'a' * 40), change_set.changes[0])
+
+    def test_there_is_no_manifest___only_the_files_are_given(self):
+        change_set = plugins.change_set(None, ['a.py'])
+
+        self.assertEqual(plugins.ChangeSet(None, None, ['a.py'], [], [], [], [], {}, {}), change_set)
+
+
+class PluginsFindPlugins(TestCase):
+    def test_names_are_registered___hooks_are_returned_in_the_order_of_the_names(self):
+        with patch('githooks.plugins.iter_entry_points', return_value=[('first', 'pkg:first'), ('second', 'pkg.mod:second')]):
+            hooks = plugins.find_plugins(['second', 'missing', 'first'])
+
+        self.assertEqual(['plugin:second', 'plugin:first'], [str(h) for h in hooks])
+        self.assertEqual(['second', 'first'], [h.name for h in hooks])
+        self.assertEqual(['pkg.mod:second', 'pkg:first'], [h.target for h in hooks])
+
+    def test_no_names_are_given___entry_points_are_not_loaded(self):
+        with patch('githooks.plugins.iter_entry_points') as iter_mock:
+            self.assertEqual([], plugins.find_plugins([]))
+
+        iter_mock.assert_not_called()
+
+
+class PluginsPluginHook(TestCase):
+    def test_hook_is_pickled___name_and_target_are_kept(self):
+        hook = pickle.loads(pickle.dumps(plugins.PluginHook('check', 'tests.test_plugins:passing_plugin')))
+
+        self.assertEqual(plugins.PluginHook('check', 'tests.test_plugins:passing_plugin'), hook)
+        self.assertEqual('plugin:check', str(hook))
+        self.assertEqual('check', hook.name)
+        self.assertEqual('tests.test_plugins:passing_plugin', hook.target)
+
+    def test_hook_is_not_a_path___it_is_not_a_string_and_is_checked_as_a_plugin(self):
+        hook = plugins.PluginHook('check', 'tests.test_plugins:passing_plugin')
+
+        self.assertNotIsInstance(hook, str)
+        self.assertTrue(meta.is_plugin(hook))
+        self.assertFalse(meta.is_plugin('/hooks/plugin:check'))
+        self.assertNotEqual('plugin:check', hook)
+
+    def test_metadata_is_read___fields_come_from_the_hook_and_config_without_touching_the_filesystem(self):
+        hook = plugins.PluginHook('check', 'tests.test_plugins:passing_plugin', {'results': 'jsonl'})
+
+        with patch('githooks.meta.os.stat') as stat_mock:
+            self.assertEqual('jsonl', meta.hook_field(hook, 'results'))
+            self.assertEqual('binary', meta.hook_field(hook, 'exclude', {'plugin:check': 'binary'}))
+            self.assertIsNone(meta.hook_field(hook, 'fixer'))
+
+        stat_mock.assert_not_called()
+
+    def test_module_source_changes___digest_changes(self):
+        root = tempfile.mkdtemp()
+        try:
+            path = os.path.join(root, 'githooks_test_plugin_module.py')
+            with open(path, 'w') as f:
+                f.write('def check(changes):\n    pass\n')
+
+            hook = plugins.PluginHook('check', 'githooks_test_plugin_module:check')
+            with patch('sys.path', [root]):
+                first = hook.digest
+                with open(path, 'w') as f:
+                    f.write('def check(changes):\n    return False\n')
+                second = hook.digest
+
+            self.assertNotEqual(first, second)
+        finally:
+            shutil.rmtree(root)
+
+    def test_module_cannot_be_found___digest_is_based_on_the_target(self):
+        self.assertEqual(
+            plugins.PluginHook('a', 'githooks_missing_module:check').digest,
+            plugins.PluginHook('b', 'githooks_missing_module:check').digest,
+        )
+
+    def test_hook_is_given_to_the_result_cache___digest_is_used_as_the_hook_hash(self):
+        hook = plugins.PluginHook('check', 'tests.test_plugins:passing_plugin')
+
+        self.assertEqual(hook.digest, cache.ResultCache(tempfile.gettempdir()).hook_hash(hook))
+
+
+class PluginsPluginPool(TestCase):
+    def setUp(self):
+        self.pool = plugins.PluginPool(plugins.change_set({'hook_type': 'pre-commit', 'root': '/repo'}, ['/repo/a.py', '/repo/b.py']), 2)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_plugin_returns_none___status_is_0_and_output_is_captured(self):
+        self.assertEqual(
+            (0, 'checked /repo/a.py,/repo/b.py'),
+            self.pool.run(plugins.PluginHook('check', 'tests.test_plugins:passing_plugin')),
+        )
+
+    def test_plugin_is_given_its_own_files___plugin_sees_those_files(self):
+        self.assertEqual(
+            (1, '/repo/b.py is wrong'),
+            self.pool.run(plugins.PluginHook('check', 'tests.test_plugins:failing_plugin'), ['/repo/b.py']),
+        )
+
+    def test_plugin_returns_an_integer___integer_is_the_status(self):
+        self.assertEqual((3, ''), self.pool.run(plugins.PluginHook('check', 'tests.test_plugins:status_plugin')))
+
+    def test_plugin_raises___status_is_1_and_the_traceback_is_the_output(self):
+        status, output = self.pool.run(plugins.PluginHook('check', 'tests.test_plugins:broken_plugin'))
+
+        self.assertEqual(1, status)
+        self.assertIn('RuntimeError: broken', output)
+
+    def test_plugin_cannot_be_imported___status_is_1(self):
+        status, output = self.pool.run(plugins.PluginHook('check', 'githooks_missing_module:check'))
+
+        self.assertEqual(1, status)
+        self.assertIn('githooks_missing_module', output)
+
+
+class PluginsHookFinder(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, '.git', 'hooks', 'pre-commit.d'))
+        with open(os.path.join(self.root, '.git', 'hooks', 'pre-commit.d', 'script'), 'w') as f:
+            f.write('#!/bin/sh\n')
+
+        with open(os.path.join(self.root, 'git-hooks.cfg'), 'w') as f:
+            f.write('[plugins]\npre-commit = check\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_plugin_is_enabled_for_the_hook_type___plugin_is_found_after_the_scripts(self):
+        with patch('githooks.plugins.iter_entry_points', return_value=[('check', 'tests.test_plugins:passing_plugin')]):
+            found = list(finders.HookFinder('pre-commit', self.root))
+
+        self.assertEqual([os.path.join(self.root, '.git', 'hooks', 'pre-commit.d', 'script'), 'plugin:check'], [str(h) for h in found])
+        self.assertIsInstance(found[1], plugins.PluginHook)
+
+    def test_plugins_are_disabled_by_the_environment___only_scripts_are_found(self):
+        with patch('githooks.plugins.iter_entry_points', return_value=[('check', 'tests.test_plugins:passing_plugin')]), \
+                patch.dict(os.environ, {'GIT_HOOKS_PLUGINS': '0'}):
+            found = list(finders.HookFinder('pre-commit', self.root))
+
+        self.assertEqual([os.path.join(self.root, '.git', 'hooks', 'pre-commit.d', 'script')], found)
+
+    def test_plugin_is_enabled_for_another_hook_type___plugin_is_not_found(self):
+        with patch('githooks.plugins.iter_entry_points', return_value=[('check', 'tests.test_plugins:passing_plugin')]):
+            self.assertEqual([], list(finders.HookFinder('commit-msg', self.root)))
+
+
+class PluginsRunner(TestCase):
+    def setUp(self):
+        self.runner = runners.PreCommitHookRunner(jobs=2)
+        self.runner.cache_class = None
+        self.runner.snapshot_class = None
+        self.runner._config_sections = {'exclude': {}, 'max-size': {}, 'results': {}, 'requirements': {}, 'fixers': {}}
+        self.runner._files = {
+            'added': [], 'modified': ['/repo/a.py', '/repo/b.py'], 'deleted': [], 'changed_lines': {}, 'file_info': {},
+            'unstaged': [], 'changes': [repo.FileChange('R', '/repo/b.py', '/repo/old.py', 90, 'a' * 40, 'b' * 40)],
+        }
+
+    def run_hooks(self, hooks):
+        with patch('githooks.runners.repo.repo_root', return_value='/repo'):
+            args, size = self.runner.build_args()
+            return dict((r.hook, r) for r in self.runner.run_hooks(hooks, args, size))
+
+    def test_plugins_are_ran___results_are_returned_and_the_pool_is_closed(self):
+        passing = plugins.PluginHook('passing', 'tests.test_plugins:passing_plugin')
+        failing = plugins.PluginHook('failing', 'tests.test_plugins:failing_plugin')
+
+        results = self.run_hooks([passing, failing])
+
+        self.assertEqual(0, results[passing].status)
+        self.assertEqual('checked /repo/a.py,/repo/b.py', results[passing].output)
+        self.assertEqual(1, results[failing].status)
+        self.assertIsNone(self.runner.plugin_pool)
+
+    def test_plugin_is_ran___change_set_is_built_from_the_manifest(self):
+        hook = plugins.PluginHook('changes', 'tests.test_plugins:change_set_plugin')
+
+        self.assertEqual('pre-commit /repo /repo/old.py', self.run_hooks([hook])[hook].output)
+
+    def test_plugin_excludes_files___plugin_is_given_the_remaining_files(self):
+        self.runner._config_sections['exclude'] = {'plugin:passing': 'binary'}
+        self.runner._files['file_info'] = {'/repo/a.py': repo.FileInfo(10, True, False), '/repo/b.py': repo.FileInfo(10, False, False)}
+        hook = plugins.PluginHook('passing', 'tests.test_plugins:passing_plugin')
+
+        self.assertEqual('checked /repo/b.py', self.run_hooks([hook])[hook].output)
+
+    def test_plugin_is_ran_outside_of_a_run___plugin_is_ran_in_its_own_pool(self):
+        hook = plugins.PluginHook('passing', 'tests.test_plugins:passing_plugin')
+
+        with patch('githooks.runners.repo.repo_root', return_value='/repo'):
+            result = self.runner.run_hook(hook, ['/repo/a.py', '--modified-files', '/repo/a.py'], capture=True)
+
+        self.assertEqual(runners.HookResult(hook, 0, result.duration, 'checked /repo/a.py', False), result)
@@ -0,0 +1,91 @@
+import pstats
+import shutil
+import sys
+import tempfile
+
+import os
+from mock import Mock
+from unittest2 import TestCase, skipIf
+
+from githooks import profiling
+
+
+class ProfilingTestCase(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write_hook(self, name, content):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        os.chmod(path, 0o755)
+        return path
+
+
+class ProfilingParseImportTimes(TestCase):
+    def test_import_lines_are_given___top_level_imports_are_returned_slowest_first(self):
+        lines = [
+            'import time: self [us] | cumulative | imported package',
+            'import time:       100 |        100 |   _json',
+            'import time:       200 |        300 | json',
+            'import time:       500 |       5000 | asyncio',
+            'import time:       bad |        bad | broken',
+        ]
+
+        self.assertEqual([('asyncio', 0.005), ('json', 0.0003)], profiling.parse_import_times(lines))
+
+
+@skipIf(sys.version_info < (3, 7), '-X importtime needs python 3.7')
+class ProfilingProfileHook(ProfilingTestCase):
+    def test_hook_is_python___imports_are_counted_as_startup_and_status_is_kept(self):
+        path = self.write_hook('hook', '#!{0}\nimport json\nimport sys\nprint(sys.argv[1:])\nsys.exit(3)\n'.format(sys.executable))
+
+        profile = profiling.profile_hook(path, ['a.py'])
+
+        self.assertTrue(profile.python)
+        self.assertEqual(3, profile.status)
+        self.assertEqual("['a.py']", profile.output)
+        self.assertIn('json', [module for module, _ in profile.imports])
+        self.assertNotIn('runpy', [module for module, _ in profile.imports])
+        self.assertAlmostEqual(profile.wall, profile.startup + profile.work)
+        self.assertIsNone(profile.stats_path)
+
+    def test_stats_path_is_given___cprofile_stats_are_saved(self):
+        path = self.write_hook('hook', '#!{0}\ndef check():\n    return 1\ncheck()\n'.format(sys.executable))
+        stats_path = os.path.join(self.root, 'hook.pstats')
+
+        profile = profiling.profile_hook(path, [], stats_path)
+
+        self.assertEqual(stats_path, profile.stats_path)
+        self.assertTrue(any(func[2] == 'check' for func in pstats.Stats(stats_path).stats))
+
+    def test_hook_is_not_python___only_wall_and_cpu_time_are_recorded(self):
+        path = self.write_hook('hook', '#!/bin/sh\necho out\necho err >&2\nexit 2\n')
+
+        profile = profiling.profile_hook(path, [])
+
+        self.assertFalse(profile.python)
+        self.assertEqual(2, profile.status)
+        self.assertEqual('out\nerr', profile.output)
+        self.assertIsNone(profile.startup)
+        self.assertIsNotNone(profile.user)
+
+
+class ProfilingProfileHooks(ProfilingTestCase):
+    def test_hooks_are_found___each_is_profiled_in_a_stats_dir_slowest_first(self):
+        fast = self.write_hook('fast', '#!/bin/sh\nexit 0\n')
+        slow = self.write_hook('slow', '#!/bin/sh\nsleep 0.2\n')
+        runner = Mock()
+        runner.build_args.return_value = (['a.py'], 1)
+        runner.get_subprocess_kwargs.return_value = {}
+        runner.get_finder.return_value = [fast, slow]
+        runner.get_hook_env.return_value = None
+        runner.get_manifest.return_value = None
+
+        profiles = profiling.profile_hooks(runner, os.path.join(self.root, 'stats'))
+
+        self.assertEqual([slow, fast], [p.hook for p in profiles])
+        self.assertTrue(os.path.isdir(os.path.join(self.root, 'stats')))
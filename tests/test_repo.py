@@ -1,6 +1,10 @@
+import shutil
 import string
+import subprocess
+import tempfile
 from unittest2 import TestCase
 
+import git
 import os
 from hypothesis import given
 from hypothesis.strategies import text, lists
@@ -32,15 +36,62 @@ class RepoGet(TestCase):
 
 
 class RepoRepoRoot(TestCase):
+    def setUp(self):
+        self.root = os.path.realpath(tempfile.mkdtemp())
+        git.Repo.init(self.root)
+        os.makedirs(os.path.join(self.root, 'sub'))
+        self.cwd = os.getcwd()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root)
+
     @patch('githooks.repo.get')
-    def test_result_is_the_parent_directory_of_the_git_directory(self, get_mock):
-        git_dir = os.path.dirname(__file__)
-        result = Mock()
-        result.git_dir = git_dir
+    def test_ran_from_a_sub_directory___root_and_git_dir_are_found_without_the_repo_object(self, get_mock):
+        os.chdir(os.path.join(self.root, 'sub'))
 
-        get_mock.return_value = result
+        with patch.dict('os.environ', {}, clear=True), patch('githooks.repo._git_output', wraps=repo._git_output) as git_mock:
+            self.assertEqual(self.root, repo.repo_root())
+            self.assertEqual(os.path.join(self.root, '.git'), repo.git_dir())
+            self.assertEqual(self.root, repo.repo_root())
+
+        self.assertEqual(1, git_mock.call_count)
+        get_mock.assert_not_called()
+
+    def test_ran_from_a_linked_worktree___root_is_the_worktree(self):
+        git_commit(self.root)
+        worktree = os.path.join(self.root, 'sub', 'linked')
+        subprocess.check_call(['git', 'worktree', 'add', '-q', '--detach', worktree], cwd=self.root)
+        os.chdir(worktree)
+
+        with patch.dict('os.environ', {}, clear=True):
+            self.assertEqual(worktree, repo.repo_root())
+            self.assertEqual(os.path.join(self.root, '.git', 'worktrees', 'linked'), repo.git_dir())
+
+
+class RepoHeadCommit(TestCase):
+    def test_repo_has_a_commit___its_id_is_returned(self):
+        root = tempfile.mkdtemp()
+        try:
+            git.Repo.init(root)
+            git_commit(root)
+
+            self.assertEqual(git.Repo(root).head.commit.hexsha, repo.head_commit(root))
+        finally:
+            shutil.rmtree(root)
 
-        self.assertEqual(os.path.dirname(git_dir), repo.repo_root())
+
+class RepoHeadTree(TestCase):
+    def test_repo_has_a_commit___its_tree_is_returned(self):
+        root = tempfile.mkdtemp()
+        try:
+            git.Repo.init(root)
+            self.assertIsNone(repo.head_tree(root))
+
+            git_commit(root)
+            self.assertEqual(git.Repo(root).head.commit.tree.hexsha, repo.head_tree(root))
+        finally:
+            shutil.rmtree(root)
 
 
 class RepoUntrackedFiles(TestCase):
@@ -135,3 +186,560 @@ class RepoDeletedFiles(TestCase):
 
             self.assertEqual([os.path.join(repo.repo_root(), f) for f in deleted], files)
             result.head.commit.diff.assert_called_once_with()
+
+
+class RepoGetWithGitDir(TestCase):
+    @patch('githooks.repo.git')
+    def test_git_dir_is_in_the_environment___repo_is_created_from_it_without_searching(self, git_mock):
+        git_mock.Repo = Mock(return_value='git repo')
+
+        with patch.dict('os.environ', {'GIT_DIR': '.git'}):
+            self.assertEqual('git repo', repo.get())
+
+        git_mock.Repo.assert_called_once_with(os.path.abspath('.git'))
+
+
+class RepoHasStagedChanges(TestCase):
+    def setUp(self):
+        self.repo_dir = tempfile.mkdtemp()
+        self.repo = git.Repo.init(self.repo_dir)
+        self.repo.git.commit('--allow-empty', '-m', 'initial', author='a <a@b>', env={'GIT_COMMITTER_NAME': 'a', 'GIT_COMMITTER_EMAIL': 'a@b'})
+
+    def tearDown(self):
+        shutil.rmtree(self.repo_dir)
+
+    def test_index_matches_head___result_is_false(self):
+        with patch('githooks.repo.repo_root', Mock(return_value=self.repo_dir)):
+            self.assertFalse(repo.has_staged_changes())
+
+    def test_file_is_staged___result_is_true(self):
+        with open(os.path.join(self.repo_dir, 'a'), 'w') as f:
+            f.write('a')
+        self.repo.index.add(['a'])
+        self.repo.index.write()
+
+        with patch('githooks.repo.repo_root', Mock(return_value=self.repo_dir)):
+            self.assertTrue(repo.has_staged_changes())
+
+
+class RepoFindGitDir(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_git_is_a_directory___directory_is_returned(self):
+        os.mkdir(os.path.join(self.dir, '.git'))
+
+        self.assertEqual(os.path.join(self.dir, '.git'), repo.find_git_dir(self.dir))
+
+    def test_git_is_a_file___referenced_directory_is_returned(self):
+        sub = os.path.join(self.dir, 'sub')
+        os.makedirs(os.path.join(self.dir, '.git', 'modules', 'sub'))
+        os.mkdir(sub)
+        with open(os.path.join(sub, '.git'), 'w') as f:
+            f.write('gitdir: ../.git/modules/sub\n')
+
+        self.assertEqual(os.path.join(self.dir, '.git', 'modules', 'sub'), repo.find_git_dir(sub))
+        self.assertEqual(os.path.join(self.dir, '.git', 'modules', 'sub', 'hooks', 'pre-commit.d'), repo.hook_type_directory('pre-commit', sub))
+
+    def test_git_file_is_a_worktree___common_directory_is_returned(self):
+        tree = os.path.join(self.dir, 'tree')
+        worktree_git_dir = os.path.join(self.dir, '.git', 'worktrees', 'tree')
+        os.makedirs(worktree_git_dir)
+        os.mkdir(tree)
+        with open(os.path.join(tree, '.git'), 'w') as f:
+            f.write('gitdir: {0}\n'.format(worktree_git_dir))
+        with open(os.path.join(worktree_git_dir, 'commondir'), 'w') as f:
+            f.write('../..\n')
+
+        self.assertEqual(os.path.join(self.dir, '.git'), repo.find_git_dir(tree))
+
+    def test_git_file_has_unknown_content___file_path_is_returned(self):
+        with open(os.path.join(self.dir, '.git'), 'w') as f:
+            f.write('something else')
+
+        self.assertEqual(os.path.join(self.dir, '.git'), repo.find_git_dir(self.dir))
+
+
+class RepoFindRepos(TestCase):
+    def test_nested_repos_and_submodules_are_found(self):
+        top = tempfile.mkdtemp()
+        try:
+            for d in ['a/.git', 'a/sub', 'b/c/.git', 'd', 'a/.git/nested/.git']:
+                os.makedirs(os.path.join(top, d))
+            with open(os.path.join(top, 'a', 'sub', '.git'), 'w') as f:
+                f.write('gitdir: ../.git/modules/sub')
+
+            self.assertEqual(
+                [os.path.join(top, 'a'), os.path.join(top, 'a', 'sub'), os.path.join(top, 'b', 'c')],
+                list(repo.find_repos(top)),
+            )
+        finally:
+            shutil.rmtree(top)
+
+
+class RepoSubmoduleFilesExcluded(TestCase):
+    def test_submodule_pointer_changes_are_not_in_the_file_lists(self):
+        file_diff = FakeDiffObject('a', 'a', False, False)
+        submodule_diff = FakeDiffObject('lib', 'lib', False, False)
+        submodule_diff.a_mode = submodule_diff.b_mode = repo.SUBMODULE_MODE
+
+        with patch('githooks.repo.get') as get_mock, patch('githooks.repo._locate', return_value=('/repo/.git', '/repo')):
+            get_mock.return_value = Mock(git_dir='/repo/.git')
+            get_mock.return_value.head.commit.diff = Mock(return_value=[file_diff, submodule_diff])
+
+            self.assertEqual(['/repo/a'], repo.modified_files())
+
+
+def git_commit(path, message='commit'):
+    subprocess.check_call(['git', '-c', 'user.name=a', '-c', 'user.email=a@b', 'commit', '-q', '--allow-empty', '-m', message], cwd=path)
+
+
+class RepoSubmoduleChanges(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.sub_src = os.path.join(self.dir, 'src')
+        self.root = os.path.join(self.dir, 'super')
+
+        git.Repo.init(self.sub_src)
+        self._write(self.sub_src, 'x.py', '1')
+        self._write(self.sub_src, 'old.py', '1')
+        subprocess.check_call(['git', 'add', '.'], cwd=self.sub_src)
+        git_commit(self.sub_src)
+
+        git.Repo.init(self.root)
+        subprocess.check_call(['git', '-c', 'protocol.file.allow=always', 'submodule', '-q', 'add', self.sub_src, 'lib'], cwd=self.root)
+        git_commit(self.root)
+
+        self.lib = os.path.join(self.root, 'lib')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self, root, name, content):
+        with open(os.path.join(root, name), 'w') as f:
+            f.write(content)
+
+    def test_nothing_has_changed___result_is_empty(self):
+        self.assertEqual([], repo.submodule_changes(root=self.root))
+
+    def test_repo_has_no_submodules___result_is_empty(self):
+        self.assertEqual([], repo.submodule_changes(root=self.sub_src))
+
+    def test_pointer_and_staged_changes___files_inside_the_submodule_are_reported(self):
+        self._write(self.lib, 'x.py', '2')
+        self._write(self.lib, 'y.py', 'y')
+        subprocess.check_call(['git', 'add', '.'], cwd=self.lib)
+        subprocess.check_call(['git', 'rm', '-q', 'old.py'], cwd=self.lib)
+        git_commit(self.lib)
+        subprocess.check_call(['git', 'add', 'lib'], cwd=self.root)
+
+        self._write(self.lib, 'z.py', 'z')
+        subprocess.check_call(['git', 'add', 'z.py'], cwd=self.lib)
+
+        changes = repo.submodule_changes(jobs=2, root=self.root)
+
+        self.assertEqual([repo.SubmoduleChanges(
+            'lib',
+            self.lib,
+            [os.path.join(self.lib, 'y.py'), os.path.join(self.lib, 'z.py')],
+            [os.path.join(self.lib, 'x.py')],
+            [os.path.join(self.lib, 'old.py')],
+        )], changes)
+        self.assertEqual({'lib'}, set(repo.staged_submodule_pointers(self.root)))
+
+
+class RepoIterFiles(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        git.Repo.init(self.root)
+
+        for name in ['a.py', 'b.py', os.path.join('dir', 'c.py'), 'gone.py']:
+            if os.path.dirname(name):
+                os.makedirs(os.path.join(self.root, os.path.dirname(name)))
+            with open(os.path.join(self.root, name), 'w') as f:
+                f.write(name)
+
+        subprocess.check_call(['git', 'add', '.'], cwd=self.root)
+        git_commit(self.root)
+        os.remove(os.path.join(self.root, 'gone.py'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _files(self, *args, **kwargs):
+        with patch('githooks.repo.repo_root', Mock(return_value=self.root)):
+            return sorted(os.path.relpath(p, self.root) for p in repo.iter_files(*args, **kwargs))
+
+    def test_all_files___every_tracked_file_in_the_working_tree_is_given(self):
+        self.assertEqual(['a.py', 'b.py', os.path.join('dir', 'c.py')], self._files(all_files=True))
+
+    def test_paths_are_given___only_those_paths_are_given(self):
+        self.assertEqual([os.path.join('dir', 'c.py')], self._files(paths=[os.path.join(self.root, 'dir')]))
+
+    def test_revision_range_is_given___changed_files_are_given(self):
+        with open(os.path.join(self.root, 'a.py'), 'w') as f:
+            f.write('changed')
+        subprocess.check_call(['git', 'commit', '-q', '-am', 'change'], cwd=self.root)
+
+        self.assertEqual(['a.py'], self._files(from_ref='HEAD~1', to_ref='HEAD'))
+        self.assertEqual([], self._files(from_ref='HEAD'))
+
+    def test_output_is_read_in_small_blocks___all_paths_are_given(self):
+        with patch('githooks.repo.repo_root', Mock(return_value=self.root)):
+            self.assertEqual(['a.py', 'b.py', 'dir/c.py', 'gone.py'], list(repo.stream_git_paths(['ls-files', '-z'], buffer_size=3)))
+
+    def test_git_fails___error_is_raised(self):
+        with self.assertRaises(subprocess.CalledProcessError):
+            list(repo.stream_git_paths(['diff', '--name-only', '-z', 'not-a-ref'], self.root))
+
+
+class RepoParseZeroContextDiff(TestCase):
+    def test_hunks_are_given___added_and_changed_ranges_are_returned(self):
+        output = b'\n'.join([
+            b'diff --git a/a.py b/a.py',
+            b'--- a/a.py',
+            b'+++ b/a.py',
+            b'@@ -3 +3 @@ def f():',
+            b'-old',
+            b'+new',
+            b'@@ -10,2 +9,0 @@',
+            b'--- removed line that looks like a header',
+            b'-removed',
+            b'@@ -20,0 +19,3 @@',
+            b'+one',
+            b'+++ added line that looks like a header',
+            b'+@@ -1 +1 @@',
+            b'\\ No newline at end of file',
+            b'diff --git "a/t\\tab.py" "b/t\\tab.py"',
+            b'new file mode 100644',
+            b'--- /dev/null',
+            b'+++ "b/t\\tab.py"',
+            b'@@ -0,0 +1,2 @@',
+            b'+x',
+            b'+y',
+        ])
+
+        self.assertEqual({'a.py': [(3, 3), (19, 21)], 't\tab.py': [(1, 2)]}, repo.parse_zero_context_diff(output))
+
+
+class RepoStagedChanges(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        git.Repo.init(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, content):
+        with open(os.path.join(self.root, name), 'w') as f:
+            f.write(content)
+
+    def blob(self, name):
+        return subprocess.check_output(['git', 'rev-parse', ':' + name], cwd=self.root).decode().strip()
+
+    def test_repo_has_no_commits___every_file_is_added(self):
+        self.write('a.py', 'a\n')
+        subprocess.check_call(['git', 'add', '.'], cwd=self.root)
+
+        self.assertEqual(
+            [repo.FileChange('A', os.path.join(self.root, 'a.py'), None, None, None, self.blob('a.py'))],
+            repo.staged_changes(self.root),
+        )
+
+    def test_files_are_moved___renames_are_reported_with_their_object_ids(self):
+        content = ''.join('line {0}\n'.format(i) for i in range(100))
+        for name in ['moved.py', 'edited.py', 'changed.py', 'deleted.py']:
+            self.write(name, name + '\n' + content)
+        subprocess.check_call(['git', 'add', '.'], cwd=self.root)
+        git_commit(self.root)
+        old = dict((name, self.blob(name)) for name in ['moved.py', 'edited.py', 'changed.py', 'deleted.py'])
+
+        subprocess.check_call(['git', 'mv', 'moved.py', 'renamed.py'], cwd=self.root)
+        subprocess.check_call(['git', 'mv', 'edited.py', 'rewritten.py'], cwd=self.root)
+        self.write('rewritten.py', 'edited.py\n' + content + 'extra\n')
+        self.write('changed.py', 'changed\n')
+        subprocess.check_call(['git', 'add', '.'], cwd=self.root)
+        subprocess.check_call(['git', 'rm', '-q', 'deleted.py'], cwd=self.root)
+
+        changes = dict((os.path.basename(c.path), c) for c in repo.staged_changes(self.root))
+
+        self.assertEqual(
+            repo.FileChange('R', os.path.join(self.root, 'renamed.py'), os.path.join(self.root, 'moved.py'), 100, old['moved.py'], old['moved.py']),
+            changes['renamed.py'],
+        )
+        self.assertEqual(('R', os.path.join(self.root, 'edited.py'), old['edited.py'], self.blob('rewritten.py')), (
+            changes['rewritten.py'].status, changes['rewritten.py'].old_path, changes['rewritten.py'].old_oid, changes['rewritten.py'].new_oid,
+        ))
+        self.assertLess(changes['rewritten.py'].similarity, 100)
+        self.assertEqual(repo.FileChange('M', os.path.join(self.root, 'changed.py'), None, None, old['changed.py'], self.blob('changed.py')), changes['changed.py'])
+        self.assertEqual(repo.FileChange('D', os.path.join(self.root, 'deleted.py'), None, None, old['deleted.py'], None), changes['deleted.py'])
+
+
+class RepoChangedLines(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        git.Repo.init(self.root)
+
+        with open(os.path.join(self.root, 'big.py'), 'w') as f:
+            f.write(''.join('line {0}\n'.format(i) for i in range(1, 1001)))
+        with open(os.path.join(self.root, 'other.py'), 'w') as f:
+            f.write('other\n')
+
+        subprocess.check_call(['git', 'add', '.'], cwd=self.root)
+        git_commit(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_files_are_staged___ranges_of_the_staged_lines_are_returned(self):
+        lines = ['line {0}\n'.format(i) for i in range(1, 1001)]
+        lines[499] = 'changed\n'
+        lines[899:902] = ['new\n', 'new\n']
+        with open(os.path.join(self.root, 'big.py'), 'w') as f:
+            f.write(''.join(lines))
+        with open(os.path.join(self.root, 'new.py'), 'w') as f:
+            f.write('a\nb\n')
+        with open(os.path.join(self.root, 'other.py'), 'w') as f:
+            f.write('unstaged\n')
+        os.remove(os.path.join(self.root, 'other.py'))
+        subprocess.check_call(['git', 'add', 'big.py', 'new.py', 'other.py'], cwd=self.root)
+
+        self.assertEqual(
+            {os.path.join(self.root, 'big.py'): [(500, 500), (900, 901)], os.path.join(self.root, 'new.py'): [(1, 2)]},
+            repo.changed_lines(self.root),
+        )
+
+
+class RepoClassifyFiles(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        git.Repo.init(self.root)
+
+        files = {
+            '.gitattributes': '*.png binary\n*.psd filter=lfs diff=lfs merge=lfs -text\n*.min.js -diff\n',
+            'image.png': 'png',
+            'design.psd': 'version https://git-lfs.github.com/spec/v1\n',
+            'app.min.js': 'js',
+            'a.py': 'a' * 2048,
+            'line\nbreak.py': 'b',
+        }
+        for name, content in files.items():
+            with open(os.path.join(self.root, name), 'w') as f:
+                f.write(content)
+
+        subprocess.check_call(['git', 'add', '.'], cwd=self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_files_are_staged___files_are_classified_by_attributes_and_staged_size(self):
+        names = ['image.png', 'design.psd', 'app.min.js', 'a.py', 'line\nbreak.py']
+
+        classes = repo.classify_files([os.path.join(self.root, n) for n in names], self.root)
+
+        self.assertEqual({
+            os.path.join(self.root, 'image.png'): repo.FileInfo(3, True, False),
+            os.path.join(self.root, 'design.psd'): repo.FileInfo(43, True, True),
+            os.path.join(self.root, 'app.min.js'): repo.FileInfo(2, True, False),
+            os.path.join(self.root, 'a.py'): repo.FileInfo(2048, False, False),
+            os.path.join(self.root, 'line\nbreak.py'): repo.FileInfo(None, False, False),
+        }, classes)
+
+    def test_no_files_are_given___result_is_empty(self):
+        self.assertEqual({}, repo.classify_files([], self.root))
+
+
+class RepoStagedSnapshot(TestCase):
+    def setUp(self):
+        self.root = os.path.realpath(tempfile.mkdtemp())
+        git.Repo.init(self.root)
+
+        self.write('a.py', 'a')
+        self.write('b/c.py', 'c')
+        self.write('d/e.py', 'e')
+        subprocess.check_call(['git', 'add', '.'], cwd=self.root)
+        git_commit(self.root)
+
+        self.write('b/c.py', 'staged')
+        subprocess.check_call(['git', 'add', 'b/c.py'], cwd=self.root)
+        self.write('b/c.py', 'unstaged')
+        self.write('d/e.py', 'unstaged')
+        self.write('u.txt', 'untracked')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, content):
+        path = os.path.join(self.root, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_files_have_unstaged_changes___they_are_found(self):
+        self.assertEqual(
+            sorted([os.path.join(self.root, 'b/c.py'), os.path.join(self.root, 'd/e.py')]),
+            sorted(repo.unstaged_files(root=self.root)),
+        )
+        self.assertEqual([os.path.join(self.root, 'd/e.py')], repo.unstaged_files([os.path.join(self.root, 'd/e.py')], self.root))
+        self.assertEqual([], repo.unstaged_files([], self.root))
+
+    def test_snapshot_is_built___staged_content_is_written_and_everything_else_is_linked(self):
+        with patch.dict(os.environ, {'GIT_HOOKS_SNAPSHOT_DIR': tempfile.gettempdir()}):
+            with repo.StagedSnapshot([os.path.join(self.root, 'b/c.py')], self.root) as snapshot:
+                path = snapshot.path
+
+                with open(snapshot.path_for(os.path.join(self.root, 'b/c.py'))) as f:
+                    self.assertEqual('staged', f.read())
+                with open(os.path.join(path, 'd', 'e.py')) as f:
+                    self.assertEqual('e', f.read())
+
+                self.assertFalse(os.path.islink(os.path.join(path, 'b', 'c.py')))
+                self.assertTrue(os.path.islink(os.path.join(path, 'a.py')))
+                self.assertTrue(os.path.islink(os.path.join(path, 'u.txt')))
+                self.assertTrue(os.path.islink(os.path.join(path, '.git')))
+                self.assertEqual('--flag', snapshot.path_for('--flag'))
+
+        self.assertFalse(os.path.exists(path))
+
+
+class RepoStageFiles(TestCase):
+    def setUp(self):
+        self.root = os.path.realpath(tempfile.mkdtemp())
+        git.Repo.init(self.root)
+
+        self.write(self.root, 'a.py', 'a')
+        self.write(self.root, 'b.py', 'b')
+        subprocess.check_call(['git', 'add', '.'], cwd=self.root)
+        git_commit(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, root, name, content):
+        with open(os.path.join(root, name), 'w') as f:
+            f.write(content)
+
+    def staged(self, name):
+        return repo._git_output(self.root, ['show', ':' + name])
+
+    def test_files_are_changed_in_the_working_tree___they_are_staged(self):
+        self.write(self.root, 'a.py', 'fixed')
+
+        with patch('githooks.repo._locate', return_value=(os.path.join(self.root, '.git'), self.root)):
+            repo.stage_files([os.path.join(self.root, 'a.py')])
+
+        self.assertEqual('fixed', self.staged('a.py'))
+
+    def test_files_are_changed_in_another_work_tree___they_are_staged_from_it_and_can_be_written_back(self):
+        other = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, other)
+        self.write(other, 'a.py', 'fixed')
+        self.write(other, 'b.py', 'fixed')
+
+        with patch('githooks.repo._locate', return_value=(os.path.join(self.root, '.git'), self.root)):
+            repo.stage_files([os.path.join(self.root, 'a.py'), os.path.join(self.root, 'b.py')], other)
+            repo.checkout_files([os.path.join(self.root, 'a.py')])
+
+        self.assertEqual(('fixed', 'fixed'), (self.staged('a.py'), self.staged('b.py')))
+        with open(os.path.join(self.root, 'a.py')) as f:
+            self.assertEqual('fixed', f.read())
+        with open(os.path.join(self.root, 'b.py')) as f:
+            self.assertEqual('b', f.read())
+
+
+class RepoIterCommitChanges(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        git.Repo.init(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _commit(self, files, removed=()):
+        for name, content in files.items():
+            with open(os.path.join(self.root, name), 'w') as f:
+                f.write(content)
+        for name in removed:
+            os.remove(os.path.join(self.root, name))
+
+        subprocess.check_call(['git', 'add', '-A', '.'], cwd=self.root)
+        git_commit(self.root)
+
+        return git.Repo(self.root).head.commit.hexsha
+
+    def _blob(self, sha, name):
+        return git.Repo(self.root).commit(sha).tree[name].hexsha
+
+    def test_each_commit_in_the_range_is_given_oldest_first(self):
+        first = self._commit({'a.py': 'a', 'b.py': 'b'})
+        second = self._commit({'a.py': 'changed', 'c.py': 'c'}, removed=['b.py'])
+
+        changes = list(repo.iter_commit_changes('HEAD', self.root))
+
+        self.assertEqual([
+            repo.CommitChanges(first, [(os.path.join(self.root, 'a.py'), self._blob(first, 'a.py')), (os.path.join(self.root, 'b.py'), self._blob(first, 'b.py'))], [], []),
+            repo.CommitChanges(second, [(os.path.join(self.root, 'c.py'), self._blob(second, 'c.py'))], [(os.path.join(self.root, 'a.py'), self._blob(second, 'a.py'))], [os.path.join(self.root, 'b.py')]),
+        ], changes)
+
+        self.assertEqual([second], [c.sha for c in repo.iter_commit_changes('HEAD~1..HEAD', self.root)])
+
+    def test_range_is_invalid___error_is_raised(self):
+        self._commit({'a.py': 'a'})
+
+        with self.assertRaises(subprocess.CalledProcessError):
+            list(repo.iter_commit_changes('not-a-ref', self.root))
+
+
+class RepoCommitChanges(RepoIterCommitChanges):
+    def test_root_commit___every_file_is_added(self):
+        sha = self._commit({'a.py': 'a'})
+
+        self.assertEqual(
+            repo.CommitChanges(sha, [(os.path.join(self.root, 'a.py'), self._blob(sha, 'a.py'))], [], []),
+            repo.commit_changes(sha, self.root),
+        )
+
+    def test_merge_commit___changes_are_against_the_first_parent(self):
+        self._commit({'a.py': 'a', 'b.py': 'b'})
+        subprocess.check_call(['git', 'checkout', '-q', '-b', 'feature'], cwd=self.root)
+        self._commit({'b.py': 'feature'})
+        subprocess.check_call(['git', 'checkout', '-q', '-'], cwd=self.root)
+        self._commit({'a.py': 'main'})
+        subprocess.check_call(['git', '-c', 'user.name=a', '-c', 'user.email=a@b', 'merge', '-q', '--no-edit', 'feature'], cwd=self.root)
+        sha = git.Repo(self.root).head.commit.hexsha
+
+        self.assertEqual([], list(repo.iter_commit_changes(sha + '^!', self.root)))
+        self.assertEqual(
+            repo.CommitChanges(sha, [], [(os.path.join(self.root, 'b.py'), self._blob(sha, 'b.py'))], []),
+            repo.commit_changes(sha, self.root),
+        )
+
+
+class RepoWorktree(TestCase):
+    def test_commit_is_checked_out_in_a_temporary_worktree_that_is_removed_on_exit(self):
+        root = tempfile.mkdtemp()
+        try:
+            git.Repo.init(root)
+            with open(os.path.join(root, 'a.py'), 'w') as f:
+                f.write('first')
+            subprocess.check_call(['git', 'add', '.'], cwd=root)
+            git_commit(root)
+            with open(os.path.join(root, 'a.py'), 'w') as f:
+                f.write('second')
+
+            with repo.Worktree(root) as worktree:
+                worktree.checkout('HEAD')
+
+                with open(os.path.join(worktree.path, 'a.py')) as f:
+                    self.assertEqual('first', f.read())
+
+            self.assertFalse(os.path.exists(worktree.path))
+            self.assertEqual(1, len(git.Repo(root).git.worktree('list').splitlines()))
+            with open(os.path.join(root, 'a.py')) as f:
+                self.assertEqual('second', f.read())
+        finally:
+            shutil.rmtree(root)
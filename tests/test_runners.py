@@ -1,3 +1,9 @@
+import json
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
 from random import randint
 
 from hypothesis import example
@@ -7,7 +13,10 @@ from hypothesis import given
 from hypothesis.strategies import lists, text, dictionaries
 from mock import patch, Mock
 
-from githooks import runners, finders
+import git
+import os
+
+from githooks import bytecode, cache, envs, runners, finders, history, plugins, repo, stats
 
 
 class FakeHookFinder(finders.HookFinder):
@@ -66,6 +75,120 @@ class HookRunnerRun(TestCase):
                 subprocess_mock.call.assert_any_call([p] + expected_args)
 
 
+class HookRunnerGetHookCommand(TestCase):
+    def test_hook_is_python___hook_is_started_through_the_bytecode_loader(self):
+        with patch.dict(os.environ, {'GIT_HOOKS_BYTECODE': '1'}):
+            runner = runners.HookRunner()
+            runner.bytecode_class = Mock()
+            runner.bytecode_class.return_value.command.return_value = ['python', '-c', 'loader', 'run', 'key', '/hook']
+
+            self.assertEqual(['python', '-c', 'loader', 'run', 'key', '/hook'], runner.get_hook_command('/hook'))
+            self.assertEqual(runner.get_bytecode(), runner.get_bytecode())
+
+    def test_hook_is_not_python___hook_is_started_directly(self):
+        runner = runners.HookRunner()
+        runner.bytecode_class = Mock()
+        runner.bytecode_class.return_value.command.return_value = None
+
+        self.assertEqual(['/hook'], runner.get_hook_command('/hook'))
+
+    def test_python_hook_was_not_compiled___hook_is_ran_unchanged(self):
+        root = tempfile.mkdtemp()
+        try:
+            path = os.path.join(root, 'hook')
+            with open(path, 'w') as f:
+                f.write('#!{0}\nimport sys\nprint(__name__, __file__, sys.argv)\n'.format(sys.executable))
+            os.chmod(path, 0o755)
+
+            runner = runners.HookRunner()
+            runner.bytecode_class = lambda: bytecode.BytecodeCache(os.path.join(root, 'cache'))
+
+            with patch.dict(os.environ, {'GIT_HOOKS_BYTECODE': '1'}):
+                command = runner.get_hook_command(path)
+
+            self.assertEqual([path], command)
+            self.assertEqual(u'__main__ {0} {1}\n'.format(path, [path, 'a.py']).encode('utf-8'), subprocess.check_output(command + ['a.py']))
+            self.assertFalse(os.path.exists(os.path.join(root, 'cache')))
+        finally:
+            shutil.rmtree(root)
+
+    def test_bytecode_is_disabled___hook_is_started_directly(self):
+        with patch.dict(os.environ, {'GIT_HOOKS_BYTECODE': '0'}):
+            runner = runners.HookRunner()
+            runner.bytecode_class = Mock()
+
+            self.assertEqual(['/hook'], runner.get_hook_command('/hook'))
+            runner.bytecode_class.assert_not_called()
+
+
+class HookRunnerHookEnv(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.hook = os.path.join(self.root, 'flake8')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write_hook(self, content):
+        with open(self.hook, 'w') as f:
+            f.write(content)
+
+    def test_hook_declares_requirements___environment_is_built_with_the_hooks_interpreter(self):
+        self.write_hook('#!/usr/bin/env python3\n# githooks-requirements: flake8==6.0.0\n')
+
+        with patch.dict(os.environ, {'GIT_HOOKS_ENVS': '1'}):
+            runner = runners.HookRunner()
+            runner.env_class = Mock()
+            runner._config_sections = {'requirements': {}}
+
+            self.assertEqual(runner.env_class.return_value.get.return_value, runner.get_hook_env(self.hook))
+            runner.env_class.return_value.get.assert_called_once_with(['flake8==6.0.0'], ['/usr/bin/env', 'python3'])
+
+    def test_hook_declares_no_requirements___no_environment_is_used(self):
+        self.write_hook('#!/bin/sh\n')
+
+        runner = runners.HookRunner()
+        runner.env_class = Mock()
+        runner._config_sections = {'requirements': {}}
+
+        self.assertIsNone(runner.get_hook_env(self.hook))
+        runner.env_class.return_value.get.assert_not_called()
+
+    def test_envs_are_disabled___no_environment_is_used(self):
+        self.write_hook('#!/bin/sh\n# githooks-requirements: flake8\n')
+
+        with patch.dict(os.environ, {'GIT_HOOKS_ENVS': '0'}):
+            runner = runners.HookRunner()
+            runner.env_class = Mock()
+
+            self.assertIsNone(runner.get_hook_env(self.hook))
+
+    def test_hook_has_an_environment___hook_is_ran_with_its_python_and_activated_env(self):
+        self.write_hook('#!/usr/bin/env python3\n')
+
+        with patch.dict(os.environ, {'GIT_HOOKS_ENVS': '1'}):
+            runner = runners.HookRunner()
+            runner.bytecode_class = None
+            runner.env_class = Mock()
+            runner.env_class.return_value.python.return_value = '/envs/abc/bin/python'
+            runner.env_class.return_value.activate.return_value = {'VIRTUAL_ENV': '/envs/abc'}
+
+            with patch.object(runner, 'get_hook_env', return_value='/envs/abc'), patch('githooks.runners.subprocess') as subprocess_mock:
+                subprocess_mock.call.return_value = 0
+                runner.run_hook(self.hook, ['a.py'])
+
+                subprocess_mock.call.assert_called_once_with(['/envs/abc/bin/python', self.hook, 'a.py'], env={'VIRTUAL_ENV': '/envs/abc'})
+
+    def test_environment_cannot_be_built___hook_fails(self):
+        runner = runners.HookRunner()
+
+        with patch.object(runner, 'get_hook_env', side_effect=envs.EnvError('no index')), patch('githooks.runners.subprocess') as subprocess_mock:
+            result = runner.run_hook(self.hook, [], capture=True)
+
+            self.assertEqual((1, 'no index'), (result.status, result.output))
+            subprocess_mock.call.assert_not_called()
+
+
 class HookRunnerGetFinder(TestCase):
     def test_correct_finder_is_returned(self):
         class Cls(object):
@@ -88,14 +211,24 @@ class PreCommitHookRunnerGetProcessKwargs(TestCase):
     def test_result_contains_added_modified_and_deleted(self):
         with patch('githooks.repo.added_files', Mock(return_value=[])):
             with patch('githooks.repo.modified_files', Mock(return_value=[])):
-                with patch('githooks.repo.deleted_files', Mock(return_value=[])):
+                with patch('githooks.repo.deleted_files', Mock(return_value=[])), patch('githooks.repo.staged_changes', Mock(return_value=[])):
 
                     kwargs = runners.PreCommitHookRunner().get_process_kwargs()
 
-                    self.assertEqual(3, len(kwargs))
+                    self.assertEqual(4, len(kwargs))
                     self.assertIn('--added-files', kwargs)
                     self.assertIn('--modified-files', kwargs)
                     self.assertIn('--deleted-files', kwargs)
+                    self.assertIn('--renamed-files', kwargs)
+
+    def test_files_are_renamed___new_paths_are_in_the_renamed_files(self):
+        runner = runners.PreCommitHookRunner()
+        runner._files = {'added': [], 'modified': [], 'deleted': [], 'changes': [
+            repo.FileChange('R', '/repo/new.py', '/repo/old.py', 100, 'a' * 40, 'a' * 40),
+            repo.FileChange('M', '/repo/b.py', None, None, 'b' * 40, 'c' * 40),
+        ]}
+
+        self.assertEqual(['/repo/new.py'], runner.get_process_kwargs()['--renamed-files'])
 
     @given(lists(text(min_size=1, max_size=10), max_size=10))
     def test_result_contains_the_added_files(self, added_files):
@@ -142,3 +275,1021 @@ class PreCommitHookRunnerGetProcessArgs(TestCase):
                     args = runners.PreCommitHookRunner().get_process_args()
 
                     self.assertSequenceEqual(added + modified, args)
+
+
+class HookRunnerGetJobs(TestCase):
+    def test_jobs_are_not_set___one_job_is_used(self):
+        with patch.dict('os.environ', {}, clear=True):
+            self.assertEqual(1, runners.HookRunner().get_jobs())
+
+    def test_jobs_are_set_in_the_environment___environment_value_is_used(self):
+        with patch.dict('os.environ', {'GIT_HOOKS_JOBS': '4'}):
+            self.assertEqual(4, runners.HookRunner().get_jobs())
+
+    def test_jobs_are_given_to_the_runner___given_value_is_used(self):
+        with patch.dict('os.environ', {'GIT_HOOKS_JOBS': '4'}):
+            self.assertEqual(2, runners.HookRunner(jobs=2).get_jobs())
+
+    def test_jobs_in_the_environment_are_invalid___one_job_is_used(self):
+        with patch.dict('os.environ', {'GIT_HOOKS_JOBS': 'lots'}):
+            self.assertEqual(1, runners.HookRunner().get_jobs())
+
+
+class FakeHistory(object):
+    def __init__(self, predictions):
+        self.predictions = predictions
+        self.recorded = []
+        self.saved = False
+
+    def predict(self, name, size):
+        return self.predictions.get(name)
+
+    def record(self, name, size, duration):
+        self.recorded.append((name, size))
+
+    def save(self):
+        self.saved = True
+
+
+class HookRunnerHistory(TestCase):
+    def test_history_class_is_not_set___no_history_is_used(self):
+        self.assertIsNone(runners.HookRunner().get_history('pre-commit'))
+
+    def test_history_is_available___longest_hooks_are_started_first_and_durations_are_recorded(self):
+        hook_history = FakeHistory({'flake8': 1.0, 'tests': 40.0})
+
+        with patch('githooks.runners.subprocess') as subprocess_mock:
+            subprocess_mock.call = Mock(return_value=0)
+
+            runner = FakeRunner(['a', 'b'], {}, FakeHookFinder(['/hooks/flake8', '/hooks/new', '/hooks/tests']))
+            runner.get_history = Mock(return_value=hook_history)
+
+            self.assertEqual(0, runner.run())
+
+            self.assertEqual(
+                [['/hooks/new', 'a', 'b'], ['/hooks/tests', 'a', 'b'], ['/hooks/flake8', 'a', 'b']],
+                [c[0][0] for c in subprocess_mock.call.call_args_list],
+            )
+            self.assertEqual([('new', 2), ('tests', 2), ('flake8', 2)], hook_history.recorded)
+            self.assertTrue(hook_history.saved)
+
+    def test_more_than_one_job_is_used___output_is_captured_and_all_hooks_are_ran(self):
+        with patch('githooks.runners.subprocess') as subprocess_mock:
+            process = Mock(returncode=1)
+            process.communicate = Mock(return_value=(b'output', None))
+            subprocess_mock.Popen = Mock(return_value=process)
+
+            runner = FakeRunner(['a'], {}, FakeHookFinder(['/hooks/one', '/hooks/two', '/hooks/three']))
+            runner.jobs = 2
+
+            self.assertEqual(3, runner.run())
+            self.assertEqual(3, subprocess_mock.Popen.call_count)
+            subprocess_mock.call.assert_not_called()
+
+
+class FakeCache(object):
+    def __init__(self, entries=None):
+        self.entries = entries or {}
+        self.prefetched = []
+
+    def hook_hash(self, hook_path):
+        return os.path.basename(hook_path)
+
+    def prefetch(self, entries):
+        self.prefetched.append(sorted(entries))
+
+    def get(self, hook_hash, key):
+        return self.entries.get((hook_hash, key))
+
+    def set(self, hook_hash, key, result):
+        self.entries[(hook_hash, key)] = result
+
+
+class HookRunnerResultCache(TestCase):
+    def _runner(self, result_cache):
+        runner = FakeRunner(['a'], {}, FakeHookFinder(['/hooks/pass', '/hooks/fail']))
+        runner.get_cache = Mock(return_value=result_cache)
+        runner.get_input_key = Mock(return_value='key')
+        return runner
+
+    def test_cache_class_is_not_set___no_cache_is_used(self):
+        self.assertIsNone(runners.HookRunner().get_cache())
+        self.assertIsNone(runners.HookRunner().get_input_key(['a']))
+
+    def test_cache_is_disabled_in_the_environment___no_cache_is_used(self):
+        with patch.dict(os.environ, {'GIT_HOOKS_CACHE': '0'}):
+            self.assertIsNone(runners.PreCommitHookRunner().get_cache())
+
+    def test_hooks_are_ran___only_passing_results_are_cached(self):
+        result_cache = FakeCache()
+
+        with patch('githooks.runners.subprocess') as subprocess_mock:
+            subprocess_mock.call = Mock(side_effect=lambda args: 0 if args[0] == '/hooks/pass' else 1)
+
+            self.assertEqual(1, self._runner(result_cache).run())
+            self.assertEqual({('pass', 'key'): {'status': 0, 'output': None}}, result_cache.entries)
+
+    def test_hooks_are_ran___every_hook_is_looked_up_in_a_single_batch(self):
+        result_cache = FakeCache()
+
+        with patch('githooks.runners.subprocess') as subprocess_mock:
+            subprocess_mock.call = Mock(return_value=0)
+
+            self._runner(result_cache).run()
+
+            self.assertEqual([[('fail', 'key'), ('pass', 'key')]], result_cache.prefetched)
+
+    def test_results_are_cached___cached_hooks_are_not_ran(self):
+        result_cache = FakeCache({('pass', 'key'): {'status': 0}, ('fail', 'key'): {'status': 1, 'output': 'failed'}})
+        hook_history = FakeHistory({})
+
+        with patch('githooks.runners.subprocess') as subprocess_mock:
+            runner = self._runner(result_cache)
+            runner.get_history = Mock(return_value=hook_history)
+
+            self.assertEqual(1, runner.run())
+            subprocess_mock.call.assert_not_called()
+            self.assertEqual([], hook_history.recorded)
+
+    def test_results_are_precomputed___failures_are_cached_with_their_output(self):
+        result_cache = FakeCache({('pass', 'key'): {'status': 0}})
+
+        with patch('githooks.runners.subprocess') as subprocess_mock:
+            process = Mock(returncode=1)
+            process.communicate = Mock(return_value=(b'bad file\n', None))
+            subprocess_mock.Popen = Mock(return_value=process)
+
+            results = self._runner(result_cache).precompute()
+
+            self.assertEqual(1, subprocess_mock.Popen.call_count)
+            self.assertEqual([('/hooks/pass', True), ('/hooks/fail', False)], sorted(((r.hook, r.cached) for r in results), reverse=True))
+            self.assertEqual({'status': 1, 'output': 'bad file'}, result_cache.entries[('fail', 'key')])
+
+    def test_no_hooks_are_installed___nothing_is_precomputed(self):
+        runner = FakeRunner(['a'], {}, FakeHookFinder([]))
+        self.assertEqual([], runner.precompute())
+
+
+class HookRunnerStats(TestCase):
+    def test_stats_class_is_not_set___no_stats_are_used(self):
+        self.assertIsNone(runners.HookRunner().get_stats())
+
+    def test_stats_are_disabled_in_the_environment___no_stats_are_used(self):
+        with patch.dict(os.environ, {'GIT_HOOKS_STATS': '0'}):
+            self.assertIsNone(runners.PreCommitHookRunner().get_stats())
+
+    def test_hooks_are_ran___each_run_is_recorded_and_metrics_are_exported(self):
+        root = tempfile.mkdtemp()
+        try:
+            run_stats = stats.RunStats(os.path.join(root, 'stats.jsonl'))
+            metrics_path = os.path.join(root, 'githooks.prom')
+
+            with patch('githooks.runners.subprocess') as subprocess_mock, patch.dict(os.environ, {'GIT_HOOKS_METRICS_FILE': metrics_path}):
+                subprocess_mock.call = Mock(side_effect=lambda args: 0 if args[0] == '/hooks/pass' else 1)
+
+                runner = FakeRunner(['a', 'b'], {}, FakeHookFinder(['/hooks/pass', '/hooks/fail']))
+                runner.get_stats = Mock(return_value=run_stats)
+
+                self.assertEqual(1, runner.run())
+
+            self.assertEqual(
+                [('fake-hook', 'fail', 2, 1, False), ('fake-hook', 'pass', 2, 0, False)],
+                sorted((r.hook_type, r.hook, r.files, r.status, r.cached) for r in run_stats.records()),
+            )
+            with open(metrics_path) as f:
+                self.assertIn('githooks_hook_failures_total{hook_type="fake-hook",hook="fail"} 1', f.read())
+        finally:
+            shutil.rmtree(root)
+
+    def test_stats_cannot_be_saved___a_warning_is_logged(self):
+        run_stats = Mock()
+        run_stats.save = Mock(side_effect=IOError('read only'))
+
+        with patch('githooks.runners.logger') as log_mock:
+            runners.HookRunner().save_stats(run_stats)
+
+            log_mock.warning.assert_called_once_with('Could not save the hook stats: read only')
+
+
+class PreCommitHookRunnerInputKey(TestCase):
+    def get_key(self, root, oid='a' * 40, unstaged=(), head_tree='t' * 40, config_digest=''):
+        path = os.path.join(root, 'a.py')
+        runner = runners.PreCommitHookRunner()
+        runner._files = {
+            'added': [path], 'modified': [], 'deleted': [], 'unstaged': [os.path.join(root, p) for p in unstaged],
+            'changed_lines': {path: [[1, 2]]}, 'changes': [repo.FileChange('A', path, None, None, None, oid)],
+            'head_tree': head_tree, 'config_digest': config_digest,
+        }
+
+        with patch('githooks.runners.repo.repo_root', return_value=root):
+            args, _ = runner.build_args()
+            return runner.get_input_key(args)
+
+    def test_same_change_in_different_checkouts___key_is_the_same(self):
+        self.assertEqual(self.get_key('/home/a/project'), self.get_key('/srv/ci/build-1234'))
+
+    def test_staged_content_changes___key_changes(self):
+        self.assertNotEqual(self.get_key('/repo'), self.get_key('/repo', oid='b' * 40))
+
+    def test_committed_files_change___key_changes(self):
+        self.assertNotEqual(self.get_key('/repo'), self.get_key('/repo', head_tree='u' * 40))
+
+    def test_config_changes___key_changes(self):
+        self.assertNotEqual(self.get_key('/repo'), self.get_key('/repo', config_digest='c' * 40))
+
+    def test_hook_reads_a_file_that_is_not_staged___result_is_not_reused_once_that_file_changes(self):
+        root = os.path.realpath(tempfile.mkdtemp())
+        cwd = os.getcwd()
+        try:
+            git.Repo.init(root)
+            hooks_dir = os.path.join(root, '.git', 'hooks', 'pre-commit.d')
+            os.makedirs(hooks_dir)
+            with open(os.path.join(hooks_dir, 'check'), 'w') as f:
+                f.write('#!/bin/sh\n! grep -q bad "$(git rev-parse --show-toplevel)/other.txt"\n')
+            os.chmod(os.path.join(hooks_dir, 'check'), 0o755)
+
+            def commit(name, content):
+                with open(os.path.join(root, name), 'w') as f:
+                    f.write(content)
+                subprocess.check_call(['git', 'add', name], cwd=root)
+                subprocess.check_call(['git', '-c', 'user.name=a', '-c', 'user.email=a@b', 'commit', '-q', '--no-verify', '-m', name, name], cwd=root)
+
+            def run():
+                runner = runners.PreCommitHookRunner()
+                runner.cache_class = lambda: cache.ResultCache(os.path.join(root, 'cache'))
+                runner.history_class = None
+                return runner.run()
+
+            commit('other.txt', 'good')
+            with open(os.path.join(root, 'a.py'), 'w') as f:
+                f.write('a')
+            subprocess.check_call(['git', 'add', 'a.py'], cwd=root)
+            os.chdir(root)
+
+            with patch.dict(os.environ, {'GIT_HOOKS_STATS': '0'}):
+                self.assertEqual(0, run())
+
+                commit('other.txt', 'bad')
+                self.assertEqual(1, run())
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(root)
+
+    def test_file_has_unstaged_changes___key_changes_with_the_working_tree_content(self):
+        root = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(root, 'a.py'), 'w') as f:
+                f.write('one')
+
+            first = self.get_key(root, unstaged=['a.py'])
+            self.assertEqual(first, self.get_key(root, unstaged=['a.py']))
+
+            with open(os.path.join(root, 'a.py'), 'w') as f:
+                f.write('two')
+
+            self.assertNotEqual(first, self.get_key(root, unstaged=['a.py']))
+        finally:
+            shutil.rmtree(root)
+
+
+class PreCommitHookRunnerManifest(TestCase):
+    def test_hooks_are_ran___manifest_is_written_for_the_run_and_removed_after(self):
+        runner = runners.PreCommitHookRunner()
+        runner.cache_class = None
+        runner.snapshot_class = None
+        runner._files = {
+            'added': ['/repo/new.py'], 'modified': ['/repo/a.py'], 'deleted': [], 'changed_lines': {'/repo/a.py': [(3, 4)]}, 'file_info': {},
+            'changes': [repo.FileChange('R', '/repo/new.py', '/repo/old.py', 100, 'a' * 40, 'a' * 40)],
+        }
+        seen = {}
+
+        def run_hook(path, args, capture):
+            with open(runner.manifest_path) as f:
+                seen[path] = json.load(f)
+            return runners.HookResult(path, 0, 0.1, None, False)
+
+        with patch.object(runner, 'run_hook', side_effect=run_hook), patch('githooks.runners.repo.repo_root', return_value='/repo'):
+            results = list(runner.run_hooks(['/hooks/flake8'], [], 2))
+
+        self.assertEqual(1, len(results))
+        self.assertEqual({
+            'version': 1, 'hook_type': 'pre-commit', 'root': '/repo', 'added': ['/repo/new.py'], 'modified': ['/repo/a.py'], 'deleted': [],
+            'changed_lines': {'/repo/a.py': [[3, 4]]}, 'file_info': {},
+            'changes': [{'status': 'R', 'path': '/repo/new.py', 'old_path': '/repo/old.py', 'similarity': 100, 'old_oid': 'a' * 40, 'new_oid': 'a' * 40}],
+        }, seen['/hooks/flake8'])
+        self.assertIsNone(runner.manifest_path)
+
+    def test_manifest_is_written___its_path_is_given_to_the_hook(self):
+        runner = runners.HookRunner()
+        runner.bytecode_class = None
+        runner.manifest_path = '/tmp/manifest.json'
+
+        with patch('githooks.runners.subprocess') as subprocess_mock:
+            subprocess_mock.call.return_value = 0
+            runner.run_hook('/hooks/flake8', [])
+
+            self.assertEqual('/tmp/manifest.json', subprocess_mock.call.call_args[1]['env']['GIT_HOOKS_MANIFEST'])
+
+
+class PreCommitHookRunnerExclusions(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.runner = runners.PreCommitHookRunner()
+        self.runner.cache_class = None
+        self.runner.snapshot_class = None
+        self.runner._config_sections = {'exclude': {}, 'max-size': {}, 'fixers': {}}
+        self.runner._files = {
+            'added': ['/repo/image.png', '/repo/big.csv'],
+            'modified': ['/repo/a.py'],
+            'deleted': [],
+            'changed_lines': {},
+            'changes': [],
+            'file_info': {
+                '/repo/image.png': repo.FileInfo(10, True, False),
+                '/repo/big.csv': repo.FileInfo(10 * 1024 ** 2, False, False),
+                '/repo/a.py': repo.FileInfo(100, False, False),
+            },
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write_hook(self, name, header):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\n' + header)
+        return path
+
+    def test_hook_excludes_binaries_and_large_files___they_are_left_out_of_its_args(self):
+        path = self.write_hook('flake8', '# githooks-exclude: binary\n# githooks-max-size: 1M\n')
+        args, _ = self.runner.build_args()
+
+        self.assertEqual(['/repo/a.py', '--modified-files', '/repo/a.py'], self.runner.get_hook_args(path, args))
+
+    def test_hook_does_not_exclude_anything___args_are_unchanged(self):
+        path = self.write_hook('flake8', '')
+        args, _ = self.runner.build_args()
+
+        self.assertEqual(args, self.runner.get_hook_args(path, args))
+
+    def test_every_file_is_excluded___hook_is_skipped(self):
+        skipped = self.write_hook('images', '# githooks-max-size: 1\n')
+        ran = self.write_hook('flake8', '')
+
+        with patch.object(self.runner, 'run_hook', side_effect=lambda path, args, capture: runners.HookResult(path, 0, 0.1, None, False)):
+            args, size = self.runner.build_args()
+            results = list(self.runner.run_hooks([skipped, ran], args, size))
+
+        self.assertEqual([(skipped, True, 0), (ran, False, 0)], [(r.hook, r.skipped, r.status) for r in results])
+
+    def run_for_manifest(self, hooks):
+        seen = {}
+
+        def run_hook(path, args, capture):
+            with open(self.runner.manifest_path) as f:
+                seen[path] = json.load(f)
+            return runners.HookResult(path, 0, 0.1, None, False)
+
+        with patch.object(self.runner, 'run_hook', side_effect=run_hook), patch('githooks.runners.repo.repo_root', return_value='/repo'):
+            args, size = self.runner.build_args()
+            list(self.runner.run_hooks(hooks, args, size))
+
+        return seen[hooks[0]]
+
+    def test_no_hook_excludes_files___files_are_not_classified_and_the_manifest_has_no_file_info(self):
+        self.runner._files.pop('file_info')
+
+        with patch('githooks.runners.repo.classify_files') as classify_mock:
+            manifest = self.run_for_manifest([self.write_hook('flake8', '')])
+
+        classify_mock.assert_not_called()
+        self.assertEqual({}, manifest['file_info'])
+
+    def test_hook_excludes_files___the_manifest_has_the_file_info(self):
+        manifest = self.run_for_manifest([self.write_hook('flake8', ''), self.write_hook('images', '# githooks-exclude: binary\n')])
+
+        self.assertEqual({'size': 10, 'binary': True, 'lfs': False}, manifest['file_info']['/repo/image.png'])
+
+
+class PreCommitHookRunnerSelectHooks(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.runner = runners.PreCommitHookRunner(defer_hooks=True)
+        self.runner._config_sections = {'deferred': {}, 'budget': {}, 'fixers': {}}
+        self.history = Mock()
+        self.history.predict = Mock(side_effect=lambda name, size: {'mypy': 8.0, 'pytest': 5.0, 'flake8': 1.0}.get(name))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write_hook(self, name, header=''):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\n' + header)
+        return path
+
+    def select(self, hooks, env=None):
+        with patch('githooks.runners.deferred.queue') as queue_mock, patch('githooks.runners.deferred.report_pending'), \
+                patch.dict(os.environ, env or {}):
+            selected = self.runner.select_hooks(hooks, 1, self.history)
+
+        return selected, queue_mock.call_args[0][0] if queue_mock.called else None
+
+    def test_hook_is_always_deferred___it_is_queued_rather_than_ran(self):
+        mypy = self.write_hook('mypy', '# githooks-deferred: always\n')
+        flake8 = self.write_hook('flake8')
+
+        self.assertEqual(([flake8], [mypy]), self.select([mypy, flake8]))
+
+    def test_hooks_exceed_the_budget___slowest_hooks_are_deferred_until_the_rest_fit(self):
+        hooks = [self.write_hook('mypy'), self.write_hook('pytest'), self.write_hook('flake8'), self.write_hook('new')]
+
+        self.assertEqual((hooks[2:], hooks[:2]), self.select(hooks, {'GIT_HOOKS_COMMIT_BUDGET': '4'}))
+
+    def test_hook_is_never_deferred___next_slowest_hook_is_deferred_instead(self):
+        hooks = [self.write_hook('mypy', '# githooks-deferred: never\n'), self.write_hook('pytest'), self.write_hook('flake8')]
+        self.runner._config_sections['budget'] = {'pre-commit': '10'}
+
+        self.assertEqual(([hooks[0], hooks[2]], [hooks[1]]), self.select(hooks))
+
+    def test_hooks_fit_the_budget___nothing_is_deferred_and_the_queue_is_cleared(self):
+        hooks = [self.write_hook('mypy'), self.write_hook('flake8')]
+
+        self.assertEqual((hooks, []), self.select(hooks, {'GIT_HOOKS_COMMIT_BUDGET': '9'}))
+
+    def test_deferring_is_disabled___every_hook_is_ran(self):
+        hooks = [self.write_hook('mypy', '# githooks-deferred: always\n')]
+
+        self.assertEqual((hooks, None), self.select(hooks, {'GIT_HOOKS_DEFERRED': '0'}))
+
+    def test_fixer_is_always_deferred___it_is_still_ran_before_the_commit(self):
+        hooks = [self.write_hook('black', '# githooks-deferred: always\n# githooks-fixer: yes\n')]
+
+        self.assertEqual((hooks, []), self.select(hooks))
+
+    def test_budget_is_invalid___no_budget_is_used(self):
+        with patch.dict(os.environ, {'GIT_HOOKS_COMMIT_BUDGET': 'soon'}):
+            self.assertIsNone(self.runner.get_commit_budget())
+
+
+class DeferredHookRunnerRunDeferred(TestCase):
+    def test_hooks_are_ran___results_include_hooks_that_had_already_passed(self):
+        runner = runners.DeferredHookRunner('abc', ['/hooks/mypy', '/hooks/pytest'])
+        runner.get_finder_class = Mock(return_value=lambda: FakeHookFinder(['/hooks/flake8', '/hooks/mypy', '/hooks/pytest']))
+
+        def run():
+            runner.results.append(runners.HookResult('/hooks/mypy', 1, 2.0, 'bad', False))
+
+        with patch.object(runners.ReplayHookRunner, 'run', side_effect=run):
+            results = runner.run_deferred()
+
+        self.assertEqual([
+            runners.HookResult('/hooks/mypy', 1, 2.0, 'bad', False),
+            runners.HookResult('/hooks/pytest', 0, 0.0, None, True),
+        ], results)
+
+    def test_plugin_hook_was_deferred___it_is_found_by_its_name(self):
+        plugin = plugins.PluginHook('check', 'pkg:check')
+        runner = runners.DeferredHookRunner('abc', ['plugin:check'])
+        runner.get_finder_class = Mock(return_value=lambda: FakeHookFinder(['/hooks/flake8', plugin]))
+
+        self.assertEqual([plugin], runner.get_finder())
+
+    def test_commit_is_checked___changes_are_against_its_first_parent(self):
+        runner = runners.DeferredHookRunner('abc', ['/hooks/mypy'])
+
+        with patch('githooks.runners.repo.commit_changes', return_value=repo.CommitChanges('abc', [], [], [])) as changes_mock:
+            self.assertEqual([repo.CommitChanges('abc', [], [], [])], list(runner.get_commits()))
+
+        changes_mock.assert_called_once_with('abc')
+
+
+class PreCommitHookRunnerDeferQueue(TestCase):
+    def setUp(self):
+        self.runner = runners.PreCommitHookRunner(defer_hooks=True)
+        self.runner.recurse_submodules = False
+
+    def run_hooks(self, results):
+        with patch('githooks.runners.HookRunner.iter_results', return_value=iter(results)), patch('githooks.runners.deferred.queue') as queue_mock:
+            list(self.runner.iter_results())
+
+        return queue_mock
+
+    def test_hooks_pass___queue_is_only_cleared_before_the_run(self):
+        queue_mock = self.run_hooks([runners.HookResult('/hooks/flake8', 0, 0.1, None, False)])
+
+        queue_mock.assert_called_once_with([])
+
+    def test_hook_fails___queue_is_cleared_after_the_run(self):
+        queue_mock = self.run_hooks([runners.HookResult('/hooks/flake8', 1, 0.1, None, False)])
+
+        self.assertEqual(2, queue_mock.call_count)
+        queue_mock.assert_called_with([])
+
+    def test_hooks_are_not_ran_by_the_hook_script___nothing_is_deferred(self):
+        runner = runners.PreCommitHookRunner()
+
+        with patch('githooks.runners.deferred.queue') as queue_mock:
+            self.assertEqual(['/hooks/mypy'], runner.select_hooks(['/hooks/mypy'], 1))
+
+        self.assertFalse(runner.defer_hooks)
+        queue_mock.assert_not_called()
+
+
+class PreCommitHookRunnerFileResults(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.hook = os.path.join(self.dir, 'check')
+        with open(self.hook, 'w') as f:
+            f.write('#!/bin/sh\n# githooks-results: jsonl\n')
+
+        self.files = ['/repo/a.py', '/repo/b.py', '/repo/c.py']
+        self.oids = {'/repo/a.py': 'a' * 40, '/repo/b.py': 'b' * 40, '/repo/c.py': 'c' * 40}
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def run_hooks(self, failing=()):
+        runner = runners.PreCommitHookRunner()
+        runner.cache_class = lambda: cache.ResultCache(os.path.join(self.dir, 'cache'))
+        runner.snapshot_class = None
+        runner._config_sections = {'exclude': {}, 'max-size': {}, 'results': {}, 'fixers': {}}
+        runner._files = {
+            'added': [], 'modified': list(self.files), 'deleted': [], 'changed_lines': {}, 'file_info': {}, 'unstaged': [],
+            'changes': [repo.FileChange('M', p, None, None, '0' * 39 + '1', self.oids[p]) for p in self.files],
+            'head_tree': 't' * 40, 'config_digest': '',
+        }
+
+        def run_hook(path, args, capture):
+            given = [a for a in args if not a.startswith('--')]
+            self.calls.append(sorted(set(given)))
+            if path in runner.results_paths:
+                with open(runner.results_paths[path], 'a') as f:
+                    for p in sorted(set(given)):
+                        f.write(json.dumps({'path': p, 'status': 1 if p in failing else 0}) + '\n')
+                    f.write('not json\n')
+
+            return runners.HookResult(path, 1 if set(given) & set(failing) else 0, 0.1, None, False)
+
+        with patch.object(runner, 'run_hook', side_effect=run_hook), patch('githooks.runners.repo.repo_root', return_value='/repo'), \
+                patch('githooks.runners.cache.hash_file', side_effect=lambda p, hash_file=cache.hash_file: self.oids.get(p) or hash_file(p)):
+            args, size = runner.build_args()
+            return list(runner.run_hooks([self.hook], args, size))
+
+    def test_hook_fails_one_file___only_that_file_is_checked_again(self):
+        self.run_hooks(failing=['/repo/b.py'])
+        self.run_hooks(failing=['/repo/b.py'])
+
+        self.assertEqual([['/repo/a.py', '/repo/b.py', '/repo/c.py'], ['/repo/b.py']], self.calls)
+
+    def test_file_changes___only_the_changed_file_is_checked_again(self):
+        self.run_hooks()
+        self.oids['/repo/c.py'] = 'd' * 40
+        self.run_hooks()
+
+        self.assertEqual([['/repo/a.py', '/repo/b.py', '/repo/c.py'], ['/repo/c.py']], self.calls)
+
+    def test_every_file_has_passed___hook_is_not_ran(self):
+        self.run_hooks(failing=['/repo/b.py'])
+        self.run_hooks()
+        results = self.run_hooks()
+
+        self.assertEqual(2, len(self.calls))
+        self.assertEqual([(0, True)], [(r.status, r.cached) for r in results])
+
+    def test_hook_does_not_report_results___files_are_not_cached_individually(self):
+        with open(self.hook, 'w') as f:
+            f.write('#!/bin/sh\n')
+
+        self.run_hooks(failing=['/repo/b.py'])
+        self.run_hooks(failing=['/repo/b.py'])
+
+        self.assertEqual([['/repo/a.py', '/repo/b.py', '/repo/c.py']] * 2, self.calls)
+
+
+class FakeSnapshot(object):
+    instances = []
+
+    def __init__(self, paths):
+        self.paths = paths
+        self.path = '/snapshot'
+        self.closed = False
+        FakeSnapshot.instances.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.closed = True
+
+    def path_for(self, path):
+        return path.replace('/repo', self.path, 1) if path.startswith('/repo/') else path
+
+
+class PreCommitHookRunnerSnapshot(TestCase):
+    def setUp(self):
+        FakeSnapshot.instances = []
+        self.runner = runners.PreCommitHookRunner()
+        self.runner.cache_class = None
+        self.runner.snapshot_class = FakeSnapshot
+        self.runner._config_sections = {'exclude': {}, 'max-size': {}, 'fixers': {}}
+        self.runner._files = {'added': ['/repo/new.py'], 'modified': ['/repo/a.py'], 'deleted': [], 'changed_lines': {}, 'file_info': {}, 'changes': []}
+
+    def run_hooks(self, hooks):
+        seen = {}
+
+        def run_hook(path, args, capture):
+            seen[path] = (args, self.runner.get_subprocess_kwargs())
+            return runners.HookResult(path, 0, 0.1, None, False)
+
+        with patch.object(self.runner, 'run_hook', side_effect=run_hook), patch('githooks.runners.repo.repo_root', return_value='/repo'):
+            args, size = self.runner.build_args()
+            list(self.runner.run_hooks(hooks, args, size))
+
+        return seen
+
+    def test_snapshot_is_enabled___hooks_share_one_snapshot_and_are_given_paths_in_it(self):
+        with patch.dict(os.environ, {'GIT_HOOKS_SNAPSHOT': '1'}):
+            seen = self.run_hooks(['/hooks/a', '/hooks/b'])
+
+        self.assertEqual(1, len(FakeSnapshot.instances))
+        self.assertEqual(['/repo/new.py', '/repo/a.py'], FakeSnapshot.instances[0].paths)
+        self.assertTrue(FakeSnapshot.instances[0].closed)
+        self.assertIsNone(self.runner.snapshot)
+        for hook in ['/hooks/a', '/hooks/b']:
+            self.assertEqual((
+                ['/snapshot/new.py', '/snapshot/a.py', '--added-files', '/snapshot/new.py', '--modified-files', '/snapshot/a.py'],
+                {'cwd': '/snapshot'},
+            ), seen[hook])
+
+    def test_snapshot_is_disabled___hooks_are_given_paths_in_the_working_tree(self):
+        with patch.dict(os.environ, {'GIT_HOOKS_SNAPSHOT': '0'}):
+            seen = self.run_hooks(['/hooks/a'])
+
+        self.assertEqual([], FakeSnapshot.instances)
+        self.assertEqual((['/repo/new.py', '/repo/a.py', '--added-files', '/repo/new.py', '--modified-files', '/repo/a.py'], {}), seen['/hooks/a'])
+
+    def test_snapshot_is_auto_and_staged_files_have_unstaged_changes___snapshot_is_used(self):
+        with patch.dict(os.environ, {'GIT_HOOKS_SNAPSHOT': 'auto'}), patch('githooks.runners.repo.unstaged_files', return_value=['/repo/a.py']) as unstaged_mock:
+            seen = self.run_hooks(['/hooks/a'])
+
+        unstaged_mock.assert_called_once_with(['/repo/new.py', '/repo/a.py'])
+        self.assertEqual({'cwd': '/snapshot'}, seen['/hooks/a'][1])
+
+    def test_snapshot_is_auto_and_staged_files_match_the_working_tree___snapshot_is_not_used(self):
+        with patch.dict(os.environ, {'GIT_HOOKS_SNAPSHOT': 'auto'}), patch('githooks.runners.repo.unstaged_files', return_value=[]):
+            seen = self.run_hooks(['/hooks/a'])
+
+        self.assertEqual([], FakeSnapshot.instances)
+        self.assertEqual({}, seen['/hooks/a'][1])
+
+    def test_snapshot_cant_be_built___hooks_run_against_the_working_tree(self):
+        with patch.dict(os.environ, {'GIT_HOOKS_SNAPSHOT': '1'}), patch.object(FakeSnapshot, '__enter__', side_effect=OSError('no space')):
+            seen = self.run_hooks(['/hooks/a'])
+
+        self.assertEqual({}, seen['/hooks/a'][1])
+
+
+class PreCommitHookRunnerFixers(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.hooks = tempfile.mkdtemp()
+        self.a = os.path.join(self.root, 'a.py')
+        with open(self.a, 'w') as f:
+            f.write('bad')
+
+        self.runner = runners.PreCommitHookRunner()
+        self.runner.cache_class = None
+        self.runner.snapshot_class = None
+        self.runner._config_sections = {'exclude': {}, 'max-size': {}, 'fixers': {}}
+        self.runner._files = {'added': [], 'modified': [self.a], 'deleted': [], 'changed_lines': {}, 'file_info': {}, 'unstaged': [], 'changes': []}
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        shutil.rmtree(self.hooks)
+
+    def write_hook(self, name, body):
+        path = os.path.join(self.hooks, name)
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\n' + body)
+
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        return path
+
+    def run_hooks(self, hooks, store_failures=False):
+        with patch('githooks.runners.repo.stage_files') as stage_mock, patch('githooks.runners.repo.repo_root', return_value=self.root), \
+                patch('githooks.runners.repo.changed_lines', return_value={}), patch('githooks.runners.repo.staged_changes', return_value=[]), \
+                patch('githooks.runners.repo.classify_files', return_value={}), \
+                patch.dict(os.environ, {'GIT_HOOKS_BYTECODE': '0', 'GIT_HOOKS_ENVS': '0'}):
+            self.runner.capture = True
+            args, size = self.runner.build_args()
+            results = list(self.runner.run_hooks(hooks, args, size, store_failures=store_failures))
+
+        return dict((r.hook, (r.status, r.output)) for r in results), stage_mock
+
+    def test_fixer_changes_a_file_and_fails___it_is_ran_again_and_the_file_is_staged_before_other_hooks_run(self):
+        fixer = self.write_hook('fix', '# githooks-fixer: yes\ngrep -q bad "$1" || exit 0\necho good > "$1"\necho fixed\nexit 1\n')
+        check = self.write_hook('check', 'cat "$1"\n')
+
+        results, stage_mock = self.run_hooks([check, fixer])
+
+        self.assertEqual({fixer: (0, ''), check: (0, 'good')}, results)
+        stage_mock.assert_called_once_with([self.a])
+
+    def test_fixer_changes_nothing___nothing_is_staged(self):
+        fixer = self.write_hook('fix', '# githooks-fixer: yes\nexit 0\n')
+
+        results, stage_mock = self.run_hooks([fixer])
+
+        self.assertEqual({fixer: (0, '')}, results)
+        stage_mock.assert_not_called()
+
+    def test_file_has_unstaged_changes_without_a_snapshot___it_is_not_staged(self):
+        fixer = self.write_hook('fix', '# githooks-fixer: yes\necho good > "$1"\n')
+        self.runner._files['unstaged'] = [self.a]
+
+        _, stage_mock = self.run_hooks([fixer])
+
+        stage_mock.assert_called_once_with([])
+
+    def test_files_cant_be_staged___fixer_fails(self):
+        fixer = self.write_hook('fix', '# githooks-fixer: yes\necho good > "$1"\n')
+
+        with patch.object(self.runner, 'stage_fixed_files', side_effect=OSError('locked')):
+            results, _ = self.run_hooks([fixer])
+
+        self.assertEqual({fixer: (1, '')}, results)
+
+    def test_results_are_precomputed___fixers_are_not_ran(self):
+        fixer = self.write_hook('fix', '# githooks-fixer: yes\necho good > "$1"\n')
+
+        results, _ = self.run_hooks([fixer], store_failures=True)
+
+        self.assertEqual({}, results)
+        with open(self.a) as f:
+            self.assertEqual('bad', f.read())
+
+    def test_fixers_are_disabled___fixer_is_ran_like_any_other_hook(self):
+        fixer = self.write_hook('fix', '# githooks-fixer: yes\necho good > "$1"\nexit 1\n')
+
+        with patch.dict(os.environ, {'GIT_HOOKS_FIXERS': '0'}):
+            results, stage_mock = self.run_hooks([fixer])
+
+        self.assertEqual({fixer: (1, '')}, results)
+        stage_mock.assert_not_called()
+
+    def test_snapshot_is_used___fixes_are_staged_from_it_and_written_to_files_without_unstaged_changes(self):
+        b = os.path.join(self.root, 'b.py')
+        self.runner._files['unstaged'] = [b]
+        self.runner.snapshot = FakeSnapshot([])
+
+        with patch('githooks.runners.repo.stage_files') as stage_mock, patch('githooks.runners.repo.checkout_files') as checkout_mock:
+            self.runner.stage_fixed_files([self.a, b])
+
+        stage_mock.assert_called_once_with([self.a, b], '/snapshot')
+        checkout_mock.assert_called_once_with([self.a])
+
+
+class PreCommitHookRunnerHistoryClass(TestCase):
+    def test_history_class_is_duration_history(self):
+        self.assertEqual(history.DurationHistory, runners.PreCommitHookRunner.history_class)
+
+
+class GetRunner(TestCase):
+    def test_pre_commit_runner_is_returned_for_pre_commit_hooks(self):
+        runner = runners.get_runner('pre-commit', jobs=3)
+
+        self.assertIsInstance(runner, runners.PreCommitHookRunner)
+        self.assertEqual(3, runner.get_jobs())
+
+
+class HookRunnerRunFastExit(TestCase):
+    def test_no_hooks_are_found___no_args_are_built_and_nothing_is_ran(self):
+        with patch('githooks.runners.subprocess') as subprocess_mock:
+            runner = FakeRunner([], {}, FakeHookFinder([]))
+            runner.get_process_args = Mock()
+            runner.has_work = Mock()
+
+            self.assertEqual(0, runner.run())
+
+            runner.get_process_args.assert_not_called()
+            runner.has_work.assert_not_called()
+            subprocess_mock.call.assert_not_called()
+
+    def test_runner_has_no_work___no_args_are_built_and_nothing_is_ran(self):
+        with patch('githooks.runners.subprocess') as subprocess_mock:
+            runner = FakeRunner([], {}, FakeHookFinder(['/hooks/flake8']))
+            runner.get_process_args = Mock()
+            runner.has_work = Mock(return_value=False)
+
+            self.assertEqual(0, runner.run())
+
+            runner.get_process_args.assert_not_called()
+            subprocess_mock.call.assert_not_called()
+
+
+class PreCommitHookRunnerHasWork(TestCase):
+    def test_has_work_is_whether_there_are_staged_changes(self):
+        with patch('githooks.repo.has_staged_changes', Mock(return_value=False)):
+            self.assertFalse(runners.PreCommitHookRunner().has_work())
+
+        with patch('githooks.repo.has_staged_changes', Mock(return_value=True)):
+            self.assertTrue(runners.PreCommitHookRunner().has_work())
+
+    def test_args_and_kwargs_are_built___each_file_list_is_only_computed_once(self):
+        with patch('githooks.repo.added_files', Mock(return_value=['a'])) as added_mock:
+            with patch('githooks.repo.modified_files', Mock(return_value=['m'])) as modified_mock:
+                with patch('githooks.repo.deleted_files', Mock(return_value=['d'])) as deleted_mock:
+                    runner = runners.PreCommitHookRunner()
+
+                    runner.get_process_args()
+                    runner.get_process_kwargs()
+
+                    self.assertEqual(1, added_mock.call_count)
+                    self.assertEqual(1, modified_mock.call_count)
+                    self.assertEqual(1, deleted_mock.call_count)
+
+
+class SubmoduleHookRunnerTests(TestCase):
+    def setUp(self):
+        self.changes = repo.SubmoduleChanges('lib', '/repo/lib', ['/repo/lib/a'], ['/repo/lib/m'], ['/repo/lib/d'])
+
+    def test_files_are_taken_from_the_submodule_changes(self):
+        with patch('githooks.repo.added_files') as added_mock:
+            runner = runners.SubmoduleHookRunner(self.changes)
+
+            self.assertEqual(('/repo/lib/a', '/repo/lib/m'), runner.get_process_args())
+            self.assertEqual(['/repo/lib/d'], runner.get_process_kwargs()['--deleted-files'])
+            added_mock.assert_not_called()
+
+    def test_hooks_are_ran_from_the_submodule_root_without_the_parent_git_environment(self):
+        with patch.dict('os.environ', {'GIT_DIR': '/repo/.git', 'GIT_INDEX_FILE': '/repo/.git/index', 'HOME': '/home'}):
+            kwargs = runners.SubmoduleHookRunner(self.changes).get_subprocess_kwargs()
+
+            self.assertEqual('/repo/lib', kwargs['cwd'])
+            self.assertNotIn('GIT_DIR', kwargs['env'])
+            self.assertNotIn('GIT_INDEX_FILE', kwargs['env'])
+            self.assertEqual('/home', kwargs['env']['HOME'])
+
+    def test_submodule_has_its_own_hooks___they_are_used(self):
+        with patch('githooks.finders.glob') as glob_mock:
+            glob_mock.glob = Mock(return_value=['/repo/.git/modules/lib/hooks/pre-commit.d/own'])
+
+            finder = runners.SubmoduleHookRunner(self.changes).get_finder()
+
+            self.assertEqual('/repo/lib', finder.root)
+
+    def test_submodule_has_no_hooks___parent_hooks_are_used(self):
+        with patch('githooks.finders.glob') as glob_mock:
+            glob_mock.glob = Mock(return_value=[])
+
+            finder = runners.SubmoduleHookRunner(self.changes).get_finder()
+
+            self.assertIsNone(finder.root)
+
+
+class PreCommitHookRunnerRunSubmodules(TestCase):
+    def test_submodules_have_changes___a_runner_is_ran_for_each(self):
+        changes = [
+            repo.SubmoduleChanges('a', '/repo/a', ['/repo/a/x'], [], []),
+            repo.SubmoduleChanges('b', '/repo/b', [], ['/repo/b/y'], []),
+        ]
+
+        runner = runners.PreCommitHookRunner(jobs=2)
+        runner.get_submodule_changes = Mock(return_value=changes)
+        runner.get_history = Mock(return_value=None)
+
+        def iter_results(r):
+            return iter([runners.HookResult('/hooks/flake8', len(r.changes.path), 0.1, None, False)])
+
+        with patch('githooks.runners.SubmoduleHookRunner.iter_results', autospec=True, side_effect=iter_results) as run_mock:
+            self.assertEqual(2, runner.run_submodules())
+            self.assertEqual({'a', 'b'}, set(c[0][0].changes.path for c in run_mock.call_args_list))
+            self.assertTrue(all(c[0][0].capture for c in run_mock.call_args_list))
+
+    def test_no_submodules_have_changes___nothing_is_ran(self):
+        runner = runners.PreCommitHookRunner()
+        runner.get_submodule_changes = Mock(return_value=[])
+
+        with patch('githooks.runners.SubmoduleHookRunner') as runner_mock:
+            self.assertEqual(0, runner.run_submodules())
+            runner_mock.assert_not_called()
+
+    def test_submodules_are_disabled_in_the_environment___submodules_are_not_ran(self):
+        runner = runners.PreCommitHookRunner()
+        runner.get_finder = Mock(return_value=FakeHookFinder([]))
+        runner.iter_submodule_results = Mock(side_effect=lambda: iter([runners.HookResult('/hooks/flake8', 1, 0.1, None, False)]))
+
+        with patch.dict('os.environ', {'GIT_HOOKS_SUBMODULES': '0'}):
+            self.assertEqual(0, runner.run())
+
+        self.assertEqual(1, runner.run())
+
+
+class FileListHookRunnerRun(TestCase):
+    def test_files_are_chunked___every_hook_is_ran_over_every_chunk(self):
+        with patch('githooks.runners.subprocess') as subprocess_mock:
+            subprocess_mock.call = Mock(return_value=0)
+
+            runner = runners.FileListHookRunner('pre-commit', iter(['a', 'b', 'c']), chunk_size=2)
+            runner.get_finder = Mock(return_value=FakeHookFinder(['/hooks/one', '/hooks/two']))
+            runner.get_history = Mock(return_value=None)
+            runner.get_stats = Mock(return_value=None)
+
+            self.assertEqual(0, runner.run())
+
+            self.assertEqual(
+                sorted([['/hooks/one', 'a', 'b'], ['/hooks/two', 'a', 'b'], ['/hooks/one', 'c'], ['/hooks/two', 'c']]),
+                sorted(c[0][0] for c in subprocess_mock.call.call_args_list),
+            )
+
+    def test_hooks_fail___return_codes_are_summed_and_history_and_stats_are_recorded(self):
+        hook_history = FakeHistory({})
+        run_stats = Mock()
+
+        with patch('githooks.runners.subprocess') as subprocess_mock:
+            process = Mock(returncode=1)
+            process.communicate = Mock(return_value=(b'', None))
+            subprocess_mock.Popen = Mock(return_value=process)
+
+            runner = runners.FileListHookRunner('pre-commit', ['a', 'b', 'c'], chunk_size=1, jobs=3)
+            runner.get_finder = Mock(return_value=FakeHookFinder(['/hooks/one']))
+            runner.get_history = Mock(return_value=hook_history)
+            runner.get_stats = Mock(return_value=run_stats)
+
+            self.assertEqual(3, runner.run())
+            self.assertEqual([('one', 1)] * 3, hook_history.recorded)
+            self.assertTrue(hook_history.saved)
+            self.assertEqual([('pre-commit', 1, 1)] * 3, [(c[0][0], c[0][1].status, c[0][2]) for c in run_stats.record.call_args_list])
+            run_stats.save.assert_called_once_with()
+
+    def test_no_hooks_are_installed___files_are_not_read(self):
+        consumed = []
+
+        def files():
+            consumed.append(True)
+            yield 'a'
+
+        runner = runners.FileListHookRunner('pre-commit', files())
+        runner.get_finder = Mock(return_value=FakeHookFinder([]))
+
+        self.assertEqual(0, runner.run())
+        self.assertEqual([], consumed)
+
+
+class ReplayHookRunnerRun(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.hook = os.path.join(self.root, 'hooks', 'nobad')
+        git.Repo.init(self.root)
+
+        os.mkdir(os.path.dirname(self.hook))
+        with open(self.hook, 'w') as f:
+            f.write('#!/bin/sh\nfor f in "$@"; do case "$f" in --*) break;; esac; if grep -q bad "$f"; then exit 1; fi; done\n')
+        os.chmod(self.hook, 0o755)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _commit(self, name, content):
+        with open(os.path.join(self.root, name), 'w') as f:
+            f.write(content)
+
+        subprocess.check_call(['git', 'add', name], cwd=self.root)
+        subprocess.check_call(['git', '-c', 'user.name=a', '-c', 'user.email=a@b', 'commit', '-q', '-m', name], cwd=self.root)
+
+    def _runner(self):
+        runner = runners.ReplayHookRunner('HEAD')
+        runner.get_finder = Mock(return_value=FakeHookFinder([self.hook]))
+        runner.get_history = Mock(return_value=None)
+        runner.get_cache = Mock(return_value=cache.ResultCache(os.path.join(self.root, 'cache')))
+        runner.get_stats = Mock(return_value=None)
+        return runner
+
+    def test_each_commit_is_checked_and_passing_results_are_reused(self):
+        self._commit('a.py', 'good')
+        self._commit('b.py', 'bad')
+        self._commit('c.py', 'good')
+
+        with patch('githooks.repo.repo_root', Mock(return_value=self.root)):
+            runner = self._runner()
+            runner.run_hook = Mock(wraps=runner.run_hook)
+
+            self.assertEqual(1, runner.run())
+            self.assertEqual(3, runner.run_hook.call_count)
+
+            runner = self._runner()
+            runner.run_hook = Mock(wraps=runner.run_hook)
+
+            self.assertEqual(1, runner.run())
+            self.assertEqual(1, runner.run_hook.call_count)
+            self.assertEqual('b.py', os.path.basename(runner.run_hook.call_args[0][1][0]))
+
+    def test_no_hooks_are_installed___nothing_is_checked(self):
+        runner = runners.ReplayHookRunner('HEAD')
+        runner.get_finder = Mock(return_value=FakeHookFinder([]))
+
+        with patch('githooks.repo.iter_commit_changes') as iter_mock:
+            self.assertEqual(0, runner.run())
+            iter_mock.assert_not_called()
@@ -0,0 +1,42 @@
+from hypothesis import given
+from hypothesis.strategies import dictionaries, floats, integers, text
+from unittest2 import TestCase
+
+from githooks import schedule
+
+
+class ScheduleLongestFirst(TestCase):
+    def test_hooks_are_ordered_by_descending_prediction_with_unknown_hooks_first(self):
+        predictions = {'a': 1.0, 'b': 40.0, 'c': None, 'd': 5.0}
+
+        self.assertEqual(['c', 'e', 'b', 'd', 'a'], schedule.longest_first(['a', 'b', 'c', 'd', 'e'], predictions))
+
+
+class SchedulePlan(TestCase):
+    def test_long_hook_is_found_last___it_is_started_first(self):
+        predictions = {'flake8': 2.0, 'isort': 1.0, 'tests': 40.0}
+
+        slots = schedule.plan(['flake8', 'isort', 'tests'], predictions, 2)
+
+        self.assertEqual([
+            schedule.Slot('tests', 0, 0.0, 40.0),
+            schedule.Slot('flake8', 1, 0.0, 2.0),
+            schedule.Slot('isort', 1, 2.0, 3.0),
+        ], slots)
+        self.assertEqual([slots[0]], schedule.critical_path(slots))
+
+    @given(
+        dictionaries(text(min_size=1, max_size=5), floats(min_value=0, max_value=100), max_size=10),
+        integers(min_value=1, max_value=5),
+    )
+    def test_every_hook_is_scheduled_and_critical_path_ends_last(self, predictions, jobs):
+        slots = schedule.plan(list(predictions), predictions, jobs)
+
+        self.assertEqual(sorted(predictions), sorted(s.hook for s in slots))
+        self.assertTrue(all(s.worker < jobs for s in slots))
+
+        path = schedule.critical_path(slots)
+        if slots:
+            self.assertEqual(max(s.end for s in slots), path[-1].end)
+        else:
+            self.assertEqual([], path)
@@ -0,0 +1,155 @@
+import shutil
+import subprocess
+import tempfile
+
+import os
+from mock import patch, Mock
+from unittest2 import TestCase
+
+from githooks import sources
+
+
+def git(root, *args):
+    return subprocess.check_output(['git'] + list(args), cwd=root, stderr=subprocess.STDOUT).decode('utf-8').strip()
+
+
+class SourcesParseGitSpec(TestCase):
+    def test_url_ref_and_path_are_given___each_part_is_parsed(self):
+        self.assertEqual(
+            sources.GitSpec('git+https://host/org/hooks.git@v1.2#pre-commit/flake8', 'https://host/org/hooks.git', 'v1.2', 'pre-commit/flake8'),
+            sources.parse_git_spec('git+https://host/org/hooks.git@v1.2#pre-commit/flake8'),
+        )
+
+    def test_ref_is_not_given___head_is_used(self):
+        self.assertEqual('HEAD', sources.parse_git_spec('git+https://host/hooks.git#flake8').ref)
+
+    def test_url_contains_a_user___it_is_not_taken_as_the_ref(self):
+        spec = sources.parse_git_spec('git+ssh://git@host/org/hooks.git#flake8')
+        self.assertEqual(('ssh://git@host/org/hooks.git', 'HEAD'), (spec.url, spec.ref))
+
+        spec = sources.parse_git_spec('git+git@host:org/hooks.git@main#flake8')
+        self.assertEqual(('git@host:org/hooks.git', 'main'), (spec.url, spec.ref))
+
+    def test_ref_contains_slashes___it_is_parsed_from_the_last_at_after_the_host(self):
+        spec = sources.parse_git_spec('git+https://host/repo.git@release/1.0#flake8')
+        self.assertEqual(('https://host/repo.git', 'release/1.0'), (spec.url, spec.ref))
+
+        spec = sources.parse_git_spec('git+ssh://git@host/org/hooks.git@feature/a/b#flake8')
+        self.assertEqual(('ssh://git@host/org/hooks.git', 'feature/a/b'), (spec.url, spec.ref))
+
+        spec = sources.parse_git_spec('git+git@host:org/hooks.git@release/1.0#flake8')
+        self.assertEqual(('git@host:org/hooks.git', 'release/1.0'), (spec.url, spec.ref))
+
+        spec = sources.parse_git_spec('git+hooks@release/1.0#flake8')
+        self.assertEqual((os.path.abspath('hooks'), 'release/1.0'), (spec.url, spec.ref))
+
+    def test_url_is_a_relative_path___it_is_made_absolute(self):
+        self.assertEqual(os.path.abspath('hooks'), sources.parse_git_spec('git+hooks@main#flake8').url)
+
+    def test_spec_is_invalid___source_error_is_raised(self):
+        for spec in ['https://host/flake8', 'git+https://host/hooks.git', 'git+https://host/hooks.git@#flake8', 'git+#flake8']:
+            self.assertRaises(sources.SourceError, sources.parse_git_spec, spec)
+
+
+class SourcesTestCase(TestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        git(self.source, 'init', '-q')
+        self.commit({'pre-commit/flake8': 'flake8 v1', 'pre-commit/isort': 'isort v1'})
+        git(self.source, 'tag', 'v1')
+
+        self.mirrors = sources.MirrorCache(self.cache_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.source)
+        shutil.rmtree(self.cache_dir)
+
+    def commit(self, files):
+        for path, content in files.items():
+            path = os.path.join(self.source, path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write(content)
+
+        git(self.source, 'add', '-A')
+        git(self.source, '-c', 'user.name=a', '-c', 'user.email=a@b', 'commit', '-q', '-m', 'commit')
+        return git(self.source, 'rev-parse', 'HEAD')
+
+    def read(self, *specs):
+        return sources.read_git_specs([sources.parse_git_spec(s) for s in specs], self.mirrors)
+
+
+class MirrorCacheTests(SourcesTestCase):
+    def test_hooks_are_read___a_mirror_is_cloned_and_all_hooks_come_from_one_read(self):
+        with patch('githooks.sources._git', Mock(wraps=sources._git)) as git_mock:
+            self.assertEqual(
+                {'git+{0}#pre-commit/flake8'.format(self.source): b'flake8 v1', 'git+{0}#pre-commit/isort'.format(self.source): b'isort v1'},
+                self.read('git+{0}#pre-commit/flake8'.format(self.source), 'git+{0}#pre-commit/isort'.format(self.source)),
+            )
+
+            self.assertTrue(os.path.isdir(self.mirrors.mirror_path(self.source)))
+            self.assertEqual(['ls-remote', 'clone', 'cat-file'], [c[0][0][0] for c in git_mock.call_args_list])
+
+    def test_ref_has_not_moved___the_mirror_is_not_fetched(self):
+        self.read('git+{0}#pre-commit/flake8'.format(self.source))
+
+        with patch('githooks.sources._git', Mock(wraps=sources._git)) as git_mock:
+            self.read('git+{0}#pre-commit/flake8'.format(self.source))
+            self.assertNotIn('fetch', [c[0][0][0] for c in git_mock.call_args_list])
+
+    def test_ref_has_moved___the_mirror_is_fetched_and_the_new_content_is_read(self):
+        self.read('git+{0}#pre-commit/flake8'.format(self.source))
+        self.commit({'pre-commit/flake8': 'flake8 v2'})
+
+        with patch('githooks.sources._git', Mock(wraps=sources._git)) as git_mock:
+            self.assertEqual([b'flake8 v2'], list(self.read('git+{0}#pre-commit/flake8'.format(self.source)).values()))
+            self.assertIn('fetch', [c[0][0][0] for c in git_mock.call_args_list])
+
+    def test_tags_and_commits_are_given___content_from_that_ref_is_read(self):
+        self.commit({'pre-commit/flake8': 'flake8 v2'})
+        git(self.source, 'branch', 'stable')
+        sha = self.commit({'pre-commit/flake8': 'flake8 v3'})
+        self.commit({'pre-commit/flake8': 'flake8 v4'})
+
+        self.assertEqual([b'flake8 v1'], list(self.read('git+{0}@v1#pre-commit/flake8'.format(self.source)).values()))
+        self.assertEqual([b'flake8 v2'], list(self.read('git+file://{0}@stable#pre-commit/flake8'.format(self.source)).values()))
+        self.assertEqual([b'flake8 v3'], list(self.read('git+{0}@{1}#pre-commit/flake8'.format(self.source, sha)).values()))
+
+    def test_branch_contains_slashes___content_from_that_branch_is_read(self):
+        git(self.source, 'branch', 'release/1.0')
+        self.commit({'pre-commit/flake8': 'flake8 v2'})
+
+        self.assertEqual([b'flake8 v1'], list(self.read('git+{0}@release/1.0#pre-commit/flake8'.format(self.source)).values()))
+        self.assertEqual([b'flake8 v1'], list(self.read('git+file://{0}@release/1.0#pre-commit/flake8'.format(self.source)).values()))
+
+    def test_branch_differs_from_head___the_branch_commit_is_used(self):
+        git(self.source, 'branch', 'stable')
+        sha = git(self.source, 'rev-parse', 'stable')
+        self.commit({'pre-commit/flake8': 'flake8 v2'})
+
+        self.assertEqual(sha, self.mirrors._remote_sha(self.source, 'stable'))
+        self.assertEqual(git(self.source, 'rev-parse', 'HEAD'), self.mirrors._remote_sha(self.source, 'HEAD'))
+
+    def test_source_cannot_be_reached___the_cached_mirror_is_used(self):
+        self.read('git+{0}#pre-commit/flake8'.format(self.source))
+        moved = self.source + '-moved'
+        os.rename(self.source, moved)
+
+        try:
+            with patch('githooks.sources.logger') as log_mock:
+                self.assertEqual([b'flake8 v1'], list(self.read('git+{0}#pre-commit/flake8'.format(self.source)).values()))
+                log_mock.warning.assert_called_once_with(u'Could not reach "{0}", using the cached mirror'.format(self.source))
+        finally:
+            os.rename(moved, self.source)
+
+    def test_source_does_not_exist___source_error_is_raised(self):
+        self.assertRaises(sources.SourceError, self.read, 'git+{0}-missing#flake8'.format(self.source))
+
+    def test_ref_does_not_exist___source_error_is_raised(self):
+        self.assertRaises(sources.SourceError, self.read, 'git+{0}@{1}#flake8'.format(self.source, 'a' * 40))
+
+    def test_path_does_not_exist___source_error_is_raised(self):
+        self.assertRaises(sources.SourceError, self.read, 'git+{0}#pre-commit/missing'.format(self.source))
+        self.assertRaises(sources.SourceError, self.read, 'git+{0}#pre-commit'.format(self.source))
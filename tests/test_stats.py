@@ -0,0 +1,120 @@
+import shutil
+import tempfile
+
+import os
+from hypothesis import given
+from hypothesis.strategies import lists, floats, integers
+from unittest2 import TestCase
+
+from githooks import stats
+from githooks.runners import HookResult
+
+
+class StatsPercentile(TestCase):
+    def test_no_values___result_is_none(self):
+        self.assertIsNone(stats.percentile([], 50))
+
+    def test_nearest_rank_is_used(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(50, stats.percentile(values, 50))
+        self.assertEqual(95, stats.percentile(values, 95))
+        self.assertEqual(100, stats.percentile(values, 100))
+        self.assertEqual(1, stats.percentile(values, 0))
+
+    @given(lists(floats(min_value=0, max_value=1000), min_size=1), integers(min_value=0, max_value=100))
+    def test_result_is_one_of_the_values(self, values, pct):
+        self.assertIn(stats.percentile(values, pct), values)
+
+
+class RunStatsTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'stats.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_runs_are_recorded___they_are_only_written_when_saved(self):
+        run_stats = stats.RunStats(self.path)
+        run_stats.record('pre-commit', HookResult('/hooks/flake8', 1, 0.5, None, False), 3)
+
+        self.assertEqual([], list(stats.RunStats(self.path).records()))
+
+        run_stats.save()
+        run_stats.save()
+
+        records = list(stats.RunStats(self.path).records())
+        self.assertEqual([('pre-commit', 'flake8', 0.5, 3, 1, False)], [r[1:] for r in records])
+
+    def test_file_grows_too_large___it_is_rotated_and_old_backups_are_dropped(self):
+        run_stats = stats.RunStats(self.path)
+        run_stats.max_bytes = 1
+
+        for i in range(4):
+            run_stats.record('pre-commit', HookResult('/hooks/hook{0}'.format(i), 0, 1.0, None, False), 1)
+            run_stats.save()
+
+        self.assertTrue(os.path.exists(self.path + '.2'))
+        self.assertFalse(os.path.exists(self.path + '.3'))
+        self.assertEqual(['hook1', 'hook2', 'hook3'], [r.hook for r in run_stats.records()])
+
+    def test_no_backups_are_kept___the_file_is_truncated(self):
+        run_stats = stats.RunStats(self.path)
+        run_stats.max_bytes = 1
+        run_stats.backups = 0
+
+        for i in range(2):
+            run_stats.record('pre-commit', HookResult('/hooks/hook{0}'.format(i), 0, 1.0, None, False), 1)
+            run_stats.save()
+
+        self.assertEqual(['hook1'], [r.hook for r in run_stats.records()])
+
+    def test_file_has_bad_lines___they_are_skipped(self):
+        with open(self.path, 'w') as f:
+            f.write('not json\n[1]\n[1.0,"pre-commit","flake8",0.1,1,0,false]\n')
+
+        self.assertEqual(['flake8'], [r.hook for r in stats.RunStats(self.path).records()])
+
+    def test_summary_gives_percentiles_failures_and_cache_hits_for_each_hook(self):
+        run_stats = stats.RunStats(self.path)
+        for duration in [1.0, 2.0, 3.0, 4.0]:
+            run_stats.record('pre-commit', HookResult('/hooks/tests', 0, duration, None, False), 1)
+        run_stats.record('pre-commit', HookResult('/hooks/tests', 1, 0.0, 'failed', True), 1)
+        run_stats.record('pre-commit', HookResult('/hooks/flake8', 0, 0.0, None, True), 1)
+        run_stats.record('pre-push', HookResult('/hooks/lint', 0, 1.0, None, False), 1)
+        run_stats.save()
+
+        self.assertEqual([
+            stats.HookSummary('pre-commit', 'flake8', 1, None, None, None, 0, 0, 1),
+            stats.HookSummary('pre-commit', 'tests', 5, 2.0, 4.0, 4.0, 10.0, 1, 1),
+        ], run_stats.summary('pre-commit'))
+        self.assertEqual(3, len(run_stats.summary()))
+
+
+class StatsOpenMetrics(TestCase):
+    def test_summaries_are_formatted_as_openmetrics(self):
+        text = stats.openmetrics([
+            stats.HookSummary('pre-commit', 'fl"ake8', 3, 0.5, 1.0, 1.0, 2.0, 1, 1),
+            stats.HookSummary('pre-commit', 'cached', 1, None, None, None, 0, 0, 1),
+        ])
+        lines = text.splitlines()
+
+        self.assertEqual('# TYPE githooks_hook_duration_seconds summary', lines[0])
+        self.assertIn('githooks_hook_duration_seconds{hook_type="pre-commit",hook="fl\\"ake8",quantile="0.95"} 1.0', lines)
+        self.assertIn('githooks_hook_duration_seconds_count{hook_type="pre-commit",hook="fl\\"ake8"} 2', lines)
+        self.assertIn('githooks_hook_cache_hits_total{hook_type="pre-commit",hook="cached"} 1', lines)
+        self.assertNotIn('hook="cached",quantile', text)
+        self.assertEqual('# EOF', lines[-1])
+
+    def test_metrics_are_written___file_is_readable_by_collectors(self):
+        root = tempfile.mkdtemp()
+        try:
+            path = os.path.join(root, 'githooks.prom')
+            stats.write_openmetrics([], path)
+
+            with open(path) as f:
+                self.assertEqual(stats.openmetrics([]), f.read())
+            self.assertEqual(0o644, os.stat(path).st_mode & 0o777)
+        finally:
+            shutil.rmtree(root)
@@ -0,0 +1,101 @@
+import shutil
+import sys
+import tempfile
+
+import os
+from hypothesis import given
+from hypothesis.strategies import integers, lists
+from mock import patch
+from unittest2 import TestCase
+
+from githooks import utils
+
+
+class UtilsImapUnordered(TestCase):
+    @given(lists(integers(), max_size=20), integers(min_value=1, max_value=4))
+    def test_all_items_are_processed(self, items, jobs):
+        self.assertEqual(sorted(i * 2 for i in items), sorted(utils.imap_unordered(lambda i: i * 2, items, jobs)))
+
+
+class UtilsLazyModule(TestCase):
+    def test_module_is_imported_when_an_attribute_is_used(self):
+        sys.modules.pop('colorsys', None)
+
+        module = utils.LazyModule('colorsys')
+        self.assertNotIn('colorsys', sys.modules)
+
+        self.assertEqual((0.0, 0.0, 0.0), module.rgb_to_hsv(0, 0, 0))
+        self.assertIn('colorsys', sys.modules)
+
+    def test_attribute_is_patched_through_the_stand_in___module_is_patched(self):
+        module = utils.LazyModule('colorsys')
+
+        with patch.object(module, 'rgb_to_hsv', return_value='patched'):
+            self.assertEqual('patched', sys.modules['colorsys'].rgb_to_hsv(0, 0, 0))
+
+        self.assertEqual((0.0, 0.0, 0.0), sys.modules['colorsys'].rgb_to_hsv(0, 0, 0))
+
+
+class UtilsGetHookNames(TestCase):
+    def test_names_are_requested_many_times___scripts_directory_is_read_once(self):
+        with patch('githooks.utils._hook_names', []), patch('githooks.utils.os.listdir', return_value=['pre-commit', 'commit-msg']) as listdir_mock:
+            self.assertEqual(['commit-msg', 'pre-commit'], utils.get_hook_names())
+            self.assertEqual(['commit-msg', 'pre-commit'], utils.get_hook_names())
+
+        listdir_mock.assert_called_once_with(utils.get_hook_script_dir())
+
+
+class UtilsImportString(TestCase):
+    def test_reference_is_given___object_is_imported(self):
+        self.assertIs(os.path.join, utils.import_string('os:path.join'))
+        self.assertIs(os.path, utils.import_string('os.path'))
+
+
+class UtilsChunks(TestCase):
+    @given(lists(integers(min_value=0, max_value=100).map(str), max_size=50), integers(min_value=1, max_value=10))
+    def test_items_are_split_into_chunks_no_larger_than_the_max(self, items, size):
+        result = list(utils.chunks(items, size))
+
+        self.assertEqual(items, [i for chunk in result for i in chunk])
+        self.assertTrue(all(0 < len(chunk) <= size for chunk in result))
+
+    def test_max_chars_is_given___chunks_are_split_by_length(self):
+        self.assertEqual(
+            [['aa', 'bb'], ['cccccc'], ['d']],
+            list(utils.chunks(['aa', 'bb', 'cccccc', 'd'], 10, 5)),
+        )
+
+
+class UtilsUserCacheDir(TestCase):
+    def test_cache_dir_is_set_in_the_environment___it_is_used(self):
+        with patch.dict(os.environ, {'GIT_HOOKS_CACHE_DIR': '/tmp/hooks-cache'}):
+            self.assertEqual('/tmp/hooks-cache/mirrors', utils.user_cache_dir('mirrors'))
+
+    def test_cache_dir_is_not_set___the_xdg_cache_dir_is_used(self):
+        with patch.dict(os.environ, {'XDG_CACHE_HOME': '/tmp/xdg'}):
+            os.environ.pop('GIT_HOOKS_CACHE_DIR', None)
+            self.assertEqual('/tmp/xdg/git-hooks', utils.user_cache_dir())
+
+
+class UtilsPythonInterpreter(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write_hook(self, name, content):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_shebang_is_python___interpreter_command_is_returned(self):
+        path = self.write_hook('hook', '#!/usr/bin/env python3 -u\nprint(1)\n')
+
+        self.assertEqual(['/usr/bin/env', 'python3', '-u'], utils.python_interpreter(path))
+
+    def test_shebang_is_not_python___result_is_none(self):
+        self.assertIsNone(utils.python_interpreter(self.write_hook('hook', '#!/bin/sh\necho 1\n')))
+        self.assertIsNone(utils.python_interpreter(self.write_hook('other', 'import python\n')))
+        self.assertIsNone(utils.python_interpreter(os.path.join(self.root, 'missing')))
@@ -0,0 +1,106 @@
+import shutil
+import sys
+import tempfile
+import time
+
+import os
+from mock import patch, Mock
+from unittest2 import TestCase, skipUnless
+
+from githooks import watch
+from githooks.runners import HookResult
+
+
+class WatcherTestMixin(object):
+    watcher_class = None
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.index = os.path.join(self.root, 'index')
+        with open(self.index, 'w') as f:
+            f.write('one')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_nothing_changes___wait_times_out(self):
+        watcher = self.watcher_class([self.index])
+        try:
+            self.assertFalse(watcher.wait(0.05))
+        finally:
+            watcher.close()
+
+    def test_file_is_replaced___change_is_seen(self):
+        watcher = self.watcher_class([self.index, os.path.join(self.root, 'missing')])
+        try:
+            time.sleep(0.01)
+            tmp = os.path.join(self.root, 'index.lock')
+            with open(tmp, 'w') as f:
+                f.write('changed')
+            os.rename(tmp, self.index)
+
+            self.assertTrue(watcher.wait(2))
+        finally:
+            watcher.close()
+
+    def test_other_file_in_the_directory_changes___change_is_not_seen(self):
+        watcher = self.watcher_class([self.index])
+        try:
+            with open(os.path.join(self.root, 'other'), 'w') as f:
+                f.write('other')
+
+            self.assertFalse(watcher.wait(0.3))
+        finally:
+            watcher.close()
+
+
+class PollingWatcherTests(WatcherTestMixin, TestCase):
+    watcher_class = watch.PollingWatcher
+
+
+@skipUnless(sys.platform.startswith('linux'), 'inotify is only available on linux')
+class InotifyWatcherTests(WatcherTestMixin, TestCase):
+    watcher_class = watch.InotifyWatcher
+
+
+class WatchGetWatcher(TestCase):
+    def test_poll_is_requested___polling_watcher_is_used(self):
+        self.assertIsInstance(watch.get_watcher([], poll=True), watch.PollingWatcher)
+
+    def test_inotify_is_unavailable___polling_watcher_is_used(self):
+        with patch('githooks.watch.InotifyWatcher', Mock(side_effect=OSError('unavailable'))):
+            self.assertIsInstance(watch.get_watcher([]), watch.PollingWatcher)
+
+
+class WatchWatch(TestCase):
+    def _runner(self):
+        runner = Mock(added_files=['/repo/a.py'], modified_files=['/repo/b.py'])
+        runner.precompute = Mock(return_value=[
+            HookResult('/hooks/flake8', 1, 0.1, 'error', False),
+            HookResult('/hooks/isort', 0, 0.0, None, True),
+        ])
+        return runner
+
+    def test_once_is_set___hooks_are_precomputed_a_single_time(self):
+        runner = self._runner()
+
+        with patch('githooks.watch.get_watcher') as get_watcher_mock:
+            results = watch.watch(lambda: runner, once=True)
+
+            self.assertEqual(runner.precompute.return_value, results)
+            get_watcher_mock.assert_not_called()
+
+    def test_files_change___hooks_are_precomputed_again_once_the_changes_settle(self):
+        runners = [self._runner(), self._runner()]
+        watcher = Mock()
+        watcher.wait = Mock(side_effect=[True, True, False, KeyboardInterrupt])
+
+        with patch('githooks.watch.get_watcher', Mock(return_value=watcher)) as get_watcher_mock:
+            with patch('githooks.watch.repo.index_path', Mock(return_value='/repo/.git/index')):
+                with self.assertRaises(KeyboardInterrupt):
+                    watch.watch(lambda: runners.pop(0), debounce=0.2)
+
+                get_watcher_mock.assert_called_with(['/repo/.git/index', '/repo/a.py', '/repo/b.py'], poll=False)
+                self.assertEqual([(), (0.2, ), (0.2, ), ()], [c[0] for c in watcher.wait.call_args_list])
+                self.assertEqual(2, watcher.close.call_count)
+                self.assertEqual([], runners)